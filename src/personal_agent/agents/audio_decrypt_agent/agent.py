@@ -10,6 +10,123 @@ from typing import Dict, Any, Optional, List
 from loguru import logger
 
 from ..base import BaseAgent, Task, TaskStatus
+from ...utils.cpu_pool import get_cpu_pool
+
+
+CORE_KEY = bytearray([0x68, 0x7A, 0x48, 0x52, 0x41, 0x6D, 0x73, 0x6F,
+                      0x35, 0x6B, 0x49, 0x6E, 0x62, 0x61, 0x78, 0x57])
+
+
+def _build_key_box(key: bytes) -> bytearray:
+    """构建密钥盒"""
+    box = bytearray(256)
+    for i in range(256):
+        box[i] = i
+    
+    j = 0
+    key_len = len(key)
+    for i in range(256):
+        j = (j + box[i] + key[i % key_len]) & 0xff
+        box[i], box[j] = box[j], box[i]
+    
+    return box
+
+
+def decrypt_ncm_file(ncm_path: str, cache_dir: str) -> Optional[str]:
+    """
+    解密NCM文件到缓存目录（在 CPU 工作池进程中执行）
+    
+    Returns:
+        输出文件路径，失败返回 None
+    """
+    import json
+    import base64
+    from Crypto.Cipher import AES
+    
+    try:
+        with open(ncm_path, 'rb') as f:
+            header = f.read(8)
+            if header != b'CTENFDAM':
+                logger.error(f"无效的 NCM 文件头: {header}")
+                return None
+            
+            f.seek(2, 1)
+            
+            key_data_len = struct.unpack('<I', f.read(4))[0]
+            key_data = f.read(key_data_len)
+            
+            key_data = bytearray(key_data)
+            for i in range(len(key_data)):
+                key_data[i] ^= 0x64
+            
+            cipher = AES.new(bytes(CORE_KEY), AES.MODE_ECB)
+            decrypted_key = cipher.decrypt(bytes(key_data))
+            
+            key = decrypted_key[17:]
+            padding_len = key[-1]
+            if padding_len <= len(key) and padding_len <= 16:
+                key = key[:-padding_len]
+            
+            key_box = _build_key_box(key)
+            
+            meta_len = struct.unpack('<I', f.read(4))[0]
+            output_format = '.mp3'
+            if meta_len > 0:
+                meta_data = f.read(meta_len)
+                try:
+                    meta_data = bytearray(meta_data)
+                    for i in range(len(meta_data)):
+                        meta_data[i] ^= 0x63
+                    
+                    meta_data = base64.b64decode(meta_data[22:])
+                    
+                    META_KEY = bytearray([0x23, 0x31, 0x34, 0x6C, 0x6A, 0x6B, 0x5F, 0x21,
+                                          0x5C, 0x5D, 0x26, 0x30, 0x55, 0x3C, 0x27, 0x28])
+                    cipher = AES.new(bytes(META_KEY), AES.MODE_ECB)
+                    decrypted_meta = cipher.decrypt(meta_data)
+                    
+                    padding_len = decrypted_meta[-1]
+                    decrypted_meta = decrypted_meta[:-padding_len]
+                    
+                    meta = json.loads(decrypted_meta.decode('utf-8'))
+                    if 'format' in meta:
+                        fmt = meta['format'].lower()
+                        if fmt in ['mp3', 'flac', 'wav', 'm4a', 'ogg']:
+                            output_format = f'.{fmt}'
+                except Exception as e:
+                    logger.debug(f"元数据解析失败: {e}")
+            
+            f.seek(9, 1)
+            
+            image_size = struct.unpack('<I', f.read(4))[0]
+            if image_size > 0:
+                f.seek(image_size, 1)
+            
+            output_name = Path(ncm_path).stem + output_format
+            output_path = Path(cache_dir) / output_name
+            
+            # 密钥流以 256 字节为周期，预先展开为整块后按大整数异或
+            key_stream = bytes(
+                key_box[(key_box[j] + key_box[(key_box[j] + j) & 0xff]) & 0xff]
+                for j in range(256)
+            )
+            stream = (key_stream[1:] + key_stream[:1]) * (0x8000 // 256)
+            with open(output_path, 'wb') as out:
+                while True:
+                    chunk = f.read(0x8000)
+                    if not chunk:
+                        break
+                    
+                    size = len(chunk)
+                    value = int.from_bytes(chunk, 'little') ^ int.from_bytes(stream[:size], 'little')
+                    out.write(value.to_bytes(size, 'little'))
+            
+            logger.info(f"✅ NCM 解密成功: {output_path}")
+            return str(output_path)
+            
+    except Exception as e:
+        logger.error(f"NCM 解密失败: {e}")
+        return None
 
 
 class AudioDecryptAgent(BaseAgent):
@@ -17,8 +134,7 @@ class AudioDecryptAgent(BaseAgent):
     
     supported_file_types = [".ncm", ".qmc", ".kwm"]
     
-    CORE_KEY = bytearray([0x68, 0x7A, 0x48, 0x52, 0x41, 0x6D, 0x73, 0x6F,
-                          0x35, 0x6B, 0x49, 0x6E, 0x62, 0x61, 0x78, 0x57])
+    DECRYPT_TIMEOUT = 600
     
     def __init__(self):
         super().__init__(
@@ -79,7 +195,7 @@ class AudioDecryptAgent(BaseAgent):
                     "message": f"✅ 解密成功！\n📁 输出文件: {final_path}"
                 }
             
-            output_path = self._decrypt_ncm(str(file_path))
+            output_path = await self._decrypt_ncm(str(file_path))
             
             if output_path:
                 final_path = self._move_to_original_dir(output_path, file_path.parent)
@@ -111,8 +227,9 @@ class AudioDecryptAgent(BaseAgent):
         fail_count = 0
         output_files = []
         
-        for file_path in files:
+        for index, file_path in enumerate(files, 1):
             file_path = Path(file_path)
+            self.report_progress(index * 100 / len(files), f"批量解密 {index}/{len(files)}: {file_path.name}", task=task)
             if not file_path.exists():
                 results.append({"file": str(file_path), "success": False, "error": "文件不存在"})
                 fail_count += 1
@@ -127,7 +244,7 @@ class AudioDecryptAgent(BaseAgent):
                     success_count += 1
                     continue
                 
-                output_path = self._decrypt_ncm(str(file_path))
+                output_path = await self._decrypt_ncm(str(file_path))
                 if output_path:
                     final_path = self._move_to_original_dir(output_path, file_path.parent)
                     results.append({"file": str(file_path), "success": True, "output": final_path})
@@ -180,107 +297,12 @@ class AudioDecryptAgent(BaseAgent):
             logger.error(f"移动文件失败: {e}")
             return cached_path
     
-    def _decrypt_ncm(self, ncm_path: str) -> Optional[str]:
-        """解密NCM文件到缓存目录"""
-        import json
-        import base64
-        from Crypto.Cipher import AES
-        
-        try:
-            with open(ncm_path, 'rb') as f:
-                header = f.read(8)
-                if header != b'CTENFDAM':
-                    logger.error(f"无效的 NCM 文件头: {header}")
-                    return None
-                
-                f.seek(2, 1)
-                
-                key_data_len = struct.unpack('<I', f.read(4))[0]
-                key_data = f.read(key_data_len)
-                
-                key_data = bytearray(key_data)
-                for i in range(len(key_data)):
-                    key_data[i] ^= 0x64
-                
-                cipher = AES.new(bytes(self.CORE_KEY), AES.MODE_ECB)
-                decrypted_key = cipher.decrypt(bytes(key_data))
-                
-                key = decrypted_key[17:]
-                padding_len = key[-1]
-                if padding_len <= len(key) and padding_len <= 16:
-                    key = key[:-padding_len]
-                
-                key_box = self._build_key_box(key)
-                
-                meta_len = struct.unpack('<I', f.read(4))[0]
-                output_format = '.mp3'
-                if meta_len > 0:
-                    meta_data = f.read(meta_len)
-                    try:
-                        meta_data = bytearray(meta_data)
-                        for i in range(len(meta_data)):
-                            meta_data[i] ^= 0x63
-                        
-                        meta_data = base64.b64decode(meta_data[22:])
-                        
-                        META_KEY = bytearray([0x23, 0x31, 0x34, 0x6C, 0x6A, 0x6B, 0x5F, 0x21,
-                                              0x5C, 0x5D, 0x26, 0x30, 0x55, 0x3C, 0x27, 0x28])
-                        cipher = AES.new(bytes(META_KEY), AES.MODE_ECB)
-                        decrypted_meta = cipher.decrypt(meta_data)
-                        
-                        padding_len = decrypted_meta[-1]
-                        decrypted_meta = decrypted_meta[:-padding_len]
-                        
-                        meta = json.loads(decrypted_meta.decode('utf-8'))
-                        if 'format' in meta:
-                            fmt = meta['format'].lower()
-                            if fmt in ['mp3', 'flac', 'wav', 'm4a', 'ogg']:
-                                output_format = f'.{fmt}'
-                    except Exception as e:
-                        logger.debug(f"元数据解析失败: {e}")
-                
-                f.seek(9, 1)
-                
-                image_size = struct.unpack('<I', f.read(4))[0]
-                if image_size > 0:
-                    f.seek(image_size, 1)
-                
-                output_name = Path(ncm_path).stem + output_format
-                output_path = self.cache_dir / output_name
-                
-                with open(output_path, 'wb') as out:
-                    while True:
-                        chunk = f.read(0x8000)
-                        if not chunk:
-                            break
-                        
-                        chunk = bytearray(chunk)
-                        for i in range(len(chunk)):
-                            j = (i + 1) & 0xff
-                            chunk[i] ^= key_box[(key_box[j] + key_box[(key_box[j] + j) & 0xff]) & 0xff]
-                        
-                        out.write(chunk)
-                
-                logger.info(f"✅ NCM 解密成功: {output_path}")
-                return str(output_path)
-                
-        except Exception as e:
-            logger.error(f"NCM 解密失败: {e}")
-            return None
-    
-    def _build_key_box(self, key: bytes) -> bytearray:
-        """构建密钥盒"""
-        box = bytearray(256)
-        for i in range(256):
-            box[i] = i
-        
-        j = 0
-        key_len = len(key)
-        for i in range(256):
-            j = (j + box[i] + key[i % key_len]) & 0xff
-            box[i], box[j] = box[j], box[i]
-        
-        return box
+    async def _decrypt_ncm(self, ncm_path: str) -> Optional[str]:
+        """解密NCM文件到缓存目录（提交到 CPU 工作池）"""
+        return await get_cpu_pool().submit(
+            decrypt_ncm_file, ncm_path, str(self.cache_dir),
+            timeout=self.DECRYPT_TIMEOUT, name=f"decrypt_ncm:{Path(ncm_path).name}"
+        )
     
     def can_handle_file(self, file_path: str, action: str = None) -> bool:
         """检查是否能处理该文件"""
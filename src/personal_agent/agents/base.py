@@ -2,6 +2,7 @@
 Base Agent - 所有智能体的基类
 """
 import asyncio
+import time
 import uuid
 from datetime import datetime
 from enum import Enum
@@ -91,6 +92,8 @@ class BaseAgent:
         self.message_handlers: List[Callable] = []
         self._running = False
         self._task_processor: Optional[asyncio.Task] = None
+        self._current_task: Optional[Task] = None
+        self._progress_marks: Dict[str, tuple] = {}
         
         self.supported_open_formats: List[str] = []
         self.supported_edit_formats: List[str] = []
@@ -346,6 +349,7 @@ class BaseAgent:
         task.status = TaskStatus.RUNNING
         task.started_at = datetime.now()
         self.status = AgentStatus.BUSY
+        self._current_task = task
 
         try:
             result = await self.execute_task(task)
@@ -366,6 +370,8 @@ class BaseAgent:
 
         finally:
             self.status = AgentStatus.IDLE
+            self._current_task = None
+            self._progress_marks.pop(task_id, None)
             logger.debug(f"🔄 '{self.name}' 状态已重置为空闲")
 
     async def execute_task(self, task: Task) -> Any:
@@ -471,6 +477,43 @@ class BaseAgent:
         """注册消息处理器"""
         self.message_handlers.append(handler)
 
+    def report_progress(self, progress: float, message: str = "", task: Optional[Task] = None):
+        """
+        报告当前任务的执行进度，由 master 转发到 Web / GUI 渠道
+
+        可在同步回调中调用；同一任务的相同百分比在 1 秒内只上报一次
+
+        Args:
+            progress: 进度百分比 0-100，-1 表示不确定
+            message: 进度说明
+            task: 任务对象，默认当前正在执行的任务
+        """
+        task = task or self._current_task
+        if task is None:
+            return
+
+        percent = -1 if progress is None or progress < 0 else min(100, int(progress))
+        now = time.monotonic()
+        last = self._progress_marks.get(task.id)
+        if last and percent != 100 and (percent == last[0] or now - last[1] < 1.0):
+            return
+        self._progress_marks[task.id] = (percent, now)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        loop.create_task(self.send_message(
+            to_agent="master",
+            message_type="task_progress",
+            content=message,
+            data={
+                "task_id": task.id,
+                "task_type": task.type,
+                "progress": percent,
+            }
+        ))
+
     async def _send_completion_report(self, task: Task):
         """发送任务完成报告给主智能体"""
         await self.send_message(
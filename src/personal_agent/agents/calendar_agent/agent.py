@@ -2,16 +2,17 @@
 Calendar Agent - 日历管理智能体
 支持创建、查询、修改、删除日程事件
 """
-import asyncio
 import json
 import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 from dataclasses import dataclass, asdict, field
 from pathlib import Path
 from loguru import logger
 
 from ..base import BaseAgent, Task, Message
+from .reminder_scheduler import ReminderScheduler
+from ...scheduler.job_scheduler import get_job_scheduler
 
 
 @dataclass
@@ -48,8 +49,20 @@ class CalendarManager:
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.events_file = self.data_dir / "events.json"
         self.events: Dict[str, CalendarEvent] = {}
+        self._listeners: List[Callable[[str], None]] = []
         self._load_events()
 
+    def add_listener(self, callback: Callable[[str], None]):
+        """注册事件变更监听（参数为事件 ID），提醒调度用它重新安排提醒"""
+        self._listeners.append(callback)
+
+    def _notify(self, event_id: str):
+        for callback in self._listeners:
+            try:
+                callback(event_id)
+            except Exception as e:
+                logger.error(f"日程变更通知失败: {e}")
+
     def _load_events(self):
         """加载事件数据"""
         try:
@@ -83,6 +96,7 @@ class CalendarManager:
         event.updated_at = datetime.now().isoformat()
         self.events[event.id] = event
         self._save_events()
+        self._notify(event.id)
         return event
 
     def get_event(self, event_id: str) -> Optional[CalendarEvent]:
@@ -98,6 +112,7 @@ class CalendarManager:
                     setattr(event, key, value)
             event.updated_at = datetime.now().isoformat()
             self._save_events()
+            self._notify(event_id)
         return event
 
     def delete_event(self, event_id: str) -> bool:
@@ -105,6 +120,7 @@ class CalendarManager:
         if event_id in self.events:
             del self.events[event_id]
             self._save_events()
+            self._notify(event_id)
             return True
         return False
 
@@ -296,6 +312,8 @@ class CalendarAgent(BaseAgent):
         "更新日程": ("update_event", {}),
     }
 
+    REMINDER_JOB = "calendar_reminders"
+
     def __init__(self):
         super().__init__(
             name="calendar_agent",
@@ -320,7 +338,8 @@ class CalendarAgent(BaseAgent):
 
         self.calendar = CalendarManager()
         self.date_parser = DateParser()
-        self._reminder_task = None
+        self.reminders = ReminderScheduler(self.calendar, on_change=self._rearm_reminders)
+        self._reminder_job_active = False
         self._notification_callback = None
 
         self.register_capability("add_event", "添加事件")
@@ -334,97 +353,68 @@ class CalendarAgent(BaseAgent):
     async def start(self):
         """启动智能体"""
         await super().start()
-        self._reminder_task = asyncio.create_task(self._reminder_checker())
-        logger.info("📅 日历提醒检查器已启动")
+        get_job_scheduler().add_job(
+            self._fire_reminders,
+            job_id=self.REMINDER_JOB,
+            trigger="date",
+            name="日程提醒",
+        )
+        self._reminder_job_active = True
+        self._rearm_reminders()
+        logger.info("📅 日历提醒已启动")
 
     async def stop(self):
         """停止智能体"""
-        if self._reminder_task:
-            self._reminder_task.cancel()
+        self._reminder_job_active = False
+        get_job_scheduler().remove_job(self.REMINDER_JOB)
         await super().stop()
 
     def set_notification_callback(self, callback):
         """设置通知回调函数"""
         self._notification_callback = callback
 
-    async def _reminder_checker(self):
-        """定时检查即将到来的事件并发送提醒"""
-        notified_events = set()
-        
-        while True:
-            try:
-                await asyncio.sleep(30)
-                
-                now = datetime.now()
-                today = now.strftime("%Y-%m-%d")
-                current_time = now.strftime("%H:%M")
-                
-                upcoming = self.calendar.get_upcoming(count=20, days=1)
-                
-                for event in upcoming:
-                    if not event.time:
-                        continue
-                    
-                    event_key = f"{event.id}_{event.date}_{event.time}"
-                    
-                    try:
-                        event_date = event.date
-                        event_time = event.time
-                        
-                        if len(event_time) > 5:
-                            import re as re_module
-                            time_match = re_module.search(r'(\d{1,2}:\d{2})', event_time)
-                            if time_match:
-                                event_time = time_match.group(1)
-                        
-                        if ' ' in event_date:
-                            event_date = event_date.split()[0]
-                        
-                        event_datetime = datetime.strptime(f"{event_date} {event_time}", "%Y-%m-%d %H:%M")
-                    except ValueError as e:
-                        logger.warning(f"解析事件时间失败: {event.date} {event.time}, 错误: {e}")
-                        continue
-                    
-                    time_diff = (event_datetime - now).total_seconds()
-                    
-                    if 0 < time_diff <= 300 and event_key not in notified_events:
-                        notified_events.add(event_key)
-                        
-                        minutes = int(time_diff // 60)
-                        if minutes > 0:
-                            message = f"⏰ 提醒：{event.title} 将在 {minutes} 分钟后（{event.time}）开始"
-                        else:
-                            message = f"⏰ 提醒：{event.title} 时间到了！"
-                        
-                        logger.info(f"📅 发送提醒: {message}")
-                        
-                        try:
-                            from ..message_bus import message_bus
-                            from ..base import Message
-                            
-                            notification_msg = Message(
-                                from_agent="calendar_agent",
-                                to_agent="master",
-                                type="notification",
-                                content=message,
-                                data={
-                                    "type": "calendar_reminder",
-                                    "title": "日程提醒",
-                                    "event_id": event.id
-                                }
-                            )
-                            await message_bus.send_message(notification_msg)
-                        except Exception as e:
-                            logger.error(f"发送通知失败: {e}")
-                
-                if now.hour == 0 and now.minute == 0:
-                    notified_events.clear()
-                    
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"提醒检查出错: {e}")
-                await asyncio.sleep(60)
+    def _rearm_reminders(self):
+        """把后台调度器中的提醒任务安排到最近一个提醒的时间（日程变更后调用，可在任意线程）"""
+        if not self._reminder_job_active:
+            return
+        fire_at = self.reminders.next_fire_at()
+        get_job_scheduler().reschedule(self.REMINDER_JOB, run_at=fire_at)
+
+    async def _fire_reminders(self):
+        """发送到期的提醒并安排下一次"""
+        now = datetime.now()
+        for event, occurrence in self.reminders.pop_due(now):
+            await self._send_reminder(event, occurrence, now)
+        self._rearm_reminders()
+
+    async def _send_reminder(self, event: CalendarEvent, occurrence: datetime, now: datetime):
+        """发送一条日程提醒"""
+        minutes = int((occurrence - now).total_seconds() // 60)
+        if minutes > 0:
+            message = f"⏰ 提醒：{event.title} 将在 {minutes} 分钟后（{occurrence.strftime('%H:%M')}）开始"
+        else:
+            message = f"⏰ 提醒：{event.title} 时间到了！"
+
+        logger.info(f"📅 发送提醒: {message}")
+
+        try:
+            from ..message_bus import message_bus
+
+            notification_msg = Message(
+                from_agent="calendar_agent",
+                to_agent="master",
+                type="notification",
+                content=message,
+                data={
+                    "type": "calendar_reminder",
+                    "title": "日程提醒",
+                    "event_id": event.id,
+                    "occurrence": occurrence.isoformat()
+                }
+            )
+            await message_bus.send_message(notification_msg)
+        except Exception as e:
+            logger.error(f"发送通知失败: {e}")
 
     async def execute_task(self, task: Task) -> Any:
         """执行任务"""
@@ -0,0 +1,272 @@
+"""
+Reminder Scheduler - 日程提醒调度
+
+用最小堆保存每个日程下一次提醒的触发时间，后台任务只安排在堆顶的时间点运行：
+1. 日程增删改时通过 CalendarManager 的监听器重新计算该日程的提醒并重新安排后台任务
+2. 重复日程（每天 / 工作日 / 每周 / 每月 / 每年）只计算下一次发生时间，触发后再排下一次
+3. 已发送的提醒（日程 ID -> 发生时间）持久化到 reminder_state.json，
+   重启后不会重复提醒；停机期间错过但日程尚未开始的提醒在启动后立即补发
+
+堆中的旧条目不做删除，弹出时与 _armed 中的当前安排比对，不一致的直接丢弃
+
+环境变量：
+    CALENDAR_REMINDER_MINUTES   默认提前提醒的分钟数（默认 5，日程的 reminder 字段优先）
+"""
+import calendar
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from ...utils.persistence import atomic_write_json
+
+
+REPEAT_RULES = {
+    "daily": ("每天", "每日", "daily", "everyday"),
+    "weekdays": ("工作日", "weekdays", "weekday"),
+    "biweekly": ("每两周", "隔周", "biweekly"),
+    "weekly": ("每周", "每星期", "weekly"),
+    "monthly": ("每月", "每个月", "monthly"),
+    "yearly": ("每年", "yearly", "annually"),
+}
+
+NO_REMINDER = ("不提醒", "无", "none", "no", "off", "false")
+
+
+def parse_event_start(date: str, time: Optional[str]) -> Optional[datetime]:
+    """日程的开始时间（没有具体时间或无法解析时返回 None）"""
+    if not date or not time:
+        return None
+    match = re.search(r"(\d{1,2}):(\d{2})", time)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(f"{date.split()[0]} {int(match.group(1)):02d}:{match.group(2)}", "%Y-%m-%d %H:%M")
+    except ValueError:
+        return None
+
+
+def parse_repeat(repeat: Optional[str]) -> Optional[str]:
+    """把重复描述归一为 REPEAT_RULES 的键"""
+    if not repeat:
+        return None
+    text = repeat.strip().lower()
+    for rule, words in REPEAT_RULES.items():
+        if any(word in text for word in words):
+            return rule
+    return None
+
+
+def parse_lead(reminder: Optional[str], default_minutes: int) -> Optional[timedelta]:
+    """提前提醒的时长，"提前15分钟" / "1小时" / "1天" / "30"；明确不提醒时返回 None"""
+    if not reminder:
+        return timedelta(minutes=default_minutes)
+    text = reminder.strip().lower()
+    if text in NO_REMINDER:
+        return None
+    match = re.search(r"(\d+(?:\.\d+)?)\s*(分钟|分|min|小时|个小时|h|hour|天|day)?", text)
+    if not match:
+        return timedelta(minutes=default_minutes)
+    value, unit = float(match.group(1)), match.group(2) or "分钟"
+    if unit in ("小时", "个小时", "h", "hour"):
+        return timedelta(hours=value)
+    if unit in ("天", "day"):
+        return timedelta(days=value)
+    return timedelta(minutes=value)
+
+
+def _add_months(start: datetime, months: int) -> datetime:
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return start.replace(year=year, month=month, day=day)
+
+
+def next_occurrence(start: datetime, rule: Optional[str], after: datetime) -> Optional[datetime]:
+    """start 按 rule 重复时第一次晚于 after 的发生时间（直接计算，不逐次展开）"""
+    if start > after:
+        return start
+    if rule is None:
+        return None
+
+    if rule in ("daily", "weekdays", "weekly", "biweekly"):
+        step = {"daily": 1, "weekdays": 1, "weekly": 7, "biweekly": 14}[rule]
+        periods = (after - start).days // step
+        candidate = start + timedelta(days=periods * step)
+        while candidate <= after or (rule == "weekdays" and candidate.weekday() >= 5):
+            candidate += timedelta(days=step)
+        return candidate
+
+    months = 12 if rule == "yearly" else 1
+    periods = ((after.year - start.year) * 12 + after.month - start.month) // months
+    candidate = _add_months(start, periods * months)
+    while candidate <= after:
+        periods += 1
+        candidate = _add_months(start, periods * months)
+    return candidate
+
+
+class ReminderScheduler:
+    """
+    日程提醒调度器（与事件循环无关，由后台任务调度器中的 calendar_reminders 任务驱动）
+
+    功能：
+    1. arm(event_id) 计算日程下一次提醒并入堆
+    2. next_fire_at() / seconds_until_next() 返回下一次提醒的时间
+    3. pop_due() 弹出到期提醒、记录已发送状态并为重复日程排下一次
+    """
+
+    # 提醒晚于日程开始超过这个时长（例如机器休眠）时不再发送
+    LATE_GRACE = timedelta(minutes=1)
+
+    def __init__(self, manager, state_file: Optional[Path] = None,
+                 on_change: Optional[Callable[[], None]] = None):
+        self.manager = manager
+        self.state_file = state_file or manager.data_dir / "reminder_state.json"
+        self.on_change = on_change
+        try:
+            self.default_minutes = int(os.getenv("CALENDAR_REMINDER_MINUTES", "5"))
+        except ValueError:
+            self.default_minutes = 5
+
+        self._lock = threading.RLock()
+        self._heap: List[Tuple[float, int, str, str]] = []
+        self._armed: Dict[str, Tuple[str, float]] = {}
+        self._counter = itertools.count()
+        self._fired: Dict[str, str] = self._load_state()
+        self._stats = {"fired": 0, "skipped_late": 0, "stale_entries": 0}
+
+        self.rebuild()
+        manager.add_listener(self._on_event_changed)
+
+    def _load_state(self) -> Dict[str, str]:
+        if not self.state_file.exists():
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ 加载提醒状态失败: {e}")
+            return {}
+
+    def _save_state(self):
+        events = self.manager.events
+        self._fired = {k: v for k, v in self._fired.items() if k in events}
+        try:
+            atomic_write_json(self.state_file, self._fired)
+        except OSError as e:
+            logger.error(f"❌ 保存提醒状态失败: {e}")
+
+    def rebuild(self, now: Optional[datetime] = None):
+        """根据全部日程重建提醒堆"""
+        now = now or datetime.now()
+        with self._lock:
+            self._heap, self._armed = [], {}
+            for event_id in list(self.manager.events):
+                self._arm(event_id, now, push=False)
+            heapq.heapify(self._heap)
+        logger.debug(f"📅 已安排 {len(self._heap)} 个日程提醒")
+
+    def _arm(self, event_id: str, now: datetime, push: bool = True):
+        self._armed.pop(event_id, None)
+        event = self.manager.events.get(event_id)
+        if event is None or event.status != "active":
+            return
+        start = parse_event_start(event.date, event.time)
+        lead = parse_lead(event.reminder, self.default_minutes)
+        if start is None or lead is None:
+            return
+
+        after = now
+        fired = self._fired.get(event_id)
+        if fired:
+            try:
+                after = max(now, datetime.fromisoformat(fired))
+            except ValueError:
+                pass
+        occurrence = next_occurrence(start, parse_repeat(event.repeat), after)
+        if occurrence is None:
+            return
+
+        fire_at = (occurrence - lead).timestamp()
+        entry = (fire_at, next(self._counter), event_id, occurrence.isoformat())
+        self._armed[event_id] = (entry[3], fire_at)
+        if push:
+            heapq.heappush(self._heap, entry)
+        else:
+            self._heap.append(entry)
+
+    def arm(self, event_id: str, now: Optional[datetime] = None):
+        """重新安排一个日程的提醒"""
+        with self._lock:
+            self._arm(event_id, now or datetime.now())
+
+    def _on_event_changed(self, event_id: str):
+        self.arm(event_id)
+        if self.on_change:
+            self.on_change()
+
+    def _drop_stale(self):
+        while self._heap:
+            fire_at, _, event_id, occurrence = self._heap[0]
+            if self._armed.get(event_id) == (occurrence, fire_at):
+                return
+            heapq.heappop(self._heap)
+            self._stats["stale_entries"] += 1
+
+    def seconds_until_next(self, now: Optional[datetime] = None) -> Optional[float]:
+        """距下一次提醒的秒数（没有待发提醒时返回 None）"""
+        now = now or datetime.now()
+        with self._lock:
+            self._drop_stale()
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - now.timestamp())
+
+    def next_fire_at(self) -> Optional[float]:
+        """下一次提醒的时间戳（没有待发提醒时返回 None）"""
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[Tuple[object, datetime]]:
+        """弹出到期的提醒，返回 [(日程, 发生时间)]"""
+        now = now or datetime.now()
+        due, popped = [], False
+        with self._lock:
+            while True:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now.timestamp():
+                    break
+                _, _, event_id, occurrence = heapq.heappop(self._heap)
+                popped = True
+                self._fired[event_id] = occurrence
+                occurrence_at = datetime.fromisoformat(occurrence)
+                event = self.manager.events.get(event_id)
+                if occurrence_at + self.LATE_GRACE < now:
+                    self._stats["skipped_late"] += 1
+                elif event is not None:
+                    due.append((event, occurrence_at))
+                    self._stats["fired"] += 1
+                self._arm(event_id, now)
+            if popped:
+                self._save_state()
+        return due
+
+    def get_stats(self) -> Dict[str, object]:
+        """获取提醒调度统计"""
+        with self._lock:
+            self._drop_stale()
+            return {
+                "pending": len(self._armed),
+                "next_fire": (datetime.fromtimestamp(self._heap[0][0]).isoformat()
+                              if self._heap else None),
+                **self._stats,
+            }
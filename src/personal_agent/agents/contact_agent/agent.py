@@ -482,7 +482,7 @@ class ContactAgent(BaseAgent):
                 "info_db": {k: v.value for k, v in contact.info_db.items()}
             })
         
-        history_text = self._get_conversation_history()
+        history_text = self._get_conversation_history(query)
         
         prompt = f"""你是一个智能通讯录助手。用户有一个关于联系人的问题，请按以下顺序查找信息：
 
@@ -493,7 +493,7 @@ class ContactAgent(BaseAgent):
 【通讯录数据】
 {json.dumps(contacts_data, ensure_ascii=False, indent=2) if contacts_data else "（通讯录为空）"}
 
-【历史聊天记录】（最近50条）
+【历史聊天记录】
 {history_text if history_text else "（无历史记录）"}
 
 【用户问题】
@@ -510,8 +510,8 @@ class ContactAgent(BaseAgent):
             logger.error(f"LLM 处理自然查询失败: {e}")
             return self.cannot_handle(reason=f"处理查询失败: {e}")
     
-    def _get_conversation_history(self, limit: int = 50) -> str:
-        """获取历史聊天记录"""
+    def _get_conversation_history(self, query: str = "") -> str:
+        """获取历史聊天记录（按 token 预算从新到旧选取）"""
         try:
             history = []
             
@@ -541,16 +541,13 @@ class ContactAgent(BaseAgent):
                 logger.warning("未能获取到任何历史记录")
                 return ""
             
-            lines = []
-            for msg in history[-limit:]:
-                role = "用户" if msg.get("role") == "user" else "助手"
-                content = msg.get("content", "")
-                if content and len(content) > 5:
-                    lines.append(f"[{role}] {content[:200]}")
-            
-            result = "\n".join(lines)
-            logger.debug(f"历史记录格式化完成，共 {len(lines)} 条")
-            return result
+            from ...memory.context_builder import get_context_builder
+            context = get_context_builder().build(
+                query=query,
+                history=[msg for msg in history if len(msg.get("content") or "") > 5]
+            )
+            logger.debug(f"历史记录格式化完成，共 {context['recent']} 条 ({context['tokens']} tokens)")
+            return context["text"]
         except Exception as e:
             logger.error(f"获取历史记录失败: {e}")
             return ""
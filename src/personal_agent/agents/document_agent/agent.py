@@ -8,6 +8,45 @@ from pathlib import Path
 from loguru import logger
 
 from ..base import BaseAgent, Task
+from ...utils.cpu_pool import get_cpu_pool
+
+
+def extract_pdf_text(path: str, max_pages: Optional[int] = None) -> Dict[str, Any]:
+    """
+    提取PDF元数据和各页文本（在 CPU 工作池进程中执行）
+    
+    Returns:
+        {"num_pages": 总页数, "metadata": {...}, "pages": [(页码, 文本), ...]}
+    """
+    import pypdf
+    
+    reader = pypdf.PdfReader(path)
+    info = reader.metadata
+    metadata = {}
+    if info:
+        metadata = {
+            key: str(value) if value else None
+            for key, value in (("title", info.title), ("author", info.author), ("subject", info.subject))
+        }
+    
+    pages = []
+    for i, page in enumerate(reader.pages, 1):
+        if max_pages is not None and i > max_pages:
+            break
+        pages.append((i, page.extract_text() or ""))
+    
+    return {"num_pages": len(reader.pages), "metadata": metadata, "pages": pages}
+
+
+def convert_pdf_to_docx(path: str, output_path: str):
+    """PDF转Word（在 CPU 工作池进程中执行）"""
+    from pdf2docx import Converter
+    
+    cv = Converter(path)
+    try:
+        cv.convert(output_path, start=0, end=None)
+    finally:
+        cv.close()
 
 
 class DocumentAgent(BaseAgent):
@@ -41,6 +80,9 @@ class DocumentAgent(BaseAgent):
         "创建表格": ("excel_generate", {}),
     }
     
+    PDF_TIMEOUT = 300
+    CONVERT_TIMEOUT = 900
+    
     def __init__(self):
         super().__init__(
             name="document_agent",
@@ -295,24 +337,25 @@ class DocumentAgent(BaseAgent):
             return "❌ 需要安装 pypdf 库: pip install pypdf"
         
         try:
-            import pypdf
-            
-            reader = pypdf.PdfReader(str(path))
-            num_pages = len(reader.pages)
+            pdf = await get_cpu_pool().submit(
+                extract_pdf_text, str(path), 1,
+                priority=6, timeout=self.PDF_TIMEOUT, name=f"pdf_read:{path.name}"
+            )
+            num_pages = pdf["num_pages"]
             
-            info = reader.metadata
+            info = pdf["metadata"]
             info_text = ""
             if info:
-                if info.title:
-                    info_text += f"标题: {info.title}\n"
-                if info.author:
-                    info_text += f"作者: {info.author}\n"
-                if info.subject:
-                    info_text += f"主题: {info.subject}\n"
+                if info.get("title"):
+                    info_text += f"标题: {info['title']}\n"
+                if info.get("author"):
+                    info_text += f"作者: {info['author']}\n"
+                if info.get("subject"):
+                    info_text += f"主题: {info['subject']}\n"
             
             text_preview = ""
             if num_pages > 0:
-                first_page_text = reader.pages[0].extract_text()
+                first_page_text = pdf["pages"][0][1]
                 text_preview = first_page_text[:500] + "..." if len(first_page_text) > 500 else first_page_text
             
             return f"""📄 PDF文件信息
@@ -342,13 +385,13 @@ class DocumentAgent(BaseAgent):
             return "❌ 需要安装 pypdf 库: pip install pypdf"
         
         try:
-            import pypdf
-            
-            reader = pypdf.PdfReader(str(path))
+            pdf = await get_cpu_pool().submit(
+                extract_pdf_text, str(path),
+                timeout=self.PDF_TIMEOUT, name=f"pdf_extract_text:{path.name}"
+            )
             all_text = []
             
-            for i, page in enumerate(reader.pages, 1):
-                text = page.extract_text()
+            for i, text in pdf["pages"]:
                 if text.strip():
                     all_text.append(f"=== 第 {i} 页 ===\n{text}")
             
@@ -362,7 +405,7 @@ class DocumentAgent(BaseAgent):
             preview = full_text[:1000] + "..." if len(full_text) > 1000 else full_text
             return f"""✅ 提取完成
 
-📊 总页数: {len(reader.pages)}
+📊 总页数: {pdf["num_pages"]}
 📝 文本长度: {len(full_text)} 字符
 
 预览:
@@ -385,13 +428,13 @@ class DocumentAgent(BaseAgent):
             return "❌ 需要安装 pypdf 库: pip install pypdf"
         
         try:
-            import pypdf
-            
-            reader = pypdf.PdfReader(str(path))
+            pdf = await get_cpu_pool().submit(
+                extract_pdf_text, str(path), 10,
+                timeout=self.PDF_TIMEOUT, name=f"pdf_summarize:{path.name}"
+            )
             all_text = []
             
-            for page in reader.pages[:10]:
-                text = page.extract_text()
+            for _, text in pdf["pages"]:
                 if text.strip():
                     all_text.append(text)
             
@@ -414,7 +457,7 @@ class DocumentAgent(BaseAgent):
             return f"""📄 PDF摘要
 
 📁 文件: {path.name}
-📊 页数: {len(reader.pages)}
+📊 页数: {pdf["num_pages"]}
 
 {summary}"""
         except Exception as e:
@@ -1139,9 +1182,6 @@ class DocumentAgent(BaseAgent):
             return "❌ 需要安装 pdf2docx 库: pip install pdf2docx"
         
         try:
-            from pdf2docx import Converter
-            import asyncio
-            
             output_dir = Path(output_dir) if output_dir else path.parent
             output_dir.mkdir(parents=True, exist_ok=True)
             
@@ -1152,10 +1192,10 @@ class DocumentAgent(BaseAgent):
             
             logger.info(f"开始转换PDF到Word: {path} → {output_path}")
             
-            cv = Converter(str(path))
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, lambda: cv.convert(str(output_path), start=0, end=None))
-            cv.close()
+            await get_cpu_pool().submit(
+                convert_pdf_to_docx, str(path), str(output_path),
+                timeout=self.CONVERT_TIMEOUT, name=f"pdf_to_word:{path.name}"
+            )
             
             logger.info(f"✅ PDF转Word成功: {output_path}")
             return f"✅ 已转换为Word文档\n\n📁 保存位置: {output_path}"
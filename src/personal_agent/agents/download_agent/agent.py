@@ -183,6 +183,9 @@ class DownloadAgent(BaseAgent):
                     url=params.get("url"),
                     filename=params.get("filename"),
                     threads=params.get("threads", 4),
+                    progress_callback=lambda t: self.report_progress(
+                        t.progress, f"下载 {t.filename} {t.speed}", task=task
+                    ),
                     save_dir=params.get("save_dir") or params.get("directory") or params.get("path")
                 )
             elif action == "batch_download":
@@ -418,7 +421,7 @@ class DownloadAgent(BaseAgent):
                 end = start + chunk_size - 1 if i < num_threads - 1 else total_size - 1
                 temp_file = task.save_path.with_suffix(f".part{i}")
                 temp_files.append(temp_file)
-                tasks.append(self._download_chunk(task.url, start, end, temp_file, task))
+                tasks.append(self._download_chunk(task.url, start, end, temp_file, task, progress_callback))
             
             # 并发下载所有块
             await asyncio.gather(*tasks)
@@ -455,7 +458,8 @@ class DownloadAgent(BaseAgent):
             task.error = str(e)
     
     async def _download_chunk(self, url: str, start: int, end: int, 
-                              temp_file: Path, task: DownloadTask):
+                              temp_file: Path, task: DownloadTask,
+                              progress_callback: Optional[Callable] = None):
         """下载文件块"""
         headers = {"Range": f"bytes={start}-{end}"}
         
@@ -478,6 +482,9 @@ class DownloadAgent(BaseAgent):
                         
                         if task.total_size > 0:
                             task.progress = (task.downloaded_size / task.total_size) * 100
+                        
+                        if progress_callback:
+                            progress_callback(task)
         
         except Exception as e:
             logger.error(f"下载块失败: {e}")
@@ -31,6 +31,10 @@ class EmailAgent(BaseAgent):
         "检查邮件": ("check_email", {}),
         "看邮件": ("check_email", {}),
         "新邮件": ("check_email", {}),
+        "今天的邮件": ("email_digest", {"period": "today"}),
+        "今日邮件": ("email_digest", {"period": "today"}),
+        "邮件摘要": ("email_digest", {"period": "today"}),
+        "总结邮件": ("email_digest", {"period": "today"}),
     }
 
     def __init__(self):
@@ -67,6 +71,48 @@ class EmailAgent(BaseAgent):
             category="email"
         )
         
+        self.register_capability(
+            capability="search_email",
+            description="在本地邮件索引中搜索已收到的邮件（离线，不连接邮件服务器），可按关键词、发件人、时间范围过滤，返回匹配的邮件和数量",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "关键词，匹配主题、正文和附件名（可选）"
+                    },
+                    "sender": {
+                        "type": "string",
+                        "description": "发件人姓名或邮箱（可选）"
+                    },
+                    "period": {
+                        "type": "string",
+                        "description": "时间范围：today / yesterday / week / month，或最近的天数（可选）"
+                    },
+                    "unread_only": {
+                        "type": "boolean",
+                        "description": "只搜索未读邮件（可选）"
+                    }
+                }
+            },
+            category="email"
+        )
+
+        self.register_capability(
+            capability="email_digest",
+            description="汇总一段时间内收到的邮件：数量、未读数、主要发件人和每封邮件的摘要（离线生成）",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "period": {
+                        "type": "string",
+                        "description": "时间范围：today / yesterday / week / month，默认 today"
+                    }
+                }
+            },
+            category="email"
+        )
+
         self.register_capability("email_management", "邮件管理")
         self.register_capability("receive_email", "接收邮件")
 
@@ -107,6 +153,12 @@ class EmailAgent(BaseAgent):
         elif task_type == "check_email":
             return await self._handle_check_email()
 
+        elif task_type == "search_email":
+            return await self._handle_search_email(params)
+
+        elif task_type == "email_digest":
+            return await self._handle_email_digest(params)
+
         elif task_type == "send":
             if params.get("attachment"):
                 return await self._handle_send_with_attachment(original_text, params)
@@ -944,6 +996,41 @@ class EmailAgent(BaseAgent):
         """检查邮件状态"""
         return f"📧 已发送: {self.sent_count}, 已接收: {self.received_count}"
     
+    async def _handle_search_email(self, params: Dict) -> str:
+        """在本地邮件索引中搜索邮件"""
+        from ...email_store import get_mail_store, parse_period
+
+        store = get_mail_store()
+        query = params.get("query") or params.get("keyword") or ""
+        start, end = parse_period(params.get("period") or params.get("days"))
+        filters = {
+            "sender": params.get("sender") or None,
+            "start": start,
+            "end": end,
+            "unread_only": bool(params.get("unread_only")),
+        }
+        results = store.search(query, limit=int(params.get("limit") or 10), **filters)
+        if not results:
+            return "📭 本地邮件中没有找到匹配的邮件"
+
+        total = store.count(query, **filters)
+        lines = [f"🔍 找到 {total} 封邮件" + (f"，显示前 {len(results)} 封" if total > len(results) else "") + "："]
+        for item in results:
+            attach = f" 📎{'、'.join(item['attachments'])}" if item["attachments"] else ""
+            lines.append(f"- {item['date'][:16].replace('T', ' ')} {item['sender']}：{item['subject']}{attach}")
+            if item["snippet"]:
+                lines.append(f"  {item['snippet']}")
+        return "\n".join(lines)
+
+    async def _handle_email_digest(self, params: Dict) -> str:
+        """根据本地邮件索引生成邮件摘要"""
+        from ...email_store import get_mail_store, parse_period
+
+        period = params.get("period") or "today"
+        start, end = parse_period(period)
+        titles = {"today": "今天的邮件", "yesterday": "昨天的邮件", "week": "最近一周的邮件", "month": "最近一个月的邮件"}
+        return get_mail_store().format_digest(start, end, title=titles.get(str(period), "邮件摘要"))
+
     async def send_reply(self, to_email: str, subject: str, content: str) -> str:
         """发送回复邮件"""
         logger.info(f"📧 发送回复邮件到: {to_email}")
@@ -1200,6 +1287,8 @@ class EmailAgent(BaseAgent):
 ### 支持的操作
 - **发送邮件**：发送邮件给指定收件人
 - **接收邮件**：检查新邮件
+- **搜索邮件**：在本地邮件索引中按关键词、发件人、时间搜索
+- **邮件摘要**：汇总今天 / 最近一周收到的邮件
 - **发送附件**：发送带有附件的邮件
 - **邮件管理**：管理邮件收发记录
 
@@ -1207,6 +1296,8 @@ class EmailAgent(BaseAgent):
 - "给张三发邮件" - 发送邮件给张三
 - "发送邮件给李四，内容是..." - 发送指定内容的邮件
 - "查邮件" - 检查新邮件
+- "找张三关于报销的邮件" - 搜索本地邮件
+- "总结今天的邮件" - 生成今日邮件摘要
 - "把文件发给王五" - 发送带附件的邮件
 
 ### 注意事项
@@ -1,12 +1,53 @@
 from loguru import logger
 from typing import Dict, Any, Optional, List
 from ..base import BaseAgent, Task
+from ...utils.cpu_pool import get_cpu_pool
 from PIL import Image
+import asyncio
 import os
 import pathlib
 import glob
 
 
+def convert_image_file(source_path: str, output_path: str, target_format: str, quality: int = 85):
+    """转换图片格式（在 CPU 工作池进程中执行）"""
+    img = Image.open(source_path)
+    if target_format in ["jpg", "jpeg"] and img.mode in ("RGBA", "LA", "P"):
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        if img.mode == "P":
+            img = img.convert("RGBA")
+        background.paste(img, mask=img.split()[-1] if img.mode == "RGBA" else None)
+        img = background
+    elif target_format == "png" and img.mode == "RGB":
+        img = img.convert("RGBA")
+    
+    save_kwargs = {}
+    if target_format in ["jpg", "jpeg", "webp"]:
+        save_kwargs["quality"] = quality
+    img.save(output_path, format=target_format.upper(), **save_kwargs)
+
+
+def resize_image_file(source_path: str, output_path: str, width: Optional[int] = None,
+                      height: Optional[int] = None, scale: Optional[float] = None) -> tuple:
+    """调整图片尺寸（在 CPU 工作池进程中执行），返回新尺寸"""
+    img = Image.open(source_path)
+    orig_w, orig_h = img.size
+    
+    if scale is not None:
+        new_w = int(orig_w * scale)
+        new_h = int(orig_h * scale)
+    else:
+        new_w = width if width is not None else orig_w
+        new_h = height if height is not None else orig_h
+    
+    if new_w <= 0 or new_h <= 0:
+        raise ValueError("无效的尺寸参数")
+    
+    resized_img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+    resized_img.save(output_path)
+    return new_w, new_h
+
+
 class ImageConverterAgent(BaseAgent):
     PRIORITY: int = 5
     
@@ -24,9 +65,11 @@ class ImageConverterAgent(BaseAgent):
     }
     
     SUPPORTED_FORMATS = {"png", "jpg", "jpeg", "webp", "bmp", "gif", "tiff"}
+    JOB_TIMEOUT = 120
     
     def __init__(self):
         super().__init__(name="image_converter_agent", description="图片格式转换智能体 - 支持多种图片格式之间的转换（PNG、JPG、WEBP、BMP、GIF等）")
+        self._reserved_outputs = set()
     
     def _get_pictures_dir(self) -> pathlib.Path:
         """获取图片保存目录"""
@@ -73,28 +116,23 @@ class ImageConverterAgent(BaseAgent):
             return self.cannot_handle(f"不支持的目标格式。支持的格式: {', '.join(self.SUPPORTED_FORMATS)}")
         
         try:
-            img = Image.open(source_path)
-            if target_format in ["jpg", "jpeg"] and img.mode in ("RGBA", "LA", "P"):
-                background = Image.new("RGB", img.size, (255, 255, 255))
-                if img.mode == "P":
-                    img = img.convert("RGBA")
-                background.paste(img, mask=img.split()[-1] if img.mode == "RGBA" else None)
-                img = background
-            elif target_format == "png" and img.mode == "RGB":
-                img = img.convert("RGBA")
-            
             output_dir = self._get_pictures_dir()
             output_dir.mkdir(parents=True, exist_ok=True)
             
             source_name = pathlib.Path(source_path).stem
             output_path = output_dir / f"{source_name}.{target_format}"
-            if output_path.exists():
+            if output_path.exists() or str(output_path) in self._reserved_outputs:
                 output_path = output_dir / f"{source_name}_converted.{target_format}"
             
-            save_kwargs = {}
-            if target_format in ["jpg", "jpeg", "webp"]:
-                save_kwargs["quality"] = quality
-            img.save(output_path, format=target_format.upper(), **save_kwargs)
+            # 批量转换并行执行时，避免同名文件写到同一个输出路径
+            self._reserved_outputs.add(str(output_path))
+            try:
+                await get_cpu_pool().submit(
+                    convert_image_file, source_path, str(output_path), target_format, quality,
+                    timeout=self.JOB_TIMEOUT, name=f"convert_image:{source_name}"
+                )
+            finally:
+                self._reserved_outputs.discard(str(output_path))
             return f"✅ 已转换: {output_path}"
         except Exception as e:
             return self.cannot_handle(f"转换失败: {e}")
@@ -110,31 +148,17 @@ class ImageConverterAgent(BaseAgent):
             return self.cannot_handle("源文件不存在")
         
         try:
-            img = Image.open(source_path)
-            orig_w, orig_h = img.size
-            
-            if scale is not None:
-                new_w = int(orig_w * scale)
-                new_h = int(orig_h * scale)
-            elif size:
+            if scale is None and size:
                 if isinstance(size, str) and "x" in size.lower():
                     parts = size.lower().split("x")
                     if len(parts) == 2:
                         try:
-                            new_w = int(parts[0].strip())
-                            new_h = int(parts[1].strip())
+                            width = int(parts[0].strip())
+                            height = int(parts[1].strip())
                         except ValueError:
                             return self.cannot_handle("无效的尺寸格式，请使用如 '128x128' 的格式")
                 else:
                     return self.cannot_handle("无效的尺寸格式，请使用如 '128x128' 的格式")
-            else:
-                new_w = width if width is not None else orig_w
-                new_h = height if height is not None else orig_h
-            
-            if new_w <= 0 or new_h <= 0:
-                return self.cannot_handle("无效的尺寸参数")
-            
-            resized_img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
             
             output_dir = self._get_pictures_dir()
             output_dir.mkdir(parents=True, exist_ok=True)
@@ -143,7 +167,13 @@ class ImageConverterAgent(BaseAgent):
             source_ext = pathlib.Path(source_path).suffix
             output_path = output_dir / f"{source_name}_resized{source_ext}"
             
-            resized_img.save(output_path)
+            try:
+                new_w, new_h = await get_cpu_pool().submit(
+                    resize_image_file, source_path, str(output_path), width, height, scale,
+                    timeout=self.JOB_TIMEOUT, name=f"resize_image:{source_name}"
+                )
+            except ValueError as e:
+                return self.cannot_handle(str(e))
             return f"✅ 已调整尺寸: {output_path} ({new_w}x{new_h})"
         except Exception as e:
             return self.cannot_handle(f"调整尺寸失败: {e}")
@@ -166,14 +196,23 @@ class ImageConverterAgent(BaseAgent):
             if not files:
                 return self.cannot_handle("源文件夹中没有找到支持的图片文件")
             
+            # 各文件的转换提交到 CPU 工作池并行执行
             converted = 0
-            for file_path in files:
+            finished = 0
+            task = self._current_task
+            
+            async def convert_one(file_path: str):
+                nonlocal converted, finished
                 try:
                     result = await self._convert_image({"source_path": file_path, "target_format": target_format})
-                    if result.startswith("✅"):
+                    if isinstance(result, str) and result.startswith("✅"):
                         converted += 1
-                except:
-                    continue
+                except Exception:
+                    pass
+                finished += 1
+                self.report_progress(finished * 100 / len(files), f"批量转换 {finished}/{len(files)}: {os.path.basename(file_path)}", task=task)
+            
+            await asyncio.gather(*(convert_one(file_path) for file_path in files))
             
             return f"✅ 批量转换完成: {converted}/{len(files)} 个文件"
         except Exception as e:
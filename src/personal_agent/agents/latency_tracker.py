@@ -0,0 +1,250 @@
+"""
+智能体耗时统计
+按 (智能体, 任务类型) 记录历史执行耗时，推算自适应的等待超时和“请稍候”提示时机
+"""
+import json
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from loguru import logger
+
+
+def _env_float(key: str, default: float) -> float:
+    try:
+        return float(os.getenv(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class AgentLatencyTracker:
+    """
+    智能体耗时统计器
+
+    功能：
+    1. 按智能体和任务类型保存最近 N 次执行耗时（滚动窗口）
+    2. 根据耗时分位数计算等待超时：p95 × 倍数，并限制在下限/上限之间
+    3. 等待超时的任务记为删失样本（真实耗时至少为已等待时长），下次放宽超时
+    4. 根据耗时中位数决定何时发送“请稍候”提示
+    5. 数据持久化到本地，重启后继续使用
+    """
+
+    INSTANCE = None
+
+    # 样本不足时使用的默认超时（秒），沿用原先的固定值
+    DEFAULT_TIMEOUTS: Dict[str, float] = {
+        "file_download": 1800,
+        "download": 1800,
+        "video_download": 1800,
+        "decrypt_ncm": 1800,
+        "batch_decrypt": 1800,
+        "batch_convert": 1800,
+        "generate_image": 120,
+        "text_to_image": 120,
+        "image_generation": 120,
+    }
+    DEFAULT_TIMEOUT = 300
+
+    # 长任务类型允许更高的超时上限
+    LONG_TASK_TYPES = {
+        "file_download", "download", "video_download",
+        "decrypt_ncm", "batch_decrypt", "batch_convert",
+    }
+
+    def __new__(cls, *args, **kwargs):
+        if cls.INSTANCE is None:
+            cls.INSTANCE = super().__new__(cls)
+        return cls.INSTANCE
+
+    def __init__(self, data_dir: Optional[Path] = None):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+
+        self.data_dir = data_dir or Path.home() / ".personal_agent" / "analytics"
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.latency_file = self.data_dir / "agent_latency.json"
+
+        self.window_size = int(_env_float("AGENT_LATENCY_WINDOW", 50))
+        self.min_samples = int(_env_float("AGENT_LATENCY_MIN_SAMPLES", 5))
+        self.timeout_multiplier = _env_float("AGENT_TIMEOUT_MULTIPLIER", 3.0)
+        self.timeout_floor = _env_float("AGENT_TIMEOUT_FLOOR", 15.0)
+        self.timeout_ceiling = _env_float("AGENT_TIMEOUT_CEILING", 600.0)
+        self.long_timeout_ceiling = _env_float("AGENT_LONG_TIMEOUT_CEILING", 3600.0)
+        self.notice_floor = _env_float("AGENT_NOTICE_FLOOR", 1.5)
+        self.notice_ceiling = _env_float("AGENT_NOTICE_CEILING", 10.0)
+        self.default_notice_delay = 3.0
+        # 超时后下次至少等待 已等待时长 × 该倍数
+        self.timeout_backoff = _env_float("AGENT_TIMEOUT_BACKOFF", 2.0)
+        self.censored_window = int(_env_float("AGENT_TIMEOUT_CENSORED_WINDOW", 5))
+        # 最近这么多秒内有进度上报，视为任务仍在推进
+        self.progress_stale = _env_float("AGENT_PROGRESS_STALE", 60.0)
+
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = {}
+        self._censored: Dict[str, List[float]] = {}
+        self._load()
+
+        self._initialized = True
+        logger.info(f"⏱️ 智能体耗时统计已初始化，已记录 {len(self._samples)} 类任务")
+
+    @staticmethod
+    def _key(agent_name: str, task_type: str) -> str:
+        return f"{agent_name}:{task_type}"
+
+    def _load(self):
+        """加载历史耗时和超时记录"""
+        if not self.latency_file.exists():
+            return
+        try:
+            with open(self.latency_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"加载智能体耗时记录失败: {e}")
+            return
+
+        # 兼容旧格式 {key: [耗时, ...]}
+        if "samples" not in data:
+            data = {"samples": data, "censored": {}}
+        self._samples = {
+            k: [float(v) for v in vs][-self.window_size:]
+            for k, vs in (data.get("samples") or {}).items()
+        }
+        self._censored = {
+            k: [float(v) for v in vs][-self.censored_window:]
+            for k, vs in (data.get("censored") or {}).items()
+        }
+
+    def _save(self):
+        """保存历史耗时和超时记录"""
+        try:
+            with self._lock:
+                snapshot = {
+                    "samples": {k: list(v) for k, v in self._samples.items()},
+                    "censored": {k: list(v) for k, v in self._censored.items() if v},
+                }
+            tmp_file = self.latency_file.with_suffix(".tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_file, self.latency_file)
+        except Exception as e:
+            logger.warning(f"保存智能体耗时记录失败: {e}")
+
+    def record(self, agent_name: str, task_type: str, duration: float):
+        """
+        记录一次任务耗时
+
+        Args:
+            agent_name: 智能体名称
+            task_type: 任务类型
+            duration: 耗时（秒）
+        """
+        if duration is None or duration < 0:
+            return
+        key = self._key(agent_name, task_type)
+        with self._lock:
+            samples = self._samples.setdefault(key, [])
+            samples.append(round(float(duration), 3))
+            if len(samples) > self.window_size:
+                del samples[:len(samples) - self.window_size]
+            # 任务能正常完成，最早的一条超时记录随之失效
+            censored = self._censored.get(key)
+            if censored:
+                censored.pop(0)
+        self._save()
+        logger.debug(f"⏱️ 记录耗时 {key}: {duration:.2f}s")
+
+    def record_timeout(self, agent_name: str, task_type: str, waited: float):
+        """
+        记录一次等待超时（删失样本）
+
+        任务没有在 waited 秒内完成，真实耗时至少为 waited；
+        该时长作为耗时下限计入样本，同时下次超时至少放宽到 waited × 退避倍数
+
+        Args:
+            agent_name: 智能体名称
+            task_type: 任务类型
+            waited: 已等待的秒数
+        """
+        if waited is None or waited <= 0:
+            return
+        key = self._key(agent_name, task_type)
+        with self._lock:
+            samples = self._samples.setdefault(key, [])
+            samples.append(round(float(waited), 3))
+            if len(samples) > self.window_size:
+                del samples[:len(samples) - self.window_size]
+            censored = self._censored.setdefault(key, [])
+            censored.append(round(float(waited), 3))
+            if len(censored) > self.censored_window:
+                del censored[:len(censored) - self.censored_window]
+        self._save()
+        logger.info(f"⏱️ 记录超时 {key}: 已等待 {waited:.1f}s，下次将放宽超时")
+
+    def percentile(self, agent_name: str, task_type: str, pct: float) -> Optional[float]:
+        """获取耗时分位数，样本不足时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(self._key(agent_name, task_type), []))
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(pct / 100 * len(samples)) - 1))
+        return samples[index]
+
+    def get_timeout(self, agent_name: str, task_type: str) -> float:
+        """
+        获取任务等待超时（秒）
+
+        Args:
+            agent_name: 智能体名称
+            task_type: 任务类型
+
+        Returns:
+            超时秒数
+        """
+        default = self.get_default_timeout(task_type)
+        with self._lock:
+            censored = list(self._censored.get(self._key(agent_name, task_type), []))
+        p95 = self.percentile(agent_name, task_type, 95)
+        if p95 is None and not censored:
+            return default
+
+        is_long = task_type in self.LONG_TASK_TYPES
+        ceiling = self.long_timeout_ceiling if is_long else self.timeout_ceiling
+        # 长任务耗时波动大（取决于文件大小），不低于原先的固定超时
+        floor = max(self.timeout_floor, default) if is_long else self.timeout_floor
+        estimate = p95 * self.timeout_multiplier if p95 is not None else default
+        if censored:
+            estimate = max(estimate, max(censored) * self.timeout_backoff)
+        return min(max(ceiling, floor), max(floor, estimate))
+
+    def get_default_timeout(self, task_type: str) -> float:
+        """获取任务类型的默认超时（秒），即原先的固定值"""
+        return self.DEFAULT_TIMEOUTS.get(task_type, self.DEFAULT_TIMEOUT)
+
+    def get_notice_delay(self, agent_name: str, task_type: str) -> float:
+        """获取“请稍候”提示的发送延迟（秒）"""
+        p50 = self.percentile(agent_name, task_type, 50)
+        if p50 is None:
+            return self.default_notice_delay
+        return min(self.notice_ceiling, max(self.notice_floor, p50 * 1.5))
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """获取各类任务的耗时统计"""
+        stats = {}
+        with self._lock:
+            keys = list(self._samples.keys())
+        for key in keys:
+            agent_name, _, task_type = key.partition(":")
+            stats[key] = {
+                "samples": len(self._samples.get(key, [])),
+                "timeouts": len(self._censored.get(key, [])),
+                "p50": self.percentile(agent_name, task_type, 50),
+                "p95": self.percentile(agent_name, task_type, 95),
+                "timeout": self.get_timeout(agent_name, task_type),
+            }
+        return stats
+
+
+def get_latency_tracker() -> AgentLatencyTracker:
+    """获取智能体耗时统计实例"""
+    return AgentLatencyTracker()
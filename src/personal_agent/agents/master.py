@@ -12,6 +12,8 @@ from loguru import logger
 from .base import BaseAgent, Task, TaskStatus, Message
 from .message_bus import message_bus
 from .agent_scanner import get_agent_scanner
+from .process_host import AgentProcessProxy, get_isolated_agents
+from ..utils.progress import progress_manager, ProgressEvent
 
 try:
     import sys
@@ -65,6 +67,7 @@ class MasterAgent(BaseAgent):
     
     _pending_skill_confirmation: Dict[str, Dict] = {}
     _pending_action: Optional[Dict] = None
+    _resume_prompt: Optional[str] = None
 
     def _get_agent_registry(self) -> Dict[str, tuple]:
         """获取智能体注册表（使用缓存）"""
@@ -149,6 +152,7 @@ class MasterAgent(BaseAgent):
         
         self._init_skill_manager()
         self._check_unregistered_agents()
+        self._check_unfinished_workflows()
 
         message_bus.register_agent(self.name, self.message_queue)
         logger.info(f"✅ Master 智能体已注册到消息总线，实例 ID: {id(message_bus)}")
@@ -272,6 +276,12 @@ class MasterAgent(BaseAgent):
                 del sys.modules[old_module_name]
                 logger.debug(f"🧹 清理旧模块缓存: {old_module_name}")
             
+            if agent_name_lower in get_isolated_agents():
+                agent = AgentProcessProxy(agent_name_lower, module_path, class_name)
+                await agent.start()
+                self.register_sub_agent(agent)
+                return agent
+            
             if full_module_name in sys.modules:
                 module = sys.modules[full_module_name]
             else:
@@ -302,9 +312,8 @@ class MasterAgent(BaseAgent):
         if "@" in recipient_name:
             return recipient_name
         
-        from ..contacts.smart_contact_book import SmartContactBook
-        contact_book = SmartContactBook()
-        contact = contact_book.get_contact(recipient_name)
+        from ..contacts.smart_contact_book import smart_contact_book
+        contact = smart_contact_book.get_contact(recipient_name)
         
         if contact and contact.email:
             logger.info(f"📧 解析收件人: {recipient_name} -> {contact.email}")
@@ -326,9 +335,8 @@ class MasterAgent(BaseAgent):
         if "@" in recipient_name:
             return {"email": recipient_name, "relationship": ""}
         
-        from ..contacts.smart_contact_book import SmartContactBook
-        contact_book = SmartContactBook()
-        contact = contact_book.get_contact(recipient_name)
+        from ..contacts.smart_contact_book import smart_contact_book
+        contact = smart_contact_book.get_contact(recipient_name)
         
         if contact:
             return {
@@ -388,6 +396,10 @@ class MasterAgent(BaseAgent):
             if re.match(pattern, text_lower):
                 return response
         
+        if clean_text in ("/jobs", "后台任务", "定时任务"):
+            from ..scheduler.job_scheduler import get_job_scheduler
+            return get_job_scheduler().format_jobs()
+        
         return None
     
     def _try_direct_agent_route(self, request: str) -> Optional[Tuple[str, str]]:
@@ -758,6 +770,11 @@ class MasterAgent(BaseAgent):
         if auto_extract_result:
             response = f"{response}\n\n{auto_extract_result}"
 
+        # 7. 问候语未展示过的未完成工作流提示（Web/CLI 等没有问候语的渠道）
+        resume_prompt = self.get_resume_prompt()
+        if resume_prompt and isinstance(response, str):
+            response = f"{response}\n\n{resume_prompt}"
+
         logger.info(f"⏱️ [计时] process_user_request 总耗时: {time.time() - total_start:.2f}秒")
         return response
     
@@ -2388,73 +2405,82 @@ class MasterAgent(BaseAgent):
         }
         return task_descriptions.get(task_type, task_type)
 
-    async def _dispatch_tasks(self, tasks: List[Task]) -> List[Task]:
+    async def _dispatch_tasks(self, tasks: List[Task], workflow_id: Optional[str] = None,
+                              previous_results: Optional[Dict[int, Any]] = None,
+                              step_offset: int = 0) -> List[Task]:
         """
         分配任务给合适的智能体
 
         Args:
             tasks: 任务列表
+            workflow_id: 恢复执行时的工作流检查点 ID
+            previous_results: 恢复执行时已完成步骤的结果 {步骤序号(从1开始): 结果}
+            step_offset: 恢复执行时第一个任务在工作流中的步骤序号
 
         Returns:
             完成的任务列表
         """
         completed_tasks = []
-        previous_result = None
+        total_steps = len(tasks) + step_offset
 
-        for task in tasks:
+        # 多步骤工作流：持久化计划和每一步的状态，崩溃或重启后可以继续
+        from .workflow_store import get_workflow_store
+        workflow_store = get_workflow_store()
+        if workflow_id is None and len(tasks) > 1 and any(t.params.get("is_workflow") for t in tasks):
+            request = next((t.params.get("original_text") for t in tasks if t.params.get("original_text")), "")
+            workflow_id = workflow_store.create(tasks, request or tasks[0].content)
+
+        # 编译并校验步骤间的参数模板，引用错误在任何智能体执行之前失败
+        from .workflow_template import compile_plan, StepOutputs, TemplateError
+        try:
+            compiled_plan = compile_plan(tasks, step_offset)
+        except TemplateError as e:
+            logger.error(f"❌ 工作流参数模板无效: {e}")
+            for task in tasks:
+                task.status = TaskStatus.FAILED
+                task.error = f"工作流参数无效: {e}"
+            if workflow_id:
+                workflow_store.finish(workflow_id, workflow_store.FAILED)
+            return list(tasks)
+
+        step_outputs = StepOutputs()
+        for step, result in sorted((previous_results or {}).items()):
+            step_outputs.set(step, result)
+
+        for step_number, task in enumerate(tasks, step_offset + 1):
             logger.info(f"📋 处理任务: {task.type}, step_index={task.params.get('step_index')}, is_workflow={task.params.get('is_workflow')}")
+            if total_steps > 1:
+                progress_manager.emit(ProgressEvent(
+                    kind="step_started",
+                    message=f"▶️ 步骤 {step_number}/{total_steps}: {self._get_task_description(task.type)}",
+                    progress=int((step_number - 1) * 100 / total_steps),
+                    task_id=task.id,
+                    task_type=task.type,
+                    step_index=step_number,
+                    total_steps=total_steps,
+                ))
             
-            if task.params.get("is_workflow") and task.params.get("step_index", 0) > 0:
-                prev_str = str(previous_result)[:100] if previous_result else 'None'
-                logger.info(f"🔍 检查 previous_result: {prev_str}...")
-                
-                if previous_result:
-                    prev_output = previous_result
-                    if isinstance(previous_result, dict):
-                        prev_output = previous_result.get("output", previous_result.get("message", str(previous_result)))
-                    
-                    for key, value in task.params.items():
-                        if isinstance(value, str):
-                            import re
-                            
-                            output_pattern = r'\{output:([^}]+)\}'
-                            output_matches = re.findall(output_pattern, value)
-                            if output_matches:
-                                for match in output_matches:
-                                    placeholder = f"{{output:{match}}}"
-                                    replacement = str(prev_output)
-                                    task.params[key] = value.replace(placeholder, replacement)
-                                    logger.info(f"🔄 工作流: 使用前一步骤结果替换 {placeholder} -> {str(replacement)[:100]}...")
-                            
-                            placeholders = [
-                                "{{previous_result}}",
-                                "{previous_result}",
-                                "{previouss_result}",
-                                "{{previouss_result}}",
-                            ]
-                            for placeholder in placeholders:
-                                if placeholder in value:
-                                    replacement = str(prev_output)
-                                    
-                                    if key == "attachment":
-                                        if isinstance(previous_result, dict):
-                                            if "file_path" in previous_result:
-                                                replacement = previous_result["file_path"]
-                                                logger.info(f"📎 从结果中提取 file_path: {replacement}")
-                                            elif "first_file_path" in previous_result:
-                                                replacement = previous_result["first_file_path"]
-                                                logger.info(f"📎 从结果中提取 first_file_path: {replacement}")
-                                            else:
-                                                path_match = re.search(r'([A-Za-z]:\\[^\n\r]+\.(xlsx|xls|docx|doc|pdf|txt|csv|png|jpg|jpeg|gif|bmp|webp))', replacement)
-                                                if path_match:
-                                                    replacement = path_match.group(1)
-                                                    logger.info(f"📎 从结果中提取文件路径: {replacement}")
-                                    
-                                    task.params[key] = value.replace(placeholder, replacement)
-                                    logger.info(f"🔄 工作流: 使用前一步骤结果作为参数 {key} = {str(task.params[key])[:100]}...")
-                                    break
+            compiled = compiled_plan.get(task.id)
+            if compiled:
+                if step_outputs.has_previous():
+                    try:
+                        for key in step_outputs.render(compiled, task.params):
+                            logger.info(f"🔄 工作流: 使用前序步骤结果作为参数 {key} = {str(task.params[key])[:100]}...")
+                    except TemplateError as e:
+                        # 参数引用无法解析，不再把未替换的模板交给智能体执行
+                        logger.error(f"❌ 工作流步骤 {step_number} 参数解析失败: {e}")
+                        task.status = TaskStatus.FAILED
+                        task.error = f"工作流参数解析失败: {e}"
+                        completed_tasks.append(task)
+                        self._emit_step_finished(task, step_number, total_steps, self.name)
+                        if workflow_id:
+                            workflow_store.update_step(
+                                workflow_id, step_number - 1, task.status.value,
+                                result=task.result, error=task.error
+                            )
+                        continue
                 else:
-                    logger.warning(f"⚠️ 工作流步骤 {task.params.get('step_index', 0)} 没有前一步骤结果可用")
+                    logger.warning(f"⚠️ 工作流步骤 {step_number} 没有前一步骤结果可用")
             
             if task.type in ["current_weather", "weather_forecast"] and Settings:
                 city = task.params.get("city", "")
@@ -2483,25 +2509,36 @@ class MasterAgent(BaseAgent):
                     logger.info(f"📤 任务 '{task.id}' 分配给 '{agent.name}'")
 
                     # 脉冲询问方式等待任务完成
-                    # 下载任务需要更长的超时时间
-                    if task.type in ['file_download', 'download', 'video_download']:
-                        max_wait = 3600  # 下载任务最多等待30分钟
-                    elif task.type in ['generate_image', 'text_to_image', 'image_generation']:
-                        max_wait = 120  # 图片生成最多等待2分钟
-                    else:
-                        max_wait = 600  # 其他任务最多等待5分钟
+                    # 超时和提示时机根据该智能体处理此类任务的历史耗时自适应计算
+                    from .latency_tracker import get_latency_tracker
+                    latency_tracker = get_latency_tracker()
+                    max_wait = latency_tracker.get_timeout(agent.name, task.type)
+                    default_wait = latency_tracker.get_default_timeout(task.type)
+                    notice_delay = latency_tracker.get_notice_delay(agent.name, task.type)
                     wait_interval = 0.5  # 每次间隔0.5秒
-                    wait_count = 0
+                    wait_start = time.monotonic()
+                    timed_out = False
+                    
+                    # 任务仍在上报进度时，超时不低于默认值
+                    last_progress_at = None
+                    
+                    def on_task_progress(event: ProgressEvent):
+                        nonlocal last_progress_at
+                        if event.kind == "task_progress" and event.task_id == task.id:
+                            last_progress_at = time.monotonic()
+                    
+                    progress_manager.subscribe(on_task_progress)
+                    progress_manager.track(task.id)
                     
                     # 任务执行超时提示
                     task_timeout_sent = False
                     
                     async def check_task_timeout():
                         nonlocal task_timeout_sent
-                        await asyncio.sleep(3.0)
+                        await asyncio.sleep(notice_delay)
                         if not task_timeout_sent:
                             task_timeout_sent = True
-                            logger.info(f"⏳ 任务 '{task.type}' 执行时间超过3秒，发送提示消息")
+                            logger.info(f"⏳ 任务 '{task.type}' 执行时间超过{notice_delay:.1f}秒，发送提示消息")
                             from ..session_manager import simple_session_manager
                             simple_session_manager.add_message("system", f"⏳ 正在{self._get_task_description(task.type)}，请稍候...")
                             if hasattr(self, '_send_temp_message'):
@@ -2509,18 +2546,31 @@ class MasterAgent(BaseAgent):
                     
                     task_timeout_task = asyncio.create_task(check_task_timeout())
                     
-                    while wait_count < max_wait:
-                        # 从智能体的任务列表中获取最新状态
-                        latest_task = agent.tasks.get(task.id)
-                        if latest_task:
-                            if latest_task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
+                    try:
+                        while True:
+                            # 从智能体的任务列表中获取最新状态
+                            latest_task = agent.tasks.get(task.id)
+                            if latest_task:
+                                if latest_task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
+                                    break
+                            else:
+                                # 任务不在列表中，可能已完成被清理
                                 break
-                        else:
-                            # 任务不在列表中，可能已完成被清理
-                            break
-                        
-                        await asyncio.sleep(wait_interval)
-                        wait_count += 1
+                            
+                            now = time.monotonic()
+                            if now - wait_start >= max_wait:
+                                progressing = (
+                                    last_progress_at is not None
+                                    and now - last_progress_at < latency_tracker.progress_stale
+                                )
+                                if not progressing or now - wait_start >= default_wait:
+                                    timed_out = True
+                                    break
+                            
+                            await asyncio.sleep(wait_interval)
+                    finally:
+                        progress_manager.unsubscribe(on_task_progress)
+                        progress_manager.untrack(task.id)
                     
                     task_timeout_sent = True
                     if not task_timeout_task.done():
@@ -2530,28 +2580,40 @@ class MasterAgent(BaseAgent):
                         except asyncio.CancelledError:
                             pass
                     
-                    if wait_count >= max_wait:
-                        logger.warning(f"⏰ 任务 '{task.id}' 等待超时")
+                    if timed_out:
+                        waited = time.monotonic() - wait_start
+                        logger.warning(f"⏰ 任务 '{task.id}' 等待超时（{waited:.0f}秒）")
+                        task.status = TaskStatus.FAILED
+                        task.error = f"任务执行超时（{waited:.0f}秒）"
+                        latency_tracker.record_timeout(agent.name, task.type, waited)
+                    elif task.status == TaskStatus.COMPLETED:
+                        if task.started_at and task.completed_at:
+                            duration = (task.completed_at - task.started_at).total_seconds()
+                        else:
+                            duration = time.monotonic() - wait_start
+                        latency_tracker.record(agent.name, task.type, duration)
                     
                     # 保存任务结果供后续工作流步骤使用
                     if task.params.get("is_workflow"):
                         # 从智能体获取最新的任务状态和结果
                         final_task = agent.tasks.get(task.id)
                         if final_task and final_task.result:
-                            previous_result = final_task.result
-                            logger.info(f"💾 工作流: 保存步骤结果，长度: {len(str(final_task.result))}")
+                            step_outputs.set(step_number, final_task.result)
+                            logger.info(f"💾 工作流: 保存步骤 {step_number} 结果，类型: {type(final_task.result).__name__}")
                         elif task.result:
-                            previous_result = task.result
-                            logger.info(f"💾 工作流: 保存步骤结果（本地），长度: {len(str(task.result))}")
+                            step_outputs.set(step_number, task.result)
+                            logger.info(f"💾 工作流: 保存步骤 {step_number} 结果（本地），类型: {type(task.result).__name__}")
                         else:
                             logger.warning(f"⚠️ 工作流步骤没有返回结果")
                     
                     completed_tasks.append(task)
+                    self._emit_step_finished(task, step_number, total_steps, agent.name)
                 else:
                     logger.error(f"❌ 任务 '{task.id}' 分配失败")
                     task.status = TaskStatus.FAILED
                     task.error = "智能体拒绝接受任务"
                     completed_tasks.append(task)
+                    self._emit_step_finished(task, step_number, total_steps, agent.name)
             else:
                 logger.warning(f"⚠️ 没有找到合适的智能体处理任务: {task.type}")
                 
@@ -2635,6 +2697,8 @@ class MasterAgent(BaseAgent):
                     task.result = confirm_msg
                     task.status = TaskStatus.COMPLETED
                     completed_tasks.append(task)
+                    if workflow_id:
+                        workflow_store.finish(workflow_id, workflow_store.FAILED)
                     return completed_tasks
                 
                 logger.info("交给LLM处理")
@@ -2644,16 +2708,122 @@ class MasterAgent(BaseAgent):
                     task.status = TaskStatus.COMPLETED
                     
                     if task.params.get("is_workflow"):
-                        previous_result = llm_response
-                        logger.info(f"💾 工作流: 保存 LLM 结果，长度: {len(str(llm_response))}")
+                        step_outputs.set(step_number, llm_response)
+                        logger.info(f"💾 工作流: 保存步骤 {step_number} 的 LLM 结果")
                 except Exception as e:
                     logger.error(f"LLM 处理失败: {e}")
                     task.status = TaskStatus.FAILED
                     task.error = f"处理失败: {str(e)}"
                 completed_tasks.append(task)
+                self._emit_step_finished(task, step_number, total_steps, self.name)
+
+            if workflow_id:
+                workflow_store.update_step(
+                    workflow_id, step_number - 1, task.status.value,
+                    result=task.result, error=task.error
+                )
+
+        if workflow_id:
+            all_completed = all(t.status == TaskStatus.COMPLETED for t in completed_tasks)
+            workflow_store.finish(workflow_id, workflow_store.COMPLETED if all_completed else workflow_store.FAILED)
 
         return completed_tasks
 
+    def _check_unfinished_workflows(self):
+        """启动时检查未完成的工作流，准备恢复提示"""
+        try:
+            from .workflow_store import get_workflow_store
+            store = get_workflow_store()
+            unfinished = store.get_unfinished()
+        except Exception as e:
+            logger.debug(f"检查未完成工作流失败: {e}")
+            return
+
+        if not unfinished:
+            return
+
+        record = unfinished[0]
+        resume_index = store.get_resume_index(record)
+        total = len(record["steps"])
+        steps_desc = " → ".join(self._get_task_description(step["type"]) for step in record["steps"])
+        self._pending_action = {
+            "action": "resume_workflow",
+            "params": {"workflow_id": record["id"]}
+        }
+        self._resume_prompt = (
+            f"🔁 检测到上次未完成的工作流：{record.get('request') or steps_desc}\n"
+            f"📋 步骤: {steps_desc}\n"
+            f"✅ 已完成 {resume_index}/{total} 步，可从第 {resume_index + 1} 步继续。\n"
+            f"回复\"确认\"继续执行。"
+        )
+        logger.info(f"🔁 发现未完成的工作流: {record['id']}，可从步骤 {resume_index + 1} 继续")
+
+    def get_resume_prompt(self) -> Optional[str]:
+        """获取（并消费）未完成工作流的恢复提示"""
+        prompt = self._resume_prompt
+        self._resume_prompt = None
+        return prompt
+
+    async def resume_workflow(self, workflow_id: str) -> str:
+        """从检查点恢复工作流，跳过输出仍然有效的步骤"""
+        from .workflow_store import get_workflow_store
+        store = get_workflow_store()
+        record = store.load(workflow_id)
+        if not record or record.get("status") != store.RUNNING:
+            return "❌ 工作流已结束或不存在"
+
+        resume_index = store.get_resume_index(record)
+        if resume_index >= len(record["steps"]):
+            store.finish(workflow_id)
+            return "✅ 工作流的所有步骤都已完成"
+
+        tasks = store.build_tasks(record, resume_index)
+        # 已完成步骤的输出全部恢复，{step:N} 引用才能解析到更早的步骤
+        previous_results = {
+            step["index"] + 1: step.get("result")
+            for step in record["steps"][:resume_index]
+            if step.get("result") is not None
+        }
+        logger.info(f"🔁 恢复工作流 {workflow_id}，从步骤 {resume_index + 1} 开始")
+
+        results = await self._dispatch_tasks(
+            tasks,
+            workflow_id=workflow_id,
+            previous_results=previous_results,
+            step_offset=resume_index,
+        )
+        return await self._aggregate_results(results, {"type": "workflow", "params": {}})
+
+    @staticmethod
+    def _summarize_result(task: Task, limit: int = 200) -> str:
+        """生成任务结果摘要（用于步骤进度推送）"""
+        if task.status != TaskStatus.COMPLETED:
+            summary = task.error or "执行失败"
+        elif isinstance(task.result, dict):
+            summary = task.result.get("message") or task.result.get("output") or task.result.get("error") or str(task.result)
+        else:
+            summary = str(task.result) if task.result is not None else "完成"
+        summary = str(summary).strip()
+        return summary[:limit] + "..." if len(summary) > limit else summary
+
+    def _emit_step_finished(self, task: Task, step_number: int, total_steps: int, agent_name: str = ""):
+        """推送步骤完成事件（仅多步骤任务）"""
+        if total_steps <= 1:
+            return
+        success = task.status == TaskStatus.COMPLETED
+        icon = "✅" if success else "❌"
+        progress_manager.emit(ProgressEvent(
+            kind="step_finished",
+            message=f"{icon} 步骤 {step_number}/{total_steps} {self._get_task_description(task.type)}: {self._summarize_result(task)}",
+            progress=int(step_number * 100 / total_steps),
+            task_id=task.id,
+            task_type=task.type,
+            agent=agent_name,
+            step_index=step_number,
+            total_steps=total_steps,
+            success=success,
+        ))
+
     async def _select_agent(self, task: Task) -> Optional[BaseAgent]:
         """
         选择最适合处理任务的智能体（支持懒加载）
@@ -2957,6 +3127,19 @@ class MasterAgent(BaseAgent):
                 content = f"【{agent_name}】{message.content}"
                 await self._notification_callback(content)
 
+        elif message.type == "task_progress":
+            # 长任务进度（下载、解密、批量转换等），转发给各渠道
+            progress = message.data.get("progress", -1)
+            text = message.content or f"正在{self._get_task_description(message.data.get('task_type', ''))}"
+            progress_manager.emit(ProgressEvent(
+                kind="task_progress",
+                message=f"⏳ {text} ({progress}%)" if progress >= 0 else f"⏳ {text}",
+                progress=progress,
+                task_id=message.data.get("task_id", ""),
+                task_type=message.data.get("task_type", ""),
+                agent=message.from_agent,
+            ))
+
         elif message.type == "status_update":
             # 状态更新
             agent_name = message.from_agent
@@ -3507,8 +3690,8 @@ tests/
     async def _infer_missing_info(self, task: Task, missing_info: Dict) -> Optional[Dict]:
         """从上下文推断缺失的信息"""
         try:
-            history_text = self._get_conversation_history(30)
             original_text = task.params.get("original_text", task.content)
+            history_text = self._get_conversation_history(original_text)
             
             missing_desc = ", ".join([f"{k}({v})" for k, v in missing_info.items()])
             
@@ -3516,7 +3699,7 @@ tests/
 
 用户请求: {original_text}
 
-历史对话（最近30条）:
+历史对话:
 {history_text if history_text else "无历史记录"}
 
 需要推断的信息: {missing_desc}
@@ -3552,11 +3735,11 @@ tests/
             logger.error(f"推断缺失信息失败: {e}")
             return None
     
-    def _get_conversation_history(self, limit: int = 30) -> str:
-        """获取历史聊天记录（从历史记录管理器）"""
+    def _get_conversation_history(self, query: str = "") -> str:
+        """获取历史聊天记录（按 token 预算组装最近对话、相关记录和早前摘要）"""
         try:
-            from ..memory.history_manager import history_manager
-            return history_manager.get_history_text(limit)
+            from ..memory.context_builder import get_context_builder
+            return get_context_builder().build_text(query=query)
         except Exception as e:
             logger.warning(f"获取历史记录失败: {e}")
             return ""
@@ -3605,10 +3788,10 @@ tests/
                     if agent:
                         await agent.assign_task(task)
                         return await self._wait_for_task_completion(task)
-                elif action == "general":
+                elif action in ("general", "resume_workflow"):
                     return await self._execute_pending_action(pending, content)
             
-            history_text = self._get_conversation_history(20)
+            history_text = self._get_conversation_history(content)
             
             chat_context = context.get("chat_context") if context else None
             if chat_context:
@@ -3727,6 +3910,9 @@ tests/
                 await agent.assign_task(task)
                 return await self._wait_for_task_completion(task)
         
+        elif action == "resume_workflow":
+            return await self.resume_workflow(params.get("workflow_id", ""))
+        
         return "✅ 操作已完成"
 
     def get_system_status(self) -> Dict:
@@ -3,7 +3,7 @@ Message Bus - 智能体间消息总线
 实现智能体间的异步通信
 """
 import asyncio
-from typing import Dict, List, Callable
+from typing import Dict, List, Callable, Optional
 from loguru import logger
 from .base import Message
 
@@ -18,6 +18,7 @@ class MessageBus:
     def __init__(self):
         self._agents: Dict[str, asyncio.Queue] = {}  # 智能体消息队列
         self._subscribers: Dict[str, List[Callable]] = {}  # 消息订阅者
+        self._fallback: Optional[asyncio.Queue] = None  # 未注册接收者的转交队列
         self._running = False
 
     def register_agent(self, agent_name: str, queue: asyncio.Queue):
@@ -25,6 +26,10 @@ class MessageBus:
         self._agents[agent_name] = queue
         logger.info(f"✅ 智能体 '{agent_name}' 已注册到消息总线，当前注册: {list(self._agents.keys())}")
 
+    def set_fallback(self, queue: Optional[asyncio.Queue]):
+        """设置未注册接收者的转交队列（智能体子进程中用于把消息转发给主进程）"""
+        self._fallback = queue
+
     def unregister_agent(self, agent_name: str):
         """注销智能体"""
         if agent_name in self._agents:
@@ -51,6 +56,10 @@ class MessageBus:
             await self._agents[message.to_agent].put(message)
             logger.debug(f"📨 消息已路由到 '{message.to_agent}': {message.type}")
 
+        elif self._fallback is not None:
+            await self._fallback.put(message)
+            logger.debug(f"📨 消息已转交: '{message.to_agent}' 未在本地注册")
+
         else:
             logger.warning(f"⚠️ 消息无法送达，智能体 '{message.to_agent}' 不存在")
 
@@ -0,0 +1,398 @@
+"""
+智能体进程托管
+把选定的智能体放到受监管的子进程中运行，避免阻塞调用或原生崩溃拖垮主进程
+
+启用方式（环境变量）：
+    ISOLATED_AGENTS=document_agent,image_converter_agent,audio_decrypt_agent
+    AGENT_PROCESS_MEMORY_MB=1024            常驻内存上限（MB），0 表示不限制
+    AGENT_PROCESS_CPU_SECONDS=600           单个任务可使用的 CPU 时间上限（秒），0 表示不限制
+    AGENT_PROCESS_MAX_RESTARTS=5            10 分钟内最多自动重启次数
+    <智能体名大写>_PROCESS_MEMORY_MB / <智能体名大写>_PROCESS_CPU_SECONDS   单个智能体的覆盖值
+
+主进程中由 AgentProcessProxy 代替真实智能体注册到消息总线，
+Task 和 Message 数据类通过 multiprocessing 管道在两个进程间传递。
+内存和 CPU 限制依赖 psutil，未安装时只做崩溃重启。
+"""
+import asyncio
+import multiprocessing
+import os
+import pickle
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+from loguru import logger
+
+from .base import BaseAgent, AgentStatus, Task, Message
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
+
+def _env_float(key: str, default: float) -> float:
+    try:
+        return float(os.getenv(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_isolated_agents() -> Set[str]:
+    """获取需要在子进程中运行的智能体名称"""
+    value = os.getenv("ISOLATED_AGENTS", "")
+    return {name.strip().lower() for name in value.split(",") if name.strip()}
+
+
+@dataclass
+class ProcessLimits:
+    """子进程资源限制"""
+    memory_mb: float = 1024
+    cpu_seconds: float = 600
+    max_restarts: int = 5
+    restart_window: float = 600
+    health_interval: float = 2.0
+    start_timeout: float = 60.0
+
+    @classmethod
+    def for_agent(cls, agent_name: str) -> "ProcessLimits":
+        prefix = agent_name.upper()
+        return cls(
+            memory_mb=_env_float(f"{prefix}_PROCESS_MEMORY_MB", _env_float("AGENT_PROCESS_MEMORY_MB", 1024)),
+            cpu_seconds=_env_float(f"{prefix}_PROCESS_CPU_SECONDS", _env_float("AGENT_PROCESS_CPU_SECONDS", 600)),
+            max_restarts=int(_env_float("AGENT_PROCESS_MAX_RESTARTS", 5)),
+        )
+
+
+def _picklable(value: Any) -> Any:
+    """确保结果可以通过管道传递，否则退化为字符串"""
+    try:
+        pickle.dumps(value)
+        return value
+    except Exception:
+        return str(value)
+
+
+async def _child_loop(agent_name: str, module_path: str, class_name: str, conn):
+    import importlib
+    from .message_bus import message_bus
+
+    module = importlib.import_module(module_path, package="personal_agent.agents")
+    agent: BaseAgent = getattr(module, class_name)()
+    await agent.start()
+
+    # 子进程中发往 master 及其他智能体的消息（任务进度等）通过管道转发给主进程，
+    # 由主进程的消息总线投递
+    outbound_queue: asyncio.Queue = asyncio.Queue()
+    message_bus.register_agent("master", outbound_queue)
+    message_bus.set_fallback(outbound_queue)
+
+    async def forward_messages():
+        while True:
+            message = await outbound_queue.get()
+            message.data = _picklable(message.data)
+            conn.send(("message", message))
+
+    async def run_task(task: Task):
+        agent._current_task = task
+        try:
+            result = await agent.execute_task(task)
+            conn.send(("result", task.id, _picklable(result), None, getattr(task, "no_retry", False)))
+        except Exception as e:
+            logger.exception("📋 子进程任务失败详细信息:")
+            conn.send(("result", task.id, None, str(e), getattr(task, "no_retry", False)))
+        finally:
+            agent._current_task = None
+            agent._progress_marks.pop(task.id, None)
+
+    asyncio.create_task(forward_messages())
+    conn.send(("ready", {
+        "pid": os.getpid(),
+        "description": agent.description,
+        "capabilities": list(agent.capabilities),
+        "capability_details": agent.capability_details,
+        "open_formats": list(agent.supported_open_formats),
+        "edit_formats": list(agent.supported_edit_formats),
+    }))
+
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            item = await loop.run_in_executor(None, conn.recv)
+        except (EOFError, OSError):
+            break
+        kind = item[0]
+        if kind == "task":
+            asyncio.create_task(run_task(item[1]))
+        elif kind == "message":
+            await agent.message_queue.put(item[1])
+        elif kind == "stop":
+            break
+
+    await agent.stop()
+
+
+def _child_main(agent_name: str, module_path: str, class_name: str, conn):
+    """子进程入口"""
+    try:
+        asyncio.run(_child_loop(agent_name, module_path, class_name, conn))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        try:
+            conn.send(("fatal", str(e)))
+        except Exception:
+            pass
+        raise
+
+
+class AgentProcessProxy(BaseAgent):
+    """
+    子进程智能体代理
+
+    功能：
+    1. 在主进程中代表真实智能体，沿用 BaseAgent 的任务队列和完成报告
+    2. 任务通过管道发送给子进程执行，子进程的消息转发到主进程消息总线
+    3. 子进程崩溃后自动重启，正在执行的任务标记为失败
+    4. 按内存和单任务 CPU 时间限制监控子进程，超限时终止并重启
+    """
+
+    def __init__(self, agent_name: str, module_path: str, class_name: str,
+                 limits: Optional[ProcessLimits] = None):
+        super().__init__(name=agent_name, description=f"{agent_name}（子进程）")
+        self.module_path = module_path
+        self.class_name = class_name
+        self.limits = limits or ProcessLimits.for_agent(agent_name)
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._task_cpu_start: Dict[str, float] = {}
+        self._reader: Optional[asyncio.Task] = None
+        self._monitor: Optional[asyncio.Task] = None
+        self._restart_times: List[float] = []
+        self._restarting = False
+        self._stopping = False
+        self.restart_count = 0
+        self.last_exit_code: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self._last_usage: Dict[str, float] = {}
+
+    async def _spawn(self):
+        """启动子进程并等待就绪"""
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_child_main,
+            args=(self.name, self.module_path, self.class_name, child_conn),
+            name=f"agent-{self.name}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+
+        loop = asyncio.get_running_loop()
+        ready = await loop.run_in_executor(None, parent_conn.poll, self.limits.start_timeout)
+        if not ready:
+            process.kill()
+            raise RuntimeError(f"智能体进程 '{self.name}' 启动超时")
+        kind, info = await loop.run_in_executor(None, parent_conn.recv)
+        if kind != "ready":
+            process.join(timeout=1)
+            raise RuntimeError(f"智能体进程 '{self.name}' 启动失败: {info}")
+
+        self._process = process
+        self._conn = parent_conn
+        self.description = info.get("description") or self.description
+        self.capabilities = info.get("capabilities", [])
+        self.capability_details = info.get("capability_details", {})
+        self.supported_open_formats = info.get("open_formats", [])
+        self.supported_edit_formats = info.get("edit_formats", [])
+        self._reader = asyncio.create_task(self._read_loop(parent_conn))
+        logger.info(f"🧩 智能体 '{self.name}' 已在子进程中启动 (PID: {process.pid})")
+
+    async def start(self):
+        """启动子进程和本地任务队列"""
+        self._stopping = False
+        await self._spawn()
+        await super().start()
+        self._monitor = asyncio.create_task(self._monitor_loop())
+
+    async def stop(self):
+        """停止子进程"""
+        self._stopping = True
+        if self._monitor and not self._monitor.done():
+            self._monitor.cancel()
+        if self._conn:
+            try:
+                self._conn.send(("stop",))
+            except Exception:
+                pass
+        if self._process:
+            await asyncio.get_running_loop().run_in_executor(None, self._process.join, 5)
+            if self._process.is_alive():
+                self._process.kill()
+        self._fail_pending("智能体进程已停止")
+        await super().stop()
+
+    async def execute_task(self, task: Task) -> Any:
+        """把任务发送给子进程执行并等待结果"""
+        if not self._process or not self._process.is_alive():
+            raise RuntimeError(f"智能体进程 '{self.name}' 不可用")
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[task.id] = future
+        self._task_cpu_start[task.id] = self._cpu_time()
+        try:
+            self._conn.send(("task", task))
+            result, error, no_retry = await future
+        finally:
+            self._pending.pop(task.id, None)
+            self._task_cpu_start.pop(task.id, None)
+
+        task.no_retry = no_retry
+        if error:
+            raise RuntimeError(error)
+        return result
+
+    async def _handle_message(self, message: Message):
+        """其他智能体发给本智能体的消息转发给子进程"""
+        if self._conn and self._process and self._process.is_alive():
+            try:
+                self._conn.send(("message", message))
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ 转发消息到智能体进程 '{self.name}' 失败: {e}")
+        await super()._handle_message(message)
+
+    async def _read_loop(self, conn):
+        """读取子进程发来的结果和消息"""
+        from .message_bus import message_bus
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                item = await loop.run_in_executor(None, conn.recv)
+            except (EOFError, OSError):
+                break
+            except asyncio.CancelledError:
+                return
+            kind = item[0]
+            if kind == "result":
+                _, task_id, result, error, no_retry = item
+                future = self._pending.get(task_id)
+                if future and not future.done():
+                    future.set_result((result, error, no_retry))
+            elif kind == "message":
+                await message_bus.send_message(item[1])
+            elif kind == "fatal":
+                self.last_error = item[1]
+
+        if conn is self._conn and not self._stopping:
+            await self._handle_exit("管道已关闭")
+
+    def _cpu_time(self) -> float:
+        if not PSUTIL_AVAILABLE or not self._process:
+            return 0.0
+        try:
+            times = psutil.Process(self._process.pid).cpu_times()
+            return times.user + times.system
+        except Exception:
+            return 0.0
+
+    async def _monitor_loop(self):
+        """健康检查：进程存活、内存和单任务 CPU 时间"""
+        while not self._stopping:
+            try:
+                await asyncio.sleep(self.limits.health_interval)
+                if self._restarting or not self._process:
+                    continue
+                if not self._process.is_alive():
+                    await self._handle_exit("进程已退出")
+                    continue
+                if not PSUTIL_AVAILABLE:
+                    continue
+
+                proc = psutil.Process(self._process.pid)
+                rss_mb = proc.memory_info().rss / 1024 / 1024
+                cpu_time = self._cpu_time()
+                self._last_usage = {"rss_mb": round(rss_mb, 1), "cpu_seconds": round(cpu_time, 1)}
+
+                reason = None
+                if self.limits.memory_mb > 0 and rss_mb > self.limits.memory_mb:
+                    reason = f"内存超限 ({rss_mb:.0f}MB > {self.limits.memory_mb:.0f}MB)"
+                elif self.limits.cpu_seconds > 0:
+                    for task_id, start in self._task_cpu_start.items():
+                        if cpu_time - start > self.limits.cpu_seconds:
+                            reason = f"任务 CPU 时间超限 ({cpu_time - start:.0f}s > {self.limits.cpu_seconds:.0f}s)"
+                            break
+                if reason:
+                    logger.warning(f"⚠️ 智能体进程 '{self.name}' {reason}，正在终止")
+                    self._process.kill()
+                    await self._handle_exit(reason)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.debug(f"智能体进程健康检查出错 '{self.name}': {e}")
+
+    def _fail_pending(self, reason: str):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result((None, reason, False))
+
+    async def _handle_exit(self, reason: str):
+        """子进程退出：标记正在执行的任务失败并尝试重启"""
+        if self._restarting or self._stopping:
+            return
+        self._restarting = True
+        try:
+            if self._process:
+                self._process.join(timeout=1)
+                self.last_exit_code = self._process.exitcode
+            self.last_error = reason
+            logger.error(f"❌ 智能体进程 '{self.name}' 异常退出: {reason} (退出码: {self.last_exit_code})")
+            self._fail_pending(f"智能体进程异常退出: {reason}")
+
+            now = time.monotonic()
+            self._restart_times = [t for t in self._restart_times if now - t < self.limits.restart_window]
+            if len(self._restart_times) >= self.limits.max_restarts:
+                self.status = AgentStatus.ERROR
+                logger.error(f"❌ 智能体进程 '{self.name}' 重启过于频繁，已停止自动重启")
+                return
+
+            delay = min(30, 2 ** len(self._restart_times))
+            self._restart_times.append(now)
+            await asyncio.sleep(delay)
+            try:
+                await self._spawn()
+                self.restart_count += 1
+                self.status = AgentStatus.IDLE
+                logger.info(f"🔄 智能体进程 '{self.name}' 已重启（第 {self.restart_count} 次）")
+            except Exception as e:
+                self.status = AgentStatus.ERROR
+                logger.error(f"❌ 智能体进程 '{self.name}' 重启失败: {e}")
+        finally:
+            self._restarting = False
+
+    def get_health(self) -> Dict[str, Any]:
+        """获取子进程健康状态"""
+        alive = bool(self._process and self._process.is_alive())
+        return {
+            "isolated": True,
+            "pid": self._process.pid if self._process else None,
+            "alive": alive,
+            "restarts": self.restart_count,
+            "last_exit_code": self.last_exit_code,
+            "last_error": self.last_error,
+            "running_tasks": len(self._pending),
+            "limits": {
+                "memory_mb": self.limits.memory_mb,
+                "cpu_seconds": self.limits.cpu_seconds,
+            },
+            "usage": dict(self._last_usage),
+        }
+
+    def get_status(self) -> Dict:
+        status = super().get_status()
+        status["process"] = self.get_health()
+        return status
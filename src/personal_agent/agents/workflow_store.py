@@ -0,0 +1,205 @@
+"""
+工作流检查点存储
+在任务分配过程中持久化工作流计划、步骤状态和步骤输出，进程重启后可从上次完成的步骤继续
+"""
+import json
+import os
+import re
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from .base import Task
+
+
+class WorkflowStore:
+    """
+    工作流检查点存储
+
+    功能：
+    1. 每个工作流保存为一个 JSON 文件（原子写入）
+    2. 每个步骤开始/结束时更新状态和输出
+    3. 启动时列出未完成的工作流，并计算可以跳过的步骤
+    """
+
+    INSTANCE = None
+
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    ABANDONED = "abandoned"
+
+    # 结果中可能包含输出文件路径的字段
+    PATH_KEYS = ("file_path", "first_file_path", "output", "output_path", "save_path")
+    PATH_LIST_KEYS = ("output_files", "files")
+    PATH_PATTERN = re.compile(r'([A-Za-z]:\\[^\n\r"\'<>|?*]+\.\w{1,5}|/[^\n\r"\'<>|?*\s]+\.\w{1,5})')
+
+    def __new__(cls, *args, **kwargs):
+        if cls.INSTANCE is None:
+            cls.INSTANCE = super().__new__(cls)
+        return cls.INSTANCE
+
+    def __init__(self, data_dir: Optional[Path] = None, max_age_hours: int = 24):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+
+        self.data_dir = data_dir or Path.home() / ".personal_agent" / "workflows"
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.max_age = timedelta(hours=max_age_hours)
+
+        self._initialized = True
+
+    def _file(self, workflow_id: str) -> Path:
+        return self.data_dir / f"{workflow_id}.json"
+
+    def _write(self, record: Dict):
+        """原子写入工作流记录"""
+        record["updated_at"] = datetime.now().isoformat()
+        path = self._file(record["id"])
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"保存工作流检查点失败: {e}")
+
+    def load(self, workflow_id: str) -> Optional[Dict]:
+        """加载工作流记录"""
+        path = self._file(workflow_id)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"加载工作流检查点失败 {workflow_id}: {e}")
+            return None
+
+    def create(self, tasks: List[Task], request: str = "") -> str:
+        """
+        创建工作流记录
+
+        Args:
+            tasks: 工作流步骤任务列表
+            request: 用户原始请求
+
+        Returns:
+            工作流 ID
+        """
+        workflow_id = str(uuid.uuid4())[:12]
+        record = {
+            "id": workflow_id,
+            "request": request,
+            "status": self.RUNNING,
+            "created_at": datetime.now().isoformat(),
+            "steps": [
+                {
+                    "index": i,
+                    "type": task.type,
+                    "content": task.content if isinstance(task.content, str) else str(task.content),
+                    "params": task.params,
+                    "priority": task.priority,
+                    "status": "pending",
+                    "result": None,
+                    "error": None,
+                }
+                for i, task in enumerate(tasks)
+            ],
+        }
+        self._write(record)
+        logger.info(f"💾 工作流检查点已创建: {workflow_id} ({len(tasks)} 个步骤)")
+        return workflow_id
+
+    def update_step(self, workflow_id: str, index: int, status: str,
+                    result: Any = None, error: Optional[str] = None):
+        """更新步骤状态和输出"""
+        record = self.load(workflow_id)
+        if not record or index >= len(record["steps"]):
+            return
+        step = record["steps"][index]
+        step["status"] = status
+        step["result"] = result
+        step["error"] = error
+        step["finished_at"] = datetime.now().isoformat()
+        self._write(record)
+
+    def finish(self, workflow_id: str, status: str = COMPLETED):
+        """结束工作流（完成的工作流会删除检查点）"""
+        if status == self.COMPLETED:
+            try:
+                self._file(workflow_id).unlink(missing_ok=True)
+            except Exception as e:
+                logger.warning(f"删除工作流检查点失败: {e}")
+            return
+        record = self.load(workflow_id)
+        if record:
+            record["status"] = status
+            self._write(record)
+
+    def get_unfinished(self) -> List[Dict]:
+        """获取未完成的工作流（按更新时间倒序），过期的标记为放弃"""
+        records = []
+        now = datetime.now()
+        for path in self.data_dir.glob("*.json"):
+            record = self.load(path.stem)
+            if not record or record.get("status") != self.RUNNING:
+                continue
+            try:
+                updated = datetime.fromisoformat(record.get("updated_at", ""))
+            except ValueError:
+                updated = now - self.max_age
+            if now - updated > self.max_age:
+                self.finish(record["id"], self.ABANDONED)
+                continue
+            records.append(record)
+        records.sort(key=lambda r: r.get("updated_at", ""), reverse=True)
+        return records
+
+    def _extract_paths(self, result: Any) -> List[str]:
+        """从步骤结果中提取输出文件路径"""
+        paths = []
+        if isinstance(result, dict):
+            for key in self.PATH_KEYS:
+                value = result.get(key)
+                if isinstance(value, str) and self.PATH_PATTERN.fullmatch(value.strip()):
+                    paths.append(value.strip())
+            for key in self.PATH_LIST_KEYS:
+                value = result.get(key)
+                if isinstance(value, list):
+                    paths.extend(v for v in value if isinstance(v, str))
+        elif isinstance(result, str):
+            paths.extend(m.strip() for m in self.PATH_PATTERN.findall(result))
+        return paths
+
+    def is_step_output_valid(self, step: Dict) -> bool:
+        """已完成步骤的输出是否仍然有效（输出文件仍存在）"""
+        if step.get("status") != "completed":
+            return False
+        return all(Path(p).exists() for p in self._extract_paths(step.get("result")))
+
+    def get_resume_index(self, record: Dict) -> int:
+        """计算需要从哪个步骤继续：第一个未完成或输出已失效的步骤"""
+        for step in record["steps"]:
+            if not self.is_step_output_valid(step):
+                return step["index"]
+        return len(record["steps"])
+
+    def build_tasks(self, record: Dict, start_index: int) -> List[Task]:
+        """根据记录重建剩余步骤的任务"""
+        tasks = []
+        for step in record["steps"][start_index:]:
+            tasks.append(Task(
+                type=step["type"],
+                content=step.get("content", ""),
+                params=dict(step.get("params") or {}),
+                priority=step.get("priority", 5),
+            ))
+        return tasks
+
+
+def get_workflow_store() -> WorkflowStore:
+    """获取工作流检查点存储实例"""
+    return WorkflowStore()
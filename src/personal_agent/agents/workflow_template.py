@@ -0,0 +1,243 @@
+"""
+工作流参数模板
+在计划构建时把步骤参数中的占位符编译一次，执行时直接引用前序步骤的结构化输出
+
+支持的占位符：
+    {previous_result} / {{previous_result}}   上一步骤的输出
+    {output:路径}                              上一步骤输出中的字段，如 {output:file_path}、
+                                               {output:download_agent.files.0}（首段为提供者名称时自动忽略）
+    {step:N} / {step:N.路径}                   第 N 步（从 1 开始）的输出或其中的字段
+
+参数值只包含一个占位符时，直接替换为引用对象本身（文件路径、列表、字典），不做字符串化；
+与其他文本混合时才转换为字符串。
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .base import Task
+
+
+class TemplateError(ValueError):
+    """工作流参数模板错误（在任何智能体执行之前抛出）"""
+
+
+PREVIOUS = -1
+
+_PLACEHOLDER_PATTERN = re.compile(
+    r'\{\{?\s*previouss?_result\s*\}?\}'
+    r'|\{output:([^{}]+)\}'
+    r'|\{step:(\d+)(?:\.([^{}]+))?\}'
+)
+
+_FILE_PATH_PATTERN = re.compile(
+    r'([A-Za-z]:\\[^\n\r]+\.(xlsx|xls|docx|doc|pdf|txt|csv|png|jpg|jpeg|gif|bmp|webp))'
+)
+
+# 需要文件路径的参数
+FILE_PARAMS = {"attachment"}
+
+
+@dataclass(frozen=True)
+class OutputRef:
+    """对某一步骤输出的引用"""
+    step: int                               # 步骤序号（从 1 开始），PREVIOUS 表示上一步骤
+    path: Tuple[str, ...] = ()
+    lenient: bool = False                   # {output:...} 兼容写法：路径无法解析时返回整个输出
+
+
+@dataclass
+class CompiledParam:
+    """编译后的单个参数"""
+    key: str
+    segments: List[Union[str, OutputRef]]
+
+    @property
+    def is_single_ref(self) -> bool:
+        return len(self.segments) == 1 and isinstance(self.segments[0], OutputRef)
+
+
+@dataclass
+class CompiledParams:
+    """编译后的步骤参数"""
+    step: int
+    params: List[CompiledParam] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.params)
+
+
+def _compile_value(key: str, value: str) -> Optional[CompiledParam]:
+    segments: List[Union[str, OutputRef]] = []
+    pos = 0
+    for match in _PLACEHOLDER_PATTERN.finditer(value):
+        if match.start() > pos:
+            segments.append(value[pos:match.start()])
+        output_path, step_no, step_path = match.groups()
+        if step_no is not None:
+            path = tuple(p for p in (step_path or "").split(".") if p)
+            segments.append(OutputRef(step=int(step_no), path=path))
+        elif output_path is not None:
+            path = tuple(p for p in output_path.strip().split(".") if p)
+            segments.append(OutputRef(step=PREVIOUS, path=path, lenient=True))
+        else:
+            segments.append(OutputRef(step=PREVIOUS))
+        pos = match.end()
+    if not any(isinstance(seg, OutputRef) for seg in segments):
+        return None
+    if pos < len(value):
+        segments.append(value[pos:])
+    return CompiledParam(key=key, segments=segments)
+
+
+def compile_params(params: Dict[str, Any], step: int) -> CompiledParams:
+    """
+    编译一个步骤的参数
+
+    Args:
+        params: 步骤参数
+        step: 步骤序号（从 1 开始）
+
+    Returns:
+        编译结果
+
+    Raises:
+        TemplateError: 引用了不存在或尚未执行的步骤
+    """
+    compiled = CompiledParams(step=step)
+    for key, value in params.items():
+        if not isinstance(value, str):
+            continue
+        param = _compile_value(key, value)
+        if not param:
+            continue
+        for seg in param.segments:
+            if not isinstance(seg, OutputRef):
+                continue
+            if seg.step == PREVIOUS and step <= 1:
+                raise TemplateError(f"步骤 {step} 的参数 {key} 引用了上一步骤的输出，但它是第一步")
+            if seg.step != PREVIOUS and not 1 <= seg.step < step:
+                raise TemplateError(f"步骤 {step} 的参数 {key} 引用了步骤 {seg.step}，只能引用之前的步骤")
+        compiled.params.append(param)
+    return compiled
+
+
+def compile_plan(tasks: List[Task], step_offset: int = 0) -> Dict[str, CompiledParams]:
+    """
+    编译整个工作流计划，返回 task.id -> 编译结果
+
+    Raises:
+        TemplateError: 任意步骤的模板无效
+    """
+    plan = {}
+    for step, task in enumerate(tasks, step_offset + 1):
+        if not task.params.get("is_workflow"):
+            continue
+        compiled = compile_params(task.params, step)
+        if compiled:
+            plan[task.id] = compiled
+    return plan
+
+
+def default_output(result: Any) -> Any:
+    """步骤结果的默认视图：字典取 output / message 字段"""
+    if isinstance(result, dict):
+        return result.get("output", result.get("message", result))
+    return result
+
+
+def _lookup(value: Any, path: Tuple[str, ...]) -> Tuple[bool, Any]:
+    for part in path:
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, (list, tuple)) and part.lstrip("-").isdigit() and -len(value) <= int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return False, None
+    return True, value
+
+
+def _as_file_path(result: Any) -> Any:
+    """从步骤结果中提取文件路径（用于附件等参数）"""
+    if isinstance(result, dict):
+        for key in ("file_path", "first_file_path"):
+            if result.get(key):
+                return result[key]
+        result = default_output(result)
+    if isinstance(result, str):
+        match = _FILE_PATH_PATTERN.search(result)
+        if match:
+            return match.group(1)
+    return result
+
+
+class StepOutputs:
+    """已完成步骤的输出，以及字符串化结果的缓存"""
+
+    def __init__(self):
+        self._outputs: Dict[int, Any] = {}
+        self._last_step: Optional[int] = None
+        self._str_cache: Dict[int, Tuple[Any, str]] = {}
+
+    def set(self, step: int, result: Any):
+        self._outputs[step] = result
+        self._last_step = step
+
+    @property
+    def previous(self) -> Any:
+        return self._outputs.get(self._last_step) if self._last_step is not None else None
+
+    def has_previous(self) -> bool:
+        return self._last_step is not None
+
+    def _stringify(self, value: Any) -> str:
+        if isinstance(value, str):
+            return value
+        cached = self._str_cache.get(id(value))
+        if cached is None or cached[0] is not value:
+            cached = (value, str(value))
+            self._str_cache[id(value)] = cached
+        return cached[1]
+
+    def resolve(self, ref: OutputRef, file_param: bool = False) -> Any:
+        result = self.previous if ref.step == PREVIOUS else self._outputs.get(ref.step)
+        if result is None:
+            return None
+        if ref.path:
+            found, value = _lookup(result, ref.path)
+            if not found and ref.lenient and len(ref.path) > 1:
+                found, value = _lookup(result, ref.path[1:])
+            if found:
+                return value
+            if not ref.lenient:
+                raise TemplateError(f"步骤输出中不存在字段: {'.'.join(ref.path)}")
+        if file_param:
+            return _as_file_path(result)
+        return default_output(result)
+
+    def render(self, compiled: CompiledParams, params: Dict[str, Any]) -> List[str]:
+        """
+        把编译后的模板渲染到参数中
+
+        Returns:
+            成功替换的参数名列表
+        """
+        rendered = []
+        for param in compiled.params:
+            file_param = param.key in FILE_PARAMS
+            if param.is_single_ref:
+                value = self.resolve(param.segments[0], file_param)
+                if value is None:
+                    continue
+                params[param.key] = value
+            else:
+                parts = []
+                for seg in param.segments:
+                    if isinstance(seg, OutputRef):
+                        value = self.resolve(seg, file_param)
+                        parts.append("" if value is None else self._stringify(value))
+                    else:
+                        parts.append(seg)
+                params[param.key] = "".join(parts)
+            rendered.append(param.key)
+        return rendered
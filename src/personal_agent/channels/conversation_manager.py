@@ -5,13 +5,17 @@ Conversation Manager - 对话管理器（单对话模式）
 import json
 import os
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, field, asdict
 from pathlib import Path
 
 from loguru import logger
 
+from ..memory.conversation_archive import ConversationArchive
+from ..memory.search_index import get_search_index
+from ..utils.persistence import DebouncedJsonWriter
+
 
 @dataclass
 class Message:
@@ -71,7 +75,15 @@ class Conversation:
 
 
 class ConversationManager:
-    """对话管理器（单对话模式）"""
+    """
+    对话管理器（单对话模式）
+    
+    conversation.json 只保存最近 LIVE_MESSAGES 条消息；更早的消息以及超过
+    CONVERSATION_ARCHIVE_DAYS 天（默认 30）的消息移入压缩归档（archive/），
+    向前翻页或搜索时按需读取，启动耗时和内存占用不随历史增长
+    """
+    
+    LIVE_MESSAGES = 50
     
     def __init__(self, storage_path: str = None):
         if storage_path is None:
@@ -81,8 +93,50 @@ class ConversationManager:
         self.storage_path.mkdir(parents=True, exist_ok=True)
         
         self.conversation: Optional[Conversation] = None
+        self.archive = ConversationArchive(self.storage_path / "archive")
+        self.archive_days = int(os.getenv("CONVERSATION_ARCHIVE_DAYS", "30") or 0)
+        self._writer = DebouncedJsonWriter(
+            self._get_conversation_file,
+            lambda: self.conversation.to_dict(),
+            name="conversation"
+        )
         
         self._load()
+        self._sync_search_index()
+    
+    def _sync_search_index(self):
+        """全文索引为空时用归档和已加载的消息建立索引"""
+        index = get_search_index()
+        if not index.available or not self.conversation or index.count("conversation") > 0:
+            return
+        index.add_many("conversation", (
+            (m.get("role", ""), m.get("content", ""), self.conversation.id, m.get("timestamp"))
+            for m in self.archive.iter_messages()
+        ))
+        index.add_many("conversation", [
+            (m.role, m.content, self.conversation.id, m.timestamp) for m in self.conversation.messages
+        ])
+    
+    def _archive_old(self, keep: int = None) -> int:
+        """
+        把超出保留条数或超过归档天数的早期消息移入归档
+        
+        Returns:
+            归档的消息数
+        """
+        messages = self.conversation.messages
+        keep = self.LIVE_MESSAGES if keep is None else keep
+        split = max(0, len(messages) - keep)
+        if self.archive_days > 0:
+            cutoff = (datetime.now() - timedelta(days=self.archive_days)).isoformat()
+            while split < len(messages) and messages[split].timestamp < cutoff:
+                split += 1
+        if not split:
+            return 0
+        
+        self.archive.append([m.to_dict() for m in messages[:split]])
+        self.conversation.messages = messages[split:]
+        return split
     
     def _get_conversation_file(self) -> Path:
         """获取对话文件路径"""
@@ -98,10 +152,13 @@ class ConversationManager:
                     data = json.load(f)
                     self.conversation = Conversation.from_dict(data)
                 
-                if len(self.conversation.messages) > 50:
-                    self.conversation.messages = self.conversation.messages[-50:]
+                archived = self._archive_old()
+                if archived:
+                    self._writer.flush(force=True)
+                    logger.info(f"📦 已归档 {archived} 条早期对话消息")
                 
-                logger.info(f"✅ 已加载对话，共 {len(self.conversation.messages)} 条消息")
+                logger.info(f"✅ 已加载对话，共 {len(self.conversation.messages)} 条消息"
+                            f"（归档 {self.archive.count()} 条）")
             except json.JSONDecodeError as e:
                 logger.error(f"❌ 对话文件JSON格式错误: {e}")
                 self.conversation = Conversation()
@@ -114,17 +171,23 @@ class ConversationManager:
             logger.info("✅ 创建新对话")
     
     def _save(self):
-        """保存对话"""
+        """标记对话已修改，短时间内的多次修改合并为一次原子写入"""
         if not self.conversation:
             return
-        
-        file_path = self._get_conversation_file()
-        try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(self.conversation.to_dict(), f, ensure_ascii=False, indent=2)
+        self._writer.mark_dirty()
+    
+    def flush(self) -> bool:
+        """立即保存对话"""
+        if not self.conversation:
+            return True
+        if self._writer.flush():
             logger.debug(f"💾 对话已保存，共 {len(self.conversation.messages)} 条消息")
-        except Exception as e:
-            logger.error(f"❌ 保存对话失败: {e}")
+            return True
+        return False
+    
+    def get_persistence_stats(self) -> Dict[str, Any]:
+        """获取对话写入统计"""
+        return self._writer.get_stats()
     
     def get_conversation(self) -> Optional[Conversation]:
         """获取对话"""
@@ -134,21 +197,37 @@ class ConversationManager:
         """添加消息到对话"""
         if self.conversation:
             self.conversation.add_message(role, content, metadata)
+            if len(self.conversation.messages) >= self.LIVE_MESSAGES * 2:
+                self._archive_old()
             self._save()
+            get_search_index().add("conversation", content, role, self.conversation.id,
+                                   self.conversation.messages[-1].timestamp)
     
     def clear_messages(self):
         """清空对话消息"""
         if self.conversation:
             self.conversation.clear_messages()
             self._save()
+            self.archive.clear()
+            get_search_index().clear("conversation")
             logger.info("🗑️ 对话内容已清空")
     
     def get_messages(self) -> List[Message]:
-        """获取所有消息"""
+        """获取内存中的（最近）消息"""
         if self.conversation:
             return self.conversation.messages
         return []
     
+    def load_older(self, before: int = None, limit: int = 50) -> List[Message]:
+        """
+        从归档按需读取更早的消息（向前翻页）
+        
+        Args:
+            before: 归档位置，返回此位置之前的消息；默认从归档末尾开始
+            limit: 条数
+        """
+        return [Message.from_dict(m) for m in self.archive.page(before, limit)]
+    
     def search_history(self, query_type: str, keyword: str = None) -> Dict[str, Any]:
         """
         搜索对话历史
@@ -285,9 +364,22 @@ class ConversationManager:
         return {"found": False, "result": None, "message": "没有找到操作相关记录"}
     
     def _search_keyword(self, messages: List[Message], keyword: str) -> Dict[str, Any]:
-        """关键词搜索"""
+        """关键词搜索（优先使用全文索引，可搜索到未加载到内存的早期消息）"""
         results = []
         
+        index = get_search_index()
+        if index.available:
+            results = [
+                {
+                    "content": r["content"][:300],
+                    "timestamp": r["timestamp"],
+                    "role": r["role"],
+                    "snippet": r["snippet"],
+                }
+                for r in index.search(keyword, limit=20, source="conversation")
+            ]
+            messages = []
+        
         for msg in messages:
             if keyword.lower() in msg.content.lower():
                 results.append({
@@ -296,6 +388,12 @@ class ConversationManager:
                     "role": msg.role
                 })
         
+        if not index.available and len(results) < 5:
+            results += [
+                {"content": m.get("content", "")[:300], "timestamp": m.get("timestamp", ""), "role": m.get("role", "")}
+                for m in self.archive.search(keyword, limit=5 - len(results))
+            ]
+        
         if results:
             return {
                 "found": True,
@@ -1062,6 +1062,7 @@ class ChatWindow:
         self.messages_list.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         self.messages_list.setSpacing(0)
         self.messages_list.setUniformItemSizes(False)
+        self.messages_list.verticalScrollBar().valueChanged.connect(self._on_messages_scrolled)
         
         layout.addWidget(self.messages_list, 1)
 
@@ -1330,6 +1331,7 @@ class ChatWindow:
 
     def _clear_chat(self):
         """Clear chat history"""
+        self._archive_cursor = 0
         self.messages_list.clear()
         self._show_welcome()
 
@@ -1351,6 +1353,7 @@ class ChatWindow:
         if not hasattr(self, 'conv_manager'):
             self._init_conversation_manager()
         
+        self._archive_cursor = 0
         self.conv_manager.clear_messages()
         self.messages_list.clear()
         
@@ -1363,7 +1366,9 @@ class ChatWindow:
 
     def _load_conversation_messages(self):
         """Load messages for current conversation"""
+        self._archive_cursor = 0
         self.messages_list.clear()
+        self._archive_cursor = self.conv_manager.archive.count()
         
         conv = self.conv_manager.get_conversation()
         if conv:
@@ -1372,6 +1377,25 @@ class ChatWindow:
             
             if not conv.messages:
                 self._show_welcome()
+    
+    def _on_messages_scrolled(self, value: int):
+        """滚动到顶部时从归档加载更早的消息"""
+        if value != self.messages_list.verticalScrollBar().minimum():
+            return
+        if not hasattr(self, 'conv_manager') or not getattr(self, '_archive_cursor', 0):
+            return
+        
+        older = self.conv_manager.load_older(self._archive_cursor, limit=30)
+        if not older:
+            self._archive_cursor = 0
+            return
+        self._archive_cursor = max(0, self._archive_cursor - len(older))
+        
+        scroll_bar = self.messages_list.verticalScrollBar()
+        old_maximum = scroll_bar.maximum()
+        for row, msg in enumerate(older):
+            self._append_message_without_save(msg.role, msg.content, row=row)
+        scroll_bar.setValue(scroll_bar.maximum() - old_maximum)
 
     def append_message(self, role: str, content: str, metadata: dict = None):
         """Add message to chat and save to conversation"""
@@ -1387,8 +1411,8 @@ class ChatWindow:
             self._pending_auto_speak = None
             self._start_auto_speak_after_message_added(text_to_speak)
 
-    def _append_message_without_save(self, role: str, content: str, metadata: dict = None):
-        """Add message to chat without saving to conversation"""
+    def _append_message_without_save(self, role: str, content: str, metadata: dict = None, row: int = None):
+        """Add message to chat without saving to conversation (row: insert position for older messages)"""
         from PyQt6.QtWidgets import QListWidgetItem, QHBoxLayout, QVBoxLayout, QLabel
         
         timestamp = datetime.now().strftime("%H:%M")
@@ -1577,6 +1601,11 @@ class ChatWindow:
         
         item.setSizeHint(self.QSize(self.messages_list.width(), total_height + 16))
         
+        if row is not None:
+            self.messages_list.insertItem(row, item)
+            self.messages_list.setItemWidget(item, msg_widget)
+            return
+        
         self.messages_list.addItem(item)
         self.messages_list.setItemWidget(item, msg_widget)
         
@@ -2591,6 +2620,7 @@ class ChatWindow:
         class ResponseThread(QThread):
             response_ready = pyqtSignal(object)
             status_update = pyqtSignal(str)
+            progress_event = pyqtSignal(dict)
             web_server_result = pyqtSignal(dict)
             agent_names_ready = pyqtSignal(list)
             chat_history_updated = pyqtSignal(list)
@@ -2607,7 +2637,12 @@ class ChatWindow:
             def cancel(self):
                 self._cancelled = True
             
+            def _forward_progress(self, event):
+                # 进度事件在事件循环线程中产生，通过信号转到界面线程
+                self.progress_event.emit(event.to_dict())
+            
             def run(self):
+                progress_manager.subscribe(self._forward_progress)
                 try:
                     from ..channels import IncomingMessage, MessageType
                     
@@ -2687,6 +2722,8 @@ class ChatWindow:
                     import traceback
                     traceback.print_exc()
                     self.response_ready.emit(f"错误: {e}")
+                finally:
+                    progress_manager.unsubscribe(self._forward_progress)
         
         def on_response(resp):
             progress_manager.clear_callback()
@@ -2728,6 +2765,13 @@ class ChatWindow:
         
         progress_manager.set_callback(on_progress)
         
+        def on_progress_event(event):
+            # 多步骤工作流：每完成一步就显示该步结果，其余事件更新状态行
+            if event.get("kind") == "step_finished":
+                self.append_message("system", event.get("message", ""))
+            else:
+                on_status_update(event.get("message", ""))
+        
         def on_web_server_result(result):
             if result.get('success'):
                 self._show_web_server_dialog(
@@ -2748,6 +2792,7 @@ class ChatWindow:
         new_thread = ResponseThread(text, self.multi_agent, files_to_send, chat_history)
         new_thread.response_ready.connect(on_response)
         new_thread.status_update.connect(on_status_update)
+        new_thread.progress_event.connect(on_progress_event)
         new_thread.web_server_result.connect(on_web_server_result)
         new_thread.agent_names_ready.connect(on_agent_names)
         new_thread.chat_history_updated.connect(on_chat_history_updated)
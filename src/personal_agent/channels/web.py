@@ -2,6 +2,7 @@
 Web Channel - HTTP/WebSocket interface
 """
 import asyncio
+import contextvars
 import json
 import logging
 from datetime import datetime
@@ -9,9 +10,13 @@ from typing import List, Optional, Set
 import uuid
 
 from .base import BaseChannel, IncomingMessage, OutgoingMessage, MessageHandler, MessageType
+from ..utils.progress import progress_manager, ProgressEvent
 
 logger = logging.getLogger(__name__)
 
+# 正在处理的消息来自哪个 WebSocket 连接，进度事件只推送给该连接
+_current_client: contextvars.ContextVar = contextvars.ContextVar("web_current_client", default=None)
+
 
 class WebChannel(BaseChannel):
     name = "web"
@@ -22,9 +27,11 @@ class WebChannel(BaseChannel):
         self._running = False
         self._message_handlers: List[MessageHandler] = []
         self._connected_clients: Set = set()
+        self._clients_by_id: dict = {}
         self._pending_responses: dict = {}
         self._server = None
         self._runner = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         self._stop_event = asyncio.Event()
 
     async def start(self) -> None:
@@ -46,6 +53,9 @@ class WebChannel(BaseChannel):
             self._server = web.TCPSite(self._runner, self.host, self.port)
             await self._server.start()
 
+            self._loop = asyncio.get_running_loop()
+            progress_manager.subscribe(self._on_progress_event)
+
             logger.info(f"🌐 Web interface started at http://{self.host}:{self.port}")
             logger.info(f"📱 手机访问: http://你的电脑IP:{self.port}")
 
@@ -131,6 +141,10 @@ class WebChannel(BaseChannel):
         ws = aiohttp.web.WebSocketResponse()
         await ws.prepare(request)
         self._connected_clients.add(ws)
+        # 页面通过 /chat 提交消息时带上同一个 client_id，进度据此推送到这个连接
+        client_id = request.query.get("client_id")
+        if client_id:
+            self._clients_by_id[client_id] = ws
 
         async for msg in ws:
             if msg.type == aiohttp.WSMsgType.TEXT:
@@ -145,17 +159,42 @@ class WebChannel(BaseChannel):
                     channel=self.name
                 )
 
-                for handler in self._message_handlers:
-                    response = handler(message)
-                    if response:
-                        await ws.send_json({
-                            "type": "response",
-                            "content": response.content
-                        })
+                token = _current_client.set(ws)
+                try:
+                    for handler in self._message_handlers:
+                        response = handler(message)
+                        if asyncio.iscoroutine(response):
+                            response = await response
+                        if response:
+                            await ws.send_json({
+                                "type": "response",
+                                "content": response.content
+                            })
+                finally:
+                    _current_client.reset(token)
 
         self._connected_clients.discard(ws)
+        if client_id and self._clients_by_id.get(client_id) is ws:
+            del self._clients_by_id[client_id]
         return ws
 
+    def _on_progress_event(self, event: ProgressEvent):
+        """把进度事件推送给提交该任务的 WebSocket 连接（可能在其他线程中调用）"""
+        client = _current_client.get()
+        if client is None or not self._loop or self._loop.is_closed():
+            return
+        payload = {"type": "progress", **event.to_dict()}
+        self._loop.call_soon_threadsafe(asyncio.ensure_future, self._push_progress(client, payload))
+
+    async def _push_progress(self, client, payload: dict):
+        if client not in self._connected_clients:
+            return
+        try:
+            await client.send_json(payload)
+        except Exception as e:
+            logger.debug(f"Progress push error: {e}")
+            self._connected_clients.discard(client)
+
     async def _handle_chat(self, request):
         from aiohttp import web
         data = await request.json()
@@ -171,12 +210,16 @@ class WebChannel(BaseChannel):
         )
 
         response_content = ""
-        for handler in self._message_handlers:
-            result = handler(message)
-            if asyncio.iscoroutine(result):
-                result = await result
-            if result:
-                response_content = result.content
+        token = _current_client.set(self._clients_by_id.get(data.get("client_id")))
+        try:
+            for handler in self._message_handlers:
+                result = handler(message)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                if result:
+                    response_content = result.content
+        finally:
+            _current_client.reset(token)
 
         return web.json_response({"response": response_content})
 
@@ -539,6 +582,9 @@ class WebChannel(BaseChannel):
             if (loading) loading.remove();
         }
 
+        // 进度连接和 /chat 请求使用同一个 clientId，服务端只把本页面提交的任务进度推送过来
+        const clientId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+
         async function sendMessage() {
             const message = input.value.trim();
             if (!message) return;
@@ -554,7 +600,7 @@ class WebChannel(BaseChannel):
                 const response = await fetch('/chat', {
                     method: 'POST',
                     headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({message: message})
+                    body: JSON.stringify({message: message, client_id: clientId})
                 });
                 const data = await response.json();
                 
@@ -572,6 +618,27 @@ class WebChannel(BaseChannel):
 
         send.onclick = sendMessage;
         input.onkeypress = (e) => { if (e.key === 'Enter') sendMessage(); };
+
+        // 多步骤工作流进度：步骤完成时显示结果，其余事件更新“思考中”提示
+        function connectProgress() {
+            const ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host +
+                                     '/ws?client_id=' + encodeURIComponent(clientId));
+            ws.onmessage = (e) => {
+                const data = JSON.parse(e.data);
+                if (data.type !== 'progress') return;
+                const loading = document.getElementById('loading-message');
+                if (data.kind === 'step_finished') {
+                    addMessage('agent', data.message);
+                    if (loading) chat.appendChild(loading);
+                } else if (loading) {
+                    loading.querySelector('.message-content').innerHTML =
+                        '<span class="loading"></span> ' + escapeHtml(data.message);
+                }
+                chat.scrollTop = chat.scrollHeight;
+            };
+            ws.onclose = () => setTimeout(connectProgress, 3000);
+        }
+        connectProgress();
         
         input.focus();
     </script>
@@ -582,6 +649,7 @@ class WebChannel(BaseChannel):
     async def stop(self) -> None:
         self._running = False
         self._stop_event.set()
+        progress_manager.unsubscribe(self._on_progress_event)
         
         for client in self._connected_clients:
             await client.close()
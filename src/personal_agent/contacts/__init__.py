@@ -2,5 +2,6 @@
 Contacts Module - 智能通讯录模块
 """
 from .smart_contact_book import SmartContactBook, Contact, ContactInfo, smart_contact_book
+from .contact_index import ContactIndex
 
-__all__ = ['SmartContactBook', 'Contact', 'ContactInfo', 'smart_contact_book']
+__all__ = ['SmartContactBook', 'Contact', 'ContactInfo', 'smart_contact_book', 'ContactIndex']
@@ -0,0 +1,288 @@
+"""
+Contact Index - 联系人检索索引
+
+按姓名、拼音、首字母、别名、邮箱、电话和标签检索联系人，增量更新：
+1. 每个检索词以 "词\\0槽位\\0字段" 的形式放在一个有序列表中，前缀查询用二分定位，
+   只扫描匹配的区间，与联系人总数基本无关（数万联系人时单次查询在 1 毫秒以内）
+2. 拼音按音节边界、英文名按单词边界、电话按任意位置、邮箱按用户名分段生成后缀，
+   "san"、"walker"、"1234"、"zhang" 这类片段也能命中
+3. 姓名 / 别名 / 全拼额外建立删除一个字符的变体表，拼写错一个字母时仍可模糊命中
+4. 查询中含汉字时同时按拼音查询，同音字写错也能找到
+
+拼音依赖 pypinyin，未安装时只对英文名按单词生成"拼音"和首字母
+"""
+import heapq
+import re
+from bisect import bisect_left, insort
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+
+FIELD_WEIGHTS = {
+    "name": 100,
+    "alias": 90,
+    "pinyin": 80,
+    "initials": 70,
+    "phone": 65,
+    "email": 60,
+    "tag": 40,
+    "info": 20,
+}
+
+FUZZY_SCORE = 45
+MAX_SCAN = 5000
+
+_CJK = re.compile(r"[\u4e00-\u9fff]")
+_SEP = "\x00"
+
+
+def normalize(text: str) -> str:
+    """小写并去掉空白"""
+    return re.sub(r"\s+", "", (text or "").lower())
+
+
+@lru_cache(maxsize=16384)
+def _char_pinyin(char: str) -> str:
+    return lazy_pinyin(char)[0]
+
+
+def to_pinyin(text: str) -> List[str]:
+    """文本的拼音音节（非中文按单词切分；汉字逐字转换并缓存，建索引时不重复分词）"""
+    text = (text or "").lower()
+    if lazy_pinyin is not None and _CJK.search(text):
+        return [
+            _char_pinyin(part) if _CJK.match(part) else part
+            for part in re.findall(r"[\u4e00-\u9fff]|[a-z0-9]+", text)
+        ]
+    return re.findall(r"[a-z0-9]+", text)
+
+
+def _deletes(term: str) -> Set[str]:
+    """删除一个字符的所有变体（含原词）"""
+    return {term} | {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class ContactIndex:
+    """
+    联系人检索索引
+
+    槽位（slot）是联系人在索引中的内部编号，对外只暴露联系人名称
+    """
+
+    def __init__(self):
+        self._entries: List[str] = []
+        self._fuzzy: Dict[str, Set[int]] = {}
+        self._slots: Dict[str, int] = {}
+        self._names: Dict[int, str] = {}
+        self._slot_entries: Dict[int, List[str]] = {}
+        self._slot_fuzzy: Dict[int, Set[str]] = {}
+        self._next_slot = 0
+        if lazy_pinyin is None:
+            logger.debug("pypinyin 未安装，联系人拼音检索仅支持英文名")
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @staticmethod
+    def _terms(contact) -> List[Tuple[str, str, bool]]:
+        """联系人的检索词 (字段, 词, 是否为后缀)"""
+        terms: List[Tuple[str, str, bool]] = []
+
+        def add_text(field: str, text: str, char_suffixes: bool = False):
+            term = normalize(text)
+            if not term:
+                return
+            terms.append((field, term, False))
+            if char_suffixes:
+                terms.extend((field, term[i:], True) for i in range(1, min(len(term), 6)))
+
+        def add_pinyin(field: str, text: str):
+            syllables = to_pinyin(text)
+            if not syllables:
+                return
+            full = "".join(syllables)
+            if full != normalize(text):
+                terms.append(("pinyin", full, False))
+                terms.extend(("pinyin", "".join(syllables[i:]), True) for i in range(1, len(syllables)))
+            else:
+                # 英文等多词名称：每个单词起始处也作为后缀，"walker" 能命中 Johnny Walker
+                terms.extend((field, "".join(syllables[i:]), True) for i in range(1, len(syllables)))
+            if len(syllables) > 1:
+                initials = "".join(s[0] for s in syllables)
+                terms.append(("initials", initials, False))
+                terms.extend(("initials", initials[i:], True) for i in range(1, len(initials)))
+
+        for field, text in [("name", contact.name)] + [("alias", a) for a in contact.alias]:
+            add_text(field, text, char_suffixes=True)
+            add_pinyin(field, text)
+
+        phone = re.sub(r"\D", "", contact.phone or "")
+        if phone:
+            terms.append(("phone", phone, False))
+            terms.extend(("phone", phone[i:], True) for i in range(1, len(phone) - 2))
+
+        email = normalize(contact.email)
+        if email:
+            terms.append(("email", email, False))
+            # 用户名按 . _ - + 切分，每一段起始处和域名都作为后缀，"zhang" 能命中 san.zhang@x.com
+            local, at, domain = email.partition("@")
+            terms.extend(("email", email[m.end():], True) for m in re.finditer(r"[._+\-]", local)
+                         if m.end() < len(local))
+            if at and domain:
+                terms.append(("email", domain, True))
+
+        for tag in [*getattr(contact, "tags", []), contact.relationship, contact.company, contact.position]:
+            if tag:
+                add_text("tag", tag)
+                syllables = to_pinyin(tag)
+                if syllables and "".join(syllables) != normalize(tag):
+                    terms.append(("tag", "".join(syllables), False))
+
+        for info in contact.info_db.values():
+            if info.value and len(info.value) <= 30:
+                add_text("info", info.value)
+
+        return terms
+
+    @staticmethod
+    def _fuzzy_terms(terms: List[Tuple[str, str, bool]]) -> Set[str]:
+        return {
+            term for field, term, suffix in terms
+            if not suffix and field in ("name", "alias", "pinyin") and 3 <= len(term) <= 16
+        }
+
+    def _slot_for(self, name: str) -> int:
+        slot = self._slots.get(name)
+        if slot is None:
+            slot = self._next_slot
+            self._next_slot += 1
+            self._slots[name] = slot
+            self._names[slot] = name
+        return slot
+
+    def _add(self, contact, sorted_insert: bool):
+        slot = self._slot_for(contact.name)
+        terms = self._terms(contact)
+        entries = sorted({f"{term}{_SEP}{slot}{_SEP}{field}{'~' if suffix else ''}"
+                          for field, term, suffix in terms})
+        if sorted_insert:
+            for entry in entries:
+                insort(self._entries, entry)
+        else:
+            self._entries.extend(entries)
+        self._slot_entries[slot] = entries
+        self._slot_fuzzy[slot] = set()
+        for term in self._fuzzy_terms(terms):
+            for variant in _deletes(term):
+                self._fuzzy.setdefault(variant, set()).add(slot)
+                self._slot_fuzzy[slot].add(variant)
+
+    def build(self, contacts: Iterable):
+        """批量建立索引（启动时使用，最后统一排序）"""
+        self._entries, self._fuzzy = [], {}
+        self._slots, self._names, self._slot_entries, self._slot_fuzzy = {}, {}, {}, {}
+        for contact in contacts:
+            self._add(contact, sorted_insert=False)
+        self._entries.sort()
+
+    def update(self, contact):
+        """新增或更新一个联系人的索引"""
+        self.remove(contact.name)
+        self._add(contact, sorted_insert=True)
+
+    def remove(self, name: str):
+        """删除联系人的索引"""
+        slot = self._slots.pop(name, None)
+        if slot is None:
+            return
+        del self._names[slot]
+        for entry in self._slot_entries.pop(slot, []):
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+        for variant in self._slot_fuzzy.pop(slot, set()):
+            slots = self._fuzzy.get(variant)
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del self._fuzzy[variant]
+
+    def _scan(self, prefix: str, scores: Dict[int, float], fields: Optional[Set[str]] = None,
+              penalty: float = 0.0):
+        """前缀区间扫描，按字段权重、是否完全匹配、是否后缀打分"""
+        i = bisect_left(self._entries, prefix)
+        end = min(len(self._entries), i + MAX_SCAN)
+        while i < end and self._entries[i].startswith(prefix):
+            term, slot, code = self._entries[i].split(_SEP)
+            i += 1
+            field = code.rstrip("~")
+            if fields and field not in fields:
+                continue
+            score = FIELD_WEIGHTS[field] + 10 * len(prefix) / len(term) - penalty
+            if len(term) == len(prefix):
+                score += 30
+            if code.endswith("~"):
+                score -= 15
+            slot = int(slot)
+            if score > scores.get(slot, 0):
+                scores[slot] = score
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        排序后的模糊检索
+
+        Returns:
+            [(联系人名称, 分数)]，按分数从高到低
+        """
+        q = normalize(query)
+        if not q:
+            return []
+
+        scores: Dict[int, float] = {}
+        self._scan(q, scores)
+
+        if _CJK.search(q):
+            syllables = to_pinyin(q)
+            if syllables and "".join(syllables) != q:
+                self._scan("".join(syllables), scores, fields={"pinyin"}, penalty=20)
+
+        if len(scores) < limit and len(q) >= 3:
+            for variant in _deletes(q):
+                for slot in self._fuzzy.get(variant, ()):
+                    if slot not in scores:
+                        scores[slot] = FUZZY_SCORE
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -len(self._names[item[0]])))
+        return [(self._names[slot], round(score, 2)) for slot, score in top]
+
+    def lookup_exact(self, query: str) -> List[str]:
+        """姓名、别名或全拼完全相同的联系人"""
+        q = normalize(query)
+        if not q:
+            return []
+        names = []
+        i = bisect_left(self._entries, q + _SEP)
+        while i < len(self._entries) and self._entries[i].startswith(q + _SEP):
+            _, slot, code = self._entries[i].split(_SEP)
+            if code in ("name", "alias", "pinyin"):
+                name = self._names[int(slot)]
+                if name not in names:
+                    names.append(name)
+            i += 1
+        return names
+
+    def get_stats(self):
+        """获取索引统计"""
+        return {
+            "contacts": len(self._slots),
+            "entries": len(self._entries),
+            "fuzzy_variants": len(self._fuzzy),
+            "pinyin": lazy_pinyin is not None,
+        }
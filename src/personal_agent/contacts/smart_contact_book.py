@@ -1,8 +1,12 @@
 """
 Smart Contact Book - 智能通讯录管理模块
 支持每个联系人的独立信息库，自动提取和保存联系人信息
+
+联系人按行保存在 SQLite（contacts.db）中，修改一个联系人只写一行；
+检索走增量更新的 ContactIndex，支持拼音、首字母和模糊匹配
 """
 import json
+import os
 import re
 from pathlib import Path
 from typing import List, Dict, Optional, Any
@@ -10,6 +14,9 @@ from dataclasses import dataclass, field, asdict
 from datetime import datetime
 from loguru import logger
 
+from .contact_index import ContactIndex
+from ..utils.sqlite_pool import get_sqlite_pool
+
 
 @dataclass
 class ContactInfo:
@@ -33,6 +40,7 @@ class Contact:
     position: str = ""
     relationship: str = ""
     notes: str = ""
+    tags: List[str] = field(default_factory=list)
     
     info_db: Dict[str, ContactInfo] = field(default_factory=dict)
     
@@ -69,6 +77,7 @@ class Contact:
             "position": self.position,
             "relationship": self.relationship,
             "notes": self.notes,
+            "tags": self.tags,
             "info_db": {k: asdict(v) for k, v in self.info_db.items()},
             "created_at": self.created_at,
             "updated_at": self.updated_at
@@ -91,6 +100,7 @@ class Contact:
             position=data.get("position", ""),
             relationship=data.get("relationship", ""),
             notes=data.get("notes", ""),
+            tags=data.get("tags", []),
             info_db=info_db,
             created_at=data.get("created_at", ""),
             updated_at=data.get("updated_at", "")
@@ -112,6 +122,8 @@ class Contact:
             lines.append(f"   💼 职位: {self.position}")
         if self.relationship:
             lines.append(f"   👥 关系: {self.relationship}")
+        if self.tags:
+            lines.append(f"   🏷️ 标签: {', '.join(self.tags)}")
         
         if self.info_db:
             lines.append("   📋 详细信息:")
@@ -173,37 +185,78 @@ class SmartContactBook:
         self.data_path.parent.mkdir(parents=True, exist_ok=True)
         self._contacts: Dict[str, Contact] = {}
         self._alias_map: Dict[str, str] = {}
+        self.index = ContactIndex()
+        self._db = get_sqlite_pool(str(self.data_path.with_suffix(".db")))
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS contacts (
+                name TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at TEXT
+            );
+        """)
         self._load()
     
     def _load(self):
-        """加载通讯录"""
-        if self.data_path.exists():
-            try:
-                with open(self.data_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                    if "contacts" in data:
-                        contacts_data = data.get("contacts", {})
-                    else:
-                        contacts_data = data
-                    
-                    for name, contact_data in contacts_data.items():
-                        if isinstance(contact_data, dict):
-                            contact = Contact.from_dict(contact_data)
-                            self._contacts[name] = contact
-                            for alias in contact.alias:
-                                self._alias_map[alias.lower()] = name
-                            self._alias_map[name.lower()] = name
-            except Exception as e:
-                logger.error(f"加载通讯录失败: {e}")
+        """加载通讯录（首次启动时迁移旧的 contacts.json）"""
+        try:
+            rows = self._db.fetchall("SELECT name, data FROM contacts")
+        except Exception as e:
+            logger.error(f"加载通讯录失败: {e}")
+            rows = []
+        
+        if not rows and self.data_path.exists():
+            self._migrate_json()
+        else:
+            for name, data in rows:
+                try:
+                    self._contacts[name] = Contact.from_dict(json.loads(data))
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"⚠️ 跳过损坏的联系人记录 {name}: {e}")
+        
+        for name, contact in self._contacts.items():
+            for alias in contact.alias:
+                self._alias_map[alias.lower()] = name
+            self._alias_map[name.lower()] = name
+        self.index.build(self._contacts.values())
+    
+    def _migrate_json(self):
+        """把旧的 contacts.json 导入数据库"""
+        try:
+            with open(self.data_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            
+            if "contacts" in data:
+                contacts_data = data.get("contacts", {})
+            else:
+                contacts_data = data
+            
+            for name, contact_data in contacts_data.items():
+                if isinstance(contact_data, dict):
+                    self._contacts[name] = Contact.from_dict(contact_data)
+        except Exception as e:
+            logger.error(f"加载通讯录失败: {e}")
+            return
+        
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO contacts (name, data, updated_at) VALUES (?, ?, ?)",
+                [(name, json.dumps(c.to_dict(), ensure_ascii=False), c.updated_at)
+                 for name, c in self._contacts.items()]
+            )
+            os.replace(self.data_path, self.data_path.with_suffix(".json.bak"))
+            logger.info(f"📦 已迁移 {len(self._contacts)} 个联系人到 {self.data_path.with_suffix('.db').name}")
+        except Exception as e:
+            logger.error(f"迁移通讯录失败: {e}")
     
-    def _save(self):
-        """保存通讯录"""
+    def _save(self, contact: Contact):
+        """保存单个联系人并更新检索索引"""
+        self.index.update(contact)
         try:
-            data = {name: contact.to_dict() for name, contact in self._contacts.items()}
-            with open(self.data_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            logger.debug("通讯录已保存")
+            self._db.execute(
+                "INSERT OR REPLACE INTO contacts (name, data, updated_at) VALUES (?, ?, ?)",
+                (contact.name, json.dumps(contact.to_dict(), ensure_ascii=False), contact.updated_at)
+            )
+            logger.debug(f"联系人已保存: {contact.name}")
         except Exception as e:
             logger.error(f"保存通讯录失败: {e}")
     
@@ -235,7 +288,7 @@ class SmartContactBook:
             for a in (alias or []):
                 self._alias_map[a.lower()] = name
         
-        self._save()
+        self._save(contact)
         logger.info(f"✅ 联系人已保存: {name}")
         return contact
     
@@ -247,6 +300,11 @@ class SmartContactBook:
             actual_name = self._alias_map[name_lower]
             return self._contacts.get(actual_name)
         
+        # 拼音完全相同且只有一个联系人时直接命中（如 "zhangsan"）
+        exact = self.index.lookup_exact(name)
+        if len(exact) == 1:
+            return self._contacts.get(exact[0])
+        
         for contact_name, contact in self._contacts.items():
             if name in contact_name or contact_name in name:
                 return contact
@@ -261,7 +319,7 @@ class SmartContactBook:
             contact = self.add_contact(name)
         
         contact.add_info(key, value, source)
-        self._save()
+        self._save(contact)
         
         logger.info(f"📝 已为 {contact.name} 添加信息: {key} = {value}")
         return True
@@ -292,7 +350,7 @@ class SmartContactBook:
             for key, value in extracted.items():
                 contact.add_info(key, value, "对话提取")
             
-            self._save()
+            self._save(contact)
             results["saved"] = True
             logger.info(f"✅ 已为 {contact.name} 提取并保存 {len(extracted)} 条信息")
         
@@ -349,31 +407,39 @@ class SmartContactBook:
         
         return contact.get_display_info()
     
-    def search_contacts(self, keyword: str) -> List[Contact]:
-        """搜索联系人"""
-        keyword = keyword.lower()
-        results = []
+    def search_contacts(self, keyword: str, limit: int = 20) -> List[Contact]:
+        """
+        搜索联系人（按相关度排序）
+        
+        支持姓名、别名、拼音（zhangsan）、首字母（zs）、邮箱、电话片段和标签，
+        拼写错一个字母也能模糊命中；索引没有结果时退回原先的子串匹配
+        （姓名、别名、邮箱、电话和详细信息）
+        """
+        results = [self._contacts[name] for name, _ in self.index.search(keyword, limit)
+                   if name in self._contacts]
+        if results:
+            return results
         
+        keyword = keyword.lower()
+        if not keyword:
+            return results
         for contact in self._contacts.values():
-            if keyword in contact.name.lower():
-                results.append(contact)
-                continue
-            
-            if any(keyword in a.lower() for a in contact.alias):
-                results.append(contact)
-                continue
-            
-            if keyword in contact.email.lower() or keyword in contact.phone.lower():
+            fields = [contact.name, *contact.alias, contact.email or "", contact.phone or ""]
+            if (any(keyword in field.lower() for field in fields)
+                    or any(keyword in info.value.lower() for info in contact.info_db.values())):
                 results.append(contact)
-                continue
-            
-            for info in contact.info_db.values():
-                if keyword in info.value.lower():
-                    results.append(contact)
+                if len(results) >= limit:
                     break
-        
         return results
     
+    def search_contacts_scored(self, keyword: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """搜索联系人并返回分数：[{"contact": Contact, "score": float}]"""
+        return [
+            {"contact": self._contacts[name], "score": score}
+            for name, score in self.index.search(keyword, limit)
+            if name in self._contacts
+        ]
+    
     def list_all_contacts(self) -> List[Contact]:
         """列出所有联系人"""
         return list(self._contacts.values())
@@ -391,7 +457,11 @@ class SmartContactBook:
         for k in keys_to_remove:
             del self._alias_map[k]
         
-        self._save()
+        self.index.remove(actual_name)
+        try:
+            self._db.execute("DELETE FROM contacts WHERE name = ?", (actual_name,))
+        except Exception as e:
+            logger.error(f"保存通讯录失败: {e}")
         logger.info(f"🗑️ 已删除联系人: {actual_name}")
         return True
     
@@ -0,0 +1,225 @@
+"""
+Email IDLE Watcher - IMAP IDLE 推送监听
+
+用一条独立的 IMAP 连接保持 IDLE（RFC 2177），服务器推送 EXISTS / RECENT 时立即通知邮件监控去拉取，
+不再按固定间隔登录和 search UNSEEN：
+1. 在服务器超时（通常 30 分钟）之前发送 DONE 并重新 IDLE
+2. 连接断开或出错时按指数退避重连
+3. 服务器不支持 IDLE 时通知调用方退回轮询
+4. 等待期间阻塞在 select 上，stop() 通过自唤醒套接字立即打断，不做定时轮询
+
+IDLE 连接只用于等待通知，读取邮件仍使用 EmailReceiver 的连接。
+
+环境变量：
+    EMAIL_IDLE                  是否启用 IDLE（默认 true）
+    EMAIL_IDLE_RENEW_SECONDS    重新 IDLE 的间隔秒数（默认 1500，需小于服务器的 29 分钟超时）
+    EMAIL_IDLE_MAX_BACKOFF      重连的最长等待秒数（默认 300）
+"""
+import imaplib
+import os
+import select
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+from loguru import logger
+
+
+class IdleNotSupported(Exception):
+    """服务器不支持 IDLE"""
+
+
+class ImapIdleWatcher:
+    """
+    IMAP IDLE 监听线程
+
+    Args:
+        connection_factory: 返回已登录并选中邮箱的 IMAP4 连接
+        on_new_mail: 收到新邮件通知时调用（在监听线程中调用）
+        on_unsupported: 服务器不支持 IDLE 时调用一次
+    """
+
+    def __init__(
+        self,
+        connection_factory: Callable[[], imaplib.IMAP4],
+        on_new_mail: Callable[[], None],
+        on_unsupported: Optional[Callable[[], None]] = None,
+        renew_seconds: float = None,
+        max_backoff: float = None,
+    ):
+        self.connection_factory = connection_factory
+        self.on_new_mail = on_new_mail
+        self.on_unsupported = on_unsupported
+        self.renew_seconds = renew_seconds or float(os.getenv("EMAIL_IDLE_RENEW_SECONDS", "1500"))
+        self.max_backoff = max_backoff or float(os.getenv("EMAIL_IDLE_MAX_BACKOFF", "300"))
+
+        self.supported: Optional[bool] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._tag_counter = 0
+        self._stats = {"notifications": 0, "renewals": 0, "reconnects": 0, "errors": 0}
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        """启动监听线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._drain_wakeups()
+        self._thread = threading.Thread(target=self._run, name="imap_idle", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """停止监听（立即打断正在进行的 IDLE）"""
+        self._stop.set()
+        try:
+            self._wake_w.send(b"x")
+        except OSError:
+            pass
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---------- 主循环 ----------
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self.connection_factory()
+                self._prepare(conn)
+                backoff = 1.0
+                logger.info("📬 IMAP IDLE 已就绪，等待新邮件推送")
+                # 连接（或重连）期间可能错过通知，先检查一次
+                self._notify()
+                while not self._stop.is_set():
+                    self._idle_once(conn)
+                    self._stats["renewals"] += 1
+            except IdleNotSupported:
+                self.supported = False
+                logger.warning("⚠️ IMAP 服务器不支持 IDLE，退回轮询模式")
+                if self.on_unsupported:
+                    self.on_unsupported()
+                return
+            except (OSError, EOFError, imaplib.IMAP4.error) as e:
+                if self._stop.is_set():
+                    break
+                self._stats["errors"] += 1
+                self._stats["reconnects"] += 1
+                logger.warning(f"⚠️ IMAP IDLE 连接中断，{backoff:g} 秒后重连: {e}")
+                self._wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                if conn is not None:
+                    self._close(conn)
+
+    def _prepare(self, conn: imaplib.IMAP4):
+        """检查 IDLE 能力，并把连接的读缓冲换成无缓冲读取，保证 select 能看到所有未读数据"""
+        if "IDLE" not in conn.capabilities:
+            typ, data = conn.capability()
+            caps = data[0].upper().split() if typ == "OK" and data and data[0] else []
+            if b"IDLE" not in caps:
+                raise IdleNotSupported()
+        self.supported = True
+        conn.file = conn.sock.makefile("rb", buffering=0)
+
+    def _next_tag(self) -> bytes:
+        self._tag_counter += 1
+        return f"IDLE{self._tag_counter}".encode()
+
+    def _idle_once(self, conn: imaplib.IMAP4):
+        """进入 IDLE，直到续期时间到或被停止，然后发送 DONE"""
+        tag = self._next_tag()
+        conn.send(tag + b" IDLE\r\n")
+        while True:
+            line = self._readline(conn)
+            if line.startswith(b"+"):
+                break
+            if line.startswith(tag):
+                raise IdleNotSupported() if b"BAD" in line.upper() else imaplib.IMAP4.error(line.decode(errors="replace"))
+            self._handle_untagged(line)
+
+        deadline = time.monotonic() + self.renew_seconds
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self._wait_readable(conn, remaining):
+                continue
+            self._handle_untagged(self._readline(conn))
+
+        conn.send(b"DONE\r\n")
+        while True:
+            line = self._readline(conn)
+            if line.startswith(tag):
+                if not line[len(tag):].strip().upper().startswith(b"OK"):
+                    raise imaplib.IMAP4.error(line.decode(errors="replace"))
+                return
+            self._handle_untagged(line)
+
+    def _handle_untagged(self, line: bytes):
+        upper = line.upper()
+        if upper.startswith(b"* BYE"):
+            raise EOFError(line.decode(errors="replace").strip())
+        if upper.endswith(b"EXISTS\r\n") or upper.endswith(b"RECENT\r\n"):
+            self._notify()
+
+    def _notify(self):
+        self._stats["notifications"] += 1
+        try:
+            self.on_new_mail()
+        except Exception as e:
+            logger.error(f"❌ 新邮件通知处理失败: {e}")
+
+    # ---------- 套接字工具 ----------
+
+    @staticmethod
+    def _readline(conn: imaplib.IMAP4) -> bytes:
+        line = conn.readline()
+        if not line:
+            raise EOFError("IMAP 连接已关闭")
+        return line
+
+    def _wait_readable(self, conn: imaplib.IMAP4, timeout: float) -> bool:
+        """等待连接可读；被 stop() 唤醒时返回 False"""
+        sock = conn.sock
+        if getattr(sock, "pending", None) and sock.pending():
+            return True
+        readable, _, _ = select.select([sock, self._wake_r], [], [], timeout)
+        return sock in readable and not self._stop.is_set()
+
+    def _wait(self, seconds: float):
+        """退避等待，可被 stop() 打断"""
+        select.select([self._wake_r], [], [], seconds)
+
+    def _drain_wakeups(self):
+        self._wake_r.setblocking(False)
+        try:
+            while self._wake_r.recv(64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        finally:
+            self._wake_r.setblocking(True)
+
+    @staticmethod
+    def _close(conn: imaplib.IMAP4):
+        try:
+            conn.logout()
+        except Exception:
+            try:
+                conn.shutdown()
+            except Exception:
+                pass
+
+    def get_stats(self):
+        """获取 IDLE 统计"""
+        return {"supported": self.supported, "running": self.running, **self._stats}
@@ -1,14 +1,23 @@
 """
 Email Monitor Service - 邮件监控服务
-定期检查新邮件并通知智能体处理
+检查新邮件并通知智能体处理
+
+服务器支持 IMAP IDLE 时由推送触发检查（另有低频兜底检查），否则按 check_interval 轮询
+
+环境变量：
+    EMAIL_IDLE                  是否启用 IDLE（默认 true）
+    EMAIL_IDLE_SAFETY_POLL      IDLE 模式下的兜底检查间隔秒数（默认 600）
 """
 import asyncio
+import os
 from datetime import datetime
 from typing import Optional, Callable, List
 from loguru import logger
 
 from .email_receiver import EmailReceiver, ReceivedEmail, email_receiver
+from .email_idle import ImapIdleWatcher
 from .config import settings
+from .scheduler.job_scheduler import get_job_scheduler
 
 
 class EmailMonitorService:
@@ -23,12 +32,14 @@ class EmailMonitorService:
         self.on_new_email = on_new_email
         self.receiver = email_receiver
         self._running = False
-        self._task: Optional[asyncio.Task] = None
         self._processed_ids: set = set()
         self._processed_count = 0
         self._notification_channel = None
         self._master_agent = None
         self._email_agent = None
+        self.use_idle = os.getenv("EMAIL_IDLE", "true").lower() not in ("0", "false", "no")
+        self.safety_poll = float(os.getenv("EMAIL_IDLE_SAFETY_POLL", "600"))
+        self._idle: Optional[ImapIdleWatcher] = None
     
     def set_agents(self, master_agent, email_agent):
         """设置智能体引用"""
@@ -49,8 +60,24 @@ class EmailMonitorService:
         self._running = True
         
         if self.receiver.connect():
-            logger.info(f"Email monitor started, checking every {self.check_interval}s")
-            self._task = asyncio.create_task(self._monitor_loop())
+            get_job_scheduler().add_job(
+                self._check_emails,
+                job_id="email_monitor",
+                trigger="interval",
+                seconds=self.safety_poll if self.use_idle else self.check_interval,
+                name="邮件检查",
+                misfire="skip",
+            )
+            if self.use_idle:
+                self._idle = ImapIdleWatcher(
+                    self.receiver.open_idle_connection,
+                    on_new_mail=lambda: get_job_scheduler().run_now("email_monitor"),
+                    on_unsupported=self._fallback_to_polling,
+                )
+                self._idle.start()
+                logger.info(f"Email monitor started in IDLE mode (safety check every {self.safety_poll:g}s)")
+            else:
+                logger.info(f"Email monitor started, checking every {self.check_interval}s")
         else:
             logger.error("Failed to start email monitor: cannot connect")
             self._running = False
@@ -58,32 +85,19 @@ class EmailMonitorService:
     async def stop(self):
         """停止监控"""
         self._running = False
-        
-        if self._task:
-            self._task.cancel()
-            try:
-                await self._task
-            except asyncio.CancelledError:
-                pass
-            self._task = None
+        get_job_scheduler().remove_job("email_monitor")
+        if self._idle:
+            await asyncio.to_thread(self._idle.stop)
+            self._idle = None
         
         self.receiver.disconnect()
         logger.info("Email monitor stopped")
     
-    async def _monitor_loop(self):
-        """监控循环"""
-        while self._running:
-            try:
-                await self._check_emails()
-            except Exception as e:
-                logger.error(f"Email check error: {e}")
-            
-            await asyncio.sleep(self.check_interval)
-    
     async def _check_emails(self):
         """检查新邮件"""
         try:
-            emails = self.receiver.fetch_unread(limit=5)
+            # 按 UID 增量同步，只下载邮件头；正文在处理时按需下载
+            emails = self.receiver.sync_new()
             
             # 使用 Message-ID 去重，避免同一封邮件被重复处理
             new_emails = []
@@ -102,7 +116,7 @@ class EmailMonitorService:
                 finally:
                     # 无论处理成功与否，都标记为已读，避免重复处理
                     try:
-                        self.receiver.mark_as_read(email.id)
+                        self.receiver.mark_as_read(email.id, email.folder)
                     except Exception as e:
                         logger.error(f"标记邮件已读失败 [{email.subject}]: {e}")
             
@@ -112,6 +126,11 @@ class EmailMonitorService:
         except Exception as e:
             logger.error(f"Failed to check emails: {e}")
     
+    def _fallback_to_polling(self):
+        """服务器不支持 IDLE 时改为按 check_interval 轮询"""
+        get_job_scheduler().reschedule("email_monitor", seconds=self.check_interval)
+        logger.info(f"Email monitor falling back to polling every {self.check_interval}s")
+
     def _is_own_email(self, email: ReceivedEmail) -> bool:
         """检查是否是自己发送的邮件"""
         own_emails = [
@@ -303,8 +322,11 @@ class EmailMonitorService:
         return {
             "running": self._running,
             "check_interval": self.check_interval,
+            "mode": "idle" if self._idle and self._idle.supported is not False else "poll",
+            "idle": self._idle.get_stats() if self._idle else None,
             "processed_count": len(self._processed_ids),
-            "connected": self.receiver._connection is not None
+            "connected": self.receiver._connection is not None,
+            "sync": self.receiver.get_sync_stats(),
         }
 
 
@@ -3,32 +3,75 @@ Email Receiver - IMAP邮件接收系统
 """
 import imaplib
 import email
+import os
+import time
 from email.header import decode_header
-from email.utils import parseaddr
+from email.utils import parseaddr, parsedate_to_datetime
 import asyncio
-from datetime import datetime
-from typing import Optional, List, Dict, Any, Callable
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Optional, List, Dict, Any, Callable, Tuple
 from dataclasses import dataclass, field
 from loguru import logger
 
 from .config import settings
+from .email_sync import (
+    EmailAttachment, MailSyncState, MessagePart, fetch_items, parse_bodystructure,
+)
+
+HEADER_FIELDS = "FROM TO SUBJECT DATE MESSAGE-ID"
+IMAP_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+HEADER_FETCH = f"(UID FLAGS RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])"
 
 
 @dataclass
 class ReceivedEmail:
-    """接收到的邮件"""
-    id: str
+    """
+    接收到的邮件
+
+    同步时只下载邮件头和结构，body / html_body 在第一次访问时下载，
+    附件的 data 在第一次读取时下载
+    """
+    id: str  # 邮件 UID
     subject: str
     sender: str
     sender_email: str
     to: str
     date: datetime
-    body: str
-    html_body: str = ""
     attachments: List[Dict] = field(default_factory=list)
     is_read: bool = False
     message_id: str = ""  # 邮件唯一标识
-    
+    folder: str = "INBOX"
+    size: int = 0
+    parts: List[MessagePart] = field(default_factory=list, repr=False)
+    body_loader: Optional[Callable[["ReceivedEmail"], None]] = field(default=None, repr=False, compare=False)
+    _body: Optional[str] = field(default=None, init=False, repr=False)
+    _html_body: Optional[str] = field(default=None, init=False, repr=False)
+
+    @property
+    def body(self) -> str:
+        self._ensure_body()
+        return self._body
+
+    @property
+    def html_body(self) -> str:
+        self._ensure_body()
+        return self._html_body
+
+    @property
+    def body_loaded(self) -> bool:
+        return self._body is not None
+
+    def set_body(self, body: str, html_body: str = ""):
+        self._body, self._html_body = body or "", html_body or ""
+
+    def _ensure_body(self):
+        if self._body is None:
+            if self.body_loader:
+                self.body_loader(self)
+            if self._body is None:
+                self.set_body("", "")
+
     def to_dict(self) -> Dict:
         return {
             "id": self.id,
@@ -50,9 +93,24 @@ class EmailReceiver:
         self.imap_port = settings.agent.email_imap_port or 993
         self.email = settings.agent.email
         self.password = settings.agent.email_password
+        ssl_env = os.getenv("EMAIL_IMAP_SSL", "").lower()
+        self.use_ssl = ssl_env not in ("0", "false", "no") if ssl_env else self.imap_port != 143
         self._connection = None
-        self._last_uid = None
+        self._bytes_in = 0
+        self._selected: Optional[str] = None
+        self._uidvalidity: Dict[str, int] = {}
         self._callbacks: List[Callable] = []
+        self.batch_size = int(os.getenv("EMAIL_FETCH_BATCH", "50"))
+        self.sync_state = MailSyncState()
+        self.index_enabled = os.getenv("EMAIL_INDEX", "true").lower() not in ("0", "false", "no")
+        self.index_bodies = os.getenv("EMAIL_INDEX_BODIES", "true").lower() not in ("0", "false", "no")
+        self.index_body_max = int(os.getenv("EMAIL_INDEX_BODY_MAX_KB", "256")) * 1024
+        self.backfill_days = int(os.getenv("EMAIL_INDEX_BACKFILL_DAYS", "30"))
+        self.backfill_max = int(os.getenv("EMAIL_INDEX_BACKFILL_MAX", "500"))
+        self._sync_stats = {
+            "syncs": 0, "messages": 0, "bytes": 0, "body_fetches": 0, "body_bytes": 0,
+            "last_sync_seconds": None, "last_sync_bytes": 0, "last_sync_messages": 0,
+        }
     
     def _decode_header_value(self, value: str) -> str:
         """解码邮件头"""
@@ -71,6 +129,10 @@ class EmailReceiver:
                 result.append(str(part))
         return ''.join(result)
     
+    def _header_text(self, value) -> str:
+        """未编码的 8 位邮件头会被解析为 Header 对象，按 UTF-8 还原成字符串"""
+        return value if isinstance(value, str) else self._decode_header_value(value)
+
     def _get_email_body(self, msg) -> tuple:
         """提取邮件正文"""
         body = ""
@@ -240,21 +302,15 @@ class EmailReceiver:
                 logger.error("   3. 尝试使用SSL端口993")
                 return False
             
-            import ssl
-            context = ssl.create_default_context()
-            
-            logger.info(f"🔐 正在建立SSL连接...")
-            self._connection = imaplib.IMAP4_SSL(
-                self.imap_server,
-                self.imap_port,
-                ssl_context=context
-            )
+            logger.info(f"🔐 正在建立{'SSL' if self.use_ssl else ''}连接...")
+            self._connection = self.open_connection()
             
             logger.info(f"🔑 正在登录...")
             self._connection.login(self.email, self.password)
             
             logger.info(f"📂 正在选择收件箱...")
-            self._connection.select('INBOX')
+            self._selected = None
+            self._select('INBOX')
             
             logger.success(f"✅ 成功连接到IMAP服务器: {self.imap_server}")
             logger.info("=" * 60)
@@ -280,6 +336,35 @@ class EmailReceiver:
             logger.info("=" * 60)
             return False
     
+    def open_connection(self) -> imaplib.IMAP4:
+        """
+        建立新的 IMAP 连接（未登录）
+
+        EMAIL_IMAP_SSL=false 或端口为 143 时使用明文连接，便于对接本地测试服务器
+        """
+        if self.use_ssl:
+            import ssl
+            return imaplib.IMAP4_SSL(
+                self.imap_server,
+                self.imap_port,
+                ssl_context=ssl.create_default_context()
+            )
+        return imaplib.IMAP4(self.imap_server, self.imap_port)
+
+    def open_idle_connection(self) -> imaplib.IMAP4:
+        """为 IDLE 监听建立独立的已登录连接（选中收件箱）"""
+        conn = self.open_connection()
+        try:
+            conn.login(self.email, self.password)
+            conn.select('INBOX')
+        except Exception:
+            try:
+                conn.shutdown()
+            except Exception:
+                pass
+            raise
+        return conn
+
     def disconnect(self):
         """断开连接"""
         if self._connection:
@@ -289,6 +374,7 @@ class EmailReceiver:
             except:
                 pass
             self._connection = None
+            self._selected = None
             logger.info("Disconnected from IMAP server")
     
     def _ensure_connection(self) -> bool:
@@ -303,87 +389,338 @@ class EmailReceiver:
             self.disconnect()
             return self.connect()
     
-    def mark_as_read(self, email_id: str) -> bool:
+    def _select(self, folder: str):
+        """选中文件夹并记录 UIDVALIDITY（已选中时不重复发送 SELECT）"""
+        if self._selected == folder:
+            return
+        status, _ = self._connection.select(folder)
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"无法选择文件夹: {folder}")
+        _, data = self._connection.response('UIDVALIDITY')
+        if data and data[0]:
+            self._uidvalidity[folder] = int(data[0])
+        self._selected = folder
+
+    def _uid_search(self, *criteria: str) -> List[int]:
+        """UID SEARCH，返回升序的 UID 列表"""
+        status, data = self._connection.uid('SEARCH', *criteria)
+        if status != 'OK' or not data or not data[0]:
+            return []
+        self._bytes_in += len(data[0])
+        return sorted(int(uid) for uid in data[0].split())
+
+    def mark_as_read(self, email_id: str, folder: str = 'INBOX') -> bool:
         """标记邮件为已读"""
         if not self._ensure_connection():
             return False
         
         try:
             # 添加 \Seen 标志标记为已读
-            self._connection.store(email_id.encode(), '+FLAGS', '\\Seen')
+            self._select(folder)
+            self._connection.uid('STORE', email_id, '+FLAGS', '(\\Seen)')
+            store = self._mail_store()
+            if store:
+                store.set_read(self.email, folder, int(email_id))
             logger.info(f"Marked email {email_id} as read")
             return True
         except Exception as e:
             logger.error(f"Failed to mark email {email_id} as read: {e}")
             return False
-    
+
+    def _build_email(self, email_id: str, msg, **kwargs) -> ReceivedEmail:
+        """根据邮件头构造 ReceivedEmail"""
+        subject = self._decode_header_value(msg.get('Subject', ''))
+        sender_full = self._header_text(msg.get('From', ''))
+        sender_name, sender_email = parseaddr(sender_full)
+        sender_name = self._decode_header_value(sender_name)
+        
+        date_str = self._header_text(msg.get('Date', ''))
+        try:
+            date = parsedate_to_datetime(date_str)
+        except:
+            date = datetime.now()
+        
+        # 获取邮件唯一标识
+        message_id = self._header_text(msg.get('Message-ID', '') or msg.get('Message-Id', ''))
+        if not message_id:
+            # 如果没有 Message-ID，使用其他字段组合生成唯一标识
+            message_id = f"{sender_email}_{date_str}_{subject}"[:100]
+        
+        return ReceivedEmail(
+            id=email_id,
+            subject=subject,
+            sender=sender_name or sender_email,
+            sender_email=sender_email,
+            to=self._header_text(msg.get('To', '')),
+            date=date,
+            message_id=message_id,
+            **kwargs
+        )
+
+    def _fetch_headers(self, uids: List[int], folder: str) -> List[ReceivedEmail]:
+        """按批 UID FETCH 邮件头、标志、大小和结构（不下载正文和附件）"""
+        emails = []
+        for i in range(0, len(uids), self.batch_size):
+            batch = uids[i:i + self.batch_size]
+            status, data = self._connection.uid('FETCH', ",".join(map(str, batch)), HEADER_FETCH)
+            if status != 'OK':
+                logger.warning(f"Failed to fetch headers for {len(batch)} emails: {data}")
+                continue
+            items, size = fetch_items(data)
+            self._bytes_in += size
+            for uid in batch:
+                attrs = items.get(uid)
+                if attrs is None:
+                    continue
+                try:
+                    emails.append(self._email_from_fetch(uid, attrs, folder))
+                except Exception as e:
+                    logger.error(f"Failed to parse email {uid}: {e}")
+        return emails
+
+    def _email_from_fetch(self, uid: int, attrs: Dict[bytes, Any], folder: str) -> ReceivedEmail:
+        header = next((v for k, v in attrs.items() if k.startswith(b"BODY[HEADER")), None) or b""
+        flags = attrs.get(b"FLAGS") or []
+        received = self._build_email(
+            str(uid),
+            email.message_from_bytes(header),
+            folder=folder,
+            size=int(attrs.get(b"RFC822.SIZE") or 0),
+            is_read=any(isinstance(f, bytes) and f.lower() == b"\\seen" for f in flags),
+        )
+        parts = parse_bodystructure(attrs.get(b"BODYSTRUCTURE"))
+        if not parts:
+            # 服务器没有返回可用的结构时退回整封下载
+            self._load_full(received)
+            return received
+        received.parts = parts
+        received.body_loader = self._load_body
+        received.attachments = [
+            EmailAttachment(part.filename, part.content_type, part.decoded_size,
+                            fetch=partial(self._fetch_attachment, received, part))
+            for part in parts if part.is_attachment
+        ]
+        return received
+
+    def _fetch_sections(self, mail: ReceivedEmail, parts: List[MessagePart]) -> Dict[str, bytes]:
+        """下载邮件的指定段（BODY.PEEK，不改变已读状态）"""
+        if not self._ensure_connection():
+            raise ConnectionError("IMAP 未连接")
+        self._select(mail.folder)
+        items = " ".join(f"BODY.PEEK[{part.section}]" for part in parts)
+        status, data = self._connection.uid('FETCH', mail.id, f"({items})")
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"下载邮件 {mail.id} 失败: {data}")
+        fetched, size = fetch_items(data)
+        self._sync_stats["body_fetches"] += 1
+        self._sync_stats["body_bytes"] += size
+        self._sync_stats["bytes"] += size
+        attrs = fetched.get(int(mail.id), {})
+        return {part.section: attrs.get(f"BODY[{part.section}]".encode()) or b"" for part in parts}
+
+    def _load_body(self, mail: ReceivedEmail):
+        """按需下载正文（只下载第一个 text/plain 和 text/html 段）"""
+        text, html = self._body_parts(mail)
+        wanted = [p for p in (text, html) if p]
+        if not wanted:
+            mail.set_body("", "")
+            return
+        try:
+            data = self._fetch_sections(mail, wanted)
+        except Exception as e:
+            logger.error(f"Failed to fetch body of email {mail.id}: {e}")
+            return
+        mail.set_body(
+            text.decode_text(data[text.section]) if text else "",
+            html.decode_text(data[html.section]) if html else "",
+        )
+        store = self._mail_store()
+        if store:
+            store.update_body(self.email, mail.folder, int(mail.id), mail.body)
+
+    @staticmethod
+    def _body_parts(mail: ReceivedEmail) -> Tuple[Optional[MessagePart], Optional[MessagePart]]:
+        """第一个 text/plain 和 text/html 段"""
+        text = next((p for p in mail.parts if p.content_type == "text/plain" and not p.is_attachment), None)
+        html = next((p for p in mail.parts if p.content_type == "text/html" and not p.is_attachment), None)
+        return text, html
+
+    def _prefetch_bodies(self, emails: List[ReceivedEmail]):
+        """
+        同步时批量预取正文用于建索引
+
+        正文段号相同的邮件合并为一次 UID FETCH；超过 EMAIL_INDEX_BODY_MAX_KB 的正文仍按需下载
+        """
+        groups: Dict[Tuple[str, ...], List[ReceivedEmail]] = {}
+        for mail in emails:
+            if mail.body_loaded or not mail.parts:
+                continue
+            wanted = [p for p in self._body_parts(mail) if p]
+            if not wanted or sum(p.size for p in wanted) > self.index_body_max:
+                continue
+            groups.setdefault(tuple(p.section for p in wanted), []).append(mail)
+
+        for sections, group in groups.items():
+            items = " ".join(f"BODY.PEEK[{section}]" for section in sections)
+            for i in range(0, len(group), self.batch_size):
+                batch = {int(mail.id): mail for mail in group[i:i + self.batch_size]}
+                status, data = self._connection.uid('FETCH', ",".join(map(str, batch)), f"({items})")
+                if status != 'OK':
+                    continue
+                fetched, size = fetch_items(data)
+                self._bytes_in += size
+                for uid, attrs in fetched.items():
+                    mail = batch.get(uid)
+                    if mail is None:
+                        continue
+                    text, html = self._body_parts(mail)
+                    mail.set_body(
+                        text.decode_text(attrs.get(f"BODY[{text.section}]".encode()) or b"") if text else "",
+                        html.decode_text(attrs.get(f"BODY[{html.section}]".encode()) or b"") if html else "",
+                    )
+
+    def _mail_store(self):
+        """本地邮件索引；未启用或不可用时返回 None（不可用时关闭索引，不影响收信）"""
+        if not self.index_enabled:
+            return None
+        try:
+            from .email_store import get_mail_store
+            store = get_mail_store()
+        except Exception as e:
+            logger.warning(f"⚠️ 本地邮件索引不可用: {e}")
+            self.index_enabled = False
+            return None
+        return store if store.available else None
+
+    def _index(self, emails: List[ReceivedEmail], folder: str):
+        """把同步到的邮件写入本地索引（先预取正文）"""
+        store = self._mail_store() if emails else None
+        if not store:
+            return
+        try:
+            if self.index_bodies:
+                self._prefetch_bodies(emails)
+            store.add_many(self.email, emails, self._uidvalidity.get(folder))
+        except Exception as e:
+            logger.warning(f"⚠️ 写入邮件索引失败: {e}")
+
+    def _backfill_index(self, folder: str, top: int, skip: List[int]):
+        """首次同步时把最近 EMAIL_INDEX_BACKFILL_DAYS 天的邮件（最多 EMAIL_INDEX_BACKFILL_MAX 封）写入索引"""
+        store = self._mail_store()
+        if not store or self.backfill_max <= 0 or not top:
+            return
+        day = datetime.now() - timedelta(days=self.backfill_days)
+        since = f"{day.day}-{IMAP_MONTHS[day.month - 1]}-{day.year}"  # 不受系统区域设置影响
+        try:
+            uids = self._uid_search('UID', f'1:{top}', 'SINCE', since)[-self.backfill_max:]
+            skipped = set(skip) | store.known_uids(self.email, folder, uids)
+            uids = [uid for uid in uids if uid not in skipped]
+            if uids:
+                self._index(self._fetch_headers(uids, folder), folder)
+                logger.info(f"🗂️ 已为 {folder} 建立 {len(uids)} 封近期邮件的本地索引")
+        except Exception as e:
+            logger.warning(f"⚠️ 建立近期邮件索引失败: {e}")
+
+    def _fetch_attachment(self, mail: ReceivedEmail, part: MessagePart) -> bytes:
+        data = part.decode(self._fetch_sections(mail, [part])[part.section])
+        logger.info(f"Fetched attachment: {part.filename} ({part.content_type}, {len(data)} bytes)")
+        return data
+
+    def _load_full(self, mail: ReceivedEmail):
+        """整封下载并解析正文和附件"""
+        try:
+            raw = self._fetch_sections(mail, [MessagePart(section="", content_type="message/rfc822")])[""]
+        except Exception as e:
+            logger.error(f"Failed to fetch email {mail.id}: {e}")
+            return
+        msg = email.message_from_bytes(raw)
+        mail.set_body(*self._get_email_body(msg))
+        mail.attachments = [
+            EmailAttachment(att["filename"], att["content_type"], att["size"], data=att["data"])
+            for att in self._extract_attachments(msg)
+        ]
+
+    def sync_new(self, folder: str = 'INBOX', unseen_only: bool = True,
+                 limit: Optional[int] = None) -> List[ReceivedEmail]:
+        """
+        增量同步文件夹中的新邮件（只下载邮件头，正文和附件按需下载）
+
+        按持久化的 UIDVALIDITY 和最后 UID 只查询新邮件；首次同步或 UIDVALIDITY 变化时
+        以当前最大 UID 为基线，只取最近 limit（默认 EMAIL_FETCH_BATCH）封未读邮件
+
+        Args:
+            folder: 文件夹
+            unseen_only: 只返回未读邮件（已读的新邮件同样推进同步进度）
+            limit: 单次最多同步的邮件数，剩余的留到下次
+        """
+        if not self._ensure_connection():
+            return []
+
+        started, self._bytes_in = time.monotonic(), 0
+        emails: List[ReceivedEmail] = []
+        try:
+            self._select(folder)
+            uidvalidity = self._uidvalidity.get(folder)
+            saved_validity, last_uid = self.sync_state.get(self.email, folder)
+
+            if saved_validity is None or saved_validity != uidvalidity:
+                if saved_validity is not None:
+                    logger.warning(f"⚠️ {folder} 的 UIDVALIDITY 已变化，重新建立同步基线")
+                    store = self._mail_store()
+                    if store:
+                        store.drop_folder(self.email, folder, keep_uidvalidity=uidvalidity)
+                top = max(self._uid_search('UID', '*'), default=0)
+                unseen = self._uid_search('UID', f'1:{top}', 'UNSEEN') if top else []
+                uids = unseen[-(limit or self.batch_size):]
+                if len(unseen) > len(uids):
+                    logger.info(f"📥 {folder} 首次同步，跳过 {len(unseen) - len(uids)} 封较早的未读邮件")
+                new_last = top
+            else:
+                uids = [uid for uid in self._uid_search('UID', f'{last_uid + 1}:*') if uid > last_uid]
+                if limit:
+                    uids = uids[:limit]
+                new_last = max(uids, default=last_uid)
+
+            if uids:
+                emails = self._fetch_headers(uids, folder)
+                self._index(emails, folder)
+            if saved_validity != uidvalidity:
+                self._backfill_index(folder, new_last, uids)
+            if new_last != last_uid or saved_validity != uidvalidity:
+                self.sync_state.update(self.email, folder, uidvalidity, new_last)
+        except Exception as e:
+            logger.error(f"Failed to sync {folder}: {e}")
+            self.disconnect()
+        finally:
+            elapsed = time.monotonic() - started
+            self._sync_stats["syncs"] += 1
+            self._sync_stats["messages"] += len(emails)
+            self._sync_stats["bytes"] += self._bytes_in
+            self._sync_stats.update(
+                last_sync_seconds=round(elapsed, 3),
+                last_sync_bytes=self._bytes_in,
+                last_sync_messages=len(emails),
+            )
+            if emails:
+                logger.info(f"📥 同步 {folder}: {len(emails)} 封新邮件，耗时 {elapsed:.2f}s，"
+                            f"传输 {self._bytes_in / 1024:.1f} KB")
+
+        if unseen_only:
+            emails = [e for e in emails if not e.is_read]
+        return emails
+
     def fetch_unread(self, limit: int = 10) -> List[ReceivedEmail]:
-        """获取未读邮件"""
+        """获取未读邮件（不使用同步进度）"""
         if not self._ensure_connection():
             return []
         
         emails = []
+        self._bytes_in = 0
         
         try:
-            # 只获取未读邮件
-            status, messages = self._connection.search(None, 'UNSEEN')
-            
-            if status != 'OK':
-                return []
-            
-            email_ids = messages[0].split()
-            
-            for email_id in email_ids[-limit:]:
-                try:
-                    status, msg_data = self._connection.fetch(email_id, '(RFC822)')
-                    
-                    if status != 'OK':
-                        continue
-                    
-                    raw_email = msg_data[0][1]
-                    msg = email.message_from_bytes(raw_email)
-                    
-                    subject = self._decode_header_value(msg.get('Subject', ''))
-                    sender_full = msg.get('From', '')
-                    sender_name, sender_email = parseaddr(sender_full)
-                    sender_name = self._decode_header_value(sender_name)
-                    
-                    date_str = msg.get('Date', '')
-                    try:
-                        from email.utils import parsedate_to_datetime
-                        date = parsedate_to_datetime(date_str)
-                    except:
-                        date = datetime.now()
-                    
-                    body, html_body = self._get_email_body(msg)
-                    
-                    # 提取附件
-                    attachments = self._extract_attachments(msg)
-                    
-                    # 获取邮件唯一标识
-                    message_id = msg.get('Message-ID', '') or msg.get('Message-Id', '')
-                    if not message_id:
-                        # 如果没有 Message-ID，使用其他字段组合生成唯一标识
-                        message_id = f"{sender_email}_{date_str}_{subject}"[:100]
-                    
-                    received = ReceivedEmail(
-                        id=email_id.decode(),
-                        subject=subject,
-                        sender=sender_name or sender_email,
-                        sender_email=sender_email,
-                        to=msg.get('To', ''),
-                        date=date,
-                        body=body,
-                        html_body=html_body,
-                        message_id=message_id,
-                        attachments=attachments
-                    )
-                    
-                    emails.append(received)
-                    
-                except Exception as e:
-                    logger.error(f"Failed to fetch email {email_id}: {e}")
-                    continue
+            self._select('INBOX')
+            uids = self._uid_search('UNSEEN')
+            emails = self._fetch_headers(uids[-limit:], 'INBOX')
             
             if emails:  # 只在有新邮件时打印
                 logger.info(f"Fetched {len(emails)} unread emails")
@@ -400,55 +737,12 @@ class EmailReceiver:
             return []
         
         emails = []
+        self._bytes_in = 0
         
         try:
-            status, messages = self._connection.search(None, 'ALL')
-            
-            if status != 'OK':
-                return []
-            
-            email_ids = messages[0].split()
-            
-            for email_id in reversed(email_ids[-limit:]):
-                try:
-                    status, msg_data = self._connection.fetch(email_id, '(RFC822)')
-                    
-                    if status != 'OK':
-                        continue
-                    
-                    raw_email = msg_data[0][1]
-                    msg = email.message_from_bytes(raw_email)
-                    
-                    subject = self._decode_header_value(msg.get('Subject', ''))
-                    sender_full = msg.get('From', '')
-                    sender_name, sender_email = parseaddr(sender_full)
-                    sender_name = self._decode_header_value(sender_name)
-                    
-                    date_str = msg.get('Date', '')
-                    try:
-                        from email.utils import parsedate_to_datetime
-                        date = parsedate_to_datetime(date_str)
-                    except:
-                        date = datetime.now()
-                    
-                    body, html_body = self._get_email_body(msg)
-                    
-                    received = ReceivedEmail(
-                        id=email_id.decode(),
-                        subject=subject,
-                        sender=sender_name or sender_email,
-                        sender_email=sender_email,
-                        to=msg.get('To', ''),
-                        date=date,
-                        body=body,
-                        html_body=html_body
-                    )
-                    
-                    emails.append(received)
-                    
-                except Exception as e:
-                    logger.error(f"Failed to fetch email {email_id}: {e}")
-                    continue
+            self._select('INBOX')
+            uids = self._uid_search('ALL')
+            emails = list(reversed(self._fetch_headers(uids[-limit:], 'INBOX')))
             
         except Exception as e:
             logger.error(f"Failed to search emails: {e}")
@@ -456,13 +750,21 @@ class EmailReceiver:
         
         return emails
     
+    def get_sync_stats(self) -> Dict[str, Any]:
+        """获取同步统计（耗时、传输字节数、按需下载次数、本地索引）"""
+        stats = {"batch_size": self.batch_size, **self._sync_stats}
+        store = self._mail_store()
+        if store:
+            stats["index"] = store.get_stats()
+        return stats
+
     def add_callback(self, callback: Callable):
         """添加新邮件回调"""
         self._callbacks.append(callback)
     
     async def check_new_emails(self) -> List[ReceivedEmail]:
         """检查新邮件"""
-        emails = self.fetch_unread()
+        emails = self.sync_new()
         
         for email in emails:
             for callback in self._callbacks:
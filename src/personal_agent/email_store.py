@@ -0,0 +1,427 @@
+"""
+Mail Store - 本地邮件索引
+
+同步邮件时把邮件头、纯文本正文和附件名写入本地 SQLite（FTS5 全文索引），
+"找张三关于报销的邮件"、"总结今天的邮件" 这类请求直接查本地索引，不再连接 IMAP 服务器：
+1. 按 账号 / 文件夹 / UID 增量写入，正文在同步时预取或按需下载后补写
+2. 分词与消息全文索引一致（中日韩单字 + 二元组，英文按单词），查询先要求全部命中，没有结果时放宽为任意命中
+3. 支持按账号、发件人、时间范围、未读、是否有附件过滤，以及计数和摘要
+4. 多个账号共用一个索引，查询时不指定账号即跨账号检索
+
+环境变量：
+    EMAIL_INDEX_BODY_CHARS   每封邮件索引的正文最大字符数（默认 20000）
+"""
+import os
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from .memory.search_index import highlight, query_terms, tokenize
+from .utils.sqlite_pool import get_sqlite_pool
+
+
+PERIODS = {
+    "today": ("今天", "今日", "today"),
+    "yesterday": ("昨天", "昨日", "yesterday"),
+    "week": ("本周", "这周", "一周", "7天", "week"),
+    "month": ("本月", "这个月", "30天", "month"),
+}
+
+
+def parse_period(period: Any = None, now: Optional[datetime] = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    把时间范围描述转换为 (开始, 结束)
+
+    支持 today / yesterday / week / month 及对应中文，或最近的天数；无法识别时不限时间
+    """
+    now = now or datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period is None or period == "":
+        return None, None
+    if isinstance(period, (int, float)) or str(period).strip().isdigit():
+        return now - timedelta(days=float(period)), None
+
+    text = str(period).strip().lower()
+    for name, words in PERIODS.items():
+        if any(word in text for word in words):
+            if name == "today":
+                return today, None
+            if name == "yesterday":
+                return today - timedelta(days=1), today
+            if name == "week":
+                return today - timedelta(days=today.weekday()) if "本周" in text or "这周" in text \
+                    else now - timedelta(days=7), None
+            return (today.replace(day=1) if "本月" in text or "这个月" in text
+                    else now - timedelta(days=30)), None
+    return None, None
+
+
+def _local_iso(date: Optional[datetime]) -> str:
+    """统一为本地时间、不带时区的 ISO 字符串，便于按日期比较"""
+    if date is None:
+        return datetime.now().isoformat(timespec="seconds")
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)
+    return date.isoformat(timespec="seconds")
+
+
+class MailStore:
+    """
+    本地邮件索引
+
+    功能：
+    1. add_many() 在同步时批量写入邮件头、附件名和已下载的正文
+    2. update_body() / set_read() 补写正文和已读状态
+    3. search() / count() / digest() 离线检索、计数和生成摘要
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, db_path: str = None):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+
+        if db_path is None:
+            db_path = str(Path.home() / ".personal_agent" / "email" / "mail_index.db")
+
+        self.db_path = db_path
+        self.max_body_chars = int(os.getenv("EMAIL_INDEX_BODY_CHARS", "20000"))
+        self._db = get_sqlite_pool(db_path)
+        self._lock = threading.Lock()
+        self.available = True
+
+        try:
+            self._init_db()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 邮件索引不可用（SQLite 可能不支持 FTS5）: {e}")
+            self.available = False
+
+        self._initialized = True
+
+    def _init_db(self):
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS mails (
+                id INTEGER PRIMARY KEY,
+                account TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                uid INTEGER NOT NULL,
+                uidvalidity INTEGER,
+                message_id TEXT,
+                subject TEXT,
+                sender TEXT,
+                sender_email TEXT,
+                recipients TEXT,
+                date TEXT NOT NULL,
+                size INTEGER DEFAULT 0,
+                is_read INTEGER DEFAULT 0,
+                attachments TEXT DEFAULT '',
+                body TEXT,
+                UNIQUE(account, folder, uid)
+            );
+            CREATE INDEX IF NOT EXISTS idx_mails_date ON mails(date);
+            CREATE INDEX IF NOT EXISTS idx_mails_sender ON mails(sender_email);
+            CREATE VIRTUAL TABLE IF NOT EXISTS mails_fts USING fts5(tokens, tokenize='unicode61');
+        """)
+
+    @staticmethod
+    def _tokens(subject: str, sender: str, sender_email: str, attachments: str, body: Optional[str]) -> str:
+        return tokenize(" ".join(filter(None, [subject, sender, sender_email, attachments, body])))
+
+    # ---------- 写入 ----------
+
+    def add_many(self, account: str, emails: Iterable[Any], uidvalidity: Optional[int] = None) -> int:
+        """
+        批量写入同步到的邮件（ReceivedEmail），已存在的邮件只补写正文
+
+        只读取已下载的正文，不会为了建索引触发按需下载
+
+        Returns:
+            新写入的邮件数
+        """
+        if not self.available:
+            return 0
+        added = 0
+        try:
+            with self._lock, self._db.transaction() as conn:
+                for mail in emails:
+                    body = mail.body[:self.max_body_chars] if mail.body_loaded else None
+                    attachments = "\n".join(att.get("filename", "") for att in mail.attachments)
+                    cursor = conn.execute(
+                        """INSERT OR IGNORE INTO mails
+                           (account, folder, uid, uidvalidity, message_id, subject, sender, sender_email,
+                            recipients, date, size, is_read, attachments, body)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                        (account, mail.folder, int(mail.id), uidvalidity, mail.message_id, mail.subject,
+                         mail.sender, mail.sender_email, mail.to, _local_iso(mail.date), mail.size,
+                         int(mail.is_read), attachments, body)
+                    )
+                    if cursor.rowcount:
+                        conn.execute(
+                            "INSERT INTO mails_fts (rowid, tokens) VALUES (?, ?)",
+                            (cursor.lastrowid, self._tokens(mail.subject, mail.sender, mail.sender_email,
+                                                            attachments, body))
+                        )
+                        added += 1
+                    elif body is not None:
+                        self._write_body(conn, account, mail.folder, int(mail.id), body)
+        except sqlite3.Error as e:
+            logger.error(f"❌ 写入邮件索引失败: {e}")
+        return added
+
+    def _write_body(self, conn, account: str, folder: str, uid: int, body: str):
+        row = conn.execute(
+            "SELECT id, subject, sender, sender_email, attachments, body FROM mails "
+            "WHERE account = ? AND folder = ? AND uid = ?",
+            (account, folder, uid)
+        ).fetchone()
+        if row is None or row[5] is not None:
+            return
+        conn.execute("UPDATE mails SET body = ? WHERE id = ?", (body, row[0]))
+        conn.execute("DELETE FROM mails_fts WHERE rowid = ?", (row[0],))
+        conn.execute("INSERT INTO mails_fts (rowid, tokens) VALUES (?, ?)",
+                     (row[0], self._tokens(row[1], row[2], row[3], row[4], body)))
+
+    def update_body(self, account: str, folder: str, uid: int, body: str):
+        """补写按需下载的正文"""
+        if not self.available:
+            return
+        try:
+            with self._lock, self._db.transaction() as conn:
+                self._write_body(conn, account, folder, int(uid), (body or "")[:self.max_body_chars])
+        except sqlite3.Error as e:
+            logger.error(f"❌ 更新邮件索引正文失败: {e}")
+
+    def set_read(self, account: str, folder: str, uid: int, is_read: bool = True):
+        """更新已读状态"""
+        if self.available:
+            self._db.execute("UPDATE mails SET is_read = ? WHERE account = ? AND folder = ? AND uid = ?",
+                             (int(is_read), account, folder, int(uid)))
+
+    def drop_folder(self, account: str, folder: str, keep_uidvalidity: Optional[int] = None) -> int:
+        """删除文件夹的索引（UIDVALIDITY 变化后旧 UID 不再有效），返回删除条数"""
+        if not self.available:
+            return 0
+        where = "account = ? AND folder = ? AND (uidvalidity IS NULL OR uidvalidity != ?)"
+        params = (account, folder, keep_uidvalidity if keep_uidvalidity is not None else -1)
+        with self._lock, self._db.transaction() as conn:
+            conn.execute(f"DELETE FROM mails_fts WHERE rowid IN (SELECT id FROM mails WHERE {where})", params)
+            cursor = conn.execute(f"DELETE FROM mails WHERE {where}", params)
+        return cursor.rowcount
+
+    def known_uids(self, account: str, folder: str, uids: List[int]) -> set:
+        """已在索引中的 UID"""
+        if not self.available or not uids:
+            return set()
+        placeholders = ",".join("?" * len(uids))
+        rows = self._db.fetchall(
+            f"SELECT uid FROM mails WHERE account = ? AND folder = ? AND uid IN ({placeholders})",
+            (account, folder, *uids)
+        )
+        return {row[0] for row in rows}
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def _filters(account, folder, sender, start, end, unread_only, has_attachment) -> Tuple[str, list]:
+        clauses, params = [], []
+        if account:
+            clauses.append("m.account = ?")
+            params.append(account)
+        if folder:
+            clauses.append("m.folder = ?")
+            params.append(folder)
+        if sender:
+            clauses.append("(m.sender LIKE ? OR m.sender_email LIKE ?)")
+            params.extend([f"%{sender}%"] * 2)
+        if start:
+            clauses.append("m.date >= ?")
+            params.append(_local_iso(start) if isinstance(start, datetime) else start)
+        if end:
+            clauses.append("m.date < ?")
+            params.append(_local_iso(end) if isinstance(end, datetime) else end)
+        if unread_only:
+            clauses.append("m.is_read = 0")
+        if has_attachment is not None:
+            clauses.append("m.attachments != ''" if has_attachment else "m.attachments = ''")
+        return " AND ".join(clauses) or "1", params
+
+    def _query(self, select: str, query: str, filters: Tuple[str, list], limit: Optional[int],
+               relax: bool = True, match_any: bool = False) -> List[tuple]:
+        """
+        执行检索；有关键词时先要求全部词元命中，relax 为真且没有结果时放宽为任意命中，
+        match_any 为真时直接按任意命中检索
+
+        select 中可以用 {score} 引用相关度（无关键词时为 0）
+        """
+        where, params = filters
+        terms = query_terms(query) if query else []
+        limit_sql = f" LIMIT {int(limit)}" if limit else ""
+        if not terms:
+            return self._db.fetchall(
+                f"SELECT {select.format(score='0')} FROM mails m WHERE {where} ORDER BY m.date DESC{limit_sql}",
+                params
+            )
+        sql = (f"SELECT {select.format(score='bm25(mails_fts)')} FROM mails_fts JOIN mails m ON m.id = mails_fts.rowid "
+               f"WHERE mails_fts MATCH ? AND {where} ORDER BY bm25(mails_fts), m.date DESC{limit_sql}")
+        rows = []
+        if match_any:
+            operators = (" OR ",)
+        else:
+            operators = (" AND ", " OR ") if relax else (" AND ",)
+        for operator in operators:
+            rows = self._db.fetchall(sql, [operator.join(terms), *params])
+            if rows or len(terms) == 1:
+                break
+        return rows
+
+    def search(self, query: str = "", account: str = None, folder: str = None, sender: str = None,
+               start: Any = None, end: Any = None, unread_only: bool = False,
+               has_attachment: Optional[bool] = None, limit: int = 10,
+               marks: Tuple[str, str] = ("【", "】")) -> List[Dict[str, Any]]:
+        """
+        离线检索邮件
+
+        Args:
+            query: 关键词（主题、发件人、附件名、正文），为空时只按条件过滤
+            account / folder: 账号和文件夹，为空时跨账号
+            sender: 发件人姓名或邮箱片段
+            start / end: 时间范围（datetime 或 ISO 字符串）
+            unread_only: 只查未读
+            has_attachment: 是否有附件
+
+        Returns:
+            有关键词时按相关度排序，否则按时间倒序；包含 snippet 高亮片段
+        """
+        if not self.available:
+            return []
+        filters = self._filters(account, folder, sender, start, end, unread_only, has_attachment)
+        select = ("m.id, m.account, m.folder, m.uid, m.subject, m.sender, m.sender_email, m.date, "
+                  "m.is_read, m.attachments, m.body, m.message_id")
+        try:
+            rows = self._query(select + ", {score}", query, filters, limit)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 邮件检索失败: {e}")
+            return []
+
+        results = []
+        for row in rows:
+            text = " ".join(" ".join(filter(None, [row[4], row[9], row[10]])).split())
+            results.append({
+                "id": row[0],
+                "account": row[1],
+                "folder": row[2],
+                "uid": row[3],
+                "subject": row[4],
+                "sender": row[5],
+                "sender_email": row[6],
+                "date": row[7],
+                "is_read": bool(row[8]),
+                "attachments": row[9].split("\n") if row[9] else [],
+                "message_id": row[11],
+                "score": -row[12] if row[12] else 0,
+                "snippet": highlight(text, query, marks) if query else " ".join((row[10] or "").split())[:80],
+            })
+        return results
+
+    def count(self, query: str = "", account: str = None, folder: str = None, sender: str = None,
+              start: Any = None, end: Any = None, unread_only: bool = False,
+              has_attachment: Optional[bool] = None) -> int:
+        """满足条件的邮件数，匹配方式与 search 一致：全部词元都没有命中时按任意命中计数"""
+        if not self.available:
+            return 0
+        filters = self._filters(account, folder, sender, start, end, unread_only, has_attachment)
+        try:
+            rows = self._query("COUNT(*)", query, filters, None, relax=False)
+            total = rows[0][0] if rows else 0
+            if not total and query and len(query_terms(query)) > 1:
+                rows = self._query("COUNT(*)", query, filters, None, match_any=True)
+                total = rows[0][0] if rows else 0
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 邮件计数失败: {e}")
+            return 0
+        return total
+
+    def digest(self, start: Any = None, end: Any = None, account: str = None,
+               limit: int = 20) -> Dict[str, Any]:
+        """时间范围内的邮件摘要数据：总数、未读数、主要发件人和最近的邮件"""
+        if not self.available:
+            return {"total": 0, "unread": 0, "with_attachments": 0, "top_senders": [], "mails": []}
+        where, params = self._filters(account, None, None, start, end, False, None)
+        rows = self._db.fetchall(
+            f"SELECT m.subject, m.sender, m.sender_email, m.date, m.is_read, m.attachments, m.body, m.account "
+            f"FROM mails m WHERE {where} ORDER BY m.date DESC",
+            params
+        )
+        senders = Counter(row[1] or row[2] for row in rows)
+        return {
+            "total": len(rows),
+            "unread": sum(1 for row in rows if not row[4]),
+            "with_attachments": sum(1 for row in rows if row[5]),
+            "accounts": sorted({row[7] for row in rows}),
+            "top_senders": senders.most_common(5),
+            "mails": [
+                {
+                    "subject": row[0],
+                    "sender": row[1] or row[2],
+                    "date": row[3],
+                    "is_read": bool(row[4]),
+                    "attachments": row[5].split("\n") if row[5] else [],
+                    "preview": " ".join((row[6] or "").split())[:60],
+                }
+                for row in rows[:limit]
+            ],
+        }
+
+    def format_digest(self, start: Any = None, end: Any = None, account: str = None,
+                      title: str = "邮件摘要", limit: int = 20) -> str:
+        """生成可直接回复用户的邮件摘要文本"""
+        data = self.digest(start, end, account, limit)
+        if not data["total"]:
+            return f"📭 {title}：没有邮件"
+
+        lines = [f"📬 {title}：共 {data['total']} 封，未读 {data['unread']} 封，"
+                 f"带附件 {data['with_attachments']} 封"]
+        if len(data["accounts"]) > 1:
+            lines.append(f"📮 账号：{'、'.join(data['accounts'])}")
+        if data["top_senders"]:
+            lines.append("👤 主要发件人：" + "、".join(f"{name}({n})" for name, n in data["top_senders"]))
+        lines.append("")
+        for mail in data["mails"]:
+            mark = "🔵" if not mail["is_read"] else "⚪"
+            attach = " 📎" if mail["attachments"] else ""
+            lines.append(f"{mark} {mail['date'][5:16].replace('T', ' ')} {mail['sender']}：{mail['subject']}{attach}")
+            if mail["preview"]:
+                lines.append(f"    {mail['preview']}")
+        if data["total"] > limit:
+            lines.append(f"... 还有 {data['total'] - limit} 封")
+        return "\n".join(lines)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计"""
+        if not self.available:
+            return {"available": False}
+        row = self._db.fetchone(
+            "SELECT COUNT(*), COUNT(body), COUNT(DISTINCT account), SUM(is_read = 0) FROM mails"
+        )
+        return {
+            "available": True,
+            "mails": row[0],
+            "with_body": row[1],
+            "accounts": row[2],
+            "unread": row[3] or 0,
+        }
+
+
+def get_mail_store() -> MailStore:
+    """获取本地邮件索引实例"""
+    return MailStore()
@@ -0,0 +1,334 @@
+"""
+Email Sync - IMAP 增量同步工具
+
+EmailReceiver 的增量同步用到的几部分：
+1. parse_imap_list: 把 UID FETCH / BODYSTRUCTURE 的括号列表（含字面量 {n}）解析成嵌套列表
+2. parse_bodystructure: 从 BODYSTRUCTURE 得到各部分的段号、类型、编码和文件名，
+   只下载邮件头后就能知道正文在哪个段、有哪些附件，正文和附件内容按需下载
+3. MailSyncState: 按 账号/文件夹 持久化 UIDVALIDITY 和最后同步的 UID，
+   重启后只同步新邮件；UIDVALIDITY 变化时（邮箱被重建）重新建立基线
+"""
+import base64
+import json
+import quopri
+import re
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from email.header import decode_header
+from itertools import takewhile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+from loguru import logger
+
+from .utils.persistence import atomic_write_json
+
+
+_LITERAL = re.compile(rb"\{(\d+)\+?\}\r\n")
+_ATOM_END = b" ()\r\n"
+
+
+def parse_imap_list(data: bytes) -> list:
+    """
+    解析 IMAP 响应中的括号列表
+
+    NIL 转为 None，带引号的字符串、字面量和原子都保留为 bytes；
+    BODY[HEADER.FIELDS (FROM TO)] 这类带方括号的原子整体作为一个原子
+    """
+    stack: List[list] = [[]]
+    pos, length = 0, len(data)
+    while pos < length:
+        char = data[pos:pos + 1]
+        if char in b" \r\n":
+            pos += 1
+        elif char == b"(":
+            stack.append([])
+            pos += 1
+        elif char == b")":
+            if len(stack) > 1:
+                item = stack.pop()
+                stack[-1].append(item)
+            pos += 1
+        elif char == b'"':
+            pos += 1
+            value = bytearray()
+            while pos < length and data[pos:pos + 1] != b'"':
+                if data[pos:pos + 1] == b"\\":
+                    pos += 1
+                value += data[pos:pos + 1]
+                pos += 1
+            stack[-1].append(bytes(value))
+            pos += 1
+        elif char == b"{" and _LITERAL.match(data, pos):
+            match = _LITERAL.match(data, pos)
+            start = match.end()
+            end = start + int(match.group(1))
+            stack[-1].append(data[start:end])
+            pos = end
+        else:
+            start, depth = pos, 0
+            while pos < length:
+                c = data[pos:pos + 1]
+                if c == b"[":
+                    depth += 1
+                elif c == b"]":
+                    depth -= 1
+                elif depth <= 0 and c in _ATOM_END:
+                    break
+                pos += 1
+            atom = data[start:pos]
+            stack[-1].append(None if atom.upper() == b"NIL" else atom)
+    while len(stack) > 1:
+        item = stack.pop()
+        stack[-1].append(item)
+    return stack[0]
+
+
+def join_fetch_response(data: List[Any]) -> Tuple[bytes, int]:
+    """把 imaplib 返回的 [(前缀, 字面量), b')', ...] 还原成连续的响应文本，并统计字节数"""
+    chunks, size = [], 0
+    for piece in data or []:
+        if isinstance(piece, tuple):
+            chunks.append(piece[0] + b"\r\n" + piece[1])
+            size += len(piece[0]) + len(piece[1])
+        elif isinstance(piece, bytes):
+            chunks.append(piece)
+            size += len(piece)
+    return b" ".join(chunks), size
+
+
+def fetch_items(data: List[Any]) -> Tuple[Dict[int, Dict[bytes, Any]], int]:
+    """
+    解析 UID FETCH 的响应
+
+    Returns:
+        ({uid: {数据项名(大写): 值}}, 响应字节数)；不带 UID 的 FETCH（如标志变化通知）被忽略
+    """
+    stream, size = join_fetch_response(data)
+    items: Dict[int, Dict[bytes, Any]] = {}
+    for node in parse_imap_list(stream):
+        if not isinstance(node, list):
+            continue
+        attrs = {}
+        for i in range(0, len(node) - 1, 2):
+            if isinstance(node[i], bytes):
+                attrs[node[i].upper()] = node[i + 1]
+        uid = attrs.get(b"UID")
+        if uid is not None:
+            items[int(uid)] = attrs
+    return items, size
+
+
+def decode_words(value: Optional[bytes]) -> str:
+    """解码 RFC 2047 编码的文本（附件名等）"""
+    if not value:
+        return ""
+    text = value.decode("utf-8", errors="ignore") if isinstance(value, bytes) else str(value)
+    parts = []
+    for part, encoding in decode_header(text):
+        if isinstance(part, bytes):
+            try:
+                parts.append(part.decode(encoding or "utf-8", errors="ignore"))
+            except LookupError:
+                parts.append(part.decode("utf-8", errors="ignore"))
+        else:
+            parts.append(part)
+    return "".join(parts)
+
+
+def _params(node) -> Dict[str, bytes]:
+    if not isinstance(node, list):
+        return {}
+    return {
+        node[i].decode(errors="ignore").lower(): node[i + 1]
+        for i in range(0, len(node) - 1, 2)
+        if isinstance(node[i], bytes) and isinstance(node[i + 1], bytes)
+    }
+
+
+def _filename(params: Dict[str, bytes]) -> str:
+    """文件名，支持 RFC 2231 的 filename*= 和分段 filename*0*= 形式"""
+    for key in ("filename", "name"):
+        if key in params:
+            return decode_words(params[key])
+        extended = sorted(k for k in params if k.startswith(key + "*"))
+        if extended:
+            raw = b"".join(params[k] for k in extended).decode("ascii", errors="ignore")
+            charset, _, encoded = raw.partition("''") if "''" in raw else ("utf-8", "", raw)
+            try:
+                return unquote(encoded, encoding=charset or "utf-8", errors="ignore")
+            except LookupError:
+                return unquote(encoded)
+    return ""
+
+
+@dataclass
+class MessagePart:
+    """BODYSTRUCTURE 中的一个叶子部分"""
+    section: str
+    content_type: str
+    charset: str = "utf-8"
+    encoding: str = "7bit"
+    size: int = 0
+    filename: str = ""
+    is_attachment: bool = False
+
+    @property
+    def decoded_size(self) -> int:
+        """解码后的大致字节数"""
+        return self.size * 3 // 4 if self.encoding == "base64" else self.size
+
+    def decode(self, data: bytes) -> bytes:
+        """按传输编码解码"""
+        if self.encoding == "base64":
+            return base64.b64decode(data + b"===", validate=False)
+        if self.encoding == "quoted-printable":
+            return quopri.decodestring(data)
+        return data
+
+    def decode_text(self, data: bytes) -> str:
+        payload = self.decode(data)
+        try:
+            return payload.decode(self.charset or "utf-8", errors="ignore")
+        except LookupError:
+            return payload.decode("utf-8", errors="ignore")
+
+
+def parse_bodystructure(node, prefix: str = "") -> List[MessagePart]:
+    """
+    把 BODYSTRUCTURE 展开为叶子部分列表
+
+    multipart 按 RFC 3501 编号（1、1.1、2 ...），非 multipart 邮件的正文段号为 1；
+    与原先的规则一致，只有 Content-Disposition 为 attachment 且有文件名的部分算附件，
+    内嵌的 message/rfc822 作为整体处理，不再展开
+    """
+    if not isinstance(node, list) or not node:
+        return []
+
+    if isinstance(node[0], list):
+        parts = []
+        # 子部分是开头连续的列表，之后是 subtype 和扩展字段
+        for index, child in enumerate(takewhile(lambda n: isinstance(n, list), node), 1):
+            parts.extend(parse_bodystructure(child, f"{prefix}{index}."))
+        return parts
+
+    if len(node) < 7:
+        return []
+    maintype = (node[0] or b"").decode(errors="ignore").lower()
+    subtype = (node[1] or b"").decode(errors="ignore").lower()
+    params = _params(node[2])
+    encoding = (node[5] or b"7bit").decode(errors="ignore").lower()
+    try:
+        size = int(node[6] or 0)
+    except ValueError:
+        size = 0
+
+    if maintype == "text":
+        ext_index = 8
+    elif maintype == "message" and subtype == "rfc822":
+        ext_index = 10
+    else:
+        ext_index = 7
+    disposition = node[ext_index + 1] if len(node) > ext_index + 1 else None
+    disposition_type = b""
+    if isinstance(disposition, list) and disposition and isinstance(disposition[0], bytes):
+        disposition_type = disposition[0].lower()
+        params = {**params, **_params(disposition[1] if len(disposition) > 1 else None)}
+    filename = _filename(params)
+
+    charset = params.get("charset", b"utf-8").decode(errors="ignore") or "utf-8"
+    return [MessagePart(
+        section=(prefix or "1.").rstrip("."),
+        content_type=f"{maintype}/{subtype}",
+        charset=charset,
+        encoding=encoding,
+        size=size,
+        filename=filename,
+        is_attachment=disposition_type == b"attachment" and bool(filename),
+    )]
+
+
+class EmailAttachment(dict):
+    """
+    邮件附件信息
+
+    与原先的附件 dict 字段相同（filename / content_type / size / data），
+    但 data 在第一次读取时才从服务器下载
+    """
+
+    def __init__(self, filename: str, content_type: str, size: int,
+                 fetch: Optional[Callable[[], bytes]] = None, data: Optional[bytes] = None):
+        super().__init__(filename=filename, content_type=content_type, size=size)
+        self._fetch = fetch
+        if data is not None:
+            self["data"] = data
+
+    @property
+    def loaded(self) -> bool:
+        return dict.__contains__(self, "data")
+
+    def _ensure(self):
+        if not self.loaded:
+            data = b""
+            if self._fetch:
+                try:
+                    data = self._fetch()
+                except Exception as e:
+                    logger.error(f"❌ 下载附件失败 [{dict.get(self, 'filename')}]: {e}")
+            self["data"] = data
+            if data:
+                self["size"] = len(data)
+
+    def __getitem__(self, key):
+        if key == "data":
+            self._ensure()
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key == "data":
+            self._ensure()
+        return super().get(key, default)
+
+
+class MailSyncState:
+    """按 账号/文件夹 保存的 UIDVALIDITY 和最后同步 UID"""
+
+    def __init__(self, state_file: Optional[Path] = None):
+        self.state_file = state_file or Path.home() / ".personal_agent" / "email" / "sync_state.json"
+        self._lock = threading.Lock()
+        self._state: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not self.state_file.exists():
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ 加载邮件同步状态失败: {e}")
+            return {}
+
+    @staticmethod
+    def _key(account: str, folder: str) -> str:
+        return f"{account}/{folder}"
+
+    def get(self, account: str, folder: str) -> Tuple[Optional[int], int]:
+        """(UIDVALIDITY, 最后同步的 UID)，没有记录时返回 (None, 0)"""
+        entry = self._state.get(self._key(account, folder)) or {}
+        return entry.get("uidvalidity"), entry.get("last_uid", 0)
+
+    def update(self, account: str, folder: str, uidvalidity: Optional[int], last_uid: int):
+        """记录同步进度并落盘"""
+        with self._lock:
+            self._state[self._key(account, folder)] = {
+                "uidvalidity": uidvalidity,
+                "last_uid": last_uid,
+                "updated_at": datetime.now().isoformat(),
+            }
+            try:
+                self.state_file.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write_json(self.state_file, self._state)
+            except OSError as e:
+                logger.error(f"❌ 保存邮件同步状态失败: {e}")
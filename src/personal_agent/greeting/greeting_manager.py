@@ -51,9 +51,14 @@ class GreetingManager:
             greeting = await self._generate_morning_greeting(user_id, now)
             self._record_open_time(user_id, current_date)
             logger.info(f"🌅 生成问候语长度: {len(greeting)}")
-            return greeting
         else:
-            return self._generate_time_based_greeting(now)
+            greeting = self._generate_time_based_greeting(now)
+
+        if self.master_agent and hasattr(self.master_agent, "get_resume_prompt"):
+            resume_prompt = self.master_agent.get_resume_prompt()
+            if resume_prompt:
+                greeting = f"{greeting}\n\n{resume_prompt}"
+        return greeting
 
     def _is_first_open_today(self, user_id: str, current_date: str) -> bool:
         """检查是否是今天第一次打开"""
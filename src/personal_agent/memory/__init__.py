@@ -9,6 +9,10 @@ Memory Module - 记忆模块
 5. VectorMemory - 向量记忆（原LongTermMemory）
 6. SQLiteMemory - SQLite记忆（原long_term_memory.py）
 7. HistoryManager - 历史记录管理
+8. MessageSearchIndex - 消息全文索引
+9. EmbeddingService - 共享向量化服务
+10. ContextBuilder - 按 token 预算组装对话上下文
+11. MemoryMaintenance - 记忆去重、保留策略与归档整理
 """
 
 from .base import BaseMemory, MemoryItem as BaseMemoryItem
@@ -16,6 +20,10 @@ from .short_term import ShortTermMemory, ConversationTurn
 from .long_term import LongTermMemory as VectorMemory
 from .manager import MemoryManager
 from .history_manager import HistoryManager, history_manager
+from .search_index import MessageSearchIndex, get_search_index
+from .embedding_service import EmbeddingService, get_embedding_service
+from .context_builder import ContextBuilder, get_context_builder
+from .maintenance import MemoryMaintenance, get_memory_maintenance
 
 from .unified_memory import (
     UnifiedMemory, 
@@ -42,6 +50,14 @@ __all__ = [
     "MemoryManager",
     "HistoryManager",
     "history_manager",
+    "MessageSearchIndex",
+    "get_search_index",
+    "EmbeddingService",
+    "get_embedding_service",
+    "ContextBuilder",
+    "get_context_builder",
+    "MemoryMaintenance",
+    "get_memory_maintenance",
     "UnifiedMemory",
     "UserProfile",
     "UserPreference",
@@ -0,0 +1,146 @@
+"""
+本地向量索引与 chromadb 的召回率和延迟对比
+
+用法：
+    python benchmark_vector_index.py --count 100000 --dim 384 --queries 200 --k 10
+
+使用带聚类结构的随机向量（接近真实文本向量的分布），以暴力计算的精确余弦 top-k 作为基准，
+分别统计 LocalVectorIndex 和 chromadb（已安装时）的写入耗时、查询延迟（p50 / p95）和 recall@k
+"""
+import argparse
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def _load_vector_index():
+    """按文件路径加载 vector_index 模块，不经过 memory 包的 __init__（会初始化历史记录和检索索引）"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vector_index.py")
+    spec = importlib.util.spec_from_file_location("vector_index", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+LocalVectorIndex = _load_vector_index().LocalVectorIndex
+
+
+def make_vectors(count: int, dim: int, clusters: int = 200, seed: int = 42):
+    """生成带聚类结构的归一化向量"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    vectors = centers[labels] + rng.normal(scale=0.6, size=(count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, labels
+
+
+def ground_truth(vectors: np.ndarray, queries: np.ndarray, k: int):
+    """精确 top-k"""
+    scores = queries @ vectors.T
+    return [set(np.argsort(-row)[:k].tolist()) for row in scores]
+
+
+def summarize(name: str, insert_seconds: float, latencies: list, recall: float):
+    latencies_ms = np.array(latencies) * 1000
+    print(f"\n{name}")
+    print(f"   写入耗时: {insert_seconds:.2f}s")
+    print(f"   查询延迟: p50 {np.percentile(latencies_ms, 50):.1f}ms, p95 {np.percentile(latencies_ms, 95):.1f}ms")
+    print(f"   recall@k: {recall:.3f}")
+
+
+def bench_local(workdir: str, vectors, labels, queries, truth, k: int, batch: int):
+    index = LocalVectorIndex(os.path.join(workdir, "local"))
+    started = time.perf_counter()
+    for start in range(0, len(vectors), batch):
+        end = min(start + batch, len(vectors))
+        index.upsert(
+            ids=[str(i) for i in range(start, end)],
+            embeddings=vectors[start:end],
+            metadatas=[{"cluster": int(label)} for label in labels[start:end]]
+        )
+    insert_seconds = time.perf_counter() - started
+
+    # 重新打开以测量内存映射加载后的查询
+    started = time.perf_counter()
+    index = LocalVectorIndex(os.path.join(workdir, "local"))
+    print(f"\n   本地索引重新加载: {time.perf_counter() - started:.2f}s")
+
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        results = index.search(query, k)
+        latencies.append(time.perf_counter() - started)
+        hits += len(expected & {int(r["id"]) for r in results})
+    summarize("LocalVectorIndex", insert_seconds, latencies, hits / (len(queries) * k))
+
+    # 首次按某个字段过滤时会建立倒排表
+    for label in ("首次", "再次"):
+        started = time.perf_counter()
+        index.search(queries[0], k, where={"cluster": int(labels[0])})
+        print(f"   带元数据过滤的查询（{label}）: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+def bench_chroma(workdir: str, vectors, labels, queries, truth, k: int, batch: int):
+    try:
+        import chromadb
+        from chromadb.config import Settings
+    except ImportError:
+        print("\nchromadb 未安装，跳过对比")
+        return
+
+    client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"),
+                                       settings=Settings(anonymized_telemetry=False))
+    collection = client.get_or_create_collection(name="bench", metadata={"hnsw:space": "cosine"})
+    started = time.perf_counter()
+    for start in range(0, len(vectors), batch):
+        end = min(start + batch, len(vectors))
+        collection.upsert(
+            ids=[str(i) for i in range(start, end)],
+            embeddings=vectors[start:end].tolist(),
+            metadatas=[{"cluster": int(label)} for label in labels[start:end]]
+        )
+    insert_seconds = time.perf_counter() - started
+
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        results = collection.query(query_embeddings=[query.tolist()], n_results=k)
+        latencies.append(time.perf_counter() - started)
+        hits += len(expected & {int(id) for id in results["ids"][0]})
+    summarize("chromadb (HNSW)", insert_seconds, latencies, hits / (len(queries) * k))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量索引基准测试")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"向量索引基准测试: {args.count} 条 x {args.dim} 维, {args.queries} 次查询, k={args.k}")
+    print("=" * 60)
+
+    vectors, labels = make_vectors(args.count, args.dim)
+    queries, _ = make_vectors(args.queries, args.dim, seed=7)
+    truth = ground_truth(vectors, queries, args.k)
+
+    workdir = tempfile.mkdtemp(prefix="vector_bench_")
+    try:
+        bench_local(workdir, vectors, labels, queries, truth, args.k, args.batch)
+        bench_chroma(workdir, vectors, labels, queries, truth, args.k, args.batch)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+"""
+Context Builder - 按 token 预算组装对话上下文
+
+LLM 提示中的历史上下文由三部分按优先级填充，总量不超过当前模型的 token 预算：
+1. 最近对话：从最新一条往前取，单条过长时截取首尾
+2. 相关记录：全文索引中与当前问题相关、但不在最近对话里的历史消息，以及调用方传入的记忆
+3. 早前对话摘要：较早的消息在后台分批合并为滚动摘要并缓存到磁盘，组装上下文时直接使用
+
+某一部分用不完的预算留给其他部分
+
+用法：
+    from ..memory.context_builder import get_context_builder
+    history_text = get_context_builder().build_text(query=user_input)
+
+环境变量：
+    CONTEXT_TOKEN_BUDGET   固定的上下文 token 预算（默认按模型上下文窗口的 1/8，最多 8000）
+"""
+import asyncio
+import bisect
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from loguru import logger
+
+from ..utils.persistence import atomic_write_json
+
+
+# 模型名前缀 -> 上下文窗口（token），按前缀最长匹配
+MODEL_CONTEXT_WINDOWS = {
+    "glm-4-long": 1000000,
+    "glm-4": 128000,
+    "glm-3": 128000,
+    "qwen-long": 1000000,
+    "qwen-max": 32000,
+    "qwen-plus": 131000,
+    "qwen-turbo": 131000,
+    "qwen": 32000,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8000,
+    "gpt-3.5": 16000,
+    "deepseek": 64000,
+}
+DEFAULT_CONTEXT_WINDOW = 32000
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """粗略估算 token 数：中日韩字符按 1 个，其余字符按 4 个字符 1 个"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if '\u4e00' <= ch <= '\u9fff' or '\u3040' <= ch <= '\u30ff')
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """把文本截到约 max_tokens，保留开头和结尾"""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = max(20, int(len(text) * max_tokens / tokens))
+    head = keep * 2 // 3
+    return f"{text[:head]}…{text[-(keep - head):]}"
+
+
+class ContextBuilder:
+    """
+    对话上下文组装器
+
+    功能：
+    1. 按模型上下文窗口确定 token 预算
+    2. 最近对话、相关记录、早前摘要按优先级分配预算
+    3. 滚动摘要在后台增量生成并缓存，不在请求路径上调用 LLM
+    """
+
+    INSTANCE = None
+
+    RECENT_SHARE = 0.6
+    MEMORY_SHARE = 0.2
+    SUMMARY_CHUNK = 20
+    SUMMARY_MAX_CHUNK = 60
+    KEEP_RAW = 30
+    SUMMARY_MAX_CHARS = 800
+    SUMMARY_RETRY_SECONDS = 300
+
+    def __new__(cls, *args, **kwargs):
+        if cls.INSTANCE is None:
+            cls.INSTANCE = super().__new__(cls)
+        return cls.INSTANCE
+
+    def __init__(self, cache_path: str = None):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+
+        if cache_path is None:
+            cache_path = os.path.join(os.getcwd(), "data", "context", "summary.json")
+        self.cache_path = Path(cache_path)
+
+        self._summary = {"text": "", "until": "", "covered": 0, "updated_at": None}
+        self._summary_task: Optional[asyncio.Task] = None
+        self._retry_at = 0.0
+        self._stats = {"builds": 0, "summary_updates": 0, "summary_failures": 0, "last_tokens": 0}
+
+        self._load_summary()
+        self._initialized = True
+
+    def _load_summary(self):
+        if not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                self._summary.update(json.load(f))
+        except Exception as e:
+            logger.warning(f"⚠️ 加载对话摘要缓存失败: {e}")
+
+    def _save_summary(self):
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_json(self.cache_path, self._summary)
+        except Exception as e:
+            logger.warning(f"⚠️ 保存对话摘要缓存失败: {e}")
+
+    def reset_summary(self):
+        """丢弃滚动摘要（历史记录被清空时）"""
+        self._summary = {"text": "", "until": "", "covered": 0, "updated_at": None}
+        self._save_summary()
+
+    @staticmethod
+    def current_model() -> str:
+        """当前 LLM 提供方使用的模型名"""
+        try:
+            from ..config import settings
+            provider = (settings.llm.provider or "").lower()
+            return getattr(settings.llm, f"{provider}_model", "") or ""
+        except Exception:
+            return ""
+
+    def budget_for_model(self, model: str = None) -> int:
+        """上下文 token 预算"""
+        fixed = os.getenv("CONTEXT_TOKEN_BUDGET")
+        if fixed:
+            try:
+                return int(fixed)
+            except ValueError:
+                pass
+        model = (model or self.current_model()).lower()
+        window = DEFAULT_CONTEXT_WINDOW
+        matched = ""
+        for prefix, size in MODEL_CONTEXT_WINDOWS.items():
+            if model.startswith(prefix) and len(prefix) > len(matched):
+                matched, window = prefix, size
+        return max(1000, min(window // 8, 8000))
+
+    @staticmethod
+    def _format(role: str, content: str) -> str:
+        return f"[{'用户' if role == 'user' else '助手'}] {content}"
+
+    def _history_messages(self) -> List[Any]:
+        from .history_manager import history_manager
+        return history_manager.messages
+
+    def build(
+        self,
+        query: str = "",
+        model: str = None,
+        budget: int = None,
+        memories: Sequence[str] = None,
+        history: Sequence[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        组装上下文
+
+        Args:
+            query: 当前问题（用于检索相关记录）
+            model: 模型名，默认使用当前配置的模型
+            budget: token 预算，默认按模型计算
+            memories: 调用方检索到的相关记忆，优先于全文索引结果
+            history: 调用方自己的对话列表（role/content）；不传时使用全局历史记录，并附带滚动摘要
+
+        Returns:
+            {"text", "tokens", "budget", "recent", "related", "summary", "omitted"}
+        """
+        budget = budget or self.budget_for_model(model)
+        use_global = history is None
+        messages = self._history_messages() if use_global else list(history)
+        self._stats["builds"] += 1
+
+        if use_global:
+            self._check_summary(messages)
+
+        summary_text = self._summary["text"] if use_global else ""
+        summary_tokens = min(estimate_tokens(summary_text), int(budget * (1 - self.RECENT_SHARE - self.MEMORY_SHARE)))
+        memory_budget = int(budget * self.MEMORY_SHARE)
+        recent_budget = budget - summary_tokens - memory_budget
+
+        # 最近对话：从新到旧，遇到已被摘要覆盖的消息为止
+        per_message = max(200, budget // 4)
+        recent_lines: List[str] = []
+        recent_keys = set()
+        used = 0
+        stop = self._summary_start(messages) if summary_text else 0
+        index = len(messages)
+        while index > stop:
+            message = messages[index - 1]
+            role, content = self._fields(message)
+            if not content:
+                index -= 1
+                continue
+            line = self._format(role, clip_to_tokens(content, per_message))
+            cost = estimate_tokens(line)
+            if used + cost > recent_budget:
+                break
+            recent_lines.append(line)
+            recent_keys.add(content)
+            used += cost
+            index -= 1
+        recent_lines.reverse()
+        omitted = max(0, index - stop)
+
+        # 相关记录：调用方的记忆优先，其次是全文索引命中且不在最近对话中的历史消息
+        memory_budget += recent_budget - used
+        related_lines: List[str] = []
+        related_used = 0
+        for line in self._related(query, memories, recent_keys if use_global else None):
+            line = clip_to_tokens(line, per_message)
+            cost = estimate_tokens(line)
+            if related_used + cost > memory_budget:
+                break
+            related_lines.append(line)
+            related_used += cost
+
+        # 剩余预算允许时摘要不截断
+        summary_budget = budget - used - related_used
+        if summary_text:
+            summary_text = clip_to_tokens(summary_text, max(summary_tokens, summary_budget))
+
+        sections = []
+        if summary_text:
+            sections.append(f"【早前对话摘要】\n{summary_text}")
+        if related_lines:
+            sections.append("【相关记录】\n" + "\n".join(related_lines))
+        if recent_lines:
+            header = "【最近对话】" + (f"（更早的 {omitted} 条未列出）" if omitted else "")
+            sections.append(header + "\n" + "\n".join(recent_lines))
+        text = "\n\n".join(sections)
+        tokens = estimate_tokens(text)
+        self._stats["last_tokens"] = tokens
+
+        if use_global:
+            self._schedule_summary(messages)
+
+        return {
+            "text": text,
+            "tokens": tokens,
+            "budget": budget,
+            "recent": len(recent_lines),
+            "related": len(related_lines),
+            "summary": bool(summary_text),
+            "omitted": omitted,
+        }
+
+    def build_text(self, query: str = "", model: str = None, budget: int = None,
+                   memories: Sequence[str] = None, history: Sequence[Dict[str, str]] = None) -> str:
+        """组装上下文文本"""
+        return self.build(query, model, budget, memories, history)["text"]
+
+    @staticmethod
+    def _fields(message: Any):
+        if isinstance(message, dict):
+            return message.get("role", ""), message.get("content", "")
+        return message.role, message.content
+
+    def _related(self, query: str, memories: Optional[Sequence[str]], exclude: Optional[set]) -> List[str]:
+        lines = [f"- {memory}" for memory in (memories or []) if memory]
+        if not query or exclude is None:
+            return lines
+        try:
+            from .search_index import get_search_index
+            hits = get_search_index().search(query, limit=8, source="history")
+        except Exception as e:
+            logger.debug(f"检索相关历史失败: {e}")
+            return lines
+        for hit in hits:
+            if hit["content"] in exclude:
+                continue
+            role = "用户" if hit["role"] == "user" else "助手"
+            lines.append(f"- [{role} {hit['timestamp'][:10]}] {hit['content']}")
+        return lines
+
+    def _summary_start(self, messages: List[Any]) -> int:
+        """第一条未被摘要覆盖的消息下标"""
+        until = self._summary["until"]
+        if not until:
+            return 0
+        return bisect.bisect_right(messages, until, key=lambda m: m.timestamp)
+
+    def _check_summary(self, messages: List[Any]):
+        """历史记录被清空或替换后丢弃过期的摘要"""
+        if not self._summary["until"]:
+            return
+        if not messages or messages[-1].timestamp < self._summary["until"]:
+            self.reset_summary()
+
+    def _schedule_summary(self, messages: List[Any]):
+        if self._summary_task is not None and not self._summary_task.done():
+            return
+        if time.monotonic() < self._retry_at:
+            return
+        pending = len(messages) - self.KEEP_RAW - self._summary_start(messages)
+        if pending < self.SUMMARY_CHUNK:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._summary_task = loop.create_task(self.refresh_summary())
+
+    async def refresh_summary(self) -> bool:
+        """
+        把较早的未摘要消息分批合并进滚动摘要
+
+        Returns:
+            是否有更新
+        """
+        updated = False
+        while True:
+            messages = self._history_messages()
+            start = self._summary_start(messages)
+            end = min(len(messages) - self.KEEP_RAW, start + self.SUMMARY_MAX_CHUNK)
+            if end - start < self.SUMMARY_CHUNK:
+                return updated
+
+            chunk = messages[start:end]
+            try:
+                text = await self._summarize(self._summary["text"], chunk)
+            except Exception as e:
+                self._stats["summary_failures"] += 1
+                self._retry_at = time.monotonic() + self.SUMMARY_RETRY_SECONDS
+                logger.warning(f"⚠️ 生成对话摘要失败: {e}")
+                return updated
+
+            if not text:
+                self._retry_at = time.monotonic() + self.SUMMARY_RETRY_SECONDS
+                return updated
+            self._summary = {
+                "text": text,
+                "until": chunk[-1].timestamp,
+                "covered": self._summary["covered"] + len(chunk),
+                "updated_at": datetime.now().isoformat(),
+            }
+            self._save_summary()
+            self._stats["summary_updates"] += 1
+            updated = True
+            logger.debug(f"📝 对话摘要已更新，累计覆盖 {self._summary['covered']} 条消息")
+
+    async def _summarize(self, previous: str, chunk: List[Any]) -> str:
+        from ..llm import LLMGateway
+        from ..config import settings
+
+        dialogue = "\n".join(
+            self._format(m.role, clip_to_tokens(m.content, 300)) for m in chunk if m.content
+        )
+        prompt = f"""请把下面的新对话合并进已有的对话摘要，输出更新后的摘要。
+
+要求：
+1. 保留用户的个人信息、偏好、提到的人物和联系方式、约定或待办的事项、重要结论
+2. 省略寒暄和已经完成且无后续的操作细节
+3. 使用简洁的中文要点，不超过 {self.SUMMARY_MAX_CHARS} 字
+4. 只输出摘要本身
+
+【已有摘要】
+{previous or "（无）"}
+
+【新对话】
+{dialogue}"""
+
+        llm = LLMGateway(settings.llm)
+        response = await llm.chat([{"role": "user", "content": prompt}])
+        return (response.content or "").strip()[:self.SUMMARY_MAX_CHARS * 2]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计"""
+        return {
+            **self._stats,
+            "summary_covered": self._summary["covered"],
+            "summary_updated_at": self._summary["updated_at"],
+            "summary_running": self._summary_task is not None and not self._summary_task.done(),
+        }
+
+
+def get_context_builder() -> ContextBuilder:
+    """获取上下文组装器实例"""
+    return ContextBuilder()
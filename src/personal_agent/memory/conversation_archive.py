@@ -0,0 +1,229 @@
+"""
+Conversation Archive - 对话压缩归档
+
+早期消息从常驻的 JSON / JSONL 文件移到压缩分段文件中，启动时不再解析和加载全部历史：
+1. 消息按时间顺序写入 gzip 压缩的 JSONL 分段（每段最多 SEGMENT_SIZE 条）
+2. index.json 记录每个分段的条数、时间范围和会话，分页和搜索只解压需要的分段
+3. 最近读取的分段保留在小型 LRU 缓存中，连续向前翻页不会重复解压
+
+消息在归档中的位置从 0 开始按时间递增，page(before, limit) 返回位置在 before 之前的 limit 条
+
+用法：
+    archive = ConversationArchive(storage_path / "archive")
+    archive.append([m.to_dict() for m in old_messages])
+    older = archive.page(before=archive.count(), limit=50)
+"""
+import gzip
+import json
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from loguru import logger
+
+from ..utils.persistence import atomic_write_json
+
+
+class ConversationArchive:
+    """
+    对话归档（压缩分段 + 索引）
+
+    功能：
+    1. 追加归档消息，最后一个分段未满时先补满
+    2. 按位置分页读取，只解压覆盖的分段
+    3. 关键词搜索（从最新分段向前扫描，按时间范围和会话跳过分段）
+    4. 按时间删除早期分段（保留策略使用）
+    """
+
+    SEGMENT_SIZE = 1000
+    CACHE_SEGMENTS = 4
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._index_file = self.path / "index.json"
+        self._lock = threading.RLock()
+        self._segments: List[Dict[str, Any]] = []
+        self._offsets: List[int] = []
+        self._total = 0
+        self._next_id = 1
+        self._cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._stats = {"segment_reads": 0, "cache_hits": 0}
+        self._load_index()
+
+    def _load_index(self):
+        if not self._index_file.exists():
+            return
+        try:
+            with open(self._index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._segments = [s for s in data.get("segments", []) if (self.path / s["file"]).exists()]
+            self._next_id = data.get("next_id", len(self._segments) + 1)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"❌ 加载对话归档索引失败: {e}")
+            self._segments = []
+        self._reindex()
+
+    def _reindex(self):
+        self._offsets = []
+        total = 0
+        for segment in self._segments:
+            self._offsets.append(total)
+            total += segment["count"]
+        self._total = total
+
+    def _save_index(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self._index_file, {"next_id": self._next_id, "segments": self._segments})
+
+    def count(self) -> int:
+        """归档中的消息数"""
+        return self._total
+
+    def _read_segment(self, segment: Dict[str, Any]) -> List[Dict[str, Any]]:
+        name = segment["file"]
+        cached = self._cache.get(name)
+        if cached is not None:
+            self._cache.move_to_end(name)
+            self._stats["cache_hits"] += 1
+            return cached
+        with gzip.open(self.path / name, "rt", encoding="utf-8") as f:
+            messages = [json.loads(line) for line in f if line.strip()]
+        self._stats["segment_reads"] += 1
+        self._cache[name] = messages
+        while len(self._cache) > self.CACHE_SEGMENTS:
+            self._cache.popitem(last=False)
+        return messages
+
+    def _write_segment(self, messages: List[Dict[str, Any]], name: str = None) -> Dict[str, Any]:
+        if name is None:
+            name = f"seg-{self._next_id:06d}.jsonl.gz"
+            self._next_id += 1
+        tmp_file = self.path / f".{name}.tmp"
+        with gzip.open(tmp_file, "wt", encoding="utf-8") as f:
+            f.write("".join(json.dumps(m, ensure_ascii=False) + "\n" for m in messages))
+        tmp_file.replace(self.path / name)
+        self._cache.pop(name, None)
+        return {
+            "file": name,
+            "count": len(messages),
+            "start": messages[0].get("timestamp", ""),
+            "end": messages[-1].get("timestamp", ""),
+            "sessions": sorted({m.get("session_id") or "default" for m in messages}),
+        }
+
+    def append(self, messages: List[Dict[str, Any]]):
+        """按时间顺序追加归档消息"""
+        if not messages:
+            return
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            pending = list(messages)
+            if self._segments and self._segments[-1]["count"] < self.SEGMENT_SIZE:
+                last = self._segments.pop()
+                pending = self._read_segment(last) + pending
+                name = last["file"]
+            else:
+                name = None
+            for start in range(0, len(pending), self.SEGMENT_SIZE):
+                self._segments.append(self._write_segment(pending[start:start + self.SEGMENT_SIZE], name))
+                name = None
+            self._save_index()
+            self._reindex()
+
+    def get_range(self, start: int, end: int) -> List[Dict[str, Any]]:
+        """位置在 [start, end) 的消息"""
+        with self._lock:
+            start, end = max(0, start), min(end, self._total)
+            if start >= end:
+                return []
+            result = []
+            i = bisect_right(self._offsets, start) - 1
+            while i < len(self._segments) and self._offsets[i] < end:
+                offset = self._offsets[i]
+                messages = self._read_segment(self._segments[i])
+                result.extend(messages[max(0, start - offset):end - offset])
+                i += 1
+            return result
+
+    def page(self, before: int = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """位置在 before 之前的 limit 条消息（默认从最新处开始），按时间顺序"""
+        before = self._total if before is None else min(before, self._total)
+        return self.get_range(before - limit, before)
+
+    def iter_messages(self) -> Iterator[Dict[str, Any]]:
+        """按时间顺序遍历全部归档消息（逐段解压）"""
+        for segment in list(self._segments):
+            with gzip.open(self.path / segment["file"], "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def search(self, keyword: str, limit: int = 10, session_id: str = None,
+               start: str = None, end: str = None) -> List[Dict[str, Any]]:
+        """子串搜索，从最新分段向前，按时间范围和会话跳过无关分段"""
+        keyword = keyword.lower()
+        results = []
+        with self._lock:
+            for segment in reversed(self._segments):
+                if session_id and session_id not in segment.get("sessions", [session_id]):
+                    continue
+                if (start and segment["end"] < start) or (end and segment["start"] > end):
+                    continue
+                for message in reversed(self._read_segment(segment)):
+                    if session_id and (message.get("session_id") or "default") != session_id:
+                        continue
+                    timestamp = message.get("timestamp", "")
+                    if (start and timestamp < start) or (end and timestamp > end):
+                        continue
+                    if keyword in message.get("content", "").lower():
+                        results.append(message)
+                        if len(results) >= limit:
+                            return results
+        return results
+
+    def drop_before(self, timestamp: str) -> List[Dict[str, Any]]:
+        """删除早于 timestamp 的消息，返回被删除的消息"""
+        removed = []
+        with self._lock:
+            kept = []
+            for segment in self._segments:
+                if segment["start"] >= timestamp:
+                    kept.append(segment)
+                    continue
+                messages = self._read_segment(segment)
+                old = [m for m in messages if m.get("timestamp", "") < timestamp]
+                removed.extend(old)
+                if len(old) == len(messages):
+                    (self.path / segment["file"]).unlink(missing_ok=True)
+                    self._cache.pop(segment["file"], None)
+                else:
+                    kept.append(self._write_segment(messages[len(old):], segment["file"]))
+            if removed:
+                self._segments = kept
+                self._save_index()
+                self._reindex()
+        return removed
+
+    def clear(self):
+        """删除全部归档"""
+        with self._lock:
+            for segment in self._segments:
+                (self.path / segment["file"]).unlink(missing_ok=True)
+            self._segments = []
+            self._cache.clear()
+            if self._index_file.exists():
+                self._save_index()
+            self._reindex()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取归档统计"""
+        return {
+            "segments": len(self._segments),
+            "messages": self._total,
+            "bytes": sum((self.path / s["file"]).stat().st_size for s in self._segments
+                         if (self.path / s["file"]).exists()),
+            "cached_segments": len(self._cache),
+            **self._stats,
+        }
@@ -0,0 +1,278 @@
+"""
+Embedding Service - 共享向量化服务
+
+进程内所有需要文本向量的组件（长期记忆、语义意图匹配、技能匹配等）共用同一个
+SentenceTransformer 模型，首次使用时才加载；批量请求中相同的文本只计算一次，
+计算结果按 (模型, 文本哈希) 缓存到磁盘，重启后无需重新计算
+
+用法：
+    from .embedding_service import get_embedding_service
+    service = get_embedding_service()
+    vectors = service.encode(["你好", "hello"])
+    vector = await service.aembed("你好")
+
+环境变量：
+    EMBEDDING_MODEL          默认模型（默认 all-MiniLM-L6-v2）
+    EMBEDDING_CACHE_MEMORY   内存中缓存的向量条数（默认 4096）
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from loguru import logger
+
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingService:
+    """
+    共享向量化服务
+
+    功能：
+    1. 模型懒加载，每个模型在进程内只加载一次
+    2. 批量接口，同一批中重复的文本只计算一次
+    3. 内存 LRU + SQLite 磁盘缓存
+    4. 同步和异步接口（异步接口在线程中计算，不阻塞事件循环）
+    5. 统计模型加载耗时和缓存命中率
+    """
+
+    INSTANCE = None
+    BATCH_SIZE = 32
+
+    def __new__(cls, *args, **kwargs):
+        if cls.INSTANCE is None:
+            cls.INSTANCE = super().__new__(cls)
+        return cls.INSTANCE
+
+    def __init__(self, cache_path: str = None):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+
+        if cache_path is None:
+            cache_path = os.path.join(os.getcwd(), "data", "embeddings", "cache.db")
+
+        self.default_model = os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL)
+        self.cache_path = Path(cache_path)
+        try:
+            self.memory_cache_size = int(os.getenv("EMBEDDING_CACHE_MEMORY", "4096"))
+        except ValueError:
+            self.memory_cache_size = 4096
+
+        self._models: Dict[str, Any] = {}
+        self._model_lock = threading.Lock()
+        self._memory_cache: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._available: Optional[bool] = None
+        self._stats = {
+            "requests": 0,
+            "texts": 0,
+            "deduplicated": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "computed": 0,
+            "compute_seconds": 0.0,
+            "model_load_seconds": {},
+        }
+
+        self._open_cache()
+        self._initialized = True
+
+    def _open_cache(self):
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                ) WITHOUT ROWID
+            """)
+            self._conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"⚠️ 向量磁盘缓存不可用，仅使用内存缓存: {e}")
+            self._conn = None
+
+    @property
+    def available(self) -> bool:
+        """sentence_transformers 是否已安装"""
+        if self._available is None:
+            try:
+                import sentence_transformers  # noqa: F401
+                self._available = True
+            except ImportError:
+                self._available = False
+        return self._available
+
+    def get_model(self, model: str = None):
+        """获取（必要时加载）模型"""
+        model = model or self.default_model
+        if model in self._models:
+            return self._models[model]
+        with self._model_lock:
+            if model not in self._models:
+                from sentence_transformers import SentenceTransformer
+
+                logger.info(f"🧠 正在加载向量模型: {model}")
+                started = time.perf_counter()
+                self._models[model] = SentenceTransformer(model)
+                seconds = round(time.perf_counter() - started, 2)
+                self._stats["model_load_seconds"][model] = seconds
+                logger.info(f"✅ 向量模型已加载: {model} ({seconds}s)")
+        return self._models[model]
+
+    def _cache_get(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._cache_lock:
+            for h in hashes:
+                vector = self._memory_cache.get((model, h))
+                if vector is not None:
+                    self._memory_cache.move_to_end((model, h))
+                    found[h] = vector
+            self._stats["memory_hits"] += len(found)
+
+            missing = [h for h in hashes if h not in found]
+            if missing and self._conn is not None:
+                try:
+                    for start in range(0, len(missing), 500):
+                        chunk = missing[start:start + 500]
+                        rows = self._conn.execute(
+                            f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                            f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                            [model, *chunk]
+                        ).fetchall()
+                        for h, blob in rows:
+                            vector = array("f", blob).tolist()
+                            found[h] = vector
+                            self._remember(model, h, vector)
+                            self._stats["disk_hits"] += 1
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ 读取向量缓存失败: {e}")
+        return found
+
+    def _cache_put(self, model: str, vectors: Dict[str, List[float]]):
+        with self._cache_lock:
+            for h, vector in vectors.items():
+                self._remember(model, h, vector)
+            if self._conn is None:
+                return
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                    [(model, h, array("f", vector).tobytes()) for h, vector in vectors.items()]
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ 写入向量缓存失败: {e}")
+
+    def _remember(self, model: str, h: str, vector: List[float]):
+        self._memory_cache[(model, h)] = vector
+        self._memory_cache.move_to_end((model, h))
+        while len(self._memory_cache) > self.memory_cache_size:
+            self._memory_cache.popitem(last=False)
+
+    def encode(self, texts: Sequence[str], model: str = None) -> List[List[float]]:
+        """
+        批量计算文本向量
+
+        Args:
+            texts: 文本列表
+            model: 模型名称，默认使用 EMBEDDING_MODEL
+
+        Returns:
+            与 texts 一一对应的向量列表；sentence_transformers 未安装时返回空列表
+        """
+        if not texts or not self.available:
+            return []
+        model = model or self.default_model
+
+        hashes = [_text_hash(text) for text in texts]
+        unique: Dict[str, str] = dict(zip(hashes, texts))
+        self._stats["requests"] += 1
+        self._stats["texts"] += len(texts)
+        self._stats["deduplicated"] += len(texts) - len(unique)
+
+        vectors = self._cache_get(model, list(unique))
+        missing = [h for h in unique if h not in vectors]
+        if missing:
+            started = time.perf_counter()
+            encoded = self.get_model(model).encode(
+                [unique[h] for h in missing], batch_size=self.BATCH_SIZE
+            ).tolist()
+            computed = dict(zip(missing, encoded))
+            self._stats["computed"] += len(computed)
+            self._stats["compute_seconds"] += time.perf_counter() - started
+            self._cache_put(model, computed)
+            vectors.update(computed)
+
+        return [vectors[h] for h in hashes]
+
+    def embed(self, text: str, model: str = None) -> List[float]:
+        """计算单条文本向量，不可用时返回空列表"""
+        result = self.encode([text], model)
+        return result[0] if result else []
+
+    async def aencode(self, texts: Sequence[str], model: str = None) -> List[List[float]]:
+        """异步批量计算文本向量"""
+        return await asyncio.to_thread(self.encode, list(texts), model)
+
+    async def aembed(self, text: str, model: str = None) -> List[float]:
+        """异步计算单条文本向量"""
+        return await asyncio.to_thread(self.embed, text, model)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计：模型加载耗时、缓存命中率等"""
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+        lookups = hits + self._stats["computed"]
+        disk_entries = 0
+        if self._conn is not None:
+            with self._cache_lock:
+                try:
+                    disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        return {
+            **self._stats,
+            "compute_seconds": round(self._stats["compute_seconds"], 3),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "loaded_models": list(self._models),
+            "memory_entries": len(self._memory_cache),
+            "disk_entries": disk_entries,
+            "available": self.available,
+        }
+
+    def clear_cache(self, model: str = None):
+        """清空向量缓存（指定模型或全部）"""
+        with self._cache_lock:
+            if model:
+                for key in [k for k in self._memory_cache if k[0] == model]:
+                    del self._memory_cache[key]
+            else:
+                self._memory_cache.clear()
+            if self._conn is not None:
+                if model:
+                    self._conn.execute("DELETE FROM embeddings WHERE model = ?", (model,))
+                else:
+                    self._conn.execute("DELETE FROM embeddings")
+                self._conn.commit()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """获取共享向量化服务实例"""
+    return EmbeddingService()
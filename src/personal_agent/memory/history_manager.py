@@ -4,12 +4,16 @@ History Manager - 历史记录管理器
 """
 import json
 import os
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, field, asdict
 from pathlib import Path
 from loguru import logger
 
+from .search_index import get_search_index
+from .conversation_archive import ConversationArchive
+
 
 @dataclass
 class HistoryMessage:
@@ -28,10 +32,25 @@ class HistoryMessage:
 
 
 class HistoryManager:
-    """历史记录管理器 - 持久化存储所有对话"""
+    """
+    历史记录管理器 - 持久化存储所有对话
+    
+    存储格式为只追加的 JSONL 日志（all_history.jsonl），每条消息一行：
+    1. 添加消息只追加一行，开销与历史总量无关
+    2. 加载时跳过崩溃导致的不完整行，并压缩重写日志
+    3. 压缩时先写临时文件再原子替换；设置 HISTORY_MAX_MESSAGES 时定期压缩并只保留最近的消息
+    4. 首次启动时自动迁移旧的 all_history.json
+    5. 超过 HISTORY_ARCHIVE_DAYS 天（默认 30）的消息在启动时移入压缩归档（archive/），
+       内存中只保留近期消息，更早的消息在翻页或搜索时按需读取
+    6. 归档和清理可能在工作线程中执行，对 self.messages 的修改和日志写入都在 _lock 内进行，
+       压缩不会丢掉同时追加的消息
+    """
     
     _instance = None
     
+    # 设置了保留条数时，超出部分累计达到该值才触发一次压缩
+    COMPACT_THRESHOLD = 1000
+    
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
@@ -47,37 +66,137 @@ class HistoryManager:
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(parents=True, exist_ok=True)
         
-        self.history_file = self.storage_path / "all_history.json"
+        self.history_file = self.storage_path / "all_history.jsonl"
+        self.legacy_file = self.storage_path / "all_history.json"
         self.messages: List[HistoryMessage] = []
+        self.max_messages = int(os.getenv("HISTORY_MAX_MESSAGES", "0") or 0)
+        self.archive_days = int(os.getenv("HISTORY_ARCHIVE_DAYS", "30") or 0)
+        self.archive = ConversationArchive(self.storage_path / "archive")
+        self._lock = threading.RLock()
+        self._log_lines = 0
         
         self._load()
+        self.archive_old()
+        self._sync_search_index()
         self._initialized = True
     
     def _load(self):
         """加载历史记录"""
-        if self.history_file.exists():
-            try:
-                with open(self.history_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.messages = [HistoryMessage.from_dict(m) for m in data.get("messages", [])]
-            except Exception as e:
-                logger.error(f"❌ 加载历史记录失败: {e}")
-                self.messages = []
-        else:
+        self.messages = []
+        self._log_lines = 0
+        
+        if not self.history_file.exists():
+            if self.legacy_file.exists():
+                self._migrate_legacy()
+            return
+        
+        skipped = 0
+        try:
+            with open(self.history_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    self._log_lines += 1
+                    try:
+                        self.messages.append(HistoryMessage.from_dict(json.loads(line)))
+                    except (ValueError, TypeError):
+                        skipped += 1
+        except Exception as e:
+            logger.error(f"❌ 加载历史记录失败: {e}")
+            return
+        
+        if skipped:
+            logger.warning(f"⚠️ 历史记录中有 {skipped} 行损坏，已跳过")
+            self.compact()
+    
+    def _migrate_legacy(self):
+        """把旧的 all_history.json 迁移为 JSONL 日志"""
+        try:
+            with open(self.legacy_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.messages = [HistoryMessage.from_dict(m) for m in data.get("messages", [])]
+        except Exception as e:
+            logger.error(f"❌ 加载历史记录失败: {e}")
             self.messages = []
+            return
+        
+        self.compact()
+        try:
+            os.replace(self.legacy_file, self.legacy_file.with_suffix(".json.bak"))
+        except OSError as e:
+            logger.warning(f"⚠️ 备份旧历史记录文件失败: {e}")
+        logger.info(f"📦 已迁移 {len(self.messages)} 条历史记录到 {self.history_file.name}")
+    
+    def _sync_search_index(self):
+        """全文索引缺失或落后时用归档和已加载的历史记录重建"""
+        index = get_search_index()
+        total = self.get_message_count()
+        if not index.available or index.count("history") >= total:
+            return
+        index.clear("history")
+        index.add_many("history", (
+            (m.get("role", ""), m.get("content", ""), m.get("session_id"), m.get("timestamp"))
+            for m in self.archive.iter_messages()
+        ))
+        index.add_many("history", [(m.role, m.content, m.session_id, m.timestamp) for m in self.messages])
+        logger.info(f"🔎 已为 {total} 条历史记录建立全文索引")
     
-    def _save(self):
-        """保存历史记录"""
+    def archive_old(self) -> int:
+        """
+        把超过 HISTORY_ARCHIVE_DAYS 天的消息移入压缩归档
+        
+        Returns:
+            归档的消息数
+        """
+        if self.archive_days <= 0:
+            return 0
+        cutoff = (datetime.now() - timedelta(days=self.archive_days)).isoformat()
+        with self._lock:
+            split = 0
+            while split < len(self.messages) and self.messages[split].timestamp < cutoff:
+                split += 1
+            old = self.messages[:split]
+        if not old:
+            return 0
+        
+        # 归档的压缩写入不持有锁，期间追加的新消息不受影响
+        self.archive.append([m.to_dict() for m in old])
+        archived = {id(m) for m in old}
+        with self._lock:
+            self.messages = [m for m in self.messages if id(m) not in archived]
+            self.compact()
+        logger.info(f"📦 已归档 {len(old)} 条 {self.archive_days} 天前的历史记录")
+        return len(old)
+    
+    def _append(self, message: HistoryMessage):
+        """追加一条消息到日志"""
+        line = json.dumps(message.to_dict(), ensure_ascii=False) + "\n"
         try:
-            data = {
-                "messages": [m.to_dict() for m in self.messages],
-                "updated_at": datetime.now().isoformat()
-            }
-            with open(self.history_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with self._lock:
+                with open(self.history_file, "a", encoding="utf-8") as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._log_lines += 1
         except Exception as e:
             logger.error(f"❌ 保存历史记录失败: {e}")
     
+    def compact(self):
+        """压缩日志：按内存中的消息重写（临时文件 + 原子替换）"""
+        tmp_file = self.history_file.with_suffix(".jsonl.tmp")
+        try:
+            with self._lock:
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    for message in self.messages:
+                        f.write(json.dumps(message.to_dict(), ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.history_file)
+                self._log_lines = len(self.messages)
+        except Exception as e:
+            logger.error(f"❌ 压缩历史记录失败: {e}")
+    
     def add_message(self, role: str, content: str, session_id: str = "default"):
         """添加消息到历史记录"""
         message = HistoryMessage(
@@ -85,20 +204,49 @@ class HistoryManager:
             content=content,
             session_id=session_id
         )
-        self.messages.append(message)
-        self._save()
+        with self._lock:
+            self.messages.append(message)
+            self._append(message)
+            if self.max_messages and len(self.messages) >= self.max_messages + self.COMPACT_THRESHOLD:
+                self.messages = self.messages[-self.max_messages:]
+                self.compact()
+        get_search_index().add("history", content, role, session_id, message.timestamp)
         logger.debug(f"📝 已添加历史记录: [{role}] {content[:50]}...")
     
     def get_history(self, limit: int = 50) -> List[Dict]:
-        """获取历史记录（用于 LLM 上下文）"""
-        if not self.messages:
-            return []
-        
+        """获取历史记录（用于 LLM 上下文），内存中不足 limit 条时从归档补充"""
         recent = self.messages[-limit:] if limit else self.messages
-        return [
+        history = [
             {"role": m.role, "content": m.content, "timestamp": m.timestamp}
             for m in recent
         ]
+        missing = (limit - len(history)) if limit else self.archive.count()
+        if missing > 0 and self.archive.count():
+            older = self.archive.page(limit=missing)
+            history = [
+                {"role": m.get("role", ""), "content": m.get("content", ""), "timestamp": m.get("timestamp", "")}
+                for m in older
+            ] + history
+        return history
+    
+    def load_page(self, before: int = None, limit: int = 50) -> List[Dict]:
+        """
+        按位置分页读取历史记录（向前翻页时使用）
+        
+        位置从最早的归档消息开始计数，内存中的消息排在归档之后
+        
+        Args:
+            before: 返回位置在 before 之前的消息，默认从最新处开始
+            limit: 条数
+        """
+        archived = self.archive.count()
+        total = archived + len(self.messages)
+        before = total if before is None else min(before, total)
+        start = max(0, before - limit)
+        
+        page = self.archive.get_range(start, min(before, archived)) if start < archived else []
+        page += [m.to_dict() for m in self.messages[max(0, start - archived):max(0, before - archived)]]
+        return page
     
     def get_history_text(self, limit: int = 30) -> str:
         """获取历史记录文本（用于 LLM 提示）"""
@@ -115,10 +263,36 @@ class HistoryManager:
         
         return "\n".join(lines)
     
-    def search_in_history(self, keyword: str, limit: int = 10) -> List[Dict]:
-        """在历史记录中搜索"""
+    def search_in_history(self, keyword: str, limit: int = 10, session_id: str = None,
+                          start: str = None, end: str = None) -> List[Dict]:
+        """
+        在历史记录中搜索（全文索引，按相关度排序）
+        
+        Args:
+            keyword: 查询文本
+            limit: 返回条数
+            session_id: 只搜索指定会话
+            start / end: 时间范围（ISO 格式）
+        """
+        index = get_search_index()
+        if index.available:
+            return [
+                {
+                    "role": r["role"],
+                    "content": r["content"],
+                    "timestamp": r["timestamp"],
+                    "snippet": r["snippet"],
+                }
+                for r in index.search(keyword, limit=limit, source="history",
+                                      session_id=session_id, start=start, end=end)
+            ]
+        
         results = []
         for msg in reversed(self.messages):
+            if session_id and msg.session_id != session_id:
+                continue
+            if (start and msg.timestamp < start) or (end and msg.timestamp > end):
+                continue
             if keyword.lower() in msg.content.lower():
                 results.append({
                     "role": msg.role,
@@ -127,16 +301,46 @@ class HistoryManager:
                 })
                 if len(results) >= limit:
                     break
+        if len(results) < limit:
+            results += [
+                {"role": m.get("role", ""), "content": m.get("content", ""), "timestamp": m.get("timestamp", "")}
+                for m in self.archive.search(keyword, limit - len(results), session_id, start, end)
+            ]
         return results
     
     def get_message_count(self) -> int:
-        """获取消息总数"""
-        return len(self.messages)
+        """获取消息总数（含归档）"""
+        return len(self.messages) + self.archive.count()
+    
+    def prune_before(self, cutoff: str) -> List[HistoryMessage]:
+        """
+        删除早于 cutoff（ISO 时间）的消息，同步压缩日志和全文索引
+        
+        Returns:
+            被删除的消息
+        """
+        removed = [HistoryMessage.from_dict(m) for m in self.archive.drop_before(cutoff)]
+        with self._lock:
+            live = [m for m in self.messages if m.timestamp < cutoff]
+            if live:
+                self.messages = [m for m in self.messages if m.timestamp >= cutoff]
+                self.compact()
+        removed += live
+        if not removed:
+            return []
+        get_search_index().delete_before("history", cutoff)
+        logger.info(f"🧹 已清理 {len(removed)} 条 {cutoff[:10]} 之前的历史记录")
+        return removed
     
     def clear_all(self):
         """清空所有历史记录（慎用）"""
-        self.messages.clear()
-        self._save()
+        with self._lock:
+            self.messages.clear()
+            self.compact()
+        self.archive.clear()
+        get_search_index().clear("history")
+        from .context_builder import get_context_builder
+        get_context_builder().reset_summary()
         logger.warning("⚠️ 所有历史记录已清空")
 
 
@@ -1,80 +1,264 @@
 """
 Long-term Memory - Vector-based persistent memory
+
+Memories are stored immediately and embedded by a background indexer in
+batches, so callers never wait on the embedding model. Items are searchable
+by substring while pending and by vector once indexed. The backing store is
+an append-only operation log that is compacted on load.
 """
+import asyncio
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 import json
 import aiofiles
+from loguru import logger
 
 from .base import BaseMemory, MemoryItem
+from .embedding_service import get_embedding_service
 
 
 class LongTermMemory(BaseMemory):
+    BATCH_SIZE = 32
+    BATCH_WINDOW = 0.2
+
     def __init__(
         self,
         db_path: Path,
         collection_name: str = "agent_memory",
-        embedding_model: str = "all-MiniLM-L6-v2"
+        embedding_model: Optional[str] = None
     ):
         self.db_path = db_path
         self.collection_name = collection_name
         self.embedding_model = embedding_model
         self._collection = None
         self._embedding_function = None
-        self._memory_file = db_path / "memory_store.json"
+        self._local_index = False
+        self._legacy_file = db_path / "memory_store.json"
+        self._memory_file = db_path / "memory_store.jsonl"
         self._memories: Dict[str, MemoryItem] = {}
+        self._initialized = False
+        self._init_lock: Optional[asyncio.Lock] = None
+
+        self._pending: Dict[str, None] = {}
+        self._pending_event: Optional[asyncio.Event] = None
+        self._idle_event: Optional[asyncio.Event] = None
+        self._indexer: Optional[asyncio.Task] = None
+        self._log_lock: Optional[asyncio.Lock] = None
+        self._index_stats = {
+            "indexed": 0,
+            "batches": 0,
+            "failed": 0,
+            "last_batch_size": 0,
+            "last_batch_ms": None,
+        }
 
     async def _initialize(self):
-        if self._collection is not None:
+        if self._initialized:
             return
-
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        async with self._init_lock:
+            if self._initialized:
+                return
+
+            self._pending_event = asyncio.Event()
+            self._idle_event = asyncio.Event()
+            self._idle_event.set()
+            self._log_lock = asyncio.Lock()
+
+            # The shared embedding service loads the model on first use
+            embedding_service = get_embedding_service()
+            if embedding_service.available:
+                self.db_path.mkdir(parents=True, exist_ok=True)
+                self._embedding_function = embedding_service
+                self._collection = self._open_collection()
+
+            await self._load_memories()
+            self._initialized = True
+
+    def _open_collection(self):
         try:
             import chromadb
             from chromadb.config import Settings
-            from sentence_transformers import SentenceTransformer
-
-            self.db_path.mkdir(parents=True, exist_ok=True)
 
             client = chromadb.PersistentClient(
                 path=str(self.db_path),
                 settings=Settings(anonymized_telemetry=False)
             )
+            return client.get_or_create_collection(name=self.collection_name)
+        except Exception as e:
+            reason = "未安装" if isinstance(e, ImportError) else e
+            logger.info(f"ℹ️ chromadb 不可用（{reason}），使用本地向量索引")
 
-            self._collection = client.get_or_create_collection(
-                name=self.collection_name
-            )
-
-            self._embedding_function = SentenceTransformer(self.embedding_model)
-
-        except ImportError:
-            pass
-
-        await self._load_memories()
+        try:
+            from .vector_index import LocalVectorIndex
+            collection = LocalVectorIndex(self.db_path / "local_index")
+            self._local_index = True
+            return collection
+        except Exception as e:
+            logger.warning(f"⚠️ 本地向量索引不可用，长期记忆退回子串匹配: {e}")
+            return None
 
     async def _load_memories(self):
+        unindexed = set()
+        operations = 0
+
         if self._memory_file.exists():
             async with aiofiles.open(self._memory_file, "r", encoding="utf-8") as f:
-                content = await f.read()
-                data = json.loads(content)
-                for id, item_data in data.items():
-                    self._memories[id] = MemoryItem.from_dict(item_data)
+                async for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    operations += 1
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        continue
+                    if op["op"] == "put":
+                        self._memories[op["id"]] = MemoryItem.from_dict(op["item"])
+                        unindexed.add(op["id"])
+                    elif op["op"] == "indexed":
+                        unindexed.difference_update(op["ids"])
+                    elif op["op"] == "delete":
+                        self._memories.pop(op["id"], None)
+                        unindexed.discard(op["id"])
+        elif self._legacy_file.exists():
+            async with aiofiles.open(self._legacy_file, "r", encoding="utf-8") as f:
+                data = json.loads(await f.read())
+            for id, item_data in data.items():
+                self._memories[id] = MemoryItem.from_dict(item_data)
+            operations = len(self._memories) + 1
+
+        if operations > len(self._memories):
+            await self._compact(unindexed)
 
-    async def _save_memories(self):
+        if self._collection is not None:
+            if self._local_index:
+                # Memories indexed by chromadb before the fallback need re-embedding
+                unindexed.update(id for id in self._memories if id not in self._collection)
+            for memory_id in unindexed:
+                self._enqueue(memory_id)
+
+    async def _compact(self, unindexed: set):
+        self.db_path.mkdir(parents=True, exist_ok=True)
+        lines = [
+            json.dumps({"op": "put", "id": id, "item": item.to_dict()}, ensure_ascii=False)
+            for id, item in self._memories.items()
+        ]
+        indexed = [id for id in self._memories if id not in unindexed]
+        if indexed:
+            lines.append(json.dumps({"op": "indexed", "ids": indexed}))
+
+        tmp_file = self._memory_file.with_suffix(".jsonl.tmp")
+        async with aiofiles.open(tmp_file, "w", encoding="utf-8") as f:
+            await f.write("".join(line + "\n" for line in lines))
+        tmp_file.replace(self._memory_file)
+
+    async def _append_log(self, *ops: Dict[str, Any]):
         self.db_path.mkdir(parents=True, exist_ok=True)
-        data = {id: item.to_dict() for id, item in self._memories.items()}
-        async with aiofiles.open(self._memory_file, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(data, ensure_ascii=False, indent=2))
+        async with self._log_lock:
+            async with aiofiles.open(self._memory_file, "a", encoding="utf-8") as f:
+                await f.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
 
     def _generate_embedding(self, text: str) -> List[float]:
         if self._embedding_function:
-            return self._embedding_function.encode(text).tolist()
+            return self._embedding_function.embed(text, self.embedding_model)
+        return []
+
+    def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if self._embedding_function:
+            return self._embedding_function.encode(texts, self.embedding_model)
         return []
 
     def _generate_id(self) -> str:
         import uuid
         return str(uuid.uuid4())
 
+    def _enqueue(self, memory_id: str):
+        self._pending[memory_id] = None
+        self._idle_event.clear()
+        self._pending_event.set()
+        if self._indexer is None or self._indexer.done():
+            self._indexer = asyncio.create_task(self._index_loop())
+
+    async def _index_loop(self):
+        while True:
+            if not self._pending:
+                self._idle_event.set()
+                self._pending_event.clear()
+                await self._pending_event.wait()
+
+            # Give bursts of adds a moment to accumulate into one batch
+            if len(self._pending) < self.BATCH_SIZE:
+                await asyncio.sleep(self.BATCH_WINDOW)
+
+            batch_ids = list(self._pending)[:self.BATCH_SIZE]
+            for id in batch_ids:
+                del self._pending[id]
+            batch_ids = [id for id in batch_ids if id in self._memories]
+            if not batch_ids:
+                continue
+
+            try:
+                await self._index_batch(batch_ids)
+            except Exception as e:
+                self._index_stats["failed"] += len(batch_ids)
+                logger.warning(f"⚠️ 长期记忆批量索引失败 ({len(batch_ids)} 条): {e}")
+
+    async def _index_batch(self, batch_ids: List[str]):
+        started = time.perf_counter()
+        items = [self._memories[id] for id in batch_ids]
+        embeddings = await asyncio.to_thread(self._generate_embeddings, [item.content for item in items])
+
+        # Items deleted or updated while embedding are skipped; updates are re-queued
+        live = [
+            (id, item, embedding) for id, item, embedding in zip(batch_ids, items, embeddings)
+            if self._memories.get(id) is item
+        ]
+        if live:
+            self._collection.upsert(
+                ids=[id for id, _, _ in live],
+                embeddings=[embedding for _, _, embedding in live],
+                documents=[item.content for _, item, _ in live],
+                metadatas=[item.metadata for _, item, _ in live]
+            )
+            for _, item, embedding in live:
+                item.embedding = embedding
+            await self._append_log({"op": "indexed", "ids": [id for id, _, _ in live]})
+
+        self._index_stats["indexed"] += len(live)
+        self._index_stats["batches"] += 1
+        self._index_stats["last_batch_size"] = len(live)
+        self._index_stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def get_index_stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "total": len(self._memories),
+            "vector_enabled": self._collection is not None,
+            "vector_backend": "local" if self._local_index else ("chromadb" if self._collection is not None else None),
+            **self._index_stats,
+        }
+
+    async def wait_until_indexed(self, timeout: Optional[float] = None) -> bool:
+        await self._initialize()
+        if not self._pending or self._collection is None:
+            return True
+        try:
+            await asyncio.wait_for(self._idle_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _prepare(self, item: MemoryItem, metadata: Optional[Dict[str, Any]]) -> str:
+        memory_id = self._generate_id()
+        item.metadata.update(metadata or {})
+        item.metadata["created_at"] = datetime.now().isoformat()
+        self._memories[memory_id] = item
+        return memory_id
+
     async def add(
         self,
         item: MemoryItem,
@@ -82,26 +266,30 @@ class LongTermMemory(BaseMemory):
     ) -> str:
         await self._initialize()
 
-        memory_id = self._generate_id()
-        item.metadata.update(metadata or {})
-        item.metadata["created_at"] = datetime.now().isoformat()
-
+        memory_id = self._prepare(item, metadata)
+        await self._append_log({"op": "put", "id": memory_id, "item": item.to_dict()})
         if self._collection is not None:
-            embedding = self._generate_embedding(item.content)
-            if embedding:
-                self._collection.add(
-                    ids=[memory_id],
-                    embeddings=[embedding],
-                    documents=[item.content],
-                    metadatas=[item.metadata]
-                )
-            item.embedding = embedding
-
-        self._memories[memory_id] = item
-        await self._save_memories()
+            self._enqueue(memory_id)
 
         return memory_id
 
+    async def add_many(
+        self,
+        items: List[MemoryItem],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        await self._initialize()
+
+        ids = [self._prepare(item, metadata) for item in items]
+        await self._append_log(*(
+            {"op": "put", "id": id, "item": item.to_dict()} for id, item in zip(ids, items)
+        ))
+        if self._collection is not None:
+            for memory_id in ids:
+                self._enqueue(memory_id)
+
+        return ids
+
     async def get(self, id: str) -> Optional[MemoryItem]:
         await self._initialize()
         return self._memories.get(id)
@@ -111,12 +299,12 @@ class LongTermMemory(BaseMemory):
 
         results = []
 
-        if self._collection is not None:
-            query_embedding = self._generate_embedding(query)
+        if self._collection is not None and self._collection.count() > 0:
+            query_embedding = await asyncio.to_thread(self._generate_embedding, query)
             if query_embedding:
                 search_results = self._collection.query(
                     query_embeddings=[query_embedding],
-                    n_results=limit
+                    n_results=min(limit, self._collection.count())
                 )
 
                 if search_results["ids"] and search_results["ids"][0]:
@@ -129,13 +317,17 @@ class LongTermMemory(BaseMemory):
                                 metadata=search_results["metadatas"][0][i] if search_results["metadatas"] else {}
                             ))
 
-        if not results:
-            query_lower = query.lower()
-            for item in self._memories.values():
-                if query_lower in item.content.lower():
-                    results.append(item)
-                    if len(results) >= limit:
-                        break
+        # Items still waiting for the indexer are matched by substring
+        query_lower = query.lower()
+        candidates = (
+            [self._memories[id] for id in self._pending if id in self._memories]
+            if results else self._memories.values()
+        )
+        for item in candidates:
+            if query_lower in item.content.lower() and item not in results:
+                results.append(item)
+                if len(results) >= limit:
+                    break
 
         return results[:limit]
 
@@ -146,24 +338,49 @@ class LongTermMemory(BaseMemory):
             if self._memories:
                 self._collection.delete(ids=list(self._memories.keys()))
 
+        self._pending.clear()
         self._memories.clear()
-        await self._save_memories()
+        await self._compact(set())
 
     async def get_all(self) -> List[MemoryItem]:
         await self._initialize()
         return list(self._memories.values())
 
+    async def items(self) -> Dict[str, MemoryItem]:
+        """All memories keyed by id (a snapshot copy)."""
+        await self._initialize()
+        return dict(self._memories)
+
+    async def delete_many(self, memory_ids: List[str]) -> List[MemoryItem]:
+        """Delete several memories with one index call and rewrite the log once."""
+        await self._initialize()
+
+        ids = [id for id in dict.fromkeys(memory_ids) if id in self._memories]
+        if not ids:
+            return []
+
+        for memory_id in ids:
+            self._pending.pop(memory_id, None)
+        if self._collection is not None:
+            self._collection.delete(ids=ids)
+
+        removed = [self._memories.pop(memory_id) for memory_id in ids]
+        async with self._log_lock:
+            await self._compact(set(self._pending))
+        return removed
+
     async def delete(self, memory_id: str) -> bool:
         await self._initialize()
 
         if memory_id not in self._memories:
             return False
 
+        self._pending.pop(memory_id, None)
         if self._collection is not None:
             self._collection.delete(ids=[memory_id])
 
         del self._memories[memory_id]
-        await self._save_memories()
+        await self._append_log({"op": "delete", "id": memory_id})
         return True
 
     async def update(self, memory_id: str, content: str) -> bool:
@@ -179,17 +396,8 @@ class LongTermMemory(BaseMemory):
             timestamp=datetime.now()
         )
 
-        if self._collection is not None:
-            embedding = self._generate_embedding(content)
-            if embedding:
-                self._collection.update(
-                    ids=[memory_id],
-                    embeddings=[embedding],
-                    documents=[content],
-                    metadatas=[new_item.metadata]
-                )
-            new_item.embedding = embedding
-
         self._memories[memory_id] = new_item
-        await self._save_memories()
+        await self._append_log({"op": "put", "id": memory_id, "item": new_item.to_dict()})
+        if self._collection is not None:
+            self._enqueue(memory_id)
         return True
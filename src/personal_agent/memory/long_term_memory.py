@@ -3,13 +3,14 @@ Long-term Memory System - 长期记忆系统
 永久保存用户信息、对话历史和重要事件
 """
 import json
-import sqlite3
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass, asdict
 from loguru import logger
 from pathlib import Path
 
+from ..utils.sqlite_pool import get_sqlite_pool
+
 
 @dataclass
 class UserProfile:
@@ -71,20 +72,18 @@ class UserInsight:
 
 
 class LongTermMemory:
-    """长期记忆系统"""
+    """长期记忆系统（通过共享 SQLite 连接池访问，WAL 模式）"""
 
     def __init__(self, db_path: str = "long_term_memory.db"):
         self.db_path = db_path
+        self._db = get_sqlite_pool(db_path)
         self._init_database()
         logger.info(f"🧠 长期记忆系统已初始化: {db_path}")
 
     def _init_database(self):
         """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # 用户档案表
-        cursor.execute("""
+        self._db.executescript("""
+            -- 用户档案表
             CREATE TABLE IF NOT EXISTS user_profiles (
                 user_id TEXT PRIMARY KEY,
                 name TEXT,
@@ -96,11 +95,9 @@ class LongTermMemory:
                 preferences TEXT,
                 created_at TEXT,
                 updated_at TEXT
-            )
-        """)
+            );
 
-        # 重要事件表
-        cursor.execute("""
+            -- 重要事件表
             CREATE TABLE IF NOT EXISTS important_events (
                 event_id TEXT PRIMARY KEY,
                 user_id TEXT,
@@ -112,11 +109,9 @@ class LongTermMemory:
                 recurring_type TEXT,
                 created_at TEXT,
                 FOREIGN KEY (user_id) REFERENCES user_profiles(user_id)
-            )
-        """)
+            );
 
-        # 用户洞察表
-        cursor.execute("""
+            -- 用户洞察表
             CREATE TABLE IF NOT EXISTS user_insights (
                 insight_id TEXT PRIMARY KEY,
                 user_id TEXT,
@@ -126,11 +121,9 @@ class LongTermMemory:
                 created_at TEXT,
                 updated_at TEXT,
                 FOREIGN KEY (user_id) REFERENCES user_profiles(user_id)
-            )
-        """)
+            );
 
-        # 对话历史表
-        cursor.execute("""
+            -- 对话历史表
             CREATE TABLE IF NOT EXISTS conversation_history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id TEXT,
@@ -139,21 +132,19 @@ class LongTermMemory:
                 content TEXT,
                 timestamp TEXT,
                 FOREIGN KEY (user_id) REFERENCES user_profiles(user_id)
-            )
-        """)
+            );
 
-        conn.commit()
-        conn.close()
+            CREATE INDEX IF NOT EXISTS idx_events_user_date ON important_events(user_id, event_date);
+            CREATE INDEX IF NOT EXISTS idx_insights_user_updated ON user_insights(user_id, updated_at);
+            CREATE INDEX IF NOT EXISTS idx_conversation_user_time ON conversation_history(user_id, timestamp);
+        """)
 
     def save_user_profile(self, profile: UserProfile) -> bool:
         """保存用户档案"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
             profile.updated_at = datetime.now().isoformat()
 
-            cursor.execute("""
+            self._db.execute("""
                 INSERT OR REPLACE INTO user_profiles
                 (user_id, name, email, phone, city, address, birthday, preferences, created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -170,8 +161,6 @@ class LongTermMemory:
                 profile.updated_at
             ))
 
-            conn.commit()
-            conn.close()
             logger.info(f"💾 用户档案已保存: {profile.name}")
             return True
         except Exception as e:
@@ -181,13 +170,7 @@ class LongTermMemory:
     def get_user_profile(self, user_id: str) -> Optional[UserProfile]:
         """获取用户档案"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute("SELECT * FROM user_profiles WHERE user_id = ?", (user_id,))
-            row = cursor.fetchone()
-
-            conn.close()
+            row = self._db.fetchone("SELECT * FROM user_profiles WHERE user_id = ?", (user_id,))
 
             if row:
                 return UserProfile(
@@ -210,10 +193,7 @@ class LongTermMemory:
     def save_important_event(self, event: ImportantEvent) -> bool:
         """保存重要事件"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute("""
+            self._db.execute("""
                 INSERT OR REPLACE INTO important_events
                 (event_id, user_id, event_type, event_date, title, description, is_recurring, recurring_type, created_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -229,8 +209,6 @@ class LongTermMemory:
                 event.created_at
             ))
 
-            conn.commit()
-            conn.close()
             logger.info(f"📅 重要事件已保存: {event.title}")
             return True
         except Exception as e:
@@ -240,19 +218,13 @@ class LongTermMemory:
     def get_upcoming_events(self, user_id: str, days: int = 7) -> List[ImportantEvent]:
         """获取即将到来的事件"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
             today = datetime.now().strftime('%Y-%m-%d')
-            cursor.execute("""
+            rows = self._db.fetchall("""
                 SELECT * FROM important_events
                 WHERE user_id = ? AND event_date >= ? AND event_date <= date('now', '+' || ? || ' days')
                 ORDER BY event_date
             """, (user_id, today, days))
 
-            rows = cursor.fetchall()
-            conn.close()
-
             events = []
             for row in rows:
                 events.append(ImportantEvent(
@@ -275,12 +247,9 @@ class LongTermMemory:
     def save_user_insight(self, insight: UserInsight) -> bool:
         """保存用户洞察"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
             insight.updated_at = datetime.now().isoformat()
 
-            cursor.execute("""
+            self._db.execute("""
                 INSERT OR REPLACE INTO user_insights
                 (insight_id, user_id, insight_type, content, confidence, created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -294,8 +263,6 @@ class LongTermMemory:
                 insight.updated_at
             ))
 
-            conn.commit()
-            conn.close()
             logger.info(f"💡 用户洞察已保存: {insight.content[:50]}...")
             return True
         except Exception as e:
@@ -305,24 +272,18 @@ class LongTermMemory:
     def get_user_insights(self, user_id: str, insight_type: Optional[str] = None) -> List[UserInsight]:
         """获取用户洞察"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
             if insight_type:
-                cursor.execute("""
+                rows = self._db.fetchall("""
                     SELECT * FROM user_insights
                     WHERE user_id = ? AND insight_type = ?
                     ORDER BY updated_at DESC
                 """, (user_id, insight_type))
             else:
-                cursor.execute("""
+                rows = self._db.fetchall("""
                     SELECT * FROM user_insights
                     WHERE user_id = ?
                     ORDER BY updated_at DESC
-                """, (user_id))
-
-            rows = cursor.fetchall()
-            conn.close()
+                """, (user_id,))
 
             insights = []
             for row in rows:
@@ -344,10 +305,7 @@ class LongTermMemory:
     def save_conversation(self, user_id: str, conversation_id: str, role: str, content: str):
         """保存对话历史"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute("""
+            self._db.execute("""
                 INSERT INTO conversation_history
                 (user_id, conversation_id, role, content, timestamp)
                 VALUES (?, ?, ?, ?, ?)
@@ -358,19 +316,28 @@ class LongTermMemory:
                 content,
                 datetime.now().isoformat()
             ))
-
-            conn.commit()
-            conn.close()
         except Exception as e:
             logger.error(f"❌ 保存对话历史失败: {e}")
 
+    def save_conversations(self, user_id: str, conversation_id: str, messages: List[Dict[str, str]]):
+        """批量保存对话历史（一个事务提交）"""
+        try:
+            now = datetime.now().isoformat()
+            self._db.executemany("""
+                INSERT INTO conversation_history
+                (user_id, conversation_id, role, content, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (user_id, conversation_id, m.get("role", ""), m.get("content", ""), m.get("timestamp") or now)
+                for m in messages
+            ])
+        except Exception as e:
+            logger.error(f"❌ 批量保存对话历史失败: {e}")
+
     def get_conversation_history(self, user_id: str, limit: int = 100) -> List[Dict]:
         """获取对话历史"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute("""
+            rows = self._db.fetchall("""
                 SELECT role, content, timestamp
                 FROM conversation_history
                 WHERE user_id = ?
@@ -378,9 +345,6 @@ class LongTermMemory:
                 LIMIT ?
             """, (user_id, limit))
 
-            rows = cursor.fetchall()
-            conn.close()
-
             return [
                 {
                     "role": row[0],
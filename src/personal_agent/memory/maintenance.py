@@ -0,0 +1,504 @@
+"""
+Memory Maintenance - 记忆整理任务
+
+各记忆存储只增不减，重复的事实越积越多、文件越来越大。整理任务在本地定期运行：
+1. 近似重复检测：文本 simhash（字符 3-gram，中英文通用）；长期记忆在向量可用时同时比较余弦相似度
+2. 合并重复项：每组保留信息最多 / 优先级最高的一条，其余删除
+3. 保留与衰减策略：过期的低优先级笔记、已过去的一次性事件、长期未更新的低置信度偏好、超期的长期记忆和历史记录
+4. 删除的条目按月归档到 data/memory_archive/YYYY-MM.jsonl.gz，需要时可以找回
+5. 每次运行生成报告（各存储清理条数、磁盘回收字节数），保存在 last_report.json
+
+用法：
+    from .maintenance import get_memory_maintenance
+    maintenance = get_memory_maintenance()
+    maintenance.start()                  # 后台定期运行
+    report = await maintenance.run_once()
+
+环境变量：
+    MEMORY_MAINTENANCE_INTERVAL_HOURS   运行间隔小时数（默认 24，0 表示不自动运行）
+    MEMORY_MAINTENANCE_DELAY_MINUTES    启动后首次运行的最短延迟（默认 10）
+    MEMORY_DUPLICATE_DISTANCE           simhash 判重的最大汉明距离（默认 3）
+    MEMORY_DUPLICATE_COSINE             向量判重的最小余弦相似度（默认 0.95）
+    MEMORY_NOTE_RETENTION_DAYS          优先级 ≤ 3 的笔记保留天数（默认 180）
+    MEMORY_EVENT_RETENTION_DAYS         已过去的一次性事件保留天数（默认 365）
+    MEMORY_PREFERENCE_STALE_DAYS        置信度 < 0.3 的偏好多久未更新视为过时（默认 180）
+    MEMORY_LONG_TERM_RETENTION_DAYS     长期记忆保留天数（默认 0，不限）
+    HISTORY_RETENTION_DAYS              历史记录保留天数（默认 0，不限）
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+import weakref
+from collections import Counter
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from loguru import logger
+
+from ..scheduler.job_scheduler import get_job_scheduler
+
+
+SIMHASH_BITS = 64
+
+
+def _env_number(name: str, default):
+    try:
+        return type(default)(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def simhash(text: str) -> int:
+    """64 位 simhash 指纹（字符 3-gram 加权）"""
+    text = re.sub(r"[\W_]+", " ", text.lower()).strip()
+    grams = Counter(text[i:i + 3] for i in range(len(text) - 2)) if len(text) > 3 else Counter([text])
+    weights = [0] * SIMHASH_BITS
+    for gram, count in grams.items():
+        h = int.from_bytes(hashlib.md5(gram.encode("utf-8")).digest()[:8], "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if h >> bit & 1 else -count
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def find_duplicates(
+    texts: Sequence[str],
+    max_distance: int = 3,
+    vectors: Optional[Sequence[Sequence[float]]] = None,
+    min_cosine: float = 0.95
+) -> List[List[int]]:
+    """
+    查找近似重复的文本
+
+    指纹分成 max_distance + 1 段，汉明距离不超过 max_distance 的两个指纹至少有一段完全相同，
+    因此只需比较同段相同的候选对；提供 vectors 时，余弦相似度不低于 min_cosine 的也视为重复
+
+    Returns:
+        下标分组，每组至少两个
+    """
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int):
+        a, b = find(i), find(j)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    fingerprints = [simhash(text) for text in texts]
+    bands = max_distance + 1
+    width = SIMHASH_BITS // bands
+    buckets: Dict[tuple, List[int]] = {}
+    for i, fp in enumerate(fingerprints):
+        for band in range(bands):
+            mask = (1 << (SIMHASH_BITS - band * width if band == bands - 1 else width)) - 1
+            buckets.setdefault((band, fp >> (band * width) & mask), []).append(i)
+    for members in buckets.values():
+        for x, i in enumerate(members):
+            for j in members[x + 1:]:
+                if find(i) != find(j) and hamming(fingerprints[i], fingerprints[j]) <= max_distance:
+                    union(i, j)
+
+    if vectors and len(vectors) == len(texts):
+        try:
+            import numpy as np
+
+            matrix = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+            for start in range(0, len(matrix), 512):
+                scores = matrix[start:start + 512] @ matrix.T
+                for row, col in zip(*np.nonzero(scores >= min_cosine)):
+                    i = start + int(row)
+                    if i < col:
+                        union(i, int(col))
+        except (ImportError, ValueError) as e:
+            logger.debug(f"向量判重跳过: {e}")
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        groups.setdefault(find(i), []).append(i)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def _grouped_duplicates(texts: Sequence[str], keys: Sequence[Any], max_distance: int) -> List[List[int]]:
+    """只在 key 相同（如同一分类）的条目之间查找重复"""
+    by_key: Dict[Any, List[int]] = {}
+    for i, key in enumerate(keys):
+        by_key.setdefault(key, []).append(i)
+    groups = []
+    for indexes in by_key.values():
+        if len(indexes) > 1:
+            for group in find_duplicates([texts[i] for i in indexes], max_distance):
+                groups.append([indexes[i] for i in group])
+    return groups
+
+
+def _path_size(path: Path) -> int:
+    """文件或目录占用的字节数"""
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    if path.is_dir():
+        return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+    return 0
+
+
+class MemoryArchive:
+    """按月归档被整理掉的记忆（gzip 压缩的 JSONL，只追加）"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def write(self, store: str, reason: str, items: List[Dict[str, Any]]) -> int:
+        if not items:
+            return 0
+        self.path.mkdir(parents=True, exist_ok=True)
+        archived_at = datetime.now().isoformat()
+        lines = "".join(
+            json.dumps({"store": store, "reason": reason, "archived_at": archived_at, "item": item},
+                       ensure_ascii=False, default=str) + "\n"
+            for item in items
+        )
+        with gzip.open(self.path / f"{datetime.now():%Y-%m}.jsonl.gz", "at", encoding="utf-8") as f:
+            f.write(lines)
+        return len(items)
+
+    def read(self, month: str = None, store: str = None) -> Iterator[Dict[str, Any]]:
+        """读取归档记录（month 形如 2024-05，默认全部）"""
+        pattern = f"{month}.jsonl.gz" if month else "*.jsonl.gz"
+        for file in sorted(self.path.glob(pattern)):
+            with gzip.open(file, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if store is None or record["store"] == store:
+                        yield record
+
+
+class MemoryMaintenance:
+    """
+    记忆整理任务
+
+    默认整理 UnifiedMemory、全局 EnhancedMemoryManager 和历史记录；
+    MemoryManager 创建时会登记自己的长期记忆和增强记忆
+    """
+
+    INSTANCE = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls.INSTANCE is None:
+            cls.INSTANCE = super().__new__(cls)
+        return cls.INSTANCE
+
+    def __init__(self, archive_path: str = None):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+
+        if archive_path is None:
+            archive_path = os.path.join(os.getcwd(), "data", "memory_archive")
+
+        self.archive = MemoryArchive(Path(archive_path))
+        self.report_file = Path(archive_path) / "last_report.json"
+
+        self.interval_hours = _env_number("MEMORY_MAINTENANCE_INTERVAL_HOURS", 24.0)
+        self.delay_minutes = _env_number("MEMORY_MAINTENANCE_DELAY_MINUTES", 10.0)
+        self.max_distance = _env_number("MEMORY_DUPLICATE_DISTANCE", 3)
+        self.min_cosine = _env_number("MEMORY_DUPLICATE_COSINE", 0.95)
+        self.note_retention_days = _env_number("MEMORY_NOTE_RETENTION_DAYS", 180)
+        self.event_retention_days = _env_number("MEMORY_EVENT_RETENTION_DAYS", 365)
+        self.preference_stale_days = _env_number("MEMORY_PREFERENCE_STALE_DAYS", 180)
+        self.long_term_retention_days = _env_number("MEMORY_LONG_TERM_RETENTION_DAYS", 0)
+        self.history_retention_days = _env_number("HISTORY_RETENTION_DAYS", 0)
+
+        self._vector_stores: "weakref.WeakValueDictionary[str, Any]" = weakref.WeakValueDictionary()
+        self._enhanced: "weakref.WeakValueDictionary[str, Any]" = weakref.WeakValueDictionary()
+        self._running = False
+        self._lock: Optional[asyncio.Lock] = None
+        self.last_report: Optional[Dict[str, Any]] = self._load_report()
+
+        self._initialized = True
+
+    def _load_report(self) -> Optional[Dict[str, Any]]:
+        if not self.report_file.exists():
+            return None
+        try:
+            with open(self.report_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def register_vector_store(self, name: str, store):
+        """登记一个 LongTermMemory（按名称去重，存储被回收后自动注销）"""
+        self._vector_stores[name] = store
+
+    def register_enhanced(self, name: str, manager):
+        """登记一个 EnhancedMemoryManager"""
+        self._enhanced[name] = manager
+
+    def start(self):
+        """启动后台定期整理（注册到后台任务调度器）"""
+        if self._running or self.interval_hours <= 0:
+            return
+        self._running = True
+        get_job_scheduler().add_job(
+            self.run_once,
+            job_id="memory_maintenance",
+            trigger="interval",
+            seconds=self.interval_hours * 3600,
+            name="记忆整理",
+            first_run_delay=self._initial_delay(),
+            jitter=300,
+            persistent=True,
+        )
+        logger.info(f"🧹 记忆整理任务已启动，每 {self.interval_hours:g} 小时运行一次")
+
+    async def stop(self):
+        """停止后台整理"""
+        self._running = False
+        get_job_scheduler().remove_job("memory_maintenance")
+
+    def _initial_delay(self) -> float:
+        """距离下次应运行的秒数（重启不会导致频繁重复整理）"""
+        delay = self.delay_minutes * 60
+        if self.last_report and self.last_report.get("finished_at"):
+            try:
+                finished = datetime.fromisoformat(self.last_report["finished_at"])
+                due = finished + timedelta(hours=self.interval_hours)
+                delay = max(delay, (due - datetime.now()).total_seconds())
+            except ValueError:
+                pass
+        return delay
+
+    async def run_once(self) -> Dict[str, Any]:
+        """
+        执行一次整理
+
+        Returns:
+            整理报告
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        if self._lock.locked():
+            return self.last_report or {}
+
+        async with self._lock:
+            started = time.perf_counter()
+            report: Dict[str, Any] = {"started_at": datetime.now().isoformat(), "stores": {}}
+
+            steps = [("unified", self._maintain_unified), ("history", self._maintain_history)]
+            steps += [(name, self._enhanced_step(manager)) for name, manager in self._enhanced_targets()]
+            steps += [(name, self._vector_step(store)) for name, store in list(self._vector_stores.items())]
+
+            for name, step in steps:
+                try:
+                    report["stores"][name] = await step()
+                except Exception as e:
+                    logger.error(f"❌ 整理 {name} 失败: {e}")
+                    report["stores"][name] = {"error": str(e)}
+
+            stores = [s for s in report["stores"].values() if "error" not in s]
+            report["duplicates"] = sum(s["duplicates"] for s in stores)
+            report["expired"] = sum(s["expired"] for s in stores)
+            report["archived"] = sum(s["duplicates"] + s["expired"] for s in stores)
+            report["reclaimed_bytes"] = sum(
+                max(0, s["bytes_before"] - s["bytes_after"]) for s in stores if s.get("bytes_before") is not None
+            )
+            report["finished_at"] = datetime.now().isoformat()
+            report["duration_seconds"] = round(time.perf_counter() - started, 3)
+
+            self.last_report = report
+            try:
+                self.report_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.report_file, "w", encoding="utf-8") as f:
+                    json.dump(report, f, ensure_ascii=False, indent=2)
+            except OSError as e:
+                logger.warning(f"⚠️ 保存整理报告失败: {e}")
+
+            logger.info(
+                f"🧹 记忆整理完成: 合并重复 {report['duplicates']} 条，清理过期 {report['expired']} 条，"
+                f"回收 {report['reclaimed_bytes'] / 1024:.1f} KB，用时 {report['duration_seconds']}s"
+            )
+            return report
+
+    def _enhanced_targets(self) -> List[tuple]:
+        from .memory_manager_enhanced import enhanced_memory_manager
+
+        targets = [("enhanced", enhanced_memory_manager)]
+        seen = {id(enhanced_memory_manager)}
+        for name, manager in list(self._enhanced.items()):
+            if id(manager) not in seen:
+                seen.add(id(manager))
+                targets.append((name, manager))
+        return targets
+
+    def _result(self, before: int, after: int, duplicates: int, expired: int,
+                bytes_before: int = None, bytes_after: int = None) -> Dict[str, Any]:
+        return {
+            "before": before,
+            "after": after,
+            "duplicates": duplicates,
+            "expired": expired,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+        }
+
+    async def _maintain_unified(self) -> Dict[str, Any]:
+        """笔记去重和保留、事件去重和过期、过时偏好清理"""
+        from .unified_memory import unified_memory as memory
+
+        bytes_before = _path_size(memory.data_dir) + _path_size(memory.legacy_file)
+        notes = list(memory.memory_notes)
+        events = list(memory.important_events)
+        before = len(notes) + len(events) + len(memory.preferences)
+
+        groups = await asyncio.to_thread(
+            _grouped_duplicates, [n.content for n in notes], [n.category for n in notes], self.max_distance
+        )
+        duplicate_notes = []
+        for group in groups:
+            members = [notes[i] for i in group]
+            keep = max(members, key=lambda n: (n.priority, len(n.content)))
+            keep.priority = max(n.priority for n in members)
+            keep.created_at = min(n.created_at for n in members)
+            duplicate_notes += [n for n in members if n is not keep]
+
+        note_cutoff = (datetime.now() - timedelta(days=self.note_retention_days)).isoformat()
+        removed = {id(n) for n in duplicate_notes}
+        expired_notes = [
+            n for n in notes
+            if id(n) not in removed and n.priority <= 3 and n.created_at < note_cutoff
+        ]
+
+        seen_events: Dict[tuple, Any] = {}
+        duplicate_events = []
+        for event in events:
+            key = (event.title.strip().lower(), event.event_date, event.is_recurring)
+            if key in seen_events:
+                duplicate_events.append(event)
+            else:
+                seen_events[key] = event
+        event_cutoff = (datetime.now() - timedelta(days=self.event_retention_days)).strftime("%Y-%m-%d")
+        expired_events = [
+            e for e in seen_events.values()
+            if not e.is_recurring and re.fullmatch(r"\d{4}-\d{2}-\d{2}", e.event_date) and e.event_date < event_cutoff
+        ]
+
+        stale_cutoff = (datetime.now() - timedelta(days=self.preference_stale_days)).isoformat()
+        stale_preferences = {
+            key: pref for key, pref in memory.preferences.items()
+            if pref.source != "manual" and pref.confidence < 0.3 and pref.updated_at < stale_cutoff
+        }
+
+        duplicates = len(duplicate_notes) + len(duplicate_events)
+        expired = len(expired_notes) + len(expired_events) + len(stale_preferences)
+        if duplicates or expired:
+            self.archive.write("unified.notes", "duplicate", [asdict(n) for n in duplicate_notes])
+            self.archive.write("unified.notes", "expired", [asdict(n) for n in expired_notes])
+            self.archive.write("unified.events", "duplicate", [asdict(e) for e in duplicate_events])
+            self.archive.write("unified.events", "expired", [asdict(e) for e in expired_events])
+            self.archive.write("unified.preferences", "stale", [asdict(p) for p in stale_preferences.values()])
+
+            dropped = {id(x) for x in duplicate_notes + expired_notes + duplicate_events + expired_events}
+            memory.replace_items(
+                memory_notes=[n for n in memory.memory_notes if id(n) not in dropped],
+                important_events=[e for e in memory.important_events if id(e) not in dropped],
+                preferences={k: v for k, v in memory.preferences.items() if k not in stale_preferences}
+            )
+
+        memory.flush()
+        after = len(memory.memory_notes) + len(memory.important_events) + len(memory.preferences)
+        return self._result(before, after, duplicates, expired,
+                            bytes_before, _path_size(memory.data_dir) + _path_size(memory.legacy_file))
+
+    async def _maintain_history(self) -> Dict[str, Any]:
+        """按 HISTORY_RETENTION_DAYS 清理历史记录"""
+        from .history_manager import history_manager
+
+        before = history_manager.get_message_count()
+        bytes_before = _path_size(history_manager.storage_path)
+        await asyncio.to_thread(history_manager.archive_old)
+        expired = 0
+        if self.history_retention_days > 0:
+            cutoff = (datetime.now() - timedelta(days=self.history_retention_days)).isoformat()
+            removed = await asyncio.to_thread(history_manager.prune_before, cutoff)
+            expired = self.archive.write("history", "expired", [m.to_dict() for m in removed])
+        return self._result(before, history_manager.get_message_count(), 0, expired,
+                            bytes_before, _path_size(history_manager.storage_path))
+
+    def _enhanced_step(self, manager):
+        async def step() -> Dict[str, Any]:
+            """衰减 + 过期清理，然后按分类合并近似重复"""
+            before = len(manager.memories)
+            expired = manager.apply_retention()
+            self.archive.write("enhanced", "expired", [m.to_dict() for m in expired])
+
+            memories = list(manager.memories.values())
+            groups = await asyncio.to_thread(
+                _grouped_duplicates, [m.content for m in memories], [m.category for m in memories],
+                self.max_distance
+            )
+            merged = manager.merge_duplicates([[memories[i].id for i in group] for group in groups])
+            self.archive.write("enhanced", "duplicate", [m.to_dict() for m in merged])
+            return self._result(before, len(manager.memories), len(merged), len(expired))
+        return step
+
+    def _vector_step(self, store):
+        async def step() -> Dict[str, Any]:
+            """长期记忆：simhash + 向量判重，按 MEMORY_LONG_TERM_RETENTION_DAYS 清理"""
+            from .embedding_service import get_embedding_service
+
+            bytes_before = _path_size(store.db_path)
+            items = await store.items()
+            ids = list(items)
+            texts = [items[id].content for id in ids]
+
+            # 向量已由后台索引计算并缓存，这里基本只读缓存
+            service = get_embedding_service()
+            vectors = await service.aencode(texts, store.embedding_model) if service.available else None
+            groups = await asyncio.to_thread(find_duplicates, texts, self.max_distance, vectors, self.min_cosine)
+
+            duplicate_ids = []
+            for group in groups:
+                keep = max(group, key=lambda i: (len(texts[i]), -items[ids[i]].timestamp.timestamp()))
+                duplicate_ids += [ids[i] for i in group if i != keep]
+
+            expired_ids = []
+            if self.long_term_retention_days > 0:
+                cutoff = datetime.now() - timedelta(days=self.long_term_retention_days)
+                skip = set(duplicate_ids)
+                expired_ids = [
+                    id for id, item in items.items()
+                    if id not in skip and item.timestamp < cutoff and not item.metadata.get("pinned")
+                ]
+
+            for reason, chosen in (("duplicate", duplicate_ids), ("expired", expired_ids)):
+                self.archive.write("long_term", reason, [{"id": id, **items[id].to_dict()} for id in chosen])
+            if duplicate_ids or expired_ids:
+                await store.delete_many(duplicate_ids + expired_ids)
+
+            after = len(await store.items())
+            return self._result(len(ids), after, len(duplicate_ids), len(expired_ids),
+                                bytes_before, _path_size(store.db_path))
+        return step
+
+    def get_last_report(self) -> Optional[Dict[str, Any]]:
+        """最近一次整理报告"""
+        return self.last_report
+
+
+def get_memory_maintenance() -> MemoryMaintenance:
+    """获取记忆整理任务实例"""
+    return MemoryMaintenance()
@@ -12,6 +12,7 @@ from .long_term import LongTermMemory
 from .unified_memory import UnifiedMemory, unified_memory
 from .memory_learner import MemoryLearner
 from .memory_manager_enhanced import EnhancedMemoryManager
+from .maintenance import get_memory_maintenance
 
 
 class MemoryManager:
@@ -52,6 +53,10 @@ class MemoryManager:
         self.learner = MemoryLearner(self.unified) if enable_learning else None
         
         self.enhanced = EnhancedMemoryManager()
+        
+        maintenance = get_memory_maintenance()
+        maintenance.register_vector_store(str(db_path / "chroma"), self.long_term)
+        maintenance.register_enhanced(f"enhanced:{session_id}", self.enhanced)
 
     async def add_conversation(
         self,
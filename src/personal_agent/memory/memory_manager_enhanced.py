@@ -2,11 +2,14 @@
 Enhanced Memory Manager - 增强记忆管理器
 支持记忆优先级、遗忘机制和智能检索
 """
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Set
 from datetime import datetime, timedelta
 from loguru import logger
 from dataclasses import dataclass, field
+import heapq
+import itertools
 import math
+import time
 
 
 @dataclass
@@ -78,22 +81,36 @@ class EnhancedMemoryManager:
     3. 智能检索
     4. 记忆压缩
     5. 记忆过期清理
+    
+    重要性分数增量维护：添加、访问、修改时重新计算单条记忆，
+    时间衰减按 decay_interval 定期统一刷新；检索通过分类、标签、日期分桶、
+    字符 n-gram 倒排索引和重要性堆完成，开销取决于候选集大小而不是记忆总数
     """
     
     def __init__(
         self,
         max_items: int = 1000,
         forget_threshold: float = 0.15,
-        cleanup_interval: int = 100
+        cleanup_interval: int = 100,
+        decay_interval: int = 3600
     ):
         self.max_items = max_items
         self.forget_threshold = forget_threshold
         self.cleanup_interval = cleanup_interval
+        self.decay_interval = decay_interval
         
         self.memories: Dict[str, MemoryItem] = {}
-        self.category_index: Dict[str, List[str]] = {}
+        self.category_index: Dict[str, Set[str]] = {}
+        self.tag_index: Dict[str, Set[str]] = {}
+        self.time_index: Dict[str, Set[str]] = {}
         self.access_count = 0
         
+        self._ngram_index: Dict[str, Set[str]] = {}
+        self._heap: List[tuple] = []
+        self._heap_version: Dict[str, int] = {}
+        self._heap_seq = itertools.count()
+        self._last_decay = time.monotonic()
+        
         self.retention_policy = {
             "critical": 365,
             "important": 90,
@@ -101,6 +118,141 @@ class EnhancedMemoryManager:
             "low": 7
         }
     
+    @staticmethod
+    def _ngrams(text: str) -> Set[str]:
+        """内容的单字和二元组（小写）"""
+        text = text.lower()
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+    
+    @staticmethod
+    def _tags(memory: MemoryItem) -> List[str]:
+        tags = memory.metadata.get("tags") or []
+        if isinstance(tags, str):
+            tags = [tags]
+        return [str(tag) for tag in tags]
+    
+    @staticmethod
+    def _bucket(moment: datetime) -> str:
+        return moment.strftime("%Y-%m-%d")
+    
+    def _index(self, memory: MemoryItem):
+        """把记忆加入分类、标签、日期和 n-gram 索引"""
+        self.category_index.setdefault(memory.category, set()).add(memory.id)
+        for tag in self._tags(memory):
+            self.tag_index.setdefault(tag, set()).add(memory.id)
+        self.time_index.setdefault(self._bucket(memory.created_at), set()).add(memory.id)
+        for gram in self._ngrams(memory.content):
+            self._ngram_index.setdefault(gram, set()).add(memory.id)
+    
+    def _unindex(self, memory: MemoryItem):
+        """从所有索引中移除记忆"""
+        indexes = [
+            (self.category_index, [memory.category]),
+            (self.tag_index, self._tags(memory)),
+            (self.time_index, [self._bucket(memory.created_at)]),
+            (self._ngram_index, self._ngrams(memory.content)),
+        ]
+        for index, keys in indexes:
+            for key in keys:
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(memory.id)
+                    if not ids:
+                        del index[key]
+        self._heap_version.pop(memory.id, None)
+    
+    def _rescore(self, memory: MemoryItem):
+        """重新计算单条记忆的重要性并更新重要性堆"""
+        memory.calculate_importance()
+        seq = next(self._heap_seq)
+        self._heap_version[memory.id] = seq
+        heapq.heappush(self._heap, (-memory.importance, seq, memory.id))
+        if len(self._heap) > 2 * len(self.memories) + 64:
+            self._rebuild_heap()
+    
+    def _rebuild_heap(self):
+        self._heap = []
+        self._heap_version = {}
+        for memory in self.memories.values():
+            seq = next(self._heap_seq)
+            self._heap_version[memory.id] = seq
+            self._heap.append((-memory.importance, seq, memory.id))
+        heapq.heapify(self._heap)
+    
+    def _maybe_decay(self, force: bool = False):
+        """按衰减周期统一刷新所有记忆的时间衰减"""
+        if not force and time.monotonic() - self._last_decay < self.decay_interval:
+            return
+        for memory in self.memories.values():
+            memory.calculate_importance()
+        self._rebuild_heap()
+        self._last_decay = time.monotonic()
+    
+    def _top_ranked(
+        self,
+        limit: int,
+        predicate: Callable[[MemoryItem], bool] = None,
+        min_importance: float = 0.0
+    ) -> List[MemoryItem]:
+        """按重要性从高到低取满足条件的前 limit 条（不修改堆内容）"""
+        results, popped = [], []
+        while self._heap and len(results) < limit:
+            entry = heapq.heappop(self._heap)
+            neg_importance, seq, memory_id = entry
+            if self._heap_version.get(memory_id) != seq:
+                continue
+            popped.append(entry)
+            if -neg_importance < min_importance:
+                break
+            memory = self.memories[memory_id]
+            if predicate is None or predicate(memory):
+                results.append(memory)
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return results
+    
+    def _candidates(
+        self,
+        query: str = "",
+        category: str = None,
+        tag: str = None,
+        since: datetime = None,
+        until: datetime = None
+    ) -> Optional[Set[str]]:
+        """根据索引求候选记忆ID，没有任何条件时返回 None"""
+        sets = []
+        
+        if category:
+            if category in self.category_index:
+                sets.append(self.category_index[category])
+        if tag:
+            sets.append(self.tag_index.get(tag, set()))
+        if since or until:
+            low = self._bucket(since) if since else ""
+            high = self._bucket(until) if until else "9999"
+            ids = set()
+            for bucket, bucket_ids in self.time_index.items():
+                if low <= bucket <= high:
+                    ids |= bucket_ids
+            sets.append(ids)
+        if query:
+            grams = self._ngrams(query)
+            if len(query) >= 2:
+                grams = {query[i:i + 2] for i in range(len(query) - 1)}
+            sets.extend(self._ngram_index.get(gram, set()) for gram in grams)
+        
+        if not sets:
+            return None
+        sets.sort(key=len)
+        result = set(sets[0])
+        for ids in sets[1:]:
+            if not result:
+                break
+            result &= ids
+        return result
+    
     def add_memory(
         self,
         content: str,
@@ -117,7 +269,7 @@ class EnhancedMemoryManager:
             category: 记忆分类
             priority: 优先级 (1-10)
             source: 来源
-            metadata: 元数据
+            metadata: 元数据（可包含 tags 标签列表）
         
         Returns:
             记忆ID
@@ -137,13 +289,9 @@ class EnhancedMemoryManager:
             metadata=metadata or {}
         )
         
-        memory.calculate_importance()
-        
         self.memories[memory_id] = memory
-        
-        if category not in self.category_index:
-            self.category_index[category] = []
-        self.category_index[category].append(memory_id)
+        self._index(memory)
+        self._rescore(memory)
         
         self.access_count += 1
         
@@ -162,7 +310,7 @@ class EnhancedMemoryManager:
         if memory_id in self.memories:
             memory = self.memories[memory_id]
             memory.access()
-            memory.calculate_importance()
+            self._rescore(memory)
             return memory
         return None
     
@@ -171,7 +319,10 @@ class EnhancedMemoryManager:
         query: str,
         category: str = None,
         limit: int = 10,
-        min_importance: float = 0.0
+        min_importance: float = 0.0,
+        tag: str = None,
+        since: datetime = None,
+        until: datetime = None
     ) -> List[MemoryItem]:
         """
         搜索记忆
@@ -181,32 +332,41 @@ class EnhancedMemoryManager:
             category: 分类过滤
             limit: 返回数量限制
             min_importance: 最小重要性阈值
+            tag: 标签过滤
+            since / until: 创建时间范围
         
         Returns:
-            匹配的记忆列表
+            匹配的记忆列表，按重要性从高到低
         """
-        results = []
+        self._maybe_decay()
         query_lower = query.lower()
         
-        search_pool = self.memories.values()
-        if category and category in self.category_index:
-            search_pool = [
-                self.memories[mid] 
-                for mid in self.category_index[category] 
-                if mid in self.memories
-            ]
-        
-        for memory in search_pool:
-            if query_lower in memory.content.lower():
-                memory.calculate_importance()
-                
-                if memory.importance >= min_importance:
-                    memory.access()
-                    results.append(memory)
+        if category and category not in self.category_index:
+            category = None
+        
+        candidates = self._candidates(query_lower, category, tag, since, until)
+        
+        def matches(memory: MemoryItem) -> bool:
+            if since and memory.created_at < since:
+                return False
+            if until and memory.created_at > until:
+                return False
+            return memory.importance >= min_importance and query_lower in memory.content.lower()
         
-        results.sort(key=lambda m: m.importance, reverse=True)
+        if candidates is None:
+            results = self._top_ranked(limit, matches, min_importance)
+        else:
+            results = heapq.nlargest(
+                limit,
+                (m for m in (self.memories[mid] for mid in candidates) if matches(m)),
+                key=lambda m: m.importance
+            )
         
-        return results[:limit]
+        for memory in results:
+            memory.access()
+            self._rescore(memory)
+        
+        return results
     
     def get_recent_memories(
         self,
@@ -216,22 +376,15 @@ class EnhancedMemoryManager:
         """获取最近记忆"""
         search_pool = self.memories.values()
         if category and category in self.category_index:
-            search_pool = [
-                self.memories[mid] 
-                for mid in self.category_index[category] 
-                if mid in self.memories
-            ]
-        
-        sorted_memories = sorted(
-            search_pool,
-            key=lambda m: m.last_accessed,
-            reverse=True
-        )
+            search_pool = [self.memories[mid] for mid in self.category_index[category]]
         
-        for memory in sorted_memories[:limit]:
+        recent = heapq.nlargest(limit, search_pool, key=lambda m: m.last_accessed)
+        
+        for memory in recent:
             memory.access()
+            self._rescore(memory)
         
-        return sorted_memories[:limit]
+        return recent
     
     def get_important_memories(
         self,
@@ -239,17 +392,8 @@ class EnhancedMemoryManager:
         min_priority: int = 7
     ) -> List[MemoryItem]:
         """获取重要记忆"""
-        important = [
-            m for m in self.memories.values()
-            if m.priority >= min_priority
-        ]
-        
-        for memory in important:
-            memory.calculate_importance()
-        
-        important.sort(key=lambda m: m.importance, reverse=True)
-        
-        return important[:limit]
+        self._maybe_decay()
+        return self._top_ranked(limit, lambda m: m.priority >= min_priority)
     
     def update_memory(
         self,
@@ -263,6 +407,7 @@ class EnhancedMemoryManager:
             return False
         
         memory = self.memories[memory_id]
+        self._unindex(memory)
         
         if content is not None:
             memory.content = content
@@ -273,8 +418,9 @@ class EnhancedMemoryManager:
         if metadata is not None:
             memory.metadata.update(metadata)
         
-        memory.calculate_importance()
         memory.access()
+        self._index(memory)
+        self._rescore(memory)
         
         logger.debug(f"📝 更新记忆: {memory_id}")
         return True
@@ -284,58 +430,90 @@ class EnhancedMemoryManager:
         if memory_id not in self.memories:
             return False
         
-        memory = self.memories[memory_id]
-        
-        if memory.category in self.category_index:
-            if memory_id in self.category_index[memory.category]:
-                self.category_index[memory.category].remove(memory_id)
-        
-        del self.memories[memory_id]
+        self._unindex(self.memories.pop(memory_id))
         
         logger.debug(f"🗑️ 删除记忆: {memory_id}")
         return True
     
     def _forget_low_priority(self):
         """遗忘低优先级记忆"""
-        for memory in self.memories.values():
-            memory.calculate_importance()
+        self._maybe_decay()
         
-        sorted_memories = sorted(
-            self.memories.items(),
-            key=lambda x: x[1].importance
-        )
-        
-        forget_count = 0
         target_count = int(self.max_items * 0.9)
+        excess = len(self.memories) - target_count
+        if excess <= 0:
+            return
         
-        for memory_id, memory in sorted_memories:
-            if len(self.memories) <= target_count:
-                break
-            
+        lowest = heapq.nsmallest(excess, self.memories.values(), key=lambda m: m.importance)
+        forget_count = 0
+        for memory in lowest:
             if memory.importance < self.forget_threshold:
-                self.delete_memory(memory_id)
+                self.delete_memory(memory.id)
                 forget_count += 1
         
         if forget_count > 0:
             logger.info(f"🧹 遗忘 {forget_count} 条低优先级记忆")
     
     def _cleanup_expired_memories(self):
-        """清理过期记忆"""
+        """清理过期记忆（只检查超过最短保留期的日期分桶）"""
         now = datetime.now()
+        oldest_allowed = self._bucket(now - timedelta(days=min(self.retention_policy.values())))
         expired = []
         
-        for memory_id, memory in self.memories.items():
-            retention_days = self._get_retention_days(memory)
-            expiry_date = memory.created_at + timedelta(days=retention_days)
-            
-            if now > expiry_date and memory.priority < 8:
-                expired.append(memory_id)
+        for bucket, ids in self.time_index.items():
+            if bucket >= oldest_allowed:
+                continue
+            for memory_id in ids:
+                memory = self.memories[memory_id]
+                retention_days = self._get_retention_days(memory)
+                expiry_date = memory.created_at + timedelta(days=retention_days)
+                
+                if now > expiry_date and memory.priority < 8:
+                    expired.append(memory_id)
         
+        removed = [self.memories[memory_id] for memory_id in expired]
         for memory_id in expired:
             self.delete_memory(memory_id)
         
         if expired:
             logger.info(f"🧹 清理 {len(expired)} 条过期记忆")
+        
+        return removed
+    
+    def apply_retention(self) -> List[MemoryItem]:
+        """
+        立即执行衰减和保留策略（供后台整理任务调用）
+        
+        Returns:
+            被清理的记忆
+        """
+        self._maybe_decay(force=True)
+        return self._cleanup_expired_memories()
+    
+    def merge_duplicates(self, groups: List[List[str]]) -> List[MemoryItem]:
+        """
+        合并外部检测出的重复记忆分组
+        
+        Args:
+            groups: 记忆 ID 分组，每组合并为一条
+        
+        Returns:
+            被合并掉（删除）的记忆
+        """
+        removed = []
+        for ids in groups:
+            group = [self.memories[mid] for mid in ids if mid in self.memories]
+            if len(group) < 2:
+                continue
+            merged = self._merge_memories(group)
+            for memory in group:
+                if memory is not merged:
+                    removed.append(memory)
+                    self.delete_memory(memory.id)
+        
+        if removed:
+            logger.info(f"🗜️ 合并 {len(removed)} 条重复记忆")
+        return removed
     
     def _get_retention_days(self, memory: MemoryItem) -> int:
         """获取记忆保留天数"""
@@ -360,11 +538,7 @@ class EnhancedMemoryManager:
         """
         search_pool = self.memories.values()
         if category and category in self.category_index:
-            search_pool = [
-                self.memories[mid] 
-                for mid in self.category_index[category] 
-                if mid in self.memories
-            ]
+            search_pool = [self.memories[mid] for mid in self.category_index[category]]
         
         similar_groups = self._find_similar_memories(list(search_pool))
         
@@ -373,11 +547,10 @@ class EnhancedMemoryManager:
             if len(group) > 1:
                 merged = self._merge_memories(group)
                 
-                for memory in group[1:]:
-                    self.delete_memory(memory.id)
-                    compressed_count += 1
-                
-                self.memories[group[0].id] = merged
+                for memory in group:
+                    if memory is not merged:
+                        self.delete_memory(memory.id)
+                        compressed_count += 1
         
         if compressed_count > 0:
             logger.info(f"🗜️ 压缩 {compressed_count} 条相似记忆")
@@ -435,7 +608,7 @@ class EnhancedMemoryManager:
         
         best_memory.priority = max(m.priority for m in memories)
         
-        best_memory.calculate_importance()
+        self._rescore(best_memory)
         
         return best_memory
     
@@ -465,13 +638,21 @@ class EnhancedMemoryManager:
             "avg_importance": round(avg_importance, 3),
             "avg_access_count": round(avg_access, 2),
             "max_items": self.max_items,
-            "forget_threshold": self.forget_threshold
+            "forget_threshold": self.forget_threshold,
+            "tags": len(self.tag_index),
+            "time_buckets": len(self.time_index),
+            "heap_size": len(self._heap)
         }
     
     def clear_all(self):
         """清空所有记忆"""
         self.memories.clear()
         self.category_index.clear()
+        self.tag_index.clear()
+        self.time_index.clear()
+        self._ngram_index.clear()
+        self._heap.clear()
+        self._heap_version.clear()
         self.access_count = 0
         logger.warning("⚠️ 所有记忆已清空")
     
@@ -495,11 +676,11 @@ class EnhancedMemoryManager:
                 metadata=data.get("metadata", {})
             )
             
+            if memory.id in self.memories:
+                self._unindex(self.memories[memory.id])
             self.memories[memory.id] = memory
-            
-            if memory.category not in self.category_index:
-                self.category_index[memory.category] = []
-            self.category_index[memory.category].append(memory.id)
+            self._index(memory)
+            self._rescore(memory)
         
         logger.info(f"📥 导入 {len(memories_data)} 条记忆")
 
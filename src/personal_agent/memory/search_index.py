@@ -0,0 +1,296 @@
+"""
+Message Search Index - 消息全文索引
+基于 SQLite FTS5 为历史记录和渠道对话建立全文索引，消息到达时增量更新
+
+中文没有词边界，写入和查询时把连续的中日韩字符切分为单字和二元组，
+英文和数字按单词切分；查询优先要求全部词元命中，没有结果时放宽为任意命中并按相关度排序，
+以容忍错别字和多余的字
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+
+_CJK_RUN = re.compile(r'[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+')
+_WORD = re.compile(r'[a-z0-9_]+')
+
+
+def _split(text: str) -> Tuple[List[str], List[str]]:
+    """拆分文本，返回 (中日韩字符串片段, 单词)"""
+    text = (text or "").lower()
+    runs = _CJK_RUN.findall(text)
+    words = _WORD.findall(_CJK_RUN.sub(" ", text))
+    return runs, words
+
+
+def tokenize(text: str) -> str:
+    """生成写入索引的词元文本：中日韩字符的单字 + 二元组，以及单词"""
+    runs, words = _split(text)
+    tokens = []
+    for run in runs:
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(words)
+    return " ".join(tokens)
+
+
+def query_terms(query: str) -> List[str]:
+    """查询词元：中日韩片段取二元组（单字片段取单字），单词取前缀"""
+    runs, words = _split(query)
+    terms = []
+    for run in runs:
+        if len(run) == 1:
+            terms.append(f'"{run}"')
+        else:
+            terms.extend(f'"{run[i:i + 2]}"' for i in range(len(run) - 1))
+    terms.extend(f'"{word}"*' for word in words)
+    return list(dict.fromkeys(terms))
+
+
+def highlight(content: str, query: str, marks: Tuple[str, str] = ("【", "】"), width: int = 80) -> str:
+    """在原文中截取命中位置附近的片段，并标记命中的字词"""
+    runs, words = _split(query)
+    needles = [run[i:i + 2] for run in runs for i in range(len(run) - 1)]
+    needles += [run for run in runs if len(run) == 1] + words
+    if not needles:
+        return content[:width]
+
+    # 收集所有命中区间并合并重叠部分，二元组相互重叠时整体高亮
+    lowered = content.lower()
+    spans = []
+    for needle in set(needles):
+        pos = lowered.find(needle)
+        while pos != -1:
+            spans.append((pos, pos + len(needle)))
+            pos = lowered.find(needle, pos + 1)
+    spans.sort()
+    merged = []
+    for span_start, span_end in spans:
+        if merged and span_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], span_end)
+        else:
+            merged.append([span_start, span_end])
+
+    start = max(0, (merged[0][0] if merged else 0) - width // 3)
+    end = min(len(content), start + width)
+    parts, cursor = [], start
+    for span_start, span_end in merged:
+        span_start, span_end = max(span_start, start), min(span_end, end)
+        if span_start >= span_end:
+            continue
+        parts.append(content[cursor:span_start])
+        parts.append(f"{marks[0]}{content[span_start:span_end]}{marks[1]}")
+        cursor = span_end
+    parts.append(content[cursor:end])
+    return ("..." if start > 0 else "") + "".join(parts) + ("..." if end < len(content) else "")
+
+
+class MessageSearchIndex:
+    """
+    消息全文索引
+
+    功能：
+    1. 按来源（history / conversation 等）和会话增量写入消息
+    2. bm25 相关度排序，支持日期范围和会话过滤
+    3. 返回带高亮标记的片段
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, db_path: str = None):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+
+        if db_path is None:
+            db_path = os.path.join(os.getcwd(), "data", "search", "messages.db")
+
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.available = True
+
+        try:
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._init_db()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 全文索引不可用（SQLite 可能不支持 FTS5）: {e}")
+            self.available = False
+
+        self._initialized = True
+
+    def _init_db(self):
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    session_id TEXT NOT NULL DEFAULT 'default',
+                    role TEXT,
+                    content TEXT NOT NULL,
+                    timestamp TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_messages_source_session ON messages(source, session_id);
+                CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp);
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(tokens, tokenize='unicode61');
+            """)
+            self._conn.commit()
+
+    def count(self, source: str = None) -> int:
+        """索引中的消息数"""
+        if not self.available:
+            return 0
+        with self._lock:
+            if source:
+                row = self._conn.execute("SELECT COUNT(*) FROM messages WHERE source = ?", (source,)).fetchone()
+            else:
+                row = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()
+        return row[0]
+
+    def add(self, source: str, content: str, role: str = "", session_id: str = "default",
+            timestamp: str = None) -> Optional[int]:
+        """增量写入一条消息，返回消息 ID"""
+        return (self.add_many(source, [(role, content, session_id, timestamp)]) or [None])[0]
+
+    def add_many(self, source: str, items: Iterable[Tuple[str, str, str, Optional[str]]]) -> List[int]:
+        """
+        批量写入消息
+
+        Args:
+            source: 来源，如 "history"、"conversation"
+            items: (role, content, session_id, timestamp) 列表
+        """
+        if not self.available:
+            return []
+        ids = []
+        try:
+            with self._lock:
+                for role, content, session_id, timestamp in items:
+                    if not content:
+                        continue
+                    cursor = self._conn.execute(
+                        "INSERT INTO messages (source, session_id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                        (source, session_id or "default", role, content, timestamp or datetime.now().isoformat())
+                    )
+                    self._conn.execute(
+                        "INSERT INTO messages_fts (rowid, tokens) VALUES (?, ?)",
+                        (cursor.lastrowid, tokenize(content))
+                    )
+                    ids.append(cursor.lastrowid)
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"❌ 写入全文索引失败: {e}")
+        return ids
+
+    def clear(self, source: str = None, session_id: str = None):
+        """删除索引中的消息"""
+        if not self.available:
+            return
+        where, params = self._filters(source, session_id, None, None)
+        with self._lock:
+            self._conn.execute(f"DELETE FROM messages_fts WHERE rowid IN (SELECT id FROM messages m {where})", params)
+            self._conn.execute(f"DELETE FROM messages AS m {where}", params)
+            self._conn.commit()
+
+    def delete_before(self, source: str, timestamp: str) -> int:
+        """删除某个来源中早于指定时间的消息，返回删除条数"""
+        if not self.available:
+            return 0
+        where, params = self._filters(source, None, None, None)
+        where += " AND m.timestamp < ?"
+        params.append(timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp)
+        with self._lock:
+            self._conn.execute(f"DELETE FROM messages_fts WHERE rowid IN (SELECT id FROM messages m {where})", params)
+            cursor = self._conn.execute(f"DELETE FROM messages AS m {where}", params)
+            self._conn.commit()
+        return cursor.rowcount
+
+    @staticmethod
+    def _filters(source, session_id, start, end) -> Tuple[str, list]:
+        clauses, params = [], []
+        if source:
+            clauses.append("m.source = ?")
+            params.append(source)
+        if session_id:
+            clauses.append("m.session_id = ?")
+            params.append(session_id)
+        if start:
+            clauses.append("m.timestamp >= ?")
+            params.append(start.isoformat() if isinstance(start, datetime) else start)
+        if end:
+            clauses.append("m.timestamp <= ?")
+            params.append(end.isoformat() if isinstance(end, datetime) else end)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def search(self, query: str, limit: int = 10, source: str = None, session_id: str = None,
+               start: Any = None, end: Any = None,
+               marks: Tuple[str, str] = ("【", "】")) -> List[Dict[str, Any]]:
+        """
+        全文搜索
+
+        Args:
+            query: 查询文本
+            limit: 返回条数
+            source: 来源过滤
+            session_id: 会话过滤
+            start / end: 时间范围（datetime 或 ISO 字符串）
+            marks: 高亮标记
+
+        Returns:
+            按相关度排序的结果，包含 snippet 高亮片段
+        """
+        terms = query_terms(query)
+        if not self.available or not terms:
+            return []
+
+        where, params = self._filters(source, session_id, start, end)
+        where = where.replace("WHERE", "AND", 1)
+        sql = f"""
+            SELECT m.id, m.source, m.session_id, m.role, m.content, m.timestamp, bm25(messages_fts) AS score
+            FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ? {where}
+            ORDER BY score, m.timestamp DESC
+            LIMIT ?
+        """
+
+        rows = []
+        try:
+            with self._lock:
+                for operator in (" AND ", " OR "):
+                    rows = self._conn.execute(sql, [operator.join(terms), *params, limit]).fetchall()
+                    if rows or len(terms) == 1:
+                        break
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 全文搜索失败: {e}")
+            return []
+
+        return [
+            {
+                "id": row[0],
+                "source": row[1],
+                "session_id": row[2],
+                "role": row[3],
+                "content": row[4],
+                "timestamp": row[5],
+                "score": -row[6],
+                "snippet": highlight(row[4], query, marks),
+            }
+            for row in rows
+        ]
+
+
+def get_search_index() -> MessageSearchIndex:
+    """获取消息全文索引实例"""
+    return MessageSearchIndex()
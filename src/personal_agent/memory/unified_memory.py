@@ -8,8 +8,11 @@ from datetime import datetime, timedelta
 from loguru import logger
 from dataclasses import dataclass, field, asdict
 import json
+import os
 import re
 
+from ..utils.persistence import DebouncedJsonWriter, atomic_write_text
+
 
 @dataclass
 class UserProfile:
@@ -81,10 +84,18 @@ class UnifiedMemory:
     4. 记忆笔记
     5. MEMORY.md生成（LLM友好）
     6. 记忆搜索
+    
+    存储：
+    - memory_data/ 下按分区分文件（profile / preferences / events / notes / context），
+      修改只标记对应分区，短时间内的多次修改合并为一次后台写入，不再每次整体重写
+    - MEMORY.md 只在内容过期且被读取时重新生成
+    - 旧的单文件 memory_data.json 首次启动时自动迁移
     """
     
     _instance = None
     
+    SECTIONS = ("profile", "preferences", "events", "notes", "context")
+    
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
@@ -103,7 +114,8 @@ class UnifiedMemory:
         self.storage_path.mkdir(parents=True, exist_ok=True)
         
         self.memory_file = self.storage_path / 'MEMORY.md'
-        self.data_file = self.storage_path / 'memory_data.json'
+        self.data_dir = self.storage_path / 'memory_data'
+        self.legacy_file = self.storage_path / 'memory_data.json'
         
         self.user_profile: UserProfile = UserProfile()
         self.preferences: Dict[str, UserPreference] = {}
@@ -112,57 +124,95 @@ class UnifiedMemory:
         self.recent_context: List[str] = []
         self.conversation_summary: List[str] = []
         
+        self._md_cache: Optional[str] = None
+        self._md_stale = True
+        self._writers = {
+            section: DebouncedJsonWriter(
+                lambda section=section: self.data_dir / f"{section}.json",
+                lambda section=section: self._section_data(section),
+                name=f"memory.{section}"
+            )
+            for section in self.SECTIONS
+        }
+        
         self._load_memory_data()
         self._initialized = True
     
+    def _section_data(self, section: str) -> Any:
+        """分区的可序列化数据"""
+        if section == "profile":
+            return self.user_profile.to_dict()
+        if section == "preferences":
+            return {k: asdict(v) for k, v in self.preferences.items()}
+        if section == "events":
+            return [asdict(e) for e in self.important_events]
+        if section == "notes":
+            return [asdict(n) for n in self.memory_notes]
+        return {
+            "recent_context": self.recent_context[-100:],
+            "conversation_summary": self.conversation_summary[-50:],
+        }
+    
+    def _load_section(self, section: str, data: Any):
+        if section == "profile":
+            self.user_profile = UserProfile.from_dict(data)
+        elif section == "preferences":
+            self.preferences = {k: UserPreference(**v) for k, v in data.items()}
+        elif section == "events":
+            self.important_events = [ImportantEvent(**e) for e in data]
+        elif section == "notes":
+            self.memory_notes = [MemoryNote(**n) for n in data]
+        else:
+            self.recent_context = data.get("recent_context", [])
+            self.conversation_summary = data.get("conversation_summary", [])
+    
     def _load_memory_data(self):
         """加载记忆数据"""
-        if self.data_file.exists():
+        if not self.data_dir.exists() and self.legacy_file.exists():
+            self._migrate_legacy()
+            return
+        
+        for section in self.SECTIONS:
+            section_file = self.data_dir / f"{section}.json"
+            if not section_file.exists():
+                continue
             try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                self.user_profile = UserProfile.from_dict(data.get("user_profile", {}))
-                
-                self.preferences = {
-                    k: UserPreference(**v) 
-                    for k, v in data.get("preferences", {}).items()
-                }
-                
-                self.important_events = [
-                    ImportantEvent(**e) 
-                    for e in data.get("important_events", [])
-                ]
-                
-                self.memory_notes = [
-                    MemoryNote(**n) 
-                    for n in data.get("memory_notes", [])
-                ]
-                
-                self.recent_context = data.get("recent_context", [])
-                self.conversation_summary = data.get("conversation_summary", [])
-                
+                with open(section_file, 'r', encoding='utf-8') as f:
+                    self._load_section(section, json.load(f))
             except Exception as e:
-                logger.error(f"❌ 加载记忆数据失败: {e}")
+                logger.error(f"❌ 加载记忆数据失败（{section}）: {e}")
     
-    def _save_memory_data(self):
-        """保存记忆数据"""
+    def _migrate_legacy(self):
+        """把旧的 memory_data.json 拆分为分区文件"""
         try:
-            data = {
-                "user_profile": self.user_profile.to_dict(),
-                "preferences": {k: asdict(v) for k, v in self.preferences.items()},
-                "important_events": [asdict(e) for e in self.important_events],
-                "memory_notes": [asdict(n) for n in self.memory_notes],
-                "recent_context": self.recent_context[-100:],
-                "conversation_summary": self.conversation_summary[-50:],
-                "updated_at": datetime.now().isoformat()
-            }
-            
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
             
+            self._load_section("profile", data.get("user_profile", {}))
+            self._load_section("preferences", data.get("preferences", {}))
+            self._load_section("events", data.get("important_events", []))
+            self._load_section("notes", data.get("memory_notes", []))
+            self._load_section("context", data)
         except Exception as e:
-            logger.error(f"❌ 保存记忆数据失败: {e}")
+            logger.error(f"❌ 加载记忆数据失败: {e}")
+            return
+        
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        if all(self._writers[section].flush(force=True) for section in self.SECTIONS):
+            os.replace(self.legacy_file, self.legacy_file.with_suffix(".json.bak"))
+            logger.info(f"📦 记忆数据已拆分为分区文件: {self.data_dir}")
+    
+    def _mark_dirty(self, *sections: str):
+        """标记分区有修改（延迟合并写入），并让 MEMORY.md 过期"""
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        for section in sections or self.SECTIONS:
+            self._writers[section].mark_dirty()
+        self._md_stale = True
+    
+    def flush(self):
+        """立即写入所有未保存的修改"""
+        for writer in self._writers.values():
+            writer.flush()
     
     def generate_memory_md(self) -> str:
         """生成MEMORY.md内容（LLM友好格式）"""
@@ -241,21 +291,26 @@ class UnifiedMemory:
         return translations.get(key, key)
     
     def update_memory_md(self):
-        """更新MEMORY.md文件"""
-        content = self.generate_memory_md()
-        try:
-            with open(self.memory_file, 'w', encoding='utf-8') as f:
-                f.write(content)
-            logger.debug(f"📝 MEMORY.md 已更新")
-        except Exception as e:
-            logger.error(f"❌ 更新MEMORY.md失败: {e}")
+        """标记 MEMORY.md 过期，下次读取时重新生成"""
+        self._md_stale = True
+    
+    def _refresh_memory_md(self) -> str:
+        """内容过期时重新生成 MEMORY.md 并写入文件"""
+        if self._md_stale or self._md_cache is None:
+            self._md_cache = self.generate_memory_md()
+            self._md_stale = False
+            try:
+                atomic_write_text(self.memory_file, self._md_cache)
+                logger.debug(f"📝 MEMORY.md 已更新")
+            except Exception as e:
+                logger.error(f"❌ 更新MEMORY.md失败: {e}")
+        return self._md_cache
     
     def update_user_profile(self, key: str, value: Any) -> bool:
         """更新用户档案"""
         if hasattr(self.user_profile, key):
             setattr(self.user_profile, key, value)
-            self._save_memory_data()
-            self.update_memory_md()
+            self._mark_dirty("profile")
             logger.info(f"👤 用户档案已更新: {key} = {value}")
             return True
         return False
@@ -263,8 +318,7 @@ class UnifiedMemory:
     def set_user_profile(self, profile: UserProfile):
         """设置用户档案"""
         self.user_profile = profile
-        self._save_memory_data()
-        self.update_memory_md()
+        self._mark_dirty("profile")
         logger.info(f"👤 用户档案已设置: {profile.name}")
     
     def update_preference(
@@ -291,8 +345,7 @@ class UnifiedMemory:
                 source=source
             )
         
-        self._save_memory_data()
-        self.update_memory_md()
+        self._mark_dirty("preferences")
         logger.info(f"⚙️ 用户偏好已更新: {key} = {value} (置信度: {confidence:.2f})")
         return True
     
@@ -328,8 +381,7 @@ class UnifiedMemory:
         )
         
         self.important_events.append(event)
-        self._save_memory_data()
-        self.update_memory_md()
+        self._mark_dirty("events")
         logger.info(f"📅 重要事件已添加: {title} @ {event_date}")
         
         return event.event_id
@@ -355,8 +407,7 @@ class UnifiedMemory:
         for i, event in enumerate(self.important_events):
             if event.event_id == event_id:
                 self.important_events.pop(i)
-                self._save_memory_data()
-                self.update_memory_md()
+                self._mark_dirty("events")
                 logger.info(f"📅 事件已删除: {event_id}")
                 return True
         return False
@@ -385,8 +436,7 @@ class UnifiedMemory:
                 reverse=True
             )[:100]
         
-        self._save_memory_data()
-        self.update_memory_md()
+        self._mark_dirty("notes")
         logger.info(f"📝 备忘录已添加: {content[:50]}...")
     
     def add_context(self, context: str):
@@ -396,7 +446,7 @@ class UnifiedMemory:
         if len(self.recent_context) > 100:
             self.recent_context = self.recent_context[-100:]
         
-        self._save_memory_data()
+        self._mark_dirty("context")
     
     def add_conversation_summary(self, summary: str):
         """添加对话摘要"""
@@ -405,14 +455,32 @@ class UnifiedMemory:
         if len(self.conversation_summary) > 50:
             self.conversation_summary = self.conversation_summary[-50:]
         
-        self._save_memory_data()
-        self.update_memory_md()
+        self._mark_dirty("context")
+    
+    def replace_items(
+        self,
+        memory_notes: List[MemoryNote] = None,
+        important_events: List[ImportantEvent] = None,
+        preferences: Dict[str, UserPreference] = None
+    ):
+        """批量替换笔记 / 事件 / 偏好（整理任务使用，只保存一次）"""
+        sections = []
+        if memory_notes is not None:
+            self.memory_notes = memory_notes
+            sections.append("notes")
+        if important_events is not None:
+            self.important_events = important_events
+            sections.append("events")
+        if preferences is not None:
+            self.preferences = preferences
+            sections.append("preferences")
+        
+        if sections:
+            self._mark_dirty(*sections)
     
     def get_memory_for_llm(self) -> str:
         """获取给LLM的记忆内容"""
-        if self.memory_file.exists():
-            return self.memory_file.read_text(encoding='utf-8')
-        return self.generate_memory_md()
+        return self._refresh_memory_md()
     
     def search_memory(self, query: str, limit: int = 10) -> List[Dict]:
         """搜索记忆"""
@@ -468,8 +536,7 @@ class UnifiedMemory:
         self.recent_context.clear()
         self.conversation_summary.clear()
         
-        self._save_memory_data()
-        self.update_memory_md()
+        self._mark_dirty()
         logger.warning("⚠️ 所有记忆已清空")
     
     def export_memory(self) -> Dict:
@@ -509,8 +576,7 @@ class UnifiedMemory:
         self.recent_context = data.get("recent_context", [])
         self.conversation_summary = data.get("conversation_summary", [])
         
-        self._save_memory_data()
-        self.update_memory_md()
+        self._mark_dirty()
         logger.info("📥 记忆已导入")
 
 
@@ -0,0 +1,325 @@
+"""
+Local Vector Index - 本地向量索引
+
+chromadb 未安装或无法打开时作为长期记忆的向量后备，只依赖 NumPy：
+向量归一化后以 float32 追加写入 vectors.f32，搜索时内存映射读取；
+ID、文档和元数据写入追加式日志 index.jsonl，删除的行在比例过高时压缩
+
+接口与 chromadb 的 Collection 一致（upsert / query / delete / count），
+LongTermMemory 可以无差别地使用；约 10 万条 384 维向量时单次查询在笔记本 CPU 上为几十毫秒
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+
+def _matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """元数据过滤：支持等值、$eq / $ne / $in / $nin 以及 $and / $or"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, expected in condition.items():
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$ne" and value == expected:
+                    return False
+                if op == "$in" and value not in expected:
+                    return False
+                if op == "$nin" and value in expected:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _hashable(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+class LocalVectorIndex:
+    """
+    基于 NumPy 的本地向量索引
+
+    功能：
+    1. 添加 / 更新 / 删除向量，数据追加写入磁盘
+    2. 余弦相似度 top-k 搜索，支持元数据过滤
+    3. 向量文件内存映射，启动时不需要整体读入内存
+    4. 删除比例过高时自动压缩
+    """
+
+    COMPACT_RATIO = 0.25
+    COMPACT_MIN_DELETED = 1000
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._vector_file = self.path / "vectors.f32"
+        self._log_file = self.path / "index.jsonl"
+        self._lock = threading.RLock()
+
+        self.dim: Optional[int] = None
+        self._ids: List[Optional[str]] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._postings: Dict[str, Dict[Any, set]] = {}
+        self._mmap: Optional[np.memmap] = None
+        self._deleted = 0
+
+        self._load()
+
+    def _load(self):
+        if not self._log_file.exists():
+            return
+        with open(self._log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    continue
+                if op["op"] == "init":
+                    self.dim = op["dim"]
+                elif op["op"] == "add":
+                    self._set_row(op["row"], op["id"], op.get("document"), op.get("metadata") or {})
+                elif op["op"] == "delete":
+                    self._remove(op["id"])
+
+        # 写入中断时向量文件和日志的行数可能不一致：丢弃没有向量的行，截掉没有日志的向量
+        if self.dim and self._vector_file.exists():
+            stored = self._vector_file.stat().st_size // (self.dim * 4)
+            for row in range(stored, len(self._ids)):
+                if self._ids[row] is not None:
+                    self._remove(self._ids[row])
+            del self._ids[stored:], self._documents[stored:], self._metadatas[stored:]
+            if stored > len(self._ids) or self._vector_file.stat().st_size % (self.dim * 4):
+                with open(self._vector_file, "r+b") as f:
+                    f.truncate(len(self._ids) * self.dim * 4)
+
+        logger.debug(f"📐 本地向量索引已加载: {len(self._rows)} 条 ({self.path})")
+
+    def _set_row(self, row: int, id: str, document: Optional[str], metadata: Dict[str, Any]):
+        if id in self._rows:
+            self._remove(id)
+        while len(self._ids) <= row:
+            self._ids.append(None)
+            self._documents.append(None)
+            self._metadatas.append(None)
+        self._ids[row] = id
+        self._documents[row] = document
+        self._metadatas[row] = metadata
+        self._rows[id] = row
+        if len(self._alive) <= row:
+            grown = np.zeros(max(1024, (row + 1) * 2), dtype=bool)
+            grown[:len(self._alive)] = self._alive
+            self._alive = grown
+        self._alive[row] = True
+        for key, postings in self._postings.items():
+            value = metadata.get(key)
+            if _hashable(value):
+                postings.setdefault(value, set()).add(row)
+
+    def _remove(self, id: str):
+        row = self._rows.pop(id, None)
+        if row is None:
+            return
+        for key, postings in self._postings.items():
+            value = self._metadatas[row].get(key)
+            if _hashable(value):
+                postings.get(value, set()).discard(row)
+        self._alive[row] = False
+        self._ids[row] = None
+        self._documents[row] = None
+        self._metadatas[row] = None
+        self._deleted += 1
+
+    def _append_log(self, ops: List[Dict[str, Any]]):
+        with open(self._log_file, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+
+    def _vectors(self) -> Optional[np.ndarray]:
+        """内存映射的向量矩阵（行数与 _ids 一致）"""
+        if not self._ids:
+            return None
+        if self._mmap is None or self._mmap.shape[0] != len(self._ids):
+            self._mmap = np.memmap(self._vector_file, dtype=np.float32, mode="r",
+                                   shape=(len(self._ids), self.dim))
+        return self._mmap
+
+    def __contains__(self, id: str) -> bool:
+        return id in self._rows
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]],
+               documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None):
+        """添加或更新向量"""
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[0] != len(ids):
+            raise ValueError("embeddings 与 ids 数量不一致")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            ops = []
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                ops.append({"op": "init", "dim": self.dim})
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度不匹配: {vectors.shape[1]} != {self.dim}")
+
+            with open(self._vector_file, "ab") as f:
+                f.write(vectors.tobytes())
+
+            start = len(self._ids)
+            for i, id in enumerate(ids):
+                document = documents[i] if documents else None
+                metadata = (metadatas[i] if metadatas else None) or {}
+                self._set_row(start + i, id, document, metadata)
+                ops.append({"op": "add", "id": id, "row": start + i, "document": document, "metadata": metadata})
+            self._append_log(ops)
+
+    add = upsert
+
+    def delete(self, ids: List[str]):
+        """删除向量"""
+        with self._lock:
+            ops = [{"op": "delete", "id": id} for id in ids if id in self._rows]
+            for op in ops:
+                self._remove(op["id"])
+            if ops:
+                self._append_log(ops)
+            if self._deleted >= max(self.COMPACT_MIN_DELETED, len(self._ids) * self.COMPACT_RATIO):
+                self.compact()
+
+    def search(self, query_embedding: List[float], k: int = 5,
+               where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        余弦相似度 top-k 搜索
+
+        Returns:
+            [{"id", "score", "document", "metadata"}]，按相似度从高到低
+        """
+        with self._lock:
+            vectors = self._vectors()
+            if vectors is None or not self._rows or k <= 0:
+                return []
+
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            if norm:
+                query = query / norm
+            scores = vectors @ query
+
+            alive = self._candidates(where)
+            candidates = np.flatnonzero(alive)
+            if candidates.size == 0:
+                return []
+            candidate_scores = scores[candidates]
+            k = min(k, candidates.size)
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+            top = top[np.argsort(-candidate_scores[top])]
+
+            return [
+                {
+                    "id": self._ids[row],
+                    "score": float(scores[row]),
+                    "document": self._documents[row],
+                    "metadata": self._metadatas[row],
+                }
+                for row in candidates[top]
+            ]
+
+    def _candidates(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """满足过滤条件的行掩码；简单等值条件走倒排表，其余条件逐行判断"""
+        alive = self._alive[:len(self._ids)].copy()
+        if not where:
+            return alive
+
+        simple = {key: value for key, value in where.items()
+                  if not key.startswith("$") and not isinstance(value, dict) and _hashable(value)}
+        for key, value in simple.items():
+            if key not in self._postings:
+                postings: Dict[Any, set] = {}
+                for row, metadata in enumerate(self._metadatas):
+                    if metadata is not None and _hashable(metadata.get(key)):
+                        postings.setdefault(metadata.get(key), set()).add(row)
+                self._postings[key] = postings
+            mask = np.zeros(len(alive), dtype=bool)
+            rows = self._postings[key].get(value)
+            if rows:
+                mask[np.fromiter(rows, dtype=np.int64, count=len(rows))] = True
+            alive &= mask
+
+        rest = {key: value for key, value in where.items() if key not in simple}
+        if rest:
+            for row in np.flatnonzero(alive):
+                if not _matches(self._metadatas[row], rest):
+                    alive[row] = False
+        return alive
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 5,
+              where: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, List[List[Any]]]:
+        """与 chromadb Collection.query 相同格式的查询结果（distances 为余弦距离）"""
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for embedding in query_embeddings:
+            hits = self.search(embedding, n_results, where)
+            result["ids"].append([hit["id"] for hit in hits])
+            result["documents"].append([hit["document"] for hit in hits])
+            result["metadatas"].append([hit["metadata"] for hit in hits])
+            result["distances"].append([1.0 - hit["score"] for hit in hits])
+        return result
+
+    def compact(self):
+        """去掉已删除的行，重写向量文件和日志"""
+        with self._lock:
+            if not self._deleted:
+                return
+            live_rows = [row for row, id in enumerate(self._ids) if id is not None]
+            vectors = self._vectors()
+            kept = np.array(vectors[live_rows]) if live_rows else np.zeros((0, self.dim or 0), np.float32)
+            self._mmap = None
+            del vectors
+
+            ids = [self._ids[row] for row in live_rows]
+            documents = [self._documents[row] for row in live_rows]
+            metadatas = [self._metadatas[row] for row in live_rows]
+
+            tmp_vectors = self._vector_file.with_name(self._vector_file.name + ".tmp")
+            tmp_log = self._log_file.with_name(self._log_file.name + ".tmp")
+            with open(tmp_vectors, "wb") as f:
+                f.write(kept.tobytes())
+            with open(tmp_log, "w", encoding="utf-8") as f:
+                if self.dim:
+                    f.write(json.dumps({"op": "init", "dim": self.dim}) + "\n")
+                for row, (id, document, metadata) in enumerate(zip(ids, documents, metadatas)):
+                    f.write(json.dumps({"op": "add", "id": id, "row": row, "document": document,
+                                        "metadata": metadata}, ensure_ascii=False) + "\n")
+            os.replace(tmp_vectors, self._vector_file)
+            os.replace(tmp_log, self._log_file)
+
+            self._ids, self._documents, self._metadatas = ids, documents, metadatas
+            self._rows = {id: row for row, id in enumerate(ids)}
+            self._alive = np.ones(len(ids), dtype=bool)
+            self._postings = {}
+            removed, self._deleted = self._deleted, 0
+            logger.info(f"🗜️ 本地向量索引已压缩，移除 {removed} 行")
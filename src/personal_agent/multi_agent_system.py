@@ -76,6 +76,9 @@ class MultiAgentSystem:
 
         self.loop = asyncio.get_running_loop()
         
+        from .scheduler.job_scheduler import get_job_scheduler
+        get_job_scheduler().start()
+        
         self._preload_metadata()
 
         self.master = MasterAgent()
@@ -86,6 +89,7 @@ class MultiAgentSystem:
         task_manager.set_limits(max_per_agent=2, max_total=8)
         
         await self._setup_email_monitor()
+        self._setup_memory_maintenance()
         await self._setup_os_agent()
         await self._setup_web_server_agent()
         await self._load_session()
@@ -128,6 +132,14 @@ class MultiAgentSystem:
         except Exception as e:
             logger.warning(f"邮件监控配置失败: {e}")
 
+    def _setup_memory_maintenance(self):
+        """启动记忆整理任务"""
+        try:
+            from .memory.maintenance import get_memory_maintenance
+            get_memory_maintenance().start()
+        except Exception as e:
+            logger.warning(f"记忆整理任务启动失败: {e}")
+
     async def _setup_os_agent(self):
         """设置操作系统智能体"""
         try:
@@ -175,10 +187,22 @@ class MultiAgentSystem:
         except Exception as e:
             logger.warning(f"停止邮件监控失败: {e}")
         
+        try:
+            from .memory.maintenance import get_memory_maintenance
+            await get_memory_maintenance().stop()
+        except Exception as e:
+            logger.warning(f"停止记忆整理任务失败: {e}")
+        
         try:
             await task_manager.stop()
         except Exception as e:
             logger.warning(f"停止任务管理器失败: {e}")
+        
+        try:
+            from .scheduler.job_scheduler import get_job_scheduler
+            await get_job_scheduler().stop()
+        except Exception as e:
+            logger.warning(f"停止后台任务调度器失败: {e}")
 
         if self.master:
             for agent_name, agent in list(self.master.sub_agents.items()):
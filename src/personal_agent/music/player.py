@@ -5,7 +5,6 @@ Music Player - 专业音乐播放器
 import os
 import json
 import random
-import threading
 import asyncio
 from pathlib import Path
 from typing import List, Dict, Optional, Any
@@ -138,62 +137,70 @@ class MusicPlayer:
         
         self.favorites: List[str] = []
         
-        self._monitor_thread = None
-        self._monitor_running = False
+        self._monitor_was_playing = False
+        self._monitor_skip_next = False
         
         self._on_song_change_callback = None
         
         self._load_data()
-        self._start_monitor()
         
         MusicPlayer._initialized = True
     
+    MONITOR_JOB = "music_monitor"
+
     def _start_monitor(self):
-        """启动播放监控线程"""
-        if self._monitor_thread and self._monitor_thread.is_alive():
+        """启动播放监控（后台调度器中每 0.5 秒检查一次，空闲时自动暂停）"""
+        if not PYGAME_AVAILABLE:
             return
-        
-        self._monitor_running = True
-        self._monitor_thread = threading.Thread(target=self._monitor_playback, daemon=True)
-        self._monitor_thread.start()
-    
+        from ..scheduler.job_scheduler import get_job_scheduler
+        scheduler = get_job_scheduler()
+        if scheduler.get_job(self.MONITOR_JOB) is None:
+            self._monitor_was_playing = False
+            self._monitor_skip_next = False
+            scheduler.add_job(
+                self._monitor_playback,
+                job_id=self.MONITOR_JOB,
+                trigger="interval",
+                seconds=0.5,
+                name="音乐播放监控",
+                misfire="skip",
+                run_in_thread=True,
+            )
+        else:
+            scheduler.resume(self.MONITOR_JOB)
+
     def _monitor_playback(self):
         """监控播放状态，自动播放下一首"""
-        import time
-        was_playing = False
-        skip_next_check = False
-        
-        while self._monitor_running:
-            try:
-                if PYGAME_AVAILABLE:
-                    is_busy = pygame.mixer.music.get_busy()
-                    
-                    if was_playing and not is_busy and not self._is_decrypting:
-                        if not skip_next_check:
-                            if self.is_playing and self.play_mode != PlayMode.SINGLE_LOOP:
-                                self.next_song()
-                                skip_next_check = True
-                            elif self.play_mode == PlayMode.SINGLE_LOOP and self.current_song:
-                                self._play_audio(self.current_song.path)
-                                self.is_playing = True
-                                self._notify_song_change()
-                                skip_next_check = True
-                    
-                    if is_busy:
-                        skip_next_check = False
-                    
-                    was_playing = is_busy
-                
-                time.sleep(0.5)
-            except Exception as e:
-                logger.debug(f"播放监控错误: {e}")
-                time.sleep(1)
-    
+        try:
+            is_busy = pygame.mixer.music.get_busy()
+
+            if self._monitor_was_playing and not is_busy and not self._is_decrypting:
+                if not self._monitor_skip_next:
+                    if self.is_playing and self.play_mode != PlayMode.SINGLE_LOOP:
+                        self.next_song()
+                        self._monitor_skip_next = True
+                    elif self.play_mode == PlayMode.SINGLE_LOOP and self.current_song:
+                        self._play_audio(self.current_song.path)
+                        self.is_playing = True
+                        self._notify_song_change()
+                        self._monitor_skip_next = True
+
+            if is_busy:
+                self._monitor_skip_next = False
+
+            self._monitor_was_playing = is_busy
+
+            # 暂停或停止后不再轮询，下次播放时恢复
+            if not is_busy and not self.is_playing and not self._is_decrypting:
+                from ..scheduler.job_scheduler import get_job_scheduler
+                get_job_scheduler().pause(self.MONITOR_JOB)
+        except Exception as e:
+            logger.debug(f"播放监控错误: {e}")
+
     def stop_monitor(self):
         """停止播放监控"""
-        self._monitor_running = False
-        if self._monitor_thread:
-            self._monitor_thread.join(timeout=2)
+        from ..scheduler.job_scheduler import get_job_scheduler
+        get_job_scheduler().remove_job(self.MONITOR_JOB)
         logger.info("🎵 播放监控已停止")
     
     def set_on_song_change_callback(self, callback):
@@ -513,6 +520,7 @@ class MusicPlayer:
                 pygame.mixer.music.set_volume(self.volume)
                 pygame.mixer.music.play()
                 self.position = 0
+                self._start_monitor()
                 return
             except Exception as e:
                 logger.error(f"pygame 播放失败: {e}")
@@ -591,6 +599,7 @@ class MusicPlayer:
                     if is_busy and not self.is_playing:
                         pygame.mixer.music.unpause()
                         self.is_playing = True
+                        self._start_monitor()
                         logger.info(f"▶️ 恢复播放: {self.current_song.title}")
                     elif not is_busy:
                         logger.info(f"▶️ 重新播放: {self.current_song.title}")
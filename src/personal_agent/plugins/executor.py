@@ -80,6 +80,7 @@ class TaskExecutor:
         self._task_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
         self._tasks: Dict[str, Task] = {}
         self._running_tasks: Set[str] = set()
+        self._done_events: Dict[str, asyncio.Event] = {}
 
         # 控制标志
         self._running = False
@@ -210,12 +211,12 @@ class TaskExecutor:
         if task.status in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED, TaskStatus.TIMEOUT):
             return task
 
-        # 等待任务完成
-        start_time = time.time()
-        while task.status not in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED, TaskStatus.TIMEOUT):
-            await asyncio.sleep(0.1)
-            if timeout and (time.time() - start_time) > timeout:
-                break
+        # 等待任务完成（由 _execute_task / cancel_task 通知，不轮询）
+        event = self._done_events.setdefault(task_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
 
         return task
 
@@ -228,6 +229,7 @@ class TaskExecutor:
         if task.status == TaskStatus.PENDING:
             task.status = TaskStatus.CANCELLED
             self._stats["total_cancelled"] += 1
+            self._notify_done(task_id)
             return True
 
         return False
@@ -246,18 +248,15 @@ class TaskExecutor:
         """工作循环"""
         while self._running:
             try:
-                # 获取任务（带优先级）
-                priority, _, task = await asyncio.wait_for(
-                    self._task_queue.get(),
-                    timeout=1.0
-                )
+                # 获取任务（带优先级），队列为空时一直等待，stop() 通过取消唤醒
+                priority, _, task = await self._task_queue.get()
 
                 # 使用信号量限制并发
                 async with self._semaphore:
                     await self._execute_task(task)
 
-            except asyncio.TimeoutError:
-                continue
+            except asyncio.CancelledError:
+                break
             except Exception as e:
                 logger.error(f"Worker loop error: {e}")
 
@@ -314,6 +313,13 @@ class TaskExecutor:
             task.completed_at = datetime.now()
             task.execution_time = time.time() - start_time
             self._running_tasks.discard(task.id)
+            self._notify_done(task.id)
+
+    def _notify_done(self, task_id: str):
+        """唤醒等待该任务的 wait_for_task"""
+        event = self._done_events.pop(task_id, None)
+        if event is not None:
+            event.set()
 
 
 # 全局执行器实例
@@ -0,0 +1,670 @@
+"""
+Job Scheduler - 统一后台任务调度
+
+各组件不再各自 while True + sleep 轮询，而是把周期任务注册到这里，由一个事件循环任务统一驱动：
+1. 所有任务的下次运行时间放在一个最小堆中，循环只睡到堆顶的时间点；增删改任务时立即唤醒重算
+2. 三种触发方式：interval（上次结束后间隔 N 秒）、cron（"分 时 日 月 周"）、date（一次性，可用 reschedule 重新安排）
+3. 可选随机抖动（jitter），避免多个任务同时触发
+4. 错过的运行（停机、休眠或任务仍在执行）按策略处理：run_once 补跑一次，skip 跳到下一个时间点；
+   超过 misfire_grace 秒的错过一律跳过
+5. persistent 任务的运行状态保存在 ~/.personal_agent/scheduler/jobs.json，重启后按上次运行时间继续
+6. 同一任务同时只运行一个实例；普通函数可放到线程池执行（run_in_thread）
+7. 对话中输入 /jobs（或"后台任务"）列出所有任务的下次运行时间和运行统计
+
+用法：
+    from ..scheduler.job_scheduler import get_job_scheduler
+    scheduler = get_job_scheduler()
+    scheduler.add_job(self._think, job_id="active_thinking", trigger="interval", seconds=3600, persistent=True)
+    scheduler.add_job(send_report, job_id="daily_report", trigger="cron", cron="0 9 * * *")
+    scheduler.reschedule("calendar_reminders", run_at=datetime(2024, 5, 1, 8, 55))
+"""
+import asyncio
+import heapq
+import inspect
+import itertools
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from loguru import logger
+
+from ..utils.persistence import atomic_write_json
+
+
+# 最长休眠时间，防止系统休眠或调整时钟后长时间不醒
+MAX_SLEEP = 3600
+
+_CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+_CRON_NAMES = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+    "sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6,
+}
+
+
+class CronExpression:
+    """
+    五段式 cron 表达式：分 时 日 月 周（周日为 0 或 7）
+
+    支持 *、*/n、a-b、a-b/n、逗号列表和英文缩写；日和周都指定时满足其一即可（与 cron 相同）
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        parts = self.expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron 表达式需要 5 段: {expression}")
+        self.fields: List[Set[int]] = [
+            self._parse_field(part, low, high) for part, (low, high) in zip(parts, _CRON_RANGES)
+        ]
+        self.fields[4] = {0 if d == 7 else d for d in self.fields[4]}
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse_field(part: str, low: int, high: int) -> Set[int]:
+        values: Set[int] = set()
+        for item in part.lower().split(","):
+            step = 1
+            if "/" in item:
+                item, step_text = item.split("/", 1)
+                step = int(step_text)
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                a, b = item.split("-", 1)
+                start, end = int(_CRON_NAMES.get(a, a)), int(_CRON_NAMES.get(b, b))
+            else:
+                start = int(_CRON_NAMES.get(item, item))
+                end = high if step > 1 else start
+            if start < low or end > high + (1 if high == 6 else 0) or start > end:
+                raise ValueError(f"cron 字段超出范围: {part}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.fields[2]
+        weekday_ok = (dt.weekday() + 1) % 7 in self.fields[4]
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        """晚于 after 的第一个匹配时间（逐级跳过不匹配的月 / 日 / 时）"""
+        minutes, hours, _, months, _ = self.fields
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after + timedelta(days=366 * 5)
+        while dt <= limit:
+            if dt.month not in months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if dt.hour not in hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            if dt.minute not in minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+        return None
+
+    def __str__(self) -> str:
+        return self.expression
+
+
+@dataclass
+class Job:
+    """调度任务及其运行状态（时间均为时间戳）"""
+    job_id: str
+    name: str
+    func: Callable
+    trigger: str
+    seconds: float = 0
+    cron: Optional[CronExpression] = None
+    run_at: Optional[float] = None
+    jitter: float = 0
+    misfire: str = "run_once"
+    misfire_grace: Optional[float] = None
+    run_in_thread: bool = False
+    persistent: bool = False
+    paused: bool = False
+    next_run: Optional[float] = None
+    last_run: Optional[float] = None
+    last_duration: Optional[float] = None
+    last_error: Optional[str] = None
+    run_count: int = 0
+    failures: int = 0
+    skipped: int = 0
+    running: bool = False
+    rerun: bool = False
+
+    def describe_trigger(self) -> str:
+        if self.trigger == "interval":
+            return f"每 {_format_seconds(self.seconds)}"
+        if self.trigger == "cron":
+            return f"cron {self.cron}"
+        return "一次性"
+
+    def to_dict(self) -> Dict[str, Any]:
+        def iso(ts: Optional[float]) -> Optional[str]:
+            return datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else None
+
+        return {
+            "job_id": self.job_id,
+            "name": self.name,
+            "trigger": self.describe_trigger(),
+            "paused": self.paused,
+            "running": self.running,
+            "next_run": iso(self.next_run),
+            "last_run": iso(self.last_run),
+            "last_duration": self.last_duration,
+            "last_error": self.last_error,
+            "run_count": self.run_count,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "persistent": self.persistent,
+        }
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds >= 3600 and seconds % 3600 == 0:
+        return f"{int(seconds // 3600)} 小时"
+    if seconds >= 60 and seconds % 60 == 0:
+        return f"{int(seconds // 60)} 分钟"
+    return f"{seconds:g} 秒"
+
+
+def _timestamp(value: Union[datetime, float, None]) -> Optional[float]:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
+
+
+class JobScheduler:
+    """
+    统一后台任务调度器
+
+    任务可以在调度器启动前注册，启动后才开始运行；
+    add_job / reschedule / pause / resume / remove_job 可在任意线程调用
+    """
+
+    INSTANCE = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls.INSTANCE is None:
+            cls.INSTANCE = super().__new__(cls)
+        return cls.INSTANCE
+
+    def __init__(self, state_file: str = None):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+
+        if state_file is None:
+            state_file = str(Path.home() / ".personal_agent" / "scheduler" / "jobs.json")
+        self.state_file = Path(state_file)
+
+        self._jobs: Dict[str, Job] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._counter = itertools.count()
+        self._lock = threading.RLock()
+        self._state: Dict[str, Dict[str, Any]] = self._load_state()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._job_tasks: Dict[str, asyncio.Task] = {}
+        self._running = False
+        self._stats = {"wakeups": 0, "runs": 0}
+
+        self._initialized = True
+
+    # ---------- 状态持久化 ----------
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        if not self.state_file.exists():
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ 加载调度任务状态失败: {e}")
+            return {}
+
+    def _save_state(self):
+        with self._lock:
+            for job in self._jobs.values():
+                if job.persistent:
+                    self._state[job.job_id] = {
+                        "last_run": job.last_run,
+                        "last_duration": job.last_duration,
+                        "last_error": job.last_error,
+                        "run_count": job.run_count,
+                        "failures": job.failures,
+                        "skipped": job.skipped,
+                    }
+            state = dict(self._state)
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_json(self.state_file, state)
+        except OSError as e:
+            logger.error(f"❌ 保存调度任务状态失败: {e}")
+
+    # ---------- 计算运行时间 ----------
+
+    @staticmethod
+    def _with_jitter(job: Job, ts: Optional[float]) -> Optional[float]:
+        if ts is None or not job.jitter:
+            return ts
+        return ts + random.uniform(0, job.jitter)
+
+    def _missed(self, job: Job, due: float, now: float) -> bool:
+        """错过的运行是否补跑"""
+        if job.misfire != "run_once":
+            return False
+        return job.misfire_grace is None or now - due <= job.misfire_grace
+
+    def _initial_run(self, job: Job, now: float, first_run_delay: float) -> Optional[float]:
+        """注册时的首次运行时间（结合持久化的上次运行时间和错过策略）"""
+        earliest = now + first_run_delay
+        if job.trigger == "interval":
+            if job.last_run is None:
+                return self._with_jitter(job, earliest)
+            due = job.last_run + job.seconds
+            if due < now and not self._missed(job, due, now):
+                due += ((now - due) // job.seconds + 1) * job.seconds
+                job.skipped += 1
+            return self._with_jitter(job, max(due, earliest))
+
+        if job.trigger == "cron":
+            if job.last_run is not None:
+                # 只看宽限期内最近错过的时间点
+                since = job.last_run
+                if job.misfire_grace is not None:
+                    since = max(since, now - job.misfire_grace)
+                due_dt = job.cron.next_after(datetime.fromtimestamp(since))
+                if due_dt is not None and due_dt.timestamp() < now and job.misfire == "run_once":
+                    return earliest
+                first_missed = job.cron.next_after(datetime.fromtimestamp(job.last_run))
+                if first_missed is not None and first_missed.timestamp() < now:
+                    job.skipped += 1
+            due_dt = job.cron.next_after(datetime.fromtimestamp(earliest))
+            return self._with_jitter(job, due_dt.timestamp() if due_dt else None)
+
+        if job.run_at is None:
+            return None
+        if job.run_at < now:
+            if job.last_run is not None and job.last_run >= job.run_at:
+                return None
+            if not self._missed(job, job.run_at, now):
+                job.skipped += 1
+                return None
+        return max(job.run_at, earliest)
+
+    def _next_run(self, job: Job, finished: float) -> Optional[float]:
+        """运行结束后的下次运行时间"""
+        if job.trigger == "interval":
+            return self._with_jitter(job, finished + job.seconds)
+        if job.trigger == "cron":
+            due_dt = job.cron.next_after(datetime.fromtimestamp(finished))
+            return self._with_jitter(job, due_dt.timestamp() if due_dt else None)
+        return None
+
+    def _push(self, job: Job):
+        if job.next_run is not None and not job.paused:
+            heapq.heappush(self._heap, (job.next_run, next(self._counter), job.job_id))
+        self._wake()
+
+    # ---------- 任务管理 ----------
+
+    def add_job(
+        self,
+        func: Callable,
+        job_id: str,
+        trigger: str = "interval",
+        seconds: float = None,
+        cron: str = None,
+        run_at: Union[datetime, float, None] = None,
+        name: str = None,
+        first_run_delay: float = 0,
+        jitter: float = 0,
+        misfire: str = "run_once",
+        misfire_grace: float = None,
+        run_in_thread: bool = False,
+        persistent: bool = False,
+        paused: bool = False,
+    ) -> Job:
+        """
+        注册（或替换）任务
+
+        Args:
+            func: 任务函数，可以是协程函数
+            job_id: 任务 ID，重复注册会替换原任务
+            trigger: interval / cron / date
+            seconds: interval 的间隔秒数（从上次运行结束算起）
+            cron: cron 表达式
+            run_at: date 的运行时间，为空时任务处于未安排状态，等待 reschedule
+            first_run_delay: 注册后至少等待的秒数
+            jitter: 每次运行时间增加 0 ~ jitter 秒的随机延迟
+            misfire: 错过运行时 run_once（补跑一次）或 skip（跳过）
+            misfire_grace: 错过超过这个秒数时一律跳过
+            run_in_thread: 普通函数是否放到线程池执行
+            persistent: 是否持久化运行状态（重启后按上次运行时间继续）
+            paused: 注册后先暂停，resume 后才开始运行
+        """
+        if trigger == "interval" and not seconds:
+            raise ValueError("interval 任务需要 seconds")
+        if trigger == "cron" and not cron:
+            raise ValueError("cron 任务需要 cron 表达式")
+        if trigger not in ("interval", "cron", "date"):
+            raise ValueError(f"不支持的触发方式: {trigger}")
+        if misfire not in ("run_once", "skip"):
+            raise ValueError(f"不支持的错过策略: {misfire}")
+
+        job = Job(
+            job_id=job_id,
+            name=name or job_id,
+            func=func,
+            trigger=trigger,
+            seconds=float(seconds or 0),
+            cron=CronExpression(cron) if cron else None,
+            run_at=_timestamp(run_at),
+            jitter=jitter,
+            misfire=misfire,
+            misfire_grace=misfire_grace,
+            run_in_thread=run_in_thread,
+            persistent=persistent,
+            paused=paused,
+        )
+
+        with self._lock:
+            saved = self._state.get(job_id) if persistent else None
+            if saved:
+                job.last_run = saved.get("last_run")
+                job.last_duration = saved.get("last_duration")
+                job.last_error = saved.get("last_error")
+                job.run_count = saved.get("run_count", 0)
+                job.failures = saved.get("failures", 0)
+                job.skipped = saved.get("skipped", 0)
+            job.next_run = self._initial_run(job, time.time(), first_run_delay)
+            self._jobs[job_id] = job
+            self._push(job)
+
+        logger.debug(f"⏰ 已注册后台任务: {job.name} ({job.describe_trigger()})")
+        self._ensure_started()
+        return job
+
+    def remove_job(self, job_id: str) -> bool:
+        """移除任务（正在运行的实例会继续运行完）"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        self._wake()
+        logger.debug(f"⏰ 已移除后台任务: {job.name}")
+        return True
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def reschedule(self, job_id: str, run_at: Union[datetime, float, None] = None,
+                   seconds: float = None) -> bool:
+        """
+        重新安排任务的下次运行时间
+
+        run_at 为空且 seconds 为空时，任务进入未安排状态（date 任务常用）；
+        seconds 用于修改 interval 任务的间隔
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            if seconds:
+                job.seconds = float(seconds)
+                job.next_run = time.time() + job.seconds if run_at is None else _timestamp(run_at)
+            else:
+                job.next_run = _timestamp(run_at)
+                if job.trigger == "date":
+                    job.run_at = job.next_run
+            self._push(job)
+        return True
+
+    def run_now(self, job_id: str) -> bool:
+        """
+        让任务尽快运行一次
+
+        任务正在运行时不算错过，而是标记为结束后立即再运行一次（多次请求合并为一次）
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            if job.running:
+                job.rerun = True
+                return True
+        return self.reschedule(job_id, run_at=time.time())
+
+    def pause(self, job_id: str) -> bool:
+        """暂停任务（不再触发，直到 resume）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job.paused = True
+        self._wake()
+        return True
+
+    def resume(self, job_id: str) -> bool:
+        """恢复任务，interval 任务在一个间隔后运行"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            if not job.paused and job.next_run is not None:
+                return True
+            job.paused = False
+            if job.trigger != "date" or job.next_run is None:
+                job.next_run = self._next_run(job, time.time()) or job.next_run
+            self._push(job)
+        return True
+
+    # ---------- 运行 ----------
+
+    def _ensure_started(self):
+        """在事件循环中注册任务时自动启动调度器"""
+        if self._running:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.start()
+
+    def start(self):
+        """启动调度循环（需要在事件循环中调用）"""
+        if self._running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._running = True
+        self._task = self._loop.create_task(self._run_loop())
+        logger.info(f"⏰ 后台任务调度器已启动（{len(self._jobs)} 个任务）")
+
+    async def stop(self):
+        """停止调度循环并取消正在运行的任务"""
+        self._running = False
+        tasks = [t for t in [self._task, *self._job_tasks.values()] if t and not t.done()]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        self._job_tasks.clear()
+        self._save_state()
+        logger.info("🛑 后台任务调度器已停止")
+
+    def _wake(self):
+        """唤醒调度循环重新计算休眠时间（可在任意线程调用）"""
+        if self._loop is None or self._wakeup is None or self._loop.is_closed():
+            return
+        try:
+            if asyncio.get_running_loop() is self._loop:
+                self._wakeup.set()
+                return
+        except RuntimeError:
+            pass
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _valid(self, ts: float, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None or job.paused or job.next_run != ts:
+            return None
+        return job
+
+    def _seconds_until_next(self, now: float) -> Optional[float]:
+        with self._lock:
+            while self._heap and self._valid(self._heap[0][0], self._heap[0][2]) is None:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - now)
+
+    def _pop_due(self, now: float) -> List[Job]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                ts, _, job_id = heapq.heappop(self._heap)
+                job = self._valid(ts, job_id)
+                if job is None:
+                    continue
+                job.next_run = None
+                task = self._job_tasks.get(job_id)
+                if task is not None and not task.done():
+                    # 上一次还没结束，本次按错过处理
+                    job.skipped += 1
+                    job.next_run = self._next_run(job, now)
+                    self._push(job)
+                    continue
+                job.running = True
+                due.append(job)
+        return due
+
+    async def _run_loop(self):
+        while self._running:
+            try:
+                self._wakeup.clear()
+                delay = self._seconds_until_next(time.time())
+                timeout = MAX_SLEEP if delay is None else min(delay, MAX_SLEEP)
+                if timeout > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                self._stats["wakeups"] += 1
+
+                for job in self._pop_due(time.time()):
+                    self._job_tasks[job.job_id] = self._loop.create_task(self._execute(job))
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"❌ 调度循环出错: {e}")
+                await asyncio.sleep(1)
+
+    async def _execute(self, job: Job):
+        started = time.time()
+        try:
+            if inspect.iscoroutinefunction(job.func):
+                await job.func()
+            elif job.run_in_thread:
+                result = await self._loop.run_in_executor(None, job.func)
+                if inspect.isawaitable(result):
+                    await result
+            else:
+                result = job.func()
+                if inspect.isawaitable(result):
+                    await result
+            job.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"❌ 后台任务 {job.name} 失败: {e}")
+        finally:
+            finished = time.time()
+            job.running = False
+            job.last_run = started
+            job.last_duration = round(finished - started, 3)
+            job.run_count += 1
+            self._stats["runs"] += 1
+            if self._job_tasks.get(job.job_id) is asyncio.current_task():
+                self._job_tasks.pop(job.job_id, None)
+            with self._lock:
+                if self._jobs.get(job.job_id) is job:
+                    if job.rerun:
+                        # 运行期间收到 run_now，结束后立即补跑一次
+                        job.rerun = False
+                        job.next_run = finished
+                        self._push(job)
+                    elif job.next_run is None:
+                        # 运行期间被 reschedule 过的任务保留新的安排
+                        job.next_run = self._next_run(job, finished)
+                        self._push(job)
+            if job.persistent:
+                self._save_state()
+
+    # ---------- 查询 ----------
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """所有任务的状态，按下次运行时间排序"""
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: (j.paused, j.next_run is None, j.next_run or 0))
+            return [job.to_dict() for job in jobs]
+
+    def format_jobs(self) -> str:
+        """任务列表（展示给用户）"""
+        jobs = self.list_jobs()
+        if not jobs:
+            return "⏰ 当前没有后台任务"
+        lines = [f"⏰ 后台任务 (共 {len(jobs)} 个)\n"]
+        for job in jobs:
+            if job["running"]:
+                status = "运行中"
+            elif job["paused"]:
+                status = "已暂停"
+            elif job["next_run"]:
+                status = f"下次 {job['next_run'].replace('T', ' ')}"
+            else:
+                status = "未安排"
+            line = f"• {job['name']}（{job['trigger']}）{status}，已运行 {job['run_count']} 次"
+            if job["failures"]:
+                line += f"，失败 {job['failures']} 次"
+            if job["last_error"]:
+                line += f"\n  └ 最近错误: {job['last_error']}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取调度器统计"""
+        return {
+            "running": self._running,
+            "jobs": len(self._jobs),
+            "active": sum(1 for j in self._jobs.values() if j.running),
+            **self._stats,
+        }
+
+
+def get_job_scheduler() -> JobScheduler:
+    """获取后台任务调度器实例"""
+    return JobScheduler()
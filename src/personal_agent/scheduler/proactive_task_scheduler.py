@@ -1,14 +1,18 @@
 """
 Proactive Task Scheduler - 主动任务调度系统
 定时和事件触发任务
+
+定时任务注册到统一的后台任务调度器（job_scheduler），按 cron 表达式触发，
+运行状态持久化，停机期间错过一小时以内的提醒会在启动后补发
 """
-import asyncio
 from datetime import datetime, timedelta
+from functools import partial
 from typing import List, Dict, Any, Callable, Optional
 from loguru import logger
 import uuid
 
 from ..agents.base import Task, TaskStatus, TaskPriority
+from .job_scheduler import get_job_scheduler
 
 
 class ScheduledTask:
@@ -93,6 +97,23 @@ class ScheduledTask:
             logger.error(f"❌ 计算下次运行时间失败: {e}")
             return None
 
+    def to_cron(self) -> Optional[str]:
+        """转换为 cron 表达式（one_time 任务返回 None）"""
+        weekday_map = {'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6, 'sun': 0}
+        parts = self.schedule_time.split(' ')
+        hour, minute = map(int, parts[-1].split(':'))
+
+        if self.schedule_type == "daily":
+            return f"{minute} {hour} * * *"
+        if self.schedule_type == "weekly":
+            return f"{minute} {hour} * * {weekday_map.get(parts[0].lower(), 1)}"
+        if self.schedule_type == "monthly":
+            return f"{minute} {hour} {int(parts[0])} * *"
+        if self.schedule_type == "yearly":
+            month, day = map(int, parts[0].split('-'))
+            return f"{minute} {hour} {day} {month} *"
+        return None
+
     def should_run(self) -> bool:
         """检查是否应该运行"""
         if not self.enabled or not self.next_run:
@@ -112,10 +133,14 @@ class ScheduledTask:
 class ProactiveTaskScheduler:
     """主动任务调度器"""
 
+    # 停机期间错过的提醒在这个时长内仍会补发
+    MISFIRE_GRACE = 3600
+
     def __init__(self):
         self._scheduled_tasks: Dict[str, ScheduledTask] = {}
         self._running = False
         self._task_handlers: Dict[str, Callable] = {}
+        self._jobs = get_job_scheduler()
         logger.info("⏰ 主动任务调度器已初始化")
 
     async def start(self):
@@ -124,38 +149,44 @@ class ProactiveTaskScheduler:
             return
 
         self._running = True
+        for scheduled_task in self._scheduled_tasks.values():
+            self._register_job(scheduled_task)
         logger.info("🚀 主动任务调度器已启动")
 
-        # 启动调度循环
-        asyncio.create_task(self._scheduler_loop())
-
     async def stop(self):
         """停止调度器"""
         self._running = False
+        for task_id in self._scheduled_tasks:
+            self._jobs.remove_job(f"proactive:{task_id}")
         logger.info("🛑 主动任务调度器已停止")
 
-    async def _scheduler_loop(self):
-        """调度循环"""
-        while self._running:
-            try:
-                # 检查所有定时任务
-                for task_id, scheduled_task in self._scheduled_tasks.items():
-                    if scheduled_task.should_run():
-                        logger.info(f"⏰ 执行定时任务: {scheduled_task.name}")
-                        
-                        # 生成并执行任务
-                        try:
-                            task = scheduled_task.task_generator(scheduled_task.params)
-                            await self._handle_task(task)
-                            scheduled_task.mark_as_run()
-                        except Exception as e:
-                            logger.error(f"❌ 执行定时任务失败: {e}")
-
-                # 每分钟检查一次
-                await asyncio.sleep(60)
-            except Exception as e:
-                logger.error(f"❌ 调度循环失败: {e}")
-                await asyncio.sleep(60)
+    def _register_job(self, scheduled_task: ScheduledTask):
+        """把定时任务注册到后台任务调度器"""
+        if not scheduled_task.enabled:
+            return
+        job_id = f"proactive:{scheduled_task.task_id}"
+        func = partial(self._run_scheduled_task, scheduled_task.task_id)
+        try:
+            cron = scheduled_task.to_cron()
+            if cron:
+                self._jobs.add_job(func, job_id=job_id, trigger="cron", cron=cron, name=scheduled_task.name,
+                                   persistent=True, misfire_grace=self.MISFIRE_GRACE)
+            else:
+                self._jobs.add_job(func, job_id=job_id, trigger="date", name=scheduled_task.name,
+                                   run_at=datetime.fromisoformat(scheduled_task.schedule_time),
+                                   persistent=True, misfire_grace=self.MISFIRE_GRACE)
+        except ValueError as e:
+            logger.error(f"❌ 注册定时任务失败 {scheduled_task.name}: {e}")
+
+    async def _run_scheduled_task(self, task_id: str):
+        """执行一个定时任务"""
+        scheduled_task = self._scheduled_tasks.get(task_id)
+        if scheduled_task is None:
+            return
+        logger.info(f"⏰ 执行定时任务: {scheduled_task.name}")
+        task = scheduled_task.task_generator(scheduled_task.params)
+        await self._handle_task(task)
+        scheduled_task.mark_as_run()
 
     async def _handle_task(self, task: Task):
         """处理任务"""
@@ -187,12 +218,15 @@ class ProactiveTaskScheduler:
     def add_scheduled_task(self, task: ScheduledTask):
         """添加定时任务"""
         self._scheduled_tasks[task.task_id] = task
+        if self._running:
+            self._register_job(task)
         logger.info(f"📅 已添加定时任务: {task.name} ({task.schedule_type})")
 
     def remove_scheduled_task(self, task_id: str):
         """移除定时任务"""
         if task_id in self._scheduled_tasks:
             del self._scheduled_tasks[task_id]
+            self._jobs.remove_job(f"proactive:{task_id}")
             logger.info(f"🗑️ 已移除定时任务: {task_id}")
 
     def get_scheduled_tasks(self) -> List[ScheduledTask]:
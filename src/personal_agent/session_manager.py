@@ -8,6 +8,8 @@ from datetime import datetime
 from typing import Dict, List, Optional, Any
 from loguru import logger
 
+from .utils.persistence import DebouncedJsonWriter, atomic_write_json
+
 
 class SimpleSessionManager:
     """
@@ -21,7 +23,7 @@ class SimpleSessionManager:
     特点：
     - 无需常驻服务
     - 简单易维护
-    - 自动保存
+    - 自动保存（短时间内的多次修改合并为一次原子写入，退出时自动刷新）
     """
     
     def __init__(self, storage_path: Path = None, auto_save: bool = True):
@@ -31,6 +33,11 @@ class SimpleSessionManager:
         
         self.current_session: Dict[str, Any] = {}
         self._current_user_id: str = "default"
+        self._writer = DebouncedJsonWriter(
+            lambda: self._get_session_file(self._current_user_id),
+            self._snapshot,
+            name="session"
+        )
         
         self._load_session()
     
@@ -75,23 +82,35 @@ class SimpleSessionManager:
             }
         }
     
+    def _snapshot(self) -> Dict[str, Any]:
+        """写入时的会话内容"""
+        self.current_session["updated_at"] = datetime.now().isoformat()
+        return self.current_session
+    
+    def _schedule_save(self):
+        """标记会话已修改，稍后合并写入"""
+        if self.auto_save:
+            self._writer.mark_dirty()
+    
     def save_session(self, user_id: str = None):
-        """保存会话"""
-        if user_id is None:
-            user_id = self._current_user_id
-        
-        session_file = self._get_session_file(user_id)
+        """立即保存会话
+
+        user_id 与当前用户不同时，与原先一样把当前会话同步写入该用户的会话文件
+        """
+        if user_id is not None and user_id != self._current_user_id:
+            try:
+                atomic_write_json(self._get_session_file(user_id), self._snapshot())
+                logger.debug(f"💾 会话已保存: {user_id}")
+            except Exception as e:
+                logger.error(f"保存会话失败: {e}")
+            return
         
-        try:
-            self.current_session["updated_at"] = datetime.now().isoformat()
-            
-            with open(session_file, "w", encoding="utf-8") as f:
-                json.dump(self.current_session, f, ensure_ascii=False, indent=2)
-            
-            logger.debug(f"💾 会话已保存: {user_id}")
-            
-        except Exception as e:
-            logger.error(f"保存会话失败: {e}")
+        if self._writer.flush(force=True):
+            logger.debug(f"💾 会话已保存: {self._current_user_id}")
+    
+    def get_persistence_stats(self) -> Dict[str, Any]:
+        """获取会话写入统计"""
+        return self._writer.get_stats()
     
     def switch_user(self, user_id: str):
         """切换用户"""
@@ -115,8 +134,7 @@ class SimpleSessionManager:
         if len(self.current_session["messages"]) > 100:
             self.current_session["messages"] = self.current_session["messages"][-50:]
         
-        if self.auto_save:
-            self.save_session()
+        self._schedule_save()
     
     def get_messages(self, limit: int = 20) -> List[Dict]:
         """获取最近的消息"""
@@ -130,8 +148,7 @@ class SimpleSessionManager:
         """设置会话上下文"""
         self.current_session["context"][key] = value
         
-        if self.auto_save:
-            self.save_session()
+        self._schedule_save()
     
     def get_preference(self, key: str, default: Any = None) -> Any:
         """获取用户偏好"""
@@ -144,8 +161,7 @@ class SimpleSessionManager:
         
         self.current_session["preferences"][key] = value
         
-        if self.auto_save:
-            self.save_session()
+        self._schedule_save()
     
     def update_statistics(self, task_success: bool = True):
         """更新统计信息"""
@@ -154,8 +170,7 @@ class SimpleSessionManager:
         if task_success:
             stats["successful_tasks"] += 1
         
-        if self.auto_save:
-            self.save_session()
+        self._schedule_save()
     
     def get_statistics(self) -> Dict:
         """获取统计信息"""
@@ -165,8 +180,7 @@ class SimpleSessionManager:
         """清空消息历史"""
         self.current_session["messages"] = []
         
-        if self.auto_save:
-            self.save_session()
+        self._schedule_save()
         
         logger.info("🧹 会话消息已清空")
     
@@ -175,8 +189,7 @@ class SimpleSessionManager:
         user_id = self._current_user_id
         self.current_session = self._create_new_session(user_id)
         
-        if self.auto_save:
-            self.save_session()
+        self._schedule_save()
         
         logger.info("🧹 会话已重置")
     
@@ -189,8 +202,7 @@ class SimpleSessionManager:
         try:
             self.current_session = json.loads(json_str)
             
-            if self.auto_save:
-                self.save_session()
+            self._schedule_save()
             
             logger.info("📥 会话已导入")
             
@@ -2,7 +2,6 @@
 Active Thinking Engine - 主动思考引擎
 定期分析用户数据，预测用户需求，主动生成任务
 """
-import asyncio
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from loguru import logger
@@ -10,6 +9,7 @@ import uuid
 
 from ..memory.long_term_memory import LongTermMemory, UserProfile, ImportantEvent, UserInsight
 from ..agents.base import Task, TaskStatus, TaskPriority
+from ..scheduler.job_scheduler import get_job_scheduler
 
 
 class ActiveThinkingEngine:
@@ -30,25 +30,23 @@ class ActiveThinkingEngine:
         self._running = True
         logger.info("🚀 主动思考引擎已启动")
 
-        # 启动定期思考任务
-        asyncio.create_task(self._periodic_thinking())
+        # 每小时思考一次（由后台任务调度器触发，重启后按上次思考时间继续）
+        get_job_scheduler().add_job(
+            self._think,
+            job_id="active_thinking",
+            trigger="interval",
+            seconds=3600,
+            name="主动思考",
+            jitter=60,
+            persistent=True,
+        )
 
     async def stop(self):
         """停止主动思考引擎"""
         self._running = False
+        get_job_scheduler().remove_job("active_thinking")
         logger.info("🛑 主动思考引擎已停止")
 
-    async def _periodic_thinking(self):
-        """定期思考"""
-        while self._running:
-            try:
-                # 每小时思考一次
-                await self._think()
-                await asyncio.sleep(3600)  # 1小时
-            except Exception as e:
-                logger.error(f"❌ 主动思考失败: {e}")
-                await asyncio.sleep(60)  # 1分钟后重试
-
     async def _think(self):
         """主动思考"""
         logger.info("🤔 开始主动思考...")
@@ -228,6 +228,19 @@ class ReActEngine:
     RETRY_DELAY = 1.0
     TOOL_TIMEOUT = 60.0
     
+    MAX_PARALLEL_TOOLS = 4
+    
+    # 有界面或系统副作用的工具，不与其他工具并发执行
+    SERIAL_TOOLS = {
+        "open_app", "smart_install", "play_music", "play_video", "system_control",
+        "clipboard_write", "take_screenshot",
+    }
+    
+    # 上下文压缩：消息总量超过预算时，截断较早的工具观察结果
+    CONTEXT_TOKEN_BUDGET = 12000
+    KEEP_RECENT_OBSERVATIONS = 2
+    OBSERVATION_PREVIEW_CHARS = 400
+    
     TOOL_TIMEOUTS = {
         "open_app": 180.0,
         "smart_install": 300.0,
@@ -294,6 +307,7 @@ class ReActEngine:
                 if iteration == 0:
                     response = await self._query_and_select_tools(messages)
                 else:
+                    self._compact_messages(messages)
                     response = await self._call_llm_with_retry(messages)
                 
                 if response.tool_calls:
@@ -430,13 +444,12 @@ class ReActEngine:
         tool_call_map = {tc.name: tc for tc in tool_calls}
         
         for level_idx, level in enumerate(plan.execution_order):
+            level_nodes = []
             for node_name in level:
                 node = plan.get_node(node_name)
                 if not node:
                     continue
                 
-                tool_call = tool_call_map.get(node.tool_name)
-                
                 args = dict(node.arguments)
                 
                 args = self._resolve_dependencies(args, node.dependencies, tool_outputs)
@@ -451,46 +464,20 @@ class ReActEngine:
                 if on_step:
                     on_step(step)
                 
-                observation = await self._execute_tool_with_timeout(
-                    node.tool_name,
-                    args,
-                    original_request=original_request
-                )
-                
-                tool_outputs[node_name] = observation
-                
-                obs_step = ReActStep(
-                    step_type="observation",
-                    content=observation
+                level_nodes.append((node_name, node, args))
+            
+            observations = await self._execute_tools_concurrently(
+                [(node.tool_name, args) for _, node, args in level_nodes],
+                original_request=original_request
+            )
+            
+            for (node_name, node, args), observation in zip(level_nodes, observations):
+                tool_call = tool_call_map.get(node.tool_name)
+                self._record_observation(
+                    node_name, node.tool_name, args, observation,
+                    tool_call.id if tool_call else f"injected_{node.tool_name}",
+                    messages, result, on_step, tool_outputs
                 )
-                result.steps.append(obs_step)
-                if on_step:
-                    on_step(obs_step)
-                
-                result.tool_calls.append({
-                    "name": node.tool_name,
-                    "arguments": args,
-                    "result": observation
-                })
-                
-                tool_call_id = tool_call.id if tool_call else f"injected_{node.tool_name}"
-                messages.append({
-                    "role": "assistant",
-                    "content": None,
-                    "tool_calls": [{
-                        "id": tool_call_id,
-                        "type": "function",
-                        "function": {
-                            "name": node.tool_name,
-                            "arguments": json.dumps(args, ensure_ascii=False)
-                        }
-                    }]
-                })
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call_id,
-                    "content": observation
-                })
         
         all_observations = []
         for node_name, obs in tool_outputs.items():
@@ -543,13 +530,13 @@ class ReActEngine:
             on_step(pending_step)
         
         for level_idx, level in enumerate(execution_plan):
+            # 同一层级的节点互不依赖，可以并发执行
+            level_nodes = []
             for node_name in level:
                 node = node_map.get(node_name)
                 if not node:
                     continue
                 
-                tool_call = tool_call_map.get(node.tool_name)
-                
                 args = dict(node.arguments)
                 
                 args = self._resolve_dependencies(args, node.dependencies, tool_outputs)
@@ -574,52 +561,171 @@ class ReActEngine:
                 if on_step:
                     on_step(step)
                 
-                observation = await self._execute_tool_with_timeout(
-                    node.tool_name,
-                    args,
-                    original_request=original_request
-                )
-                
-                tool_outputs[node_name] = observation
-                
-                obs_step = ReActStep(
-                    step_type="observation",
-                    content=observation
+                level_nodes.append((node_name, node, args))
+            
+            observations = await self._execute_tools_concurrently(
+                [(node.tool_name, args) for _, node, args in level_nodes],
+                original_request=original_request
+            )
+            
+            for (node_name, node, args), observation in zip(level_nodes, observations):
+                tool_call = tool_call_map.get(node.tool_name)
+                self._record_observation(
+                    node_name, node.tool_name, args, observation,
+                    tool_call.id if tool_call else f"injected_{node.tool_name}",
+                    messages, result, on_step, tool_outputs
                 )
-                result.steps.append(obs_step)
-                if on_step:
-                    on_step(obs_step)
-                
-                result.tool_calls.append({
-                    "name": node.tool_name,
-                    "arguments": args,
-                    "result": observation
-                })
-                
-                tool_call_id = tool_call.id if tool_call else f"injected_{node.tool_name}"
-                messages.append({
-                    "role": "assistant",
-                    "content": None,
-                    "tool_calls": [{
-                        "id": tool_call_id,
-                        "type": "function",
-                        "function": {
-                            "name": node.tool_name,
-                            "arguments": json.dumps(args, ensure_ascii=False)
-                        }
-                    }]
-                })
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call_id,
-                    "content": observation
-                })
         
         last_observation = list(tool_outputs.values())[-1] if tool_outputs else ""
         result.success = True
         result.answer = last_observation
         return result
     
+    async def _execute_tools_concurrently(
+        self,
+        calls: List[Tuple[str, Dict[str, Any]]],
+        original_request: str = None
+    ) -> List[str]:
+        """
+        并发执行一组互不依赖的工具调用（受 MAX_PARALLEL_TOOLS 限制，每个工具独立超时）
+        
+        有界面或系统副作用的工具（SERIAL_TOOLS）在其他工具完成后单独执行
+        
+        Returns:
+            与 calls 顺序一致的观察结果
+        """
+        observations: List[Optional[str]] = [None] * len(calls)
+        semaphore = asyncio.Semaphore(self.MAX_PARALLEL_TOOLS)
+        
+        async def run_one(index: int, tool_name: str, arguments: Dict[str, Any]):
+            async with semaphore:
+                try:
+                    observations[index] = await self._execute_tool_with_timeout(
+                        tool_name, arguments, original_request=original_request
+                    )
+                except Exception as e:
+                    logger.error(f"❌ 工具 '{tool_name}' 执行失败: {e}")
+                    observations[index] = f"错误：工具 '{tool_name}' 执行失败: {e}"
+        
+        parallel = [(i, name, args) for i, (name, args) in enumerate(calls) if name not in self.SERIAL_TOOLS]
+        serial = [(i, name, args) for i, (name, args) in enumerate(calls) if name in self.SERIAL_TOOLS]
+        
+        if len(parallel) > 1:
+            logger.info(f"⚡ 并发执行 {len(parallel)} 个工具: {[name for _, name, _ in parallel]}")
+        await asyncio.gather(*(run_one(i, name, args) for i, name, args in parallel))
+        for i, name, args in serial:
+            await run_one(i, name, args)
+        
+        return observations
+    
+    def _record_observation(
+        self,
+        node_name: str,
+        tool_name: str,
+        args: Dict[str, Any],
+        observation: str,
+        tool_call_id: str,
+        messages: List[Dict],
+        result: ReActResult,
+        on_step: Optional[Callable[[ReActStep], None]],
+        tool_outputs: Dict[str, str]
+    ):
+        """记录一次工具调用的观察结果"""
+        tool_outputs[node_name] = observation
+        
+        obs_step = ReActStep(
+            step_type="observation",
+            content=observation
+        )
+        result.steps.append(obs_step)
+        if on_step:
+            on_step(obs_step)
+        
+        result.tool_calls.append({
+            "name": tool_name,
+            "arguments": args,
+            "result": observation
+        })
+        
+        messages.append({
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": tool_call_id,
+                "type": "function",
+                "function": {
+                    "name": tool_name,
+                    "arguments": json.dumps(args, ensure_ascii=False)
+                }
+            }]
+        })
+        messages.append({
+            "role": "tool",
+            "tool_call_id": tool_call_id,
+            "content": observation
+        })
+    
+    @staticmethod
+    def _estimate_tokens(text: Optional[str]) -> int:
+        """粗略估算 token 数：中日韩字符按 1 个，其余字符按 4 个字符 1 个"""
+        if not text:
+            return 0
+        cjk = sum(1 for ch in text if '\u4e00' <= ch <= '\u9fff' or '\u3040' <= ch <= '\u30ff')
+        return cjk + (len(text) - cjk) // 4 + 1
+    
+    def _compact_messages(self, messages: List[Dict]) -> int:
+        """
+        在 token 预算内压缩消息列表（原地修改）
+        
+        1. 保留系统提示、最近的用户输入和最近几条工具观察结果
+        2. 较早的工具观察结果截断为预览，仍超预算时替换为引用
+        3. 仍超预算时截断较早的对话上下文
+        
+        消息条数和 tool_call 配对保持不变，完整结果保存在 ReActResult.tool_calls 中
+        
+        Returns:
+            压缩后估算的 token 数
+        """
+        total = sum(self._estimate_tokens(m.get("content")) for m in messages if isinstance(m.get("content"), str))
+        if total <= self.CONTEXT_TOKEN_BUDGET:
+            return total
+        
+        tool_indexes = [i for i, m in enumerate(messages) if m.get("role") == "tool"]
+        old_tool_indexes = tool_indexes[:-self.KEEP_RECENT_OBSERVATIONS] if self.KEEP_RECENT_OBSERVATIONS else tool_indexes
+        last_user_index = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        context_indexes = [
+            i for i, m in enumerate(messages)
+            if 0 < i < last_user_index and m.get("role") in ("user", "assistant") and isinstance(m.get("content"), str)
+        ]
+        
+        def shrink(index: int, keep_chars: int, label: str) -> int:
+            content = messages[index].get("content")
+            if not isinstance(content, str) or len(content) <= keep_chars + 50:
+                return 0
+            before = self._estimate_tokens(content)
+            if keep_chars > 0:
+                messages[index]["content"] = f"{content[:keep_chars]}\n...[{label}已截断，原长 {len(content)} 字符]"
+            else:
+                messages[index]["content"] = f"[{label}已省略，原长 {len(content)} 字符]"
+            return before - self._estimate_tokens(messages[index]["content"])
+        
+        passes = [
+            (old_tool_indexes, self.OBSERVATION_PREVIEW_CHARS, "工具结果"),
+            (old_tool_indexes, 0, "工具结果"),
+            (context_indexes, self.OBSERVATION_PREVIEW_CHARS, "历史消息"),
+            (tool_indexes, self.OBSERVATION_PREVIEW_CHARS * 4, "工具结果"),
+        ]
+        for indexes, keep_chars, label in passes:
+            for index in indexes:
+                if total <= self.CONTEXT_TOKEN_BUDGET:
+                    break
+                total -= shrink(index, keep_chars, label)
+            if total <= self.CONTEXT_TOKEN_BUDGET:
+                break
+        
+        logger.info(f"🗜️ ReAct 上下文压缩后约 {total} tokens（预算 {self.CONTEXT_TOKEN_BUDGET}）")
+        return total
+    
     def _resolve_dependencies(
         self,
         args: Dict[str, Any],
@@ -0,0 +1,260 @@
+"""
+CPU Worker Pool - 共享 CPU 进程池
+
+PDF 文本提取、图片转换、NCM 解密等 CPU 密集型工作提交到这里，在独立进程中执行，
+避免阻塞事件循环
+
+用法：
+    from ..utils.cpu_pool import get_cpu_pool
+    result = await get_cpu_pool().submit(func, arg1, arg2, priority=5, timeout=120)
+
+注意：func 必须是模块级函数，参数和返回值必须可以 pickle
+
+环境变量：
+    CPU_POOL_WORKERS    进程数（默认 CPU 核数 - 1，且不超过 CPU 核数），0 表示改用线程执行
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+
+@dataclass(order=True)
+class _Job:
+    sort_key: tuple
+    func: Callable = field(compare=False)
+    args: tuple = field(compare=False, default=())
+    kwargs: Dict[str, Any] = field(compare=False, default_factory=dict)
+    name: str = field(compare=False, default="")
+    future: Optional[asyncio.Future] = field(compare=False, default=None)
+    started: Optional[asyncio.Event] = field(compare=False, default=None)
+    interrupted: Optional[asyncio.Future] = field(compare=False, default=None)
+    executor: Any = field(compare=False, default=None)
+    attempt: int = field(compare=False, default=0)
+    started_at: float = field(compare=False, default=0.0)
+
+
+class CpuWorkerPool:
+    """
+    共享 CPU 进程池
+
+    功能：
+    1. 进程数受 CPU 核数限制，所有智能体共用
+    2. 任务按优先级排队（数字越大越优先，同优先级先进先出）
+    3. 排队中的任务可以取消；运行中的任务取消或超时会回收进程池，
+       同一进程池中其他运行中的任务重新排队
+    4. 超时时间从任务开始执行时计算；因进程池回收而重新排队的任务再次开始时重新计时
+    """
+
+    INSTANCE = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls.INSTANCE is None:
+            cls.INSTANCE = super().__new__(cls)
+        return cls.INSTANCE
+
+    def __init__(self, max_workers: Optional[int] = None):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+
+        cpu_count = os.cpu_count() or 1
+        if max_workers is None:
+            try:
+                max_workers = int(os.getenv("CPU_POOL_WORKERS", max(1, cpu_count - 1)))
+            except ValueError:
+                max_workers = max(1, cpu_count - 1)
+        self.max_workers = min(max(0, max_workers), cpu_count)
+        self.use_threads = self.max_workers == 0
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: List[_Job] = []
+        self._running: Dict[int, _Job] = {}
+        self._seq = itertools.count()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "timeouts": 0, "recycled": 0}
+
+        self._initialized = True
+        mode = "线程" if self.use_threads else f"{self.max_workers} 个进程"
+        logger.info(f"⚙️ CPU 工作池已初始化（{mode}）")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def submit(self, func: Callable, *args, priority: int = 5,
+                     timeout: Optional[float] = None, name: str = "", **kwargs) -> Any:
+        """
+        提交任务并等待结果
+
+        Args:
+            func: 模块级函数
+            priority: 优先级 1-10，数字越大越优先
+            timeout: 执行超时（秒），None 表示不限制
+            name: 任务名称（用于日志）
+
+        Returns:
+            func 的返回值
+
+        Raises:
+            asyncio.TimeoutError: 执行超时
+            asyncio.CancelledError: 调用方取消
+        """
+        name = name or getattr(func, "__name__", "job")
+        self._stats["submitted"] += 1
+
+        if self.use_threads:
+            call = asyncio.to_thread(func, *args, **kwargs)
+            return await (asyncio.wait_for(call, timeout) if timeout else call)
+
+        loop = asyncio.get_running_loop()
+        job = _Job(
+            sort_key=(-priority, next(self._seq)),
+            func=func,
+            args=args,
+            kwargs=kwargs,
+            name=name,
+            future=loop.create_future(),
+            started=asyncio.Event(),
+        )
+        heapq.heappush(self._queue, job)
+        self._pump()
+
+        try:
+            while True:
+                await job.started.wait()
+                if not timeout:
+                    return await job.future
+                # 本次执行因其他任务超时被回收、重新排队时，等下次开始后重新计时
+                interrupted = job.interrupted
+                await asyncio.wait({job.future, interrupted}, timeout=timeout,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if job.future.done():
+                    return job.future.result()
+                if not interrupted.done():
+                    raise asyncio.TimeoutError()
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            logger.warning(f"⏰ CPU 任务超时: {name} ({timeout}s)")
+            self._abort(job)
+            raise
+        except asyncio.CancelledError:
+            self._stats["cancelled"] += 1
+            self._abort(job)
+            raise
+
+    def _pump(self):
+        """把排队中的任务提交给进程池，同时运行的任务数不超过进程数"""
+        while self._queue and len(self._running) < self.max_workers:
+            job = heapq.heappop(self._queue)
+            if job.future.done():
+                continue
+
+            job.attempt += 1
+            job.executor = self._get_executor()
+            job.started_at = time.monotonic()
+            job.interrupted = job.future.get_loop().create_future()
+            key = job.sort_key[1]
+            self._running[key] = job
+            try:
+                cf = job.executor.submit(job.func, *job.args, **job.kwargs)
+            except Exception as e:
+                self._running.pop(key, None)
+                job.future.set_exception(e)
+                job.started.set()
+                continue
+
+            attempt = job.attempt
+            asyncio.wrap_future(cf).add_done_callback(
+                lambda f, job=job, attempt=attempt: self._on_done(job, attempt, f)
+            )
+            job.started.set()
+
+    def _on_done(self, job: _Job, attempt: int, f: asyncio.Future):
+        if job.attempt != attempt:
+            # 已回收的进程池中的旧结果，忽略
+            if not f.cancelled():
+                f.exception()
+            return
+        self._running.pop(job.sort_key[1], None)
+        if not job.future.done():
+            if f.cancelled():
+                job.future.cancel()
+            elif f.exception() is not None:
+                self._stats["failed"] += 1
+                job.future.set_exception(f.exception())
+            else:
+                self._stats["completed"] += 1
+                job.future.set_result(f.result())
+        elif not f.cancelled():
+            f.exception()
+        self._pump()
+
+    def _abort(self, job: _Job):
+        """取消任务：排队中直接丢弃，运行中则回收所在的进程池"""
+        if not job.future.done():
+            job.future.cancel()
+        if self._running.pop(job.sort_key[1], None) is None:
+            return
+        job.attempt += 1
+        self._recycle(job.executor)
+        self._pump()
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """终止进程池中的进程，其中其他运行中的任务重新排队"""
+        if executor is None:
+            return
+        self._stats["recycled"] += 1
+        if executor is self._executor:
+            self._executor = None
+
+        for key, other in list(self._running.items()):
+            if other.executor is executor:
+                self._running.pop(key)
+                other.attempt += 1
+                other.started.clear()
+                if other.interrupted is not None and not other.interrupted.done():
+                    other.interrupted.set_result(True)
+                heapq.heappush(self._queue, other)
+
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            try:
+                process.terminate()
+            except Exception:
+                pass
+        logger.info(f"♻️ CPU 工作池已回收 {len(processes)} 个进程")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取工作池统计"""
+        now = time.monotonic()
+        return {
+            **self._stats,
+            "max_workers": self.max_workers,
+            "queued": sum(1 for job in self._queue if not job.future.done()),
+            "running": [
+                {"name": job.name, "seconds": round(now - job.started_at, 1)}
+                for job in self._running.values()
+            ],
+        }
+
+    def shutdown(self):
+        """关闭工作池"""
+        for job in self._queue:
+            if not job.future.done():
+                job.future.cancel()
+        self._queue.clear()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def get_cpu_pool() -> CpuWorkerPool:
+    """获取共享 CPU 工作池实例"""
+    return CpuWorkerPool()
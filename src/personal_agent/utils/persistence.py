@@ -0,0 +1,240 @@
+"""
+Write-Behind Persistence - 延迟合并写入
+
+频繁变化的 JSON 状态（会话、对话）不再每次修改都整文件重写：
+修改时只标记为脏，短时间内的多次修改合并为一次写入；
+写入先写临时文件再原子替换；进程退出和收到终止信号时自动刷新
+
+用法：
+    self._writer = DebouncedJsonWriter(lambda: path, lambda: data, name="session")
+    self._writer.mark_dirty()     # 修改后调用
+    self._writer.flush()          # 需要立即落盘时调用
+"""
+import atexit
+import json
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+
+def atomic_write_text(path: Path, text: str):
+    """原子写入文本文件（临时文件 + fsync + 替换）"""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(path: Path, data: Any, indent: Optional[int] = 2):
+    """原子写入 JSON 文件"""
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=indent))
+
+
+class DebouncedJsonWriter:
+    """
+    延迟合并的 JSON 写入器
+
+    最后一次修改后 delay 秒写入；持续修改时最多延迟 max_delay 秒
+    """
+
+    def __init__(self, path_fn: Callable[[], Path], data_fn: Callable[[], Any],
+                 name: str = "", delay: float = None, max_delay: float = None, indent: Optional[int] = 2):
+        self.path_fn = path_fn
+        self.data_fn = data_fn
+        self.name = name or "state"
+        self.delay = delay if delay is not None else float(os.getenv("PERSIST_DEBOUNCE_SECONDS", "1.0"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("PERSIST_MAX_DELAY_SECONDS", "5.0"))
+        self.indent = indent
+
+        self._lock = threading.RLock()
+        self._dirty_since: Optional[float] = None
+        self._last_change: Optional[float] = None
+        self._pending_changes = 0
+        self._stats = {
+            "changes": 0,
+            "flushes": 0,
+            "coalesced": 0,
+            "errors": 0,
+            "last_flush_at": None,
+            "last_flush_ms": None,
+        }
+        _registry.register(self)
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty_since is not None
+
+    def mark_dirty(self):
+        """标记有未保存的修改"""
+        with self._lock:
+            now = time.monotonic()
+            if self._dirty_since is None:
+                self._dirty_since = now
+            self._last_change = now
+            self._pending_changes += 1
+            self._stats["changes"] += 1
+        _registry.wake()
+
+    def due_at(self) -> Optional[float]:
+        """下一次应写入的时间（monotonic），无修改时返回 None"""
+        with self._lock:
+            if self._dirty_since is None:
+                return None
+            return min(self._last_change + self.delay, self._dirty_since + self.max_delay)
+
+    def flush(self, force: bool = False) -> bool:
+        """
+        立即写入
+
+        Args:
+            force: 没有未保存的修改时也写入
+
+        Returns:
+            是否写入成功
+        """
+        with self._lock:
+            if not force and self._dirty_since is None:
+                return True
+            pending = self._pending_changes
+            started = time.perf_counter()
+            try:
+                atomic_write_text(self.path_fn(), self._serialize())
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.error(f"❌ 保存 {self.name} 失败: {e}")
+                if self._dirty_since is not None:
+                    # 推迟重试，避免后台线程反复失败
+                    self._dirty_since = self._last_change = time.monotonic()
+                return False
+
+            self._dirty_since = None
+            self._last_change = None
+            self._pending_changes = 0
+            self._stats["flushes"] += 1
+            self._stats["coalesced"] += max(0, pending - 1)
+            self._stats["last_flush_at"] = time.time()
+            self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            return True
+
+    def _serialize(self) -> str:
+        # 后台线程序列化时数据可能正被其他线程修改，出现迭代错误时重试
+        for attempt in range(3):
+            try:
+                return json.dumps(self.data_fn(), ensure_ascii=False, indent=self.indent)
+            except RuntimeError:
+                if attempt == 2:
+                    raise
+                time.sleep(0.01)
+    
+    def discard(self):
+        """丢弃未保存的修改（例如数据已被替换为其他文件的内容）"""
+        with self._lock:
+            self._dirty_since = None
+            self._last_change = None
+            self._pending_changes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写入统计"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "dirty": self.dirty,
+                "pending_changes": self._pending_changes,
+                **self._stats,
+            }
+
+
+class _WriterRegistry:
+    """所有写入器的后台刷新线程，以及退出/信号时的刷新"""
+
+    def __init__(self):
+        self._writers: List[DebouncedJsonWriter] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._hooks_installed = False
+
+    def register(self, writer: DebouncedJsonWriter):
+        with self._cond:
+            self._writers.append(writer)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+        self._install_hooks()
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = [t for t in (w.due_at() for w in self._writers) if t is not None]
+                timeout = max(0.0, min(due) - time.monotonic()) if due else None
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+                writers = list(self._writers)
+            now = time.monotonic()
+            for writer in writers:
+                due_at = writer.due_at()
+                if due_at is not None and due_at <= now:
+                    writer.flush()
+
+    def flush_all(self):
+        """刷新所有未保存的修改"""
+        with self._cond:
+            writers = list(self._writers)
+        for writer in writers:
+            if writer.dirty:
+                writer.flush()
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [w.get_stats() for w in self._writers]
+
+    def _install_hooks(self):
+        if self._hooks_installed:
+            return
+        self._hooks_installed = True
+        atexit.register(self.flush_all)
+
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for signum in (getattr(signal, "SIGTERM", None), getattr(signal, "SIGBREAK", None)):
+            if signum is None:
+                continue
+            try:
+                previous = signal.getsignal(signum)
+                signal.signal(signum, self._make_handler(previous))
+            except (ValueError, OSError):
+                pass
+
+    def _make_handler(self, previous):
+        def handler(signum, frame):
+            self.flush_all()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous == signal.SIG_DFL:
+                signal.signal(signum, signal.SIG_DFL)
+                signal.raise_signal(signum)
+        return handler
+
+
+_registry = _WriterRegistry()
+
+
+def flush_all_writers():
+    """立即刷新所有延迟写入的状态"""
+    _registry.flush_all()
+
+
+def get_write_behind_stats() -> List[Dict[str, Any]]:
+    """获取所有延迟写入器的统计（是否有未保存修改、合并次数、写入耗时等）"""
+    return _registry.get_stats()
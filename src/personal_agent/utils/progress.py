@@ -1,9 +1,36 @@
 """
 Progress Callback Manager - 进度回调管理器
 
-用于在工具执行时向GUI报告进度
+用于在工具执行时向GUI报告进度，并向各渠道推送工作流进度事件
 """
-from typing import Callable, Optional
+import contextvars
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class ProgressEvent:
+    """进度事件
+
+    kind:
+        step_started  - 工作流步骤开始
+        step_finished - 工作流步骤结束（message 为结果摘要）
+        task_progress - 长任务的百分比进度（下载、解密、批量转换等）
+    """
+    kind: str
+    message: str = ""
+    progress: int = -1                      # -1 表示不确定，0-100 表示百分比
+    task_id: str = ""
+    task_type: str = ""
+    agent: str = ""
+    step_index: Optional[int] = None        # 从 1 开始
+    total_steps: Optional[int] = None
+    success: Optional[bool] = None
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
 
 
 class ProgressManager:
@@ -11,6 +38,8 @@ class ProgressManager:
 
     def __init__(self):
         self._callback: Optional[Callable[[str, int], None]] = None
+        self._listeners: List[Callable[[ProgressEvent], None]] = []
+        self._task_contexts: Dict[str, contextvars.Context] = {}
 
     def set_callback(self, callback: Callable[[str, int], None]):
         """设置进度回调函数
@@ -36,6 +65,46 @@ class ProgressManager:
             except Exception:
                 pass
 
+    def subscribe(self, listener: Callable[[ProgressEvent], None]):
+        """订阅进度事件
+        Args:
+            listener: 事件监听函数，可能在事件循环线程中被调用，
+                      GUI 等需要自行切换到界面线程
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[ProgressEvent], None]):
+        """取消订阅进度事件"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def track(self, task_id: str):
+        """记下发起任务时的上下文
+
+        智能体上报的进度经消息总线转发，已不在发起请求的上下文中；
+        登记后，该任务的事件会在发起时的上下文中通知订阅者，
+        渠道可以用 contextvars 找回提交任务的连接
+        """
+        if task_id:
+            self._task_contexts[task_id] = contextvars.copy_context()
+
+    def untrack(self, task_id: str):
+        """任务结束后移除登记的上下文"""
+        self._task_contexts.pop(task_id, None)
+
+    def emit(self, event: ProgressEvent):
+        """推送进度事件给所有订阅者"""
+        context = self._task_contexts.get(event.task_id) if event.task_id else None
+        for listener in list(self._listeners):
+            try:
+                if context is not None:
+                    context.copy().run(listener, event)
+                else:
+                    listener(event)
+            except Exception:
+                pass
+
 
 # 全局进度管理器实例
 progress_manager = ProgressManager()
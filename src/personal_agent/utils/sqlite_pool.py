@@ -0,0 +1,216 @@
+"""
+SQLite Pool - 共享 SQLite 访问层
+
+每个数据库文件一个连接池，每个线程复用自己的连接：
+1. WAL 模式，读写互不阻塞；busy_timeout 让并发写入排队而不是立即报 "database is locked"
+2. 连接常驻，语句缓存（prepared statements）跨调用复用，不再每次操作都建立连接
+3. transaction() 把多条写入合并到一个事务中提交，支持嵌套（内层使用保存点）
+
+用法：
+    from ..utils.sqlite_pool import get_sqlite_pool
+    db = get_sqlite_pool("data/app.db")
+    db.execute("INSERT INTO t (a) VALUES (?)", (1,))
+    rows = db.fetchall("SELECT a FROM t WHERE a > ?", (0,))
+    with db.transaction():
+        db.executemany("INSERT INTO t (a) VALUES (?)", [(2,), (3,)])
+
+环境变量：
+    SQLITE_BUSY_TIMEOUT_MS   等待锁的最长时间（默认 5000）
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from loguru import logger
+
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -8000,
+    "mmap_size": 64 * 1024 * 1024,
+}
+
+
+class SQLitePool:
+    """
+    单个 SQLite 数据库的线程连接池
+
+    功能：
+    1. 每个线程一个常驻连接，首次使用时创建并设置 pragma
+    2. 自动提交模式，显式事务用 BEGIN IMMEDIATE 提前获取写锁，避免升级锁时死锁
+    3. 遇到锁冲突时按退避重试
+    4. 统计连接数、事务数和锁重试次数
+    """
+
+    STATEMENT_CACHE_SIZE = 256
+    LOCK_RETRIES = 5
+
+    def __init__(self, db_path: str, pragmas: Optional[Dict[str, Any]] = None):
+        self.db_path = str(db_path)
+        if self.db_path != ":memory:":
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        try:
+            self.busy_timeout_ms = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+        except ValueError:
+            self.busy_timeout_ms = 5000
+
+        self._local = threading.local()
+        self._connections: Dict[int, sqlite3.Connection] = {}
+        self._lock = threading.Lock()
+        self._stats = {"connections": 0, "transactions": 0, "rollbacks": 0, "lock_retries": 0}
+
+    def connection(self) -> sqlite3.Connection:
+        """当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.busy_timeout_ms / 1000,
+                isolation_level=None,
+                cached_statements=self.STATEMENT_CACHE_SIZE,
+                check_same_thread=False,
+            )
+            conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+            for name, value in self.pragmas.items():
+                try:
+                    conn.execute(f"PRAGMA {name}={value}")
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ 设置 SQLite PRAGMA {name} 失败: {e}")
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._lock:
+                self._prune()
+                self._connections[threading.get_ident()] = conn
+                self._stats["connections"] += 1
+        return conn
+
+    def _prune(self):
+        """关闭已结束线程留下的连接"""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in [ident for ident in self._connections if ident not in alive]:
+            try:
+                self._connections.pop(ident).close()
+            except sqlite3.Error:
+                pass
+
+    def _retry(self, func, *args):
+        """锁冲突时退避重试（busy_timeout 之外的兜底）"""
+        for attempt in range(self.LOCK_RETRIES):
+            try:
+                return func(*args)
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                if attempt == self.LOCK_RETRIES - 1 or getattr(self._local, "depth", 0):
+                    raise
+                self._stats["lock_retries"] += 1
+                time.sleep(0.05 * (2 ** attempt))
+
+    @contextmanager
+    def transaction(self):
+        """
+        事务上下文：正常退出时提交，异常时回滚
+
+        嵌套调用时内层使用保存点，只有最外层提交
+        """
+        conn = self.connection()
+        depth = self._local.depth
+        if depth == 0:
+            self._retry(conn.execute, "BEGIN IMMEDIATE")
+        else:
+            conn.execute(f"SAVEPOINT sp_{depth}")
+        self._local.depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0:
+                conn.execute("ROLLBACK")
+                self._stats["rollbacks"] += 1
+            else:
+                conn.execute(f"ROLLBACK TO sp_{depth}")
+                conn.execute(f"RELEASE sp_{depth}")
+            raise
+        else:
+            self._local.depth = depth
+            if depth == 0:
+                self._retry(conn.execute, "COMMIT")
+                self._stats["transactions"] += 1
+            else:
+                conn.execute(f"RELEASE sp_{depth}")
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        """执行一条语句（不在事务中时自动提交）"""
+        return self._retry(self.connection().execute, sql, params)
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Sequence[Any]]) -> sqlite3.Cursor:
+        """批量执行同一条语句，在一个事务中提交"""
+        with self.transaction() as conn:
+            return conn.executemany(sql, seq_of_params)
+
+    def executescript(self, script: str):
+        """执行多条 DDL 语句"""
+        self._retry(self.connection().executescript, script)
+
+    def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        return self.execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return self.execute(sql, params).fetchall()
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+            with self._lock:
+                self._connections.pop(threading.get_ident(), None)
+
+    def close_all(self):
+        """关闭所有线程的连接（仅在进程退出或数据库文件被替换时调用）"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections = {}
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接池统计"""
+        return {
+            "db_path": self.db_path,
+            "open_connections": len(self._connections),
+            **self._stats,
+        }
+
+
+_pools: Dict[str, SQLitePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_sqlite_pool(db_path: str, pragmas: Optional[Dict[str, Any]] = None) -> SQLitePool:
+    """获取数据库文件对应的共享连接池（同一文件在进程内只有一个池）"""
+    key = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SQLitePool(db_path, pragmas)
+            _pools[key] = pool
+        return pool
+
+
+def get_sqlite_pool_stats() -> List[Dict[str, Any]]:
+    """获取所有连接池的统计"""
+    with _pools_lock:
+        return [pool.get_stats() for pool in _pools.values()]